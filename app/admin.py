@@ -1,3 +1,76 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Carteira, Cliente, CreditoJob, Estabelecimento, ImportacaoJob, SaldoSnapshot, Transacao
+from .renderizacao import invalidar_fragmentos
+
+
+@admin.register(CreditoJob)
+class CreditoJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'carteira_destino', 'valor', 'signature', 'criado_em', 'concluido_em')
+    list_filter = ('status',)
+    search_fields = ('id', 'carteira_destino', 'signature')
+    exclude = ('chave_privada',)
+    readonly_fields = ('signature', 'erro', 'tentativas', 'criado_em', 'enviado_em', 'concluido_em')
+
+
+@admin.register(ImportacaoJob)
+class ImportacaoJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'estabelecimento', 'status', 'nome_arquivo', 'lidas', 'importados', 'criado_em')
+    list_filter = ('status',)
+    raw_id_fields = ('estabelecimento',)
+    readonly_fields = ('lidas', 'importados', 'duplicados', 'invalidos', 'erro', 'atualizado_em', 'concluido_em')
+
+
+@admin.register(Estabelecimento)
+class EstabelecimentoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'nome', 'criado_em')
+    search_fields = ('nome',)
+
+
+@admin.register(Cliente)
+class ClienteAdmin(admin.ModelAdmin):
+    list_display = ('id', 'nome', 'estabelecimento', 'moedas', 'canal', 'ativo', 'ultima_atividade_em')
+    list_filter = ('ativo', 'vip', 'canal')
+    search_fields = ('nome', 'telefone', 'email')
+    list_select_related = ('estabelecimento',)
+    raw_id_fields = ('estabelecimento',)
+    # saldo só muda por lançamento no ledger (app/ledger.py)
+    readonly_fields = ('moedas', 'ultima_atividade', 'ultima_atividade_em', 'transacoes_desde_snapshot')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # nome do cliente aparece nas páginas versionadas pelo ledger (ETag)
+        invalidar_fragmentos()
+
+
+@admin.register(Carteira)
+class CarteiraAdmin(admin.ModelAdmin):
+    list_display = ('endereco', 'cliente', 'criado_em')
+    search_fields = ('endereco',)
+    raw_id_fields = ('cliente',)
+
+
+@admin.register(Transacao)
+class TransacaoAdmin(admin.ModelAdmin):
+    list_display = ('referencia', 'cliente', 'tipo', 'moedas', 'canal', 'criado_em')
+    list_filter = ('tipo', 'canal')
+    list_select_related = ('cliente',)
+    raw_id_fields = ('estabelecimento', 'cliente')
+    # sem COUNT(*) na tabela inteira a cada página do admin
+    show_full_result_count = False
+
+    # ledger só de inserção
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SaldoSnapshot)
+class SaldoSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('cliente', 'saldo', 'ultima_transacao', 'criado_em')
+    raw_id_fields = ('cliente', 'ultima_transacao')
+
+    def has_change_permission(self, request, obj=None):
+        return False
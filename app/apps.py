@@ -2,4 +2,31 @@ from django.apps import AppConfig
 
 
 class AppConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_migrate, post_save
+
+        from .busca import _cliente_gravado
+        from .instrumentacao import instalar_em_conexao
+
+        # tempo e quantidade de consultas por request (Server-Timing e /metrics/)
+        connection_created.connect(instalar_em_conexao, dispatch_uid='app.instrumentacao')
+        # índices de busca de clientes fora do ORM (triggers do SQLite somem quando a tabela é recriada)
+        post_migrate.connect(_indices_busca, sender=self, dispatch_uid='app.busca')
+        # versão dos clientes no ETag de /clientes/buscar/
+        for modelo in (self.get_model('Cliente'), self.get_model('Carteira')):
+            for sinal in (post_save, post_delete):
+                sinal.connect(_cliente_gravado, sender=modelo, dispatch_uid=f'app.busca.{modelo.__name__}')
+
+
+def _indices_busca(sender, using, apps, **kwargs):
+    from django.db import connections
+
+    from .busca import instalar_indices
+
+    campos = {campo.name for campo in apps.get_model('app', 'Cliente')._meta.get_fields()}
+    if 'busca' in campos:
+        instalar_indices(connections[using])
@@ -0,0 +1,118 @@
+"""
+Aquecimento de um processo web antes de ele receber tráfego (gunicorn.conf.py).
+
+Um worker novo (o gunicorn recicla cada um a cada --max-requests) pagaria
+no primeiro request o import do URLconf e das views, a compilação das
+rotas e dos templates (o loader ``cached`` guarda o compilado por processo)
+e a conexão com o banco. ``aquecer()`` faz isso antes:
+
+- com ``preload_app``, uma vez no master, sem banco; os workers herdam
+  módulos, rotas e templates compilados no fork (e dividem as páginas de
+  memória enquanto ninguém escreve nelas);
+- sem preload, em cada worker, no ``post_worker_init``.
+
+``abrir_conexoes()`` roda sempre no worker: conexão aberta no master seria
+compartilhada pelos filhos.
+"""
+import logging
+import re
+import time
+import uuid
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Extensões tratadas como template nos diretórios dos engines
+EXTENSOES_TEMPLATE = ('.html', '.txt', '.xml')
+
+# Valor de exemplo por conversor de rota, para montar um caminho que resolva
+_EXEMPLOS = {'int': 1, 'uuid': uuid.UUID(int=0), 'str': 'x', 'slug': 'x', 'path': 'x'}
+_PARAMETRO = re.compile(r'<(?:(?P<tipo>\w+):)?(?P<nome>\w+)>')
+
+
+def compilar_templates():
+    """Compila todos os templates dos engines (projeto e apps); devolve quantos."""
+    from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+
+    total = 0
+    for engine in engines.all():
+        diretorios = engine.template_dirs
+        if hasattr(engine, 'engine'):
+            # DjangoTemplates com "loaders" explícitos: os diretórios dos apps vêm dos loaders
+            diretorios = [d for loader in engine.engine.template_loaders for d in loader.get_dirs()]
+        for diretorio in dict.fromkeys(diretorios):
+            base = Path(diretorio)
+            for arquivo in sorted(base.rglob('*')):
+                if arquivo.suffix not in EXTENSOES_TEMPLATE:
+                    continue
+                try:
+                    engine.get_template(arquivo.relative_to(base).as_posix())
+                except (TemplateDoesNotExist, TemplateSyntaxError) as e:
+                    # template de app que só compila com uma biblioteca não instalada
+                    logger.warning('Aquecimento: template %s não compilou: %s', arquivo, e)
+                else:
+                    total += 1
+    return total
+
+
+def _caminhos(padroes, prefixo=''):
+    """Um caminho de exemplo por rota (conversores preenchidos com ``_EXEMPLOS``)."""
+    from django.urls import URLResolver
+    from django.urls.resolvers import RoutePattern
+
+    for padrao in padroes:
+        rota = padrao.pattern
+        if not isinstance(rota, RoutePattern):
+            continue  # re_path (admin): a regex é compilada pelo _populate, sem exemplo
+        trecho = _PARAMETRO.sub(
+            lambda m: rota.converters[m['nome']].to_url(_EXEMPLOS.get(m['tipo'] or 'str', 'x')), str(rota),
+        )
+        if isinstance(padrao, URLResolver):
+            yield from _caminhos(padrao.url_patterns, prefixo + trecho)
+        else:
+            yield prefixo + trecho
+
+
+def resolver_rotas():
+    """Importa o URLconf, compila as rotas e resolve um caminho de cada; devolve quantos."""
+    from django.urls import Resolver404, get_resolver
+
+    resolver = get_resolver()
+    resolver.reverse_dict  # _populate: compila a regex de todas as rotas
+    total = 0
+    for caminho in _caminhos(resolver.url_patterns):
+        try:
+            resolver.resolve('/' + caminho)
+        except Resolver404:
+            logger.warning('Aquecimento: rota de exemplo /%s não resolveu', caminho)
+        else:
+            total += 1
+    return total
+
+
+def abrir_conexoes():
+    """Abre (e testa) a conexão de cada banco configurado neste processo."""
+    from django.db import connections
+
+    for conexao in connections.all():
+        conexao.ensure_connection()
+
+
+def fechar_conexoes():
+    """Fecha as conexões (e o pool do psycopg) antes de um fork."""
+    from django.db import connections
+
+    for conexao in connections.all():
+        conexao.close()
+        if hasattr(conexao, 'close_pool'):
+            conexao.close_pool()
+
+
+def aquecer(banco=True):
+    """Rotas, templates e (se ``banco``) conexões; devolve o que fez e quanto levou."""
+    inicio = time.perf_counter()
+    resultado = {'rotas': resolver_rotas(), 'templates': compilar_templates()}
+    if banco:
+        abrir_conexoes()
+    resultado['segundos'] = round(time.perf_counter() - inicio, 3)
+    return resultado
@@ -0,0 +1,212 @@
+"""
+Busca de clientes por nome, telefone, e-mail e carteira (/clientes/buscar/).
+
+``Cliente.busca`` guarda nome, e-mail e dígitos do telefone normalizados
+(minúsculas, sem acento), recalculado em ``Cliente.save()``; quem grava em
+massa (``bulk_create``) preenche com ``texto_busca()``. Sobre ele:
+
+- prefixo do nome: intervalo num índice (estabelecimento, busca);
+- trecho em qualquer posição (3+ caracteres): índice de trigramas —
+  ``pg_trgm`` (GIN) no Postgres, tabela FTS5 com tokenizer ``trigram`` no
+  SQLite, sincronizada por triggers a cada INSERT/UPDATE/DELETE;
+- carteira: prefixo no índice único de ``Carteira.endereco``.
+
+Cada consulta é limitada (BUSCA_CANDIDATOS) e o resultado é ordenado por
+relevância em Python: nome começando pelo termo, depois palavra do nome,
+depois telefone/e-mail/carteira, depois trecho.
+
+O ETag da busca usa ``Estabelecimento.versao_clientes``, incrementado por
+``invalidar_busca``: a cada save/delete de Cliente ou Carteira (sinais em
+app/apps.py) e por quem grava em massa (importação).
+"""
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+
+TABELA_FTS = 'app_cliente_busca'
+
+# Maior code point: limite superior do intervalo de prefixo (comparação binária do SQLite)
+_FIM_PREFIXO = '\U0010ffff'
+
+# Caracteres finais do termo procurados no FTS5; o termo inteiro é conferido
+# com instr() na linha do cliente. O começo de um telefone (DDI, DDD, 9) se
+# repete em quase todos os clientes, e um trigrama presente em todas as linhas
+# deixa a frase do FTS5 uma ordem de grandeza mais lenta.
+_TRECHO_FTS = 6
+
+_BASE58 = re.compile(r'^[1-9A-HJ-NP-Za-km-z]+$')
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e com espaços simples."""
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    sem_acento = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acento.lower().split())
+
+
+def digitos(texto):
+    return ''.join(c for c in texto or '' if c.isdigit())
+
+
+def texto_busca(nome, telefone, email):
+    """Valor de ``Cliente.busca``: começa pelo nome, para o prefixo valer como busca por nome."""
+    return ' '.join(filter(None, [normalizar(nome), normalizar(email), digitos(telefone)]))
+
+
+def normalizar_termo(termo):
+    """Termo como ele aparece em ``busca``: só dígitos se não houver letras (telefone digitado com máscara)."""
+    if not any(c.isalpha() for c in termo) and any(c.isdigit() for c in termo):
+        return digitos(termo)
+    return normalizar(termo)
+
+
+# ---------- índices (dependem do banco) ----------
+
+def instalar_indices(conexao=None):
+    """
+    Cria os índices de busca do banco atual, se faltarem. Idempotente: roda na
+    migration e de novo a cada ``migrate`` (post_migrate), porque o SQLite
+    recria a tabela em algumas alterações de schema e os triggers vão junto.
+    """
+    conexao = conexao or connection
+    with conexao.cursor() as cursor:
+        if conexao.vendor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS cliente_busca_trgm_idx ON app_cliente USING gin (busca gin_trgm_ops)'
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS cliente_estab_busca_idx '
+                'ON app_cliente (estabelecimento_id, busca varchar_pattern_ops)'
+            )
+        elif conexao.vendor == 'sqlite':
+            cursor.execute('CREATE INDEX IF NOT EXISTS cliente_estab_busca_idx ON app_cliente (estabelecimento_id, busca)')
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'app_cliente_busca_%'"
+            )
+            if cursor.fetchone()[0] == 3:
+                return
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5("
+                "busca, content='app_cliente', content_rowid='id', tokenize='trigram')"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS app_cliente_busca_ai AFTER INSERT ON app_cliente BEGIN '
+                f'INSERT INTO {TABELA_FTS}(rowid, busca) VALUES (new.id, new.busca); END'
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS app_cliente_busca_ad AFTER DELETE ON app_cliente BEGIN '
+                f"INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, busca) VALUES ('delete', old.id, old.busca); END"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS app_cliente_busca_au AFTER UPDATE OF busca ON app_cliente BEGIN '
+                f"INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, busca) VALUES ('delete', old.id, old.busca); "
+                f'INSERT INTO {TABELA_FTS}(rowid, busca) VALUES (new.id, new.busca); END'
+            )
+            # triggers recém-criados: o índice pode estar atrás da tabela
+            cursor.execute(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')")
+
+
+def remover_indices(conexao=None):
+    conexao = conexao or connection
+    with conexao.cursor() as cursor:
+        if conexao.vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS cliente_busca_trgm_idx')
+            cursor.execute('DROP INDEX IF EXISTS cliente_estab_busca_idx')
+        elif conexao.vendor == 'sqlite':
+            for sufixo in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS app_cliente_busca_{sufixo}')
+            cursor.execute(f'DROP TABLE IF EXISTS {TABELA_FTS}')
+            cursor.execute('DROP INDEX IF EXISTS cliente_estab_busca_idx')
+
+
+def _prefixo(campo, termo):
+    """Filtro de prefixo que usa índice: LIKE com pattern_ops no Postgres, intervalo no SQLite."""
+    if connection.vendor == 'postgresql':
+        return {f'{campo}__startswith': termo}
+    return {f'{campo}__gte': termo, f'{campo}__lt': termo + _FIM_PREFIXO}
+
+
+def _ids_trecho(estabelecimento_id, termo, limite):
+    from .models import Cliente
+
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            # CROSS JOIN fixa a ordem: sem ele o planejador varre os clientes do
+            # estabelecimento e consulta o FTS linha a linha (segundos em 1M)
+            cursor.execute(
+                f'SELECT c.id FROM {TABELA_FTS} f CROSS JOIN app_cliente c ON c.id = f.rowid '
+                f'WHERE {TABELA_FTS} MATCH %s AND c.estabelecimento_id = %s AND instr(c.busca, %s) > 0 LIMIT %s',
+                ['"' + termo[-_TRECHO_FTS:].replace('"', '""') + '"', estabelecimento_id, termo, limite],
+            )
+            return [linha[0] for linha in cursor.fetchall()]
+    # Postgres: LIKE '%termo%' resolvido pelo índice GIN de trigramas
+    return list(
+        Cliente.objects.filter(estabelecimento_id=estabelecimento_id, busca__contains=termo)
+        .values_list('id', flat=True)[:limite]
+    )
+
+
+# ---------- consulta ----------
+
+def _relevancia(cliente, termo, termo_bruto):
+    nome = normalizar(cliente.nome)
+    if nome.startswith(termo):
+        return 0
+    if any(palavra.startswith(termo) for palavra in nome.split()):
+        return 1
+    carteira = getattr(cliente, 'carteira', None)
+    if (
+        normalizar(cliente.email).startswith(termo)
+        or digitos(cliente.telefone).startswith(termo)
+        or (carteira is not None and carteira.endereco.startswith(termo_bruto))
+    ):
+        return 2
+    return 3
+
+
+def buscar_clientes(estabelecimento_id, termo, limite=None):
+    """Até ``limite`` clientes do estabelecimento, do mais ao menos relevante."""
+    from .models import Carteira, Cliente
+
+    limite = min(limite or settings.BUSCA_LIMITE, settings.BUSCA_LIMITE_MAX)
+    termo_bruto = termo.strip()
+    termo = normalizar_termo(termo_bruto)
+    if len(termo) < settings.BUSCA_MIN_CARACTERES:
+        return []
+
+    consulta = Cliente.objects.filter(estabelecimento_id=estabelecimento_id)
+    ids = list(
+        consulta.filter(**_prefixo('busca', termo)).order_by('busca').values_list('id', flat=True)[:limite]
+    )
+    if len(ids) < limite and len(termo) >= 3:
+        ids += _ids_trecho(estabelecimento_id, termo, settings.BUSCA_CANDIDATOS)
+    if len(termo_bruto) >= 4 and _BASE58.match(termo_bruto):
+        # só o índice de endereco: o filtro de estabelecimento fica para a consulta final
+        ids += Carteira.objects.filter(**_prefixo('endereco', termo_bruto)).values_list(
+            'cliente_id', flat=True,
+        )[:settings.BUSCA_CANDIDATOS]
+
+    clientes = consulta.filter(pk__in=set(ids)).select_related('carteira').only(
+        'id', 'nome', 'telefone', 'email', 'vip', 'ativo', 'canal', 'moedas', 'ultima_atividade',
+        'ultima_atividade_em', 'carteira__endereco',
+    )
+    ordenados = sorted(clientes, key=lambda c: (_relevancia(c, termo, termo_bruto), c.nome, c.pk))
+    return ordenados[:limite]
+
+
+def invalidar_busca(estabelecimento_id):
+    """Muda a versão dos clientes do estabelecimento (e com ela o ETag da busca)."""
+    from django.db.models import F
+
+    from .models import Estabelecimento
+
+    Estabelecimento.objects.filter(pk=estabelecimento_id).update(versao_clientes=F('versao_clientes') + 1)
+
+
+def _cliente_gravado(sender, instance, **kwargs):
+    if sender.__name__ == 'Carteira':
+        instance = instance.cliente
+    invalidar_busca(instance.estabelecimento_id)
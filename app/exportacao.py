@@ -0,0 +1,125 @@
+"""
+Exportação do histórico de transações em CSV ou JSON Lines, em streaming.
+
+As linhas saem de ``QuerySet.iterator(chunk_size=...)``: no Postgres é um
+cursor do lado do servidor, no SQLite um ``fetchmany``; cada bloco de
+EXPORTACAO_CHUNK linhas vira um pedaço da resposta (comprimido com gzip na
+hora, se o cliente aceitar). A memória do worker não cresce com o tamanho
+do histórico e o primeiro byte sai antes de o banco terminar a leitura.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, time as dtime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Canal, Transacao
+
+COLUNAS = ('referencia', 'data', 'cliente', 'tipo', 'canal', 'moedas', 'descricao')
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+_FIM = object()
+
+
+class FiltroInvalido(ValueError):
+    pass
+
+
+def _data(valor, nome):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise FiltroInvalido(f'{nome} deve estar no formato AAAA-MM-DD')
+
+
+def filtrar_transacoes(estabelecimento, parametros):
+    """
+    Transações do estabelecimento em ordem cronológica, com os filtros da
+    query string: ``de``/``ate`` (datas locais, inclusivas), ``canal`` e ``tipo``.
+    """
+    consulta = Transacao.objects.filter(estabelecimento=estabelecimento)
+    if parametros.get('de'):
+        inicio = datetime.combine(_data(parametros['de'], 'de'), dtime.min)
+        consulta = consulta.filter(criado_em__gte=timezone.make_aware(inicio))
+    if parametros.get('ate'):
+        fim = datetime.combine(_data(parametros['ate'], 'ate') + timedelta(days=1), dtime.min)
+        consulta = consulta.filter(criado_em__lt=timezone.make_aware(fim))
+    if parametros.get('canal'):
+        if parametros['canal'] not in Canal.values:
+            raise FiltroInvalido(f'canal deve ser um de: {", ".join(Canal.values)}')
+        consulta = consulta.filter(canal=parametros['canal'])
+    if parametros.get('tipo'):
+        if parametros['tipo'] not in Transacao.Tipo.values:
+            raise FiltroInvalido(f'tipo deve ser um de: {", ".join(Transacao.Tipo.values)}')
+        consulta = consulta.filter(tipo=parametros['tipo'])
+    # mesmo índice (estabelecimento, criado_em, id) da listagem
+    return consulta.order_by('criado_em', 'id').values_list(
+        'id', 'criado_em', 'cliente__nome', 'tipo', 'canal', 'moedas', 'descricao',
+    )
+
+
+def _registros(consulta, chunk):
+    for pk, criado_em, cliente, tipo, canal, moedas, descricao in consulta.iterator(chunk_size=chunk):
+        yield (f'#TRX-{pk:04d}', timezone.localtime(criado_em).isoformat(), cliente, tipo, canal, moedas, descricao)
+
+
+def _blocos_csv(consulta, chunk):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUNAS)
+    for indice, registro in enumerate(_registros(consulta, chunk), 1):
+        escritor.writerow(registro)
+        if indice % chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _blocos_jsonl(consulta, chunk):
+    linhas = []
+    for registro in _registros(consulta, chunk):
+        linhas.append(json.dumps(dict(zip(COLUNAS, registro)), ensure_ascii=False))
+        if len(linhas) == chunk:
+            yield '\n'.join(linhas) + '\n'
+            linhas = []
+    if linhas:
+        yield '\n'.join(linhas) + '\n'
+
+
+def blocos_exportacao(consulta, formato, comprimir=False, chunk=None):
+    """Pedaços (bytes) do arquivo exportado, um por bloco de ``chunk`` linhas."""
+    chunk = chunk or settings.EXPORTACAO_CHUNK
+    blocos = (_blocos_csv if formato == 'csv' else _blocos_jsonl)(consulta, chunk)
+    if not comprimir:
+        for bloco in blocos:
+            yield bloco.encode()
+        return
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: cabeçalho gzip
+    for bloco in blocos:
+        comprimido = compressor.compress(bloco.encode())
+        if comprimido:
+            yield comprimido
+    yield compressor.flush()
+
+
+async def blocos_async(blocos):
+    """
+    Versão assíncrona de ``blocos`` para o modo ASGI, onde um iterador síncrono
+    seria lido inteiro para a memória antes de sair. Cada pedaço é gerado no
+    thread único do ``sync_to_async``, o mesmo que mantém o cursor aberto.
+    """
+    proximo = sync_to_async(next)
+    while True:
+        bloco = await proximo(blocos, _FIM)
+        if bloco is _FIM:
+            return
+        yield bloco
@@ -0,0 +1,195 @@
+"""
+Servidor JSON-RPC falso da Solana, para testes de carga do crédito offline.
+
+Emula, com latência e taxa de erro configuráveis, os métodos usados pelo
+signer: getBalance, getAccountInfo, getMultipleAccounts,
+getLatestBlockhash, getBlockHeight, sendTransaction e getSignatureStatuses.
+Responde só HTTP (sem websocket de assinaturas).
+
+Uso: python manage.py fake_rpc --porta 8899
+     SOLANA_RPC_URLS=http://127.0.0.1:8899 python manage.py processar_creditos
+"""
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ALFABETO_BASE58 = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+# Slots da Solana duram ~400ms; um blockhash vale por 150 blocos
+DURACAO_SLOT = 0.4
+VALIDADE_BLOCKHASH = 150
+
+
+def base58(dados: bytes) -> str:
+    numero = int.from_bytes(dados, 'big')
+    saida = ''
+    while numero:
+        numero, resto = divmod(numero, 58)
+        saida = ALFABETO_BASE58[resto] + saida
+    zeros = len(dados) - len(dados.lstrip(b'\0'))
+    return '1' * zeros + saida
+
+
+@dataclass
+class ConfigFakeRpc:
+    latencia_ms: float = 50
+    jitter_ms: float = 20
+    taxa_erro: float = 0.0
+    saldo_lamports: int = 10 ** 12
+    fracao_contas_existentes: float = 0.9
+    confirmacao_ms: float = 800
+
+
+class EstadoFakeRpc:
+    """Relógio de slots, assinaturas enviadas e contadores por método."""
+
+    def __init__(self, config: ConfigFakeRpc):
+        self.config = config
+        self.inicio = time.monotonic()
+        self.assinaturas = {}
+        self.chamadas = Counter()
+        self.lock = threading.Lock()
+
+    def slot(self):
+        return 300_000_000 + int((time.monotonic() - self.inicio) / DURACAO_SLOT)
+
+    def altura_bloco(self):
+        return self.slot() - 20_000_000
+
+    def blockhash(self):
+        return base58(hashlib.sha256(str(self.slot()).encode()).digest())
+
+    def conta_existe(self, chave):
+        fatia = int.from_bytes(hashlib.sha256(chave.encode()).digest()[:2], 'big') / 0xFFFF
+        return fatia < self.config.fracao_contas_existentes
+
+    def registrar_envio(self, transacao_base64):
+        bruto = base64.b64decode(transacao_base64)
+        # shortvec com o número de assinaturas (1 byte até 127) seguido da primeira assinatura
+        assinatura = base58(bruto[1:65])
+        with self.lock:
+            self.assinaturas.setdefault(assinatura, time.monotonic())
+        return assinatura
+
+    def status_assinatura(self, assinatura):
+        with self.lock:
+            enviado_em = self.assinaturas.get(assinatura)
+        if enviado_em is None:
+            return None
+        if (time.monotonic() - enviado_em) * 1000 < self.config.confirmacao_ms:
+            return None
+        return {
+            'slot': self.slot(),
+            'confirmations': None,
+            'err': None,
+            'status': {'Ok': None},
+            'confirmationStatus': 'confirmed',
+        }
+
+
+def _conta(lamports):
+    return {
+        'data': ['', 'base64'],
+        'executable': False,
+        'lamports': lamports,
+        'owner': '11111111111111111111111111111111',
+        'rentEpoch': 18446744073709551615,
+        'space': 0,
+    }
+
+
+def _com_contexto(estado, valor):
+    return {'context': {'slot': estado.slot(), 'apiVersion': '2.0.0'}, 'value': valor}
+
+
+def executar_metodo(estado, metodo, params):
+    """Resultado de um método JSON-RPC; levanta KeyError se o método não existe."""
+    params = params or []
+    if metodo == 'getBalance':
+        return _com_contexto(estado, estado.config.saldo_lamports)
+    if metodo == 'getAccountInfo':
+        return _com_contexto(estado, _conta(1_000_000) if estado.conta_existe(params[0]) else None)
+    if metodo == 'getMultipleAccounts':
+        return _com_contexto(estado, [
+            _conta(1_000_000) if estado.conta_existe(chave) else None for chave in params[0]
+        ])
+    if metodo == 'getLatestBlockhash':
+        return _com_contexto(estado, {
+            'blockhash': estado.blockhash(),
+            'lastValidBlockHeight': estado.altura_bloco() + VALIDADE_BLOCKHASH,
+        })
+    if metodo == 'getBlockHeight':
+        return estado.altura_bloco()
+    if metodo == 'getSlot':
+        return estado.slot()
+    if metodo == 'sendTransaction':
+        return estado.registrar_envio(params[0])
+    if metodo == 'getSignatureStatuses':
+        return _com_contexto(estado, [estado.status_assinatura(a) for a in params[0]])
+    if metodo == 'getHealth':
+        return 'ok'
+    if metodo == 'getVersion':
+        return {'solana-core': '2.0.0-fake', 'feature-set': 0}
+    raise KeyError(metodo)
+
+
+class FakeRpcHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, como um RPC real
+
+    def log_message(self, format, *args):
+        pass
+
+    def _responder(self, status, corpo):
+        dados = json.dumps(corpo).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _atender(self, estado, pedido):
+        metodo = pedido.get('method')
+        with estado.lock:
+            estado.chamadas[metodo] += 1
+        try:
+            resultado = executar_metodo(estado, metodo, pedido.get('params'))
+        except KeyError:
+            return {'jsonrpc': '2.0', 'id': pedido.get('id'), 'error': {'code': -32601, 'message': 'Method not found'}}
+        except Exception as e:
+            return {'jsonrpc': '2.0', 'id': pedido.get('id'), 'error': {'code': -32602, 'message': str(e)}}
+        return {'jsonrpc': '2.0', 'id': pedido.get('id'), 'result': resultado}
+
+    def do_POST(self):
+        estado = self.server.estado
+        config = estado.config
+        tamanho = int(self.headers.get('Content-Length', 0))
+        corpo = self.rfile.read(tamanho)
+
+        atraso = config.latencia_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+        time.sleep(max(0.0, atraso) / 1000)
+
+        if random.random() < config.taxa_erro:
+            status = random.choice((429, 503))
+            return self._responder(status, {'jsonrpc': '2.0', 'error': {'code': status, 'message': 'fake error'}})
+
+        try:
+            pedido = json.loads(corpo)
+        except json.JSONDecodeError:
+            return self._responder(400, {'jsonrpc': '2.0', 'error': {'code': -32700, 'message': 'Parse error'}})
+
+        if isinstance(pedido, list):
+            return self._responder(200, [self._atender(estado, p) for p in pedido])
+        return self._responder(200, self._atender(estado, pedido))
+
+
+def criar_servidor(host='127.0.0.1', porta=8899, config=None):
+    servidor = ThreadingHTTPServer((host, porta), FakeRpcHandler)
+    servidor.daemon_threads = True
+    servidor.estado = EstadoFakeRpc(config or ConfigFakeRpc())
+    return servidor
@@ -0,0 +1,434 @@
+"""
+Fila durável de créditos, apoiada na tabela ``CreditoJob``.
+
+Os endpoints /creditar-moedas/ e /creditar-moedas/lote/ apenas enfileiram;
+os workers do comando ``manage.py processar_creditos`` reservam os jobs e
+executam as transferências através do pool de signers. Jobs de um mesmo
+lote são reservados em blocos e enviados com várias transferências por
+transação.
+"""
+import hashlib
+import json
+import logging
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .ledger import registrar_transacao
+from .limites import conferir_fila
+from .models import Carteira, CreditoJob, Transacao
+from .signer import SignerErro, SignerTimeout, obter_pool
+
+logger = logging.getLogger(__name__)
+
+# Chave do advisory lock que serializa os enfileiramentos no Postgres
+TRAVA_FILA = 0x746F6B6E  # 'tokn'
+
+
+class ConflitoIdempotencia(Exception):
+    """A Idempotency-Key já foi usada com outro corpo de requisição."""
+
+
+def _hash_requisicao(chave_privada, carteira_destino, valor_minimo, valor):
+    dados = json.dumps([
+        hashlib.sha256(chave_privada.encode()).hexdigest(),
+        carteira_destino,
+        bool(valor_minimo),
+        valor,
+    ])
+    return hashlib.sha256(dados.encode()).hexdigest()
+
+
+def _job_idempotente(chave_idempotencia):
+    """Job ainda válido para a chave; chaves expiradas são liberadas na hora."""
+    job = CreditoJob.objects.filter(chave_idempotencia=chave_idempotencia).first()
+    if job is not None and job.idempotencia_expira_em and job.idempotencia_expira_em <= timezone.now():
+        CreditoJob.objects.filter(pk=job.pk).update(chave_idempotencia=None)
+        return None
+    return job
+
+
+def _travar_fila():
+    """
+    Segura os outros enfileiramentos até o fim da transação atual, para a
+    contagem de ``conferir_fila`` e o insert não se intercalarem. No SQLite
+    a transação já nasce com o lock de escrita (BEGIN IMMEDIATE no settings).
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [TRAVA_FILA])
+
+
+def enfileirar_credito(chave_privada, carteira_destino, valor_minimo=False, valor=None, chave_idempotencia=None,
+                       admitir=None):
+    """
+    Enfileira um crédito e devolve ``(job, criado)``.
+
+    Com ``chave_idempotencia``, requisições repetidas (duplo clique, retry do
+    PDV) caem no mesmo job em vez de gerar outra transferência: a unicidade
+    da chave no banco resolve até requisições simultâneas.
+
+    Só um job novo passa pelo controle de admissão (app/limites.py):
+    ``admitir()`` (a taxa, da view) depois da busca pela chave e
+    ``conferir_fila`` na transação do insert. Ambos levantam ``CreditoRecusado``.
+    """
+    dados = {
+        'chave_privada': chave_privada,
+        'carteira_destino': carteira_destino,
+        'valor_minimo': bool(valor_minimo),
+        'valor': valor,
+    }
+    if not chave_idempotencia:
+        if admitir:
+            admitir()
+        with transaction.atomic():
+            _travar_fila()
+            conferir_fila()
+            return CreditoJob.objects.create(**dados), True
+
+    hash_requisicao = _hash_requisicao(chave_privada, carteira_destino, valor_minimo, valor)
+    job = _job_idempotente(chave_idempotencia)
+    if job is None:
+        if admitir:
+            admitir()
+        try:
+            with transaction.atomic():
+                _travar_fila()
+                conferir_fila()
+                return CreditoJob.objects.create(
+                    **dados,
+                    chave_idempotencia=chave_idempotencia,
+                    hash_requisicao=hash_requisicao,
+                    idempotencia_expira_em=timezone.now() + timedelta(seconds=settings.IDEMPOTENCIA_TTL),
+                ), True
+        except IntegrityError:
+            # outra requisição com a mesma chave chegou primeiro
+            job = CreditoJob.objects.get(chave_idempotencia=chave_idempotencia)
+
+    if job.hash_requisicao != hash_requisicao:
+        raise ConflitoIdempotencia('Idempotency-Key já usada com outros dados')
+    return job, False
+
+
+def limpar_idempotencia():
+    """Libera as chaves de idempotência expiradas (o job continua existindo)."""
+    return CreditoJob.objects.filter(
+        chave_idempotencia__isnull=False,
+        idempotencia_expira_em__lte=timezone.now(),
+    ).update(chave_idempotencia=None)
+
+
+def enfileirar_lote(chave_privada, destinos, admitir=None):
+    """
+    Enfileira um crédito por destino, todos com o mesmo ``lote``.
+    ``destinos`` é uma lista de dicts com carteira_destino, valor_minimo e valor.
+    A admissão é a de ``enfileirar_credito``, com o lote inteiro pesando na fila.
+    """
+    if admitir:
+        admitir()
+    lote = uuid.uuid4()
+    with transaction.atomic():
+        _travar_fila()
+        conferir_fila(len(destinos))
+        jobs = CreditoJob.objects.bulk_create([
+            CreditoJob(
+                chave_privada=chave_privada,
+                carteira_destino=destino['carteira_destino'],
+                valor_minimo=bool(destino.get('valor_minimo', False)),
+                valor=destino.get('valor'),
+                lote=lote,
+                indice_lote=indice,
+            )
+            for indice, destino in enumerate(destinos)
+        ], batch_size=500)
+    return lote, jobs
+
+
+def reservar_proximo():
+    """
+    Reserva o próximo trabalho da fila e o marca como ``submitted``.
+
+    Devolve o job mais antigo ou, se ele pertencer a um lote, até
+    ``CREDITO_LOTE_TAMANHO`` jobs pendentes desse lote (lista vazia se a fila
+    estiver vazia). A reserva é um UPDATE condicional (status ainda ``queued``)
+    com um token próprio, então dois workers nunca pegam o mesmo job, tanto no
+    SQLite quanto no Postgres.
+    """
+    candidatos = list(
+        CreditoJob.objects.filter(status=CreditoJob.Status.QUEUED)
+        .order_by('criado_em')
+        .values('pk', 'lote')[:10]
+    )
+    for candidato in candidatos:
+        if candidato['lote']:
+            pks = list(
+                CreditoJob.objects.filter(lote=candidato['lote'], status=CreditoJob.Status.QUEUED)
+                .order_by('indice_lote')
+                .values_list('pk', flat=True)[:settings.CREDITO_LOTE_TAMANHO]
+            )
+        else:
+            pks = [candidato['pk']]
+
+        reserva = uuid.uuid4()
+        reservados = CreditoJob.objects.filter(pk__in=pks, status=CreditoJob.Status.QUEUED).update(
+            status=CreditoJob.Status.SUBMITTED,
+            reserva=reserva,
+            enviado_em=timezone.now(),
+            tentativas=F('tentativas') + 1,
+        )
+        if reservados:
+            jobs = list(CreditoJob.objects.filter(reserva=reserva).order_by('indice_lote'))
+            # Job reservado nunca volta para a fila (ver marcar_orfaos): daqui em
+            # diante a chave só precisa existir na memória deste worker
+            CreditoJob.objects.filter(reserva=reserva).update(chave_privada='')
+            return jobs
+    return []
+
+
+def _chamar_signer(chamada):
+    """
+    Executa ``chamada(pool)`` convertendo falhas de infraestrutura em resposta de erro.
+    No timeout, ``assinadas`` traz as transações que o worker chegou a assinar.
+    """
+    try:
+        return chamada(obter_pool())
+    except SignerTimeout as e:
+        return {
+            'sucesso': False,
+            'erro': f'Timeout ao executar transação (limite de {settings.SIGNER_TIMEOUT} segundos)',
+            'assinadas': e.assinadas,
+        }
+    except FileNotFoundError:
+        return {
+            'sucesso': False,
+            'erro': 'tsx não encontrado. Certifique-se de ter Node.js e npx instalados.',
+        }
+    except SignerErro as e:
+        return {'sucesso': False, 'erro': f'Signer indisponível: {e}'}
+
+
+def _registrar_uso_cache(jobs, resposta):
+    cache = resposta.get('cache')
+    if cache:
+        logger.info(
+            'Crédito de %s destino(s): cache RPC %s hit(s), %s miss(es)',
+            len(jobs), cache.get('hits', 0), cache.get('misses', 0),
+        )
+
+
+def _resultado_timeout(resposta, signature):
+    """
+    Resultado de um job cujo pedido estourou o timeout: com a signature, a
+    transação pode ter chegado à rede e o job fica em ``verificar``; sem ela,
+    o worker não assinou nada (não assina depois do prazo) e a falha é segura.
+    """
+    if signature:
+        return {
+            'verificar': True,
+            'signature': signature,
+            'erro': f'{resposta["erro"]}; consultando a transação na rede antes de concluir',
+        }
+    return {'sucesso': False, 'erro': f'{resposta["erro"]}; a transação não foi enviada'}
+
+
+def _aplicar_resultado(job, resposta):
+    if resposta.get('sucesso'):
+        job.status = CreditoJob.Status.CONFIRMED
+        job.signature = resposta.get('signature', '')
+    elif resposta.get('verificar'):
+        # não terminou: sem concluido_em e sem lançamento no ledger até a consulta na rede
+        job.status = CreditoJob.Status.VERIFICAR
+        job.signature = resposta['signature']
+        job.erro = resposta['erro']
+        job.chave_privada = ''
+        return
+    else:
+        job.status = CreditoJob.Status.FAILED
+        job.erro = resposta.get('erro') or 'Erro ao executar transação'
+    job.chave_privada = ''
+    job.concluido_em = timezone.now()
+
+
+CAMPOS_RESULTADO = ['status', 'signature', 'erro', 'chave_privada', 'concluido_em']
+
+
+def _moedas(job):
+    """Moedas de um crédito (valor em SOL × MOEDAS_POR_SOL); 0 para valor mínimo ou sem valor."""
+    if job.valor_minimo or not job.valor:
+        return 0
+    return round(job.valor * settings.MOEDAS_POR_SOL)
+
+
+def _lancar_no_ledger(jobs):
+    """
+    Lança as moedas dos jobs confirmados cuja carteira de destino é de um
+    cliente. Chamado na mesma transação que grava o status ``confirmed``; o
+    lançamento é indexado pelo id do job, então repetir não credita em dobro.
+    """
+    confirmados = [job for job in jobs if job.status == CreditoJob.Status.CONFIRMED and _moedas(job) > 0]
+    if not confirmados:
+        return
+    clientes = {
+        carteira.endereco: carteira.cliente
+        for carteira in Carteira.objects.select_related('cliente').filter(
+            endereco__in={job.carteira_destino for job in confirmados},
+        )
+    }
+    for job in confirmados:
+        cliente = clientes.get(job.carteira_destino)
+        if cliente is not None:
+            registrar_transacao(
+                cliente, Transacao.Tipo.CREDITO, _moedas(job),
+                descricao=f'Crédito Solana {job.signature}'[:200], credito_job=job.pk,
+            )
+
+
+def executar_job(job):
+    """Executa a transferência de um job já reservado e grava o resultado."""
+    resposta = _chamar_signer(lambda pool: pool.transferir(
+        job.chave_privada,
+        job.carteira_destino,
+        valor_minimo=job.valor_minimo,
+        valor=job.valor,
+    ))
+    _registrar_uso_cache([job], resposta)
+    if 'assinadas' in resposta:
+        assinadas = resposta['assinadas']
+        resposta = _resultado_timeout(resposta, assinadas[0]['signature'] if assinadas else '')
+    _aplicar_resultado(job, resposta)
+    with transaction.atomic():
+        job.save(update_fields=CAMPOS_RESULTADO)
+        _lancar_no_ledger([job])
+    return job
+
+
+def executar_lote(jobs):
+    """Executa um bloco de jobs do mesmo lote em uma única chamada ao signer."""
+    destinos = [
+        {
+            'carteira_destino': job.carteira_destino,
+            'valor_minimo': job.valor_minimo,
+            'valor': job.valor,
+        }
+        for job in jobs
+    ]
+    resposta = _chamar_signer(lambda pool: pool.transferir_lote(jobs[0].chave_privada, destinos))
+    _registrar_uso_cache(jobs, resposta)
+    if resposta.get('sucesso'):
+        resultados = {r.get('indice'): r for r in resposta.get('resultados', [])}
+        for indice, job in enumerate(jobs):
+            _aplicar_resultado(job, resultados.get(indice, {'sucesso': False, 'erro': 'Sem resultado do signer'}))
+    elif 'assinadas' in resposta:
+        # cada transação do lote leva os destinos de ``indices``
+        signatures = {
+            indice: assinada['signature']
+            for assinada in resposta['assinadas']
+            for indice in assinada.get('indices') or ()
+        }
+        for indice, job in enumerate(jobs):
+            _aplicar_resultado(job, _resultado_timeout(resposta, signatures.get(indice)))
+    else:
+        for job in jobs:
+            _aplicar_resultado(job, resposta)
+    with transaction.atomic():
+        CreditoJob.objects.bulk_update(jobs, CAMPOS_RESULTADO, batch_size=500)
+        _lancar_no_ledger(jobs)
+    return jobs
+
+
+def executar_reservados(jobs):
+    if len(jobs) == 1:
+        return [executar_job(jobs[0])]
+    return executar_lote(jobs)
+
+
+def verificar_enviados(limite=256):
+    """
+    Conclui os jobs em ``verificar`` pela signature (getSignatureStatuses com
+    o histórico, via signer): confirmada lança no ledger, falha na execução
+    falha o job. Sem status na rede depois de CREDITO_VERIFICACAO_PRAZO do
+    envio, o blockhash já expirou e a transação não entra mais: o job falha e
+    o crédito pode ser reenviado. Devolve quantos jobs foram concluídos.
+    """
+    jobs = list(CreditoJob.objects.filter(status=CreditoJob.Status.VERIFICAR).order_by('enviado_em')[:limite])
+    if not jobs:
+        return 0
+    resposta = _chamar_signer(lambda pool: pool.consultar_assinaturas(sorted({job.signature for job in jobs})))
+    if not resposta.get('sucesso'):
+        logger.warning('Falha ao consultar %s job(s) em verificação: %s', len(jobs), resposta.get('erro'))
+        return 0
+
+    status = resposta.get('status') or {}
+    expirou = timezone.now() - timedelta(seconds=settings.CREDITO_VERIFICACAO_PRAZO)
+    concluidos = []
+    for job in jobs:
+        na_rede = status.get(job.signature)
+        if na_rede and na_rede.get('confirmada'):
+            job.status, job.erro = CreditoJob.Status.CONFIRMED, ''
+        elif na_rede and na_rede.get('erro'):
+            job.status, job.erro = CreditoJob.Status.FAILED, f'Erro na execução: {na_rede["erro"]}'
+        elif na_rede is None and job.enviado_em < expirou:
+            job.status = CreditoJob.Status.FAILED
+            job.erro = 'A transação não entrou na rede antes de o blockhash expirar; o crédito pode ser reenviado'
+        else:
+            continue
+        job.concluido_em = timezone.now()
+        concluidos.append(job)
+
+    with transaction.atomic():
+        # condicional: outro processar_creditos pode ter concluído o mesmo job
+        concluidos = [
+            job for job in concluidos
+            if CreditoJob.objects.filter(pk=job.pk, status=CreditoJob.Status.VERIFICAR).update(
+                status=job.status, erro=job.erro, concluido_em=job.concluido_em,
+            )
+        ]
+        _lancar_no_ledger(concluidos)
+    return len(concluidos)
+
+
+def marcar_orfaos():
+    """
+    Falha jobs presos em ``submitted`` (worker morto no meio da execução).
+
+    Eles não voltam para a fila: a transferência pode ter chegado à rede,
+    então reenviar poderia creditar em dobro.
+    """
+    limite = timezone.now() - timedelta(seconds=settings.SIGNER_TIMEOUT * 2)
+    return CreditoJob.objects.filter(
+        status=CreditoJob.Status.SUBMITTED,
+        enviado_em__lt=limite,
+    ).update(
+        status=CreditoJob.Status.FAILED,
+        erro='Execução interrompida; verifique a transação na rede antes de reenviar',
+        chave_privada='',
+        concluido_em=timezone.now(),
+    )
+
+
+def processar_fila(parar: threading.Event, intervalo=0.5):
+    """Loop de um worker: reserva e executa jobs até ``parar`` ser sinalizado."""
+    try:
+        while not parar.is_set():
+            close_old_connections()
+            jobs = reservar_proximo()
+            if not jobs:
+                parar.wait(intervalo)
+                continue
+            try:
+                executar_reservados(jobs)
+            except Exception:
+                logger.exception('Erro inesperado ao executar %s job(s) de crédito', len(jobs))
+                CreditoJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                    status=CreditoJob.Status.FAILED,
+                    erro='Erro interno ao executar transação',
+                    chave_privada='',
+                    concluido_em=timezone.now(),
+                )
+    finally:
+        connection.close()
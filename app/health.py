@@ -0,0 +1,221 @@
+"""
+Probes de saúde.
+
+- Liveness (/healthz/ e /health/): respondidas por ``FrenteWSGI``/``FrenteASGI``
+  em settings/wsgi.py e asgi.py, antes do resolver de URLs e dos middlewares
+  (sessão, CSRF, auth, log). Só dizem que o processo está de pé.
+- Readiness (/readyz/): banco acessível, pool de signers do ``processar_creditos``
+  vivo (pelo ``Batimento`` que ele grava) e fila de créditos abaixo do limite.
+  O resultado fica em cache por READINESS_CACHE_SECONDS no processo, então um
+  probe por segundo ou mil custam o mesmo para o banco.
+"""
+import json
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+BATIMENTO_SIGNER = 'signer'
+
+# path -> (content-type, corpo); os mesmos das views healthz_view/healthcheck
+LIVENESS = {
+    '/healthz/': ('text/plain', b'ok'),
+    '/health/': ('application/json', json.dumps({'status': 'ok', 'service': 'django'}).encode()),
+}
+READINESS = '/readyz/'
+
+
+def _verificar_banco():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    return {'ok': True}
+
+
+def _verificar_signer():
+    from .models import Batimento
+
+    batimento = Batimento.objects.filter(nome=BATIMENTO_SIGNER).first()
+    if batimento is None:
+        return {'ok': False, 'erro': 'processar_creditos nunca registrou batimento'}
+    idade = (timezone.now() - batimento.atualizado_em).total_seconds()
+    vivos = batimento.detalhes.get('vivos', 0)
+    ok = idade <= settings.SIGNER_HEARTBEAT_MAX_AGE and vivos > 0
+    return {'ok': ok, 'vivos': vivos, 'total': batimento.detalhes.get('total', 0), 'idade_s': round(idade, 1)}
+
+
+def _verificar_fila():
+    from .models import CreditoJob
+
+    limite = settings.READINESS_MAX_QUEUE
+    # contagem limitada: com a fila muito acima do limite o custo não cresce junto
+    na_fila = CreditoJob.objects.filter(status=CreditoJob.Status.QUEUED)[:limite + 1].count()
+    return {'ok': na_fila <= limite, 'na_fila': na_fila, 'limite': limite}
+
+
+VERIFICACOES = {
+    'banco': _verificar_banco,
+    'signer': _verificar_signer,
+    'fila': _verificar_fila,
+}
+
+
+class _Prontidao:
+    """Último resultado do readiness e quando ele expira."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.expira_em = 0.0
+        self.resultado = None
+
+    def obter(self):
+        if time.monotonic() < self.expira_em:
+            return self.resultado
+        with self.lock:
+            if time.monotonic() >= self.expira_em:
+                self.resultado = self._verificar()
+                self.expira_em = time.monotonic() + settings.READINESS_CACHE_SECONDS
+        return self.resultado
+
+    def _verificar(self):
+        verificacoes = {}
+        for nome, verificar in VERIFICACOES.items():
+            try:
+                verificacoes[nome] = verificar()
+            except Exception as e:
+                verificacoes[nome] = {'ok': False, 'erro': str(e)}
+        pronto = all(v['ok'] for v in verificacoes.values())
+        return {'status': 'ready' if pronto else 'not_ready', 'verificacoes': verificacoes}
+
+
+_prontidao = _Prontidao()
+
+
+def prontidao():
+    """``(status_http, corpo_json)`` do readiness, do cache ou recalculado."""
+    resultado = _prontidao.obter()
+    return (200 if resultado['status'] == 'ready' else 503), json.dumps(resultado).encode()
+
+
+def _prontidao_fora_do_request():
+    # fora do ciclo de request do Django: devolve/fecha a conexão como o request_finished faria
+    try:
+        return prontidao()
+    finally:
+        close_old_connections()
+
+
+def _cabecalhos(tipo, corpo):
+    return [
+        ('Content-Type', f'{tipo}; charset=utf-8' if tipo == 'text/plain' else tipo),
+        ('Content-Length', str(len(corpo))),
+        ('Cache-Control', 'no-store'),
+    ]
+
+
+class FrenteWSGI:
+    """Responde os probes antes do Django; o resto vai para ``aplicacao``."""
+
+    def __init__(self, aplicacao):
+        self.aplicacao = aplicacao
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        metodo = environ.get('REQUEST_METHOD')
+        if metodo in ('GET', 'HEAD'):
+            if path in LIVENESS:
+                tipo, corpo = LIVENESS[path]
+                start_response('200 OK', _cabecalhos(tipo, corpo))
+                # HEAD: só os cabeçalhos, com o Content-Length do GET
+                return [corpo] if metodo == 'GET' else []
+            if path == READINESS:
+                status, corpo = _prontidao_fora_do_request()
+                start_response(
+                    '200 OK' if status == 200 else '503 Service Unavailable',
+                    _cabecalhos('application/json', corpo),
+                )
+                return [corpo] if metodo == 'GET' else []
+        return self.aplicacao(environ, start_response)
+
+
+class FrenteASGI:
+    """Versão ASGI de ``FrenteWSGI``."""
+
+    def __init__(self, aplicacao):
+        self.aplicacao = aplicacao
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            path = scope['path']
+            cabeca = scope['method'] == 'HEAD'
+            if path in LIVENESS:
+                return await self._responder(send, 200, *LIVENESS[path], cabeca)
+            if path == READINESS:
+                status, corpo = await sync_to_async(_prontidao_fora_do_request)()
+                return await self._responder(send, status, 'application/json', corpo, cabeca)
+        await self.aplicacao(scope, receive, send)
+
+    async def _responder(self, send, status, tipo, corpo, cabeca=False):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(nome.lower().encode(), valor.encode()) for nome, valor in _cabecalhos(tipo, corpo)],
+        })
+        await send({'type': 'http.response.body', 'body': b'' if cabeca else corpo})
+
+
+def registrar_batimento(pool):
+    """
+    Grava o batimento do pool de signers; chamado pelo ``processar_creditos``.
+    Leva junto as confirmações de transação dos workers, que o /metrics/ do
+    processo web lê daqui (ele não fala com os workers).
+    """
+    from .models import Batimento
+
+    workers = pool.status()
+    # timeout curto, contado uma vez para todos os workers (consultados em paralelo):
+    # um worker travado não pode atrasar o batimento além do intervalo
+    confirmacoes = pool.estatisticas(timeout=2)['confirmacoes']
+    Batimento.objects.update_or_create(
+        nome=BATIMENTO_SIGNER,
+        defaults={'detalhes': {
+            'vivos': sum(1 for w in workers if w['vivo']),
+            'total': len(workers),
+            'em_voo': sum(w['em_voo'] for w in workers),
+            'confirmacoes': confirmacoes,
+        }},
+    )
+
+
+# campo do rastreador de confirmações -> ajuda da métrica
+CONTADORES_CONFIRMACAO = {
+    'confirmadas': 'Transações confirmadas pelo rastreador dos signers',
+    'falhas': 'Transações que falharam na execução',
+    'expiradas': 'Transações cujo blockhash expirou sem confirmar',
+    'reenvios': 'Reenvios de transações ainda sem status',
+    'consultas': 'Chamadas getSignatureStatuses feitas pelo rastreador',
+}
+
+
+def metricas_signer():
+    """
+    Confirmações dos signers no formato do Prometheus, do último batimento.
+    Os contadores são somados dos workers vivos e zeram quando um reinicia.
+    """
+    from .instrumentacao import Metricas
+    from .models import Batimento
+
+    detalhes = Batimento.objects.filter(nome=BATIMENTO_SIGNER).values_list('detalhes', flat=True).first()
+    confirmacoes = (detalhes or {}).get('confirmacoes')
+    if not confirmacoes:
+        return ''
+    latencia = confirmacoes['latencia']
+    metricas = Metricas(buckets=tuple(latencia['buckets']))
+    for campo, ajuda in CONTADORES_CONFIRMACAO.items():
+        metricas.contar(f'toknid_signer_{campo}_total', confirmacoes.get(campo, 0), ajuda=ajuda)
+    metricas.carregar_histograma(
+        'toknid_signer_confirmacao_seconds', latencia['contagens'], latencia['soma'], latencia['total'],
+        ajuda='Tempo do envio à confirmação das transações',
+    )
+    return metricas.prometheus()
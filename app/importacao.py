@@ -0,0 +1,417 @@
+"""
+Importação de clientes em massa a partir de planilhas CSV ou XLSX.
+
+O arquivo é lido linha a linha (``csv.reader`` sobre o arquivo enviado, ou
+openpyxl em modo ``read_only`` para XLSX) e processado em blocos de
+IMPORTACAO_CHUNK linhas. Em cada bloco:
+
+1. validação coluna a coluna (nome, telefone, e-mail, carteira, canal, vip);
+2. duplicados: uma consulta por chave nos índices (estabelecimento,
+   telefone), (estabelecimento, email) e ``Carteira.endereco``, mais as
+   chaves já vistas no próprio arquivo;
+3. gravação com ``bulk_create`` numa transação por bloco.
+
+Linhas recusadas vão para um CSV de erros (linha, motivo e os valores
+lidos); ``importar_clientes`` devolve o progresso a cada bloco.
+
+Planilhas acima de IMPORTACAO_SINCRONA_MAX_BYTES não cabem no timeout do
+gunicorn: /clientes/importar/ grava o upload em IMPORTACAO_DIR e cria um
+``ImportacaoJob``, que o worker (``manage.py processar_creditos``) importa
+em ``processar_importacoes``.
+"""
+import csv
+import io
+import logging
+import re
+import time
+import zipfile
+from datetime import timedelta
+from itertools import chain, islice
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .busca import digitos, invalidar_busca, normalizar, texto_busca
+from .models import Canal, Carteira, Cliente, ImportacaoJob
+from .renderizacao import invalidar_fragmentos
+
+logger = logging.getLogger(__name__)
+
+CAMPOS = ('nome', 'telefone', 'email', 'carteira', 'canal', 'vip')
+
+# Cabeçalho da planilha (normalizado: minúsculas, sem acento) -> campo
+APELIDOS = {
+    'nome': 'nome', 'nome completo': 'nome', 'cliente': 'nome',
+    'telefone': 'telefone', 'celular': 'telefone', 'whatsapp': 'telefone', 'fone': 'telefone',
+    'email': 'email', 'e-mail': 'email',
+    'carteira': 'carteira', 'endereco': 'carteira', 'endereco da carteira': 'carteira', 'wallet': 'carteira',
+    'canal': 'canal',
+    'vip': 'vip',
+}
+
+CANAIS = {
+    **{normalizar(valor): valor for valor in Canal.values},
+    **{normalizar(rotulo): valor for valor, rotulo in Canal.choices},
+}
+
+VERDADEIROS = frozenset({'sim', 's', 'x', '1', 'true', 'verdadeiro', 'vip'})
+
+_EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[a-z]{2,}$')
+# endereço Solana: chave pública de 32 bytes em base58
+_CARTEIRA = re.compile(r'^[1-9A-HJ-NP-Za-km-z]{32,44}$')
+
+
+# Arquivos de erros de /clientes/importar/ ficam disponíveis por este tempo
+VALIDADE_ERROS = 7 * 24 * 60 * 60  # segundos
+
+
+class ErroImportacao(ValueError):
+    """Arquivo que não dá para importar (formato, cabeçalho)."""
+
+
+def caminho_erros(importacao_id):
+    """CSV de erros de uma importação feita por /clientes/importar/."""
+    return Path(settings.IMPORTACAO_DIR) / f'{importacao_id}.csv'
+
+
+def caminho_upload(importacao_id):
+    """Planilha de um ``ImportacaoJob``, até o worker terminar de importá-la."""
+    return Path(settings.IMPORTACAO_DIR) / f'{importacao_id}.upload'
+
+
+def limpar_erros_antigos():
+    limite = time.time() - VALIDADE_ERROS
+    for arquivo in Path(settings.IMPORTACAO_DIR).glob('*.csv'):
+        if arquivo.stat().st_mtime < limite:
+            arquivo.unlink(missing_ok=True)
+
+
+# ---------- leitura ----------
+
+def _campos_do_cabecalho(cabecalho):
+    campos = [APELIDOS.get(normalizar(str(coluna or ''))) for coluna in cabecalho]
+    if 'nome' not in campos:
+        raise ErroImportacao('a planilha precisa de uma coluna "nome"')
+    return campos
+
+
+def _linhas_csv(arquivo, encoding):
+    texto = io.TextIOWrapper(arquivo, encoding=encoding, newline='')
+    primeira = texto.readline()
+    # planilhas exportadas no Brasil costumam usar ";"
+    delimitador = max((';', ',', '\t'), key=primeira.count)
+    leitor = csv.reader(chain([primeira], texto), delimiter=delimitador)
+    campos = _campos_do_cabecalho(next(leitor, []))
+
+    def linhas():
+        for valores in leitor:
+            if any(valores):
+                yield leitor.line_num, {c: v for c, v in zip(campos, valores) if c}
+
+    return linhas()
+
+
+def _celula(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))  # telefone digitado como número no Excel
+    return str(valor)
+
+
+def _linhas_xlsx(arquivo):
+    # import só aqui: o openpyxl é pesado e o worker importaria a cada boot por causa das views
+    try:
+        import openpyxl
+    except ImportError:  # opcional: sem o pacote, só CSV
+        raise ErroImportacao('importação de XLSX requer o pacote openpyxl; envie a planilha como CSV') from None
+    try:
+        planilha = openpyxl.load_workbook(arquivo, read_only=True, data_only=True).active
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise ErroImportacao(f'arquivo XLSX inválido: {e}') from e
+    valores = planilha.iter_rows(values_only=True)
+    campos = _campos_do_cabecalho(next(valores, ()))
+
+    def linhas():
+        for numero, linha in enumerate(valores, 2):
+            if any(v is not None for v in linha):
+                yield numero, {c: _celula(v) for c, v in zip(campos, linha) if c}
+
+    return linhas()
+
+
+def ler_linhas(arquivo, nome, encoding='utf-8-sig'):
+    """
+    ``(número da linha, {campo: valor})`` de cada linha da planilha, sem ler o
+    arquivo inteiro. O cabeçalho é conferido já na chamada (ErroImportacao).
+    """
+    extensao = nome.lower().rsplit('.', 1)[-1]
+    if extensao == 'xlsx':
+        return _linhas_xlsx(arquivo)
+    if extensao in ('csv', 'txt'):
+        return _linhas_csv(arquivo, encoding)
+    raise ErroImportacao('formato não suportado: envie .csv ou .xlsx')
+
+
+# ---------- validação ----------
+
+def formatar_telefone(valor):
+    """``+55 (DD) NNNNN-NNNN``, o formato usado na deduplicação; None se inválido."""
+    numero = digitos(valor)
+    if len(numero) in (10, 11):
+        numero = '55' + numero
+    if len(numero) not in (12, 13) or not numero.startswith('55'):
+        return None
+    return f'+55 ({numero[2:4]}) {numero[4:-4]}-{numero[-4:]}'
+
+
+def validar(bloco):
+    """
+    Separa um bloco de ``(linha, valores)`` em registros válidos e erros
+    ``(linha, motivo, valores)``. Cada coluna é normalizada de uma vez para o
+    bloco inteiro; depois cada linha junta os seus campos.
+    """
+    valores = [v for _, v in bloco]
+    nomes = [' '.join(v.get('nome', '').split()) for v in valores]
+    telefones_brutos = [v.get('telefone', '').strip() for v in valores]
+    telefones = [formatar_telefone(t) if t else '' for t in telefones_brutos]
+    emails = [v.get('email', '').strip().lower() for v in valores]
+    emails_ok = [not e or (len(e) <= 254 and bool(_EMAIL.match(e))) for e in emails]
+    carteiras = [v.get('carteira', '').strip() for v in valores]
+    carteiras_ok = [not c or bool(_CARTEIRA.match(c)) for c in carteiras]
+    canais = [CANAIS.get(normalizar(v.get('canal', '')) or 'pdv') for v in valores]
+    vips = [normalizar(v.get('vip', '')) in VERDADEIROS for v in valores]
+
+    validos, erros = [], []
+    for i, (linha, brutos) in enumerate(bloco):
+        if not nomes[i]:
+            motivo = 'nome obrigatório'
+        elif len(nomes[i]) > 120:
+            motivo = 'nome com mais de 120 caracteres'
+        elif telefones[i] is None:
+            motivo = f'telefone inválido: {telefones_brutos[i]}'
+        elif not emails_ok[i]:
+            motivo = f'e-mail inválido: {emails[i]}'
+        elif not carteiras_ok[i]:
+            motivo = f'carteira inválida: {carteiras[i]}'
+        elif canais[i] is None:
+            motivo = f'canal deve ser um de: {", ".join(Canal.values)}'
+        else:
+            validos.append({
+                'linha': linha, 'nome': nomes[i], 'telefone': telefones[i], 'email': emails[i],
+                'carteira': carteiras[i], 'canal': canais[i], 'vip': vips[i],
+            })
+            continue
+        erros.append((linha, motivo, brutos))
+    return validos, erros
+
+
+def _duplicados(estabelecimento, registros, vistos):
+    """Motivo de duplicidade de cada registro (None = novo), consultando os índices uma vez por chave."""
+    telefones = {r['telefone'] for r in registros if r['telefone']}
+    emails = {r['email'] for r in registros if r['email']}
+    carteiras = {r['carteira'] for r in registros if r['carteira']}
+    clientes = Cliente.objects.filter(estabelecimento=estabelecimento)
+    # o exclude casa com a condição das constraints parciais, que servem de índice
+    existentes = {
+        'telefone': set(
+            clientes.filter(telefone__in=telefones).exclude(telefone='').values_list('telefone', flat=True)
+        ),
+        'email': set(clientes.filter(email__in=emails).exclude(email='').values_list('email', flat=True)),
+        # endereço é único no sistema todo, não só no estabelecimento
+        'carteira': set(Carteira.objects.filter(endereco__in=carteiras).values_list('endereco', flat=True)),
+    }
+    motivos = []
+    for registro in registros:
+        motivo = None
+        for chave in ('telefone', 'email', 'carteira'):
+            valor = registro[chave]
+            if not valor:
+                continue
+            if valor in existentes[chave]:
+                motivo = f'{chave} já cadastrado: {valor}'
+            elif valor in vistos[chave]:
+                motivo = f'{chave} repetido no arquivo: {valor}'
+            if motivo:
+                break
+        if motivo is None:
+            for chave in ('telefone', 'email', 'carteira'):
+                if registro[chave]:
+                    vistos[chave].add(registro[chave])
+        motivos.append(motivo)
+    return motivos
+
+
+def _inserir(estabelecimento, registros):
+    clientes = Cliente.objects.bulk_create([
+        Cliente(
+            estabelecimento=estabelecimento, nome=r['nome'], telefone=r['telefone'], email=r['email'],
+            canal=r['canal'], vip=r['vip'], busca=texto_busca(r['nome'], r['telefone'], r['email']),
+        )
+        for r in registros
+    ])
+    Carteira.objects.bulk_create([
+        Carteira(cliente=cliente, endereco=r['carteira'])
+        for cliente, r in zip(clientes, registros) if r['carteira']
+    ])
+
+
+def _gravar(estabelecimento, registros):
+    """
+    Grava o bloco numa transação e devolve os registros recusados pelas
+    constraints únicas (telefone/e-mail no estabelecimento, carteira): um
+    cadastro ou outra importação que gravou a mesma chave depois da consulta
+    de duplicados. Nesse caso o bloco é refeito linha a linha, cada uma no seu
+    savepoint.
+    """
+    try:
+        with transaction.atomic():
+            _inserir(estabelecimento, registros)
+        return []
+    except IntegrityError:
+        pass
+    conflitos = []
+    for registro in registros:
+        try:
+            with transaction.atomic():
+                _inserir(estabelecimento, [registro])
+        except IntegrityError:
+            conflitos.append(registro)
+    return conflitos
+
+
+# ---------- importação ----------
+
+def importar_clientes(estabelecimento, linhas, erros=None, chunk=None):
+    """
+    Importa ``linhas`` (de ``ler_linhas``) no estabelecimento, um bloco por
+    transação. Gera o progresso após cada bloco: ``{'lidas', 'importados',
+    'duplicados', 'invalidos'}``. Linhas recusadas vão para ``erros`` (arquivo
+    texto aberto para escrita), em CSV.
+    """
+    chunk = chunk or settings.IMPORTACAO_CHUNK
+    escritor = csv.writer(erros) if erros is not None else None
+    if escritor:
+        escritor.writerow(('linha', 'motivo', *CAMPOS))
+    progresso = {'lidas': 0, 'importados': 0, 'duplicados': 0, 'invalidos': 0}
+    vistos = {'telefone': set(), 'email': set(), 'carteira': set()}
+
+    linhas = iter(linhas)
+    while bloco := list(islice(linhas, chunk)):
+        brutos = dict(bloco)
+        validos, recusadas = validar(bloco)
+        progresso['invalidos'] += len(recusadas)
+        novos = []
+        for registro, motivo in zip(validos, _duplicados(estabelecimento, validos, vistos)):
+            if motivo:
+                progresso['duplicados'] += 1
+                recusadas.append((registro['linha'], motivo, brutos[registro['linha']]))
+            else:
+                novos.append(registro)
+        if novos:
+            conflitos = {r['linha'] for r in _gravar(estabelecimento, novos)}
+            if conflitos:
+                progresso['duplicados'] += len(conflitos)
+                recusadas += [
+                    (linha, 'telefone, e-mail ou carteira cadastrado durante a importação', brutos[linha])
+                    for linha in sorted(conflitos)
+                ]
+                novos = [r for r in novos if r['linha'] not in conflitos]
+        if novos:
+            # bulk_create não dispara post_save: busca (ETag) e fragmentos mudam aqui
+            invalidar_busca(estabelecimento.pk)
+            invalidar_fragmentos()
+        if escritor:
+            escritor.writerows(
+                (linha, motivo, *(valores.get(campo, '') for campo in CAMPOS))
+                for linha, motivo, valores in sorted(recusadas, key=lambda recusada: recusada[0])
+            )
+        progresso['lidas'] += len(bloco)
+        progresso['importados'] += len(novos)
+        yield dict(progresso)
+
+
+# ---------- fila (planilhas grandes) ----------
+
+def enfileirar_importacao(estabelecimento, arquivo, encoding='utf-8-sig'):
+    """Grava o upload em IMPORTACAO_DIR (em partes, sem ler tudo para a memória) e cria o job."""
+    job = ImportacaoJob(estabelecimento=estabelecimento, nome_arquivo=arquivo.name[:255], encoding=encoding)
+    destino = caminho_upload(job.pk)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    with destino.open('wb') as saida:
+        for parte in arquivo.chunks():
+            saida.write(parte)
+    job.save()
+    return job
+
+
+def reservar_importacao():
+    """
+    Reserva a importação mais antiga da fila (None se vazia), com UPDATE
+    condicional como ``reservar_proximo`` em app/fila.py.
+    """
+    candidatos = ImportacaoJob.objects.filter(status=ImportacaoJob.Status.QUEUED).order_by('criado_em')
+    for pk in candidatos.values_list('pk', flat=True)[:10]:
+        reservado = ImportacaoJob.objects.filter(pk=pk, status=ImportacaoJob.Status.QUEUED).update(
+            status=ImportacaoJob.Status.RUNNING, atualizado_em=timezone.now(),
+        )
+        if reservado:
+            return ImportacaoJob.objects.select_related('estabelecimento').get(pk=pk)
+    return None
+
+
+def executar_importacao(job):
+    """Importa a planilha do job, gravando o progresso a cada bloco."""
+    progresso = {'lidas': 0, 'importados': 0, 'duplicados': 0, 'invalidos': 0}
+    final = {'status': ImportacaoJob.Status.DONE, 'erro': ''}
+    caminho = caminho_erros(job.pk)
+    try:
+        with caminho_upload(job.pk).open('rb') as arquivo, \
+                caminho.open('w', newline='', encoding='utf-8') as erros:
+            linhas = ler_linhas(arquivo, job.nome_arquivo, job.encoding)
+            for progresso in importar_clientes(job.estabelecimento, linhas, erros):
+                ImportacaoJob.objects.filter(pk=job.pk).update(**progresso, atualizado_em=timezone.now())
+    except (ErroImportacao, UnicodeDecodeError, LookupError, csv.Error) as e:
+        # os blocos anteriores já foram gravados
+        final = {
+            'status': ImportacaoJob.Status.FAILED,
+            'erro': f'leitura interrompida depois da linha {progresso["lidas"] + 1}: {e}',
+        }
+    if not (progresso['duplicados'] or progresso['invalidos']):
+        caminho.unlink(missing_ok=True)
+    caminho_upload(job.pk).unlink(missing_ok=True)
+    ImportacaoJob.objects.filter(pk=job.pk).update(**progresso, **final, concluido_em=timezone.now())
+
+
+def importacoes_orfas():
+    """
+    Devolve para a fila importações paradas há mais de IMPORTACAO_ORFA
+    segundos (worker morto no meio). Refazer é seguro: as linhas já gravadas
+    voltam como duplicadas.
+    """
+    limite = timezone.now() - timedelta(seconds=settings.IMPORTACAO_ORFA)
+    return ImportacaoJob.objects.filter(status=ImportacaoJob.Status.RUNNING, atualizado_em__lt=limite).update(
+        status=ImportacaoJob.Status.QUEUED, lidas=0, importados=0, duplicados=0, invalidos=0,
+    )
+
+
+def processar_importacoes(parar, intervalo=0.5):
+    """Loop do worker de importação: uma planilha por vez até ``parar`` ser sinalizado."""
+    try:
+        while not parar.is_set():
+            close_old_connections()
+            job = reservar_importacao()
+            if job is None:
+                parar.wait(intervalo)
+                continue
+            try:
+                executar_importacao(job)
+            except Exception:
+                logger.exception('Erro inesperado na importação %s', job.pk)
+                ImportacaoJob.objects.filter(pk=job.pk).update(
+                    status=ImportacaoJob.Status.FAILED, erro='Erro interno ao importar', concluido_em=timezone.now(),
+                )
+    finally:
+        connection.close()
@@ -0,0 +1,436 @@
+"""
+Instrumentação de requisições: onde o tempo de cada request é gasto.
+
+- ``InstrumentacaoMiddleware`` (o primeiro do MIDDLEWARE) mede o request
+  inteiro e as fases abaixo, e as devolve no cabeçalho ``Server-Timing``
+  (aparece no DevTools do navegador, aba Timing):
+    pre     middlewares de entrada + resolução da URL, até a view começar
+    view    view + middlewares de resposta (ETag, compressão)
+    db      tempo em consultas SQL (desc com a quantidade)
+    tpl     renderização de templates
+    total   do primeiro middleware ao último
+  SERVER_TIMING=True manda o cabeçalho em toda resposta, 'staff' só para
+  usuários staff, False (padrão) em nenhuma: os tempos revelam detalhes
+  internos (consultas por página, cache) a qualquer visitante.
+- Uma fração PROFILE_SAMPLE_RATE dos requests síncronos roda sob cProfile;
+  o .prof vai para PROFILE_DIR (abrir com ``python -m pstats`` ou snakeviz).
+- Histogramas e contadores em memória, por processo, expostos em /metrics/ no
+  formato texto do Prometheus. Cada worker grava um snapshot das suas em
+  METRICAS_DIR (``<pid>.json``, no máximo a cada INTERVALO_GRAVACAO) e o
+  /metrics/ de qualquer worker soma todos, então o scrape vê o serviço
+  inteiro. Quando um worker sai, o master do gunicorn (hook ``child_exit``)
+  soma o snapshot dele em ``encerrados.json``: os contadores não voltam a
+  zero quando o --max-requests recicla um worker.
+
+As medições de db/tpl somam no request corrente via ``contextvars``,
+que o asgiref propaga para os threads do ``sync_to_async``; fora de um
+request (comandos, worker de créditos) ``medir()`` não faz nada.
+"""
+import atexit
+import cProfile
+import contextvars
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+# Limites (segundos) dos buckets dos histogramas de duração
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Fases medidas dentro da view, na ordem do Server-Timing
+FASES = ('db', 'tpl')
+
+# Intervalo mínimo (segundos) entre dois snapshots das métricas de um worker em METRICAS_DIR
+INTERVALO_GRAVACAO = 1.0
+ARQUIVO_ENCERRADOS = 'encerrados.json'
+# Arquivos já somados em encerrados.json lembrados (o /metrics/ os ignora se ainda existirem)
+MAX_INCLUIDOS = 1000
+
+_medicao = contextvars.ContextVar('medicao', default=None)
+
+
+class Medicao:
+    """Tempos acumulados de um request."""
+
+    __slots__ = ('inicio', 'inicio_view', 'fases', 'consultas')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.inicio_view = None
+        self.fases = dict.fromkeys(FASES, 0.0)
+        self.consultas = 0
+
+    def somar(self, fase, duracao):
+        self.fases[fase] += duracao
+
+
+@contextmanager
+def medir(fase):
+    """Soma o tempo do bloco à ``fase`` do request corrente (se houver um)."""
+    medicao = _medicao.get()
+    if medicao is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicao.somar(fase, time.perf_counter() - inicio)
+
+
+def medir_consulta(execute, sql, params, many, context):
+    """``execute_wrapper`` instalado em toda conexão (ver ``AppConfig.ready``)."""
+    medicao = _medicao.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.somar('db', time.perf_counter() - inicio)
+        medicao.consultas += 1
+
+
+def instalar_em_conexao(sender, connection, **kwargs):
+    """Receiver de ``connection_created``; o wrapper sobrevive a reconexões sem duplicar."""
+    if medir_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(medir_consulta)
+
+
+class _TemplateMedido(Template):
+    def render(self, context=None, request=None):
+        with medir('tpl'):
+            return super().render(context, request)
+
+
+class DjangoTemplatesMedidos(DjangoTemplates):
+    """Backend de templates do Django com o tempo de render somado à fase ``tpl``."""
+
+    def from_string(self, template_code):
+        return _TemplateMedido(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return _TemplateMedido(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _rotulos(rotulos, extra=()):
+    pares = [*rotulos, *extra]
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + '}'
+
+
+class Metricas:
+    """Histogramas e contadores do processo, renderizados no formato do Prometheus."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.ajudas = {}
+        self.histogramas = {}  # (nome, rótulos) -> [contagem por bucket..., +Inf, soma]
+        self.contadores = {}   # (nome, rótulos) -> valor
+
+    def observar(self, nome, valor, ajuda='', **rotulos):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self.lock:
+            self.ajudas.setdefault(nome, ajuda)
+            serie = self.histogramas.get(chave)
+            if serie is None:
+                serie = self.histogramas[chave] = [0] * (len(self.buckets) + 1) + [0.0]
+            for indice, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[indice] += 1
+            serie[-2] += 1
+            serie[-1] += valor
+
+    def contar(self, nome, valor=1, ajuda='', **rotulos):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self.lock:
+            self.ajudas.setdefault(nome, ajuda)
+            self.contadores[chave] = self.contadores.get(chave, 0) + valor
+
+    def carregar_histograma(self, nome, contagens, soma, total, ajuda='', **rotulos):
+        """Histograma já acumulado em outro processo (``contagens`` cumulativas, uma por bucket)."""
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self.lock:
+            self.ajudas.setdefault(nome, ajuda)
+            self.histogramas[chave] = [*contagens, total, soma]
+
+    def exportar(self):
+        """Snapshot serializável em JSON (lido de volta por ``somar``)."""
+        with self.lock:
+            return {
+                'ajudas': dict(self.ajudas),
+                'histogramas': [[nome, rotulos, serie] for (nome, rotulos), serie in self.histogramas.items()],
+                'contadores': [[nome, rotulos, valor] for (nome, rotulos), valor in self.contadores.items()],
+            }
+
+    def somar(self, dados):
+        """Soma um snapshot de ``exportar()`` (de outro processo) a estas métricas."""
+        with self.lock:
+            for nome, ajuda in dados['ajudas'].items():
+                self.ajudas.setdefault(nome, ajuda)
+            for nome, rotulos, serie in dados['histogramas']:
+                chave = (nome, tuple(tuple(par) for par in rotulos))
+                atual = self.histogramas.get(chave)
+                self.histogramas[chave] = list(serie) if atual is None else [a + b for a, b in zip(atual, serie)]
+            for nome, rotulos, valor in dados['contadores']:
+                chave = (nome, tuple(tuple(par) for par in rotulos))
+                self.contadores[chave] = self.contadores.get(chave, 0) + valor
+
+    def prometheus(self):
+        with self.lock:
+            histogramas = {chave: list(serie) for chave, serie in self.histogramas.items()}
+            contadores = dict(self.contadores)
+            ajudas = dict(self.ajudas)
+        linhas = []
+        vistos = set()
+        for (nome, rotulos), valor in sorted(contadores.items()):
+            if nome not in vistos:
+                vistos.add(nome)
+                linhas += [f'# HELP {nome} {ajudas[nome]}', f'# TYPE {nome} counter']
+            linhas.append(f'{nome}{_rotulos(rotulos)} {valor}')
+        for (nome, rotulos), serie in sorted(histogramas.items()):
+            if nome not in vistos:
+                vistos.add(nome)
+                linhas += [f'# HELP {nome} {ajudas[nome]}', f'# TYPE {nome} histogram']
+            for limite, contagem in zip(self.buckets, serie):
+                linhas.append(f'{nome}_bucket{_rotulos(rotulos, [("le", limite)])} {contagem}')
+            linhas.append(f'{nome}_bucket{_rotulos(rotulos, [("le", "+Inf")])} {serie[-2]}')
+            linhas.append(f'{nome}_sum{_rotulos(rotulos)} {serie[-1]:.6f}')
+            linhas.append(f'{nome}_count{_rotulos(rotulos)} {serie[-2]}')
+        return '\n'.join(linhas) + '\n'
+
+
+_metricas = None
+_metricas_pid = None
+_metricas_lock = threading.Lock()
+
+
+def obter_metricas():
+    """Métricas do processo atual (um worker forkado começa as suas do zero)."""
+    global _metricas, _metricas_pid
+    pid = os.getpid()
+    if _metricas is not None and _metricas_pid == pid:
+        return _metricas
+    with _metricas_lock:
+        if _metricas is None or _metricas_pid != pid:
+            _metricas = Metricas()
+            _metricas_pid = pid
+    return _metricas
+
+
+# ---------- snapshots compartilhados entre os workers (METRICAS_DIR) ----------
+
+_proxima_gravacao = 0.0
+
+
+def _ler_json(caminho):
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def _gravar_json(caminho, dados):
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(dados, arquivo)
+    os.replace(temporario, caminho)
+
+
+def gravar_metricas():
+    """Grava o snapshot das métricas deste processo em METRICAS_DIR/<pid>.json."""
+    if not settings.METRICAS_DIR or _metricas_pid != os.getpid():
+        return  # sem diretório, ou processo que nunca mediu nada (comandos, master)
+    try:
+        os.makedirs(settings.METRICAS_DIR, exist_ok=True)
+        _gravar_json(os.path.join(settings.METRICAS_DIR, f'{os.getpid()}.json'), _metricas.exportar())
+    except OSError:
+        pass
+
+
+def _gravar_periodicamente():
+    global _proxima_gravacao
+    agora = time.monotonic()
+    if agora >= _proxima_gravacao:
+        _proxima_gravacao = agora + INTERVALO_GRAVACAO
+        gravar_metricas()
+
+
+atexit.register(gravar_metricas)
+
+
+def encerrar_processo(pid):
+    """
+    Soma o snapshot de um processo que terminou em ``encerrados.json`` e apaga
+    o dele. Chamado só pelo master do gunicorn (hooks em gunicorn.conf.py),
+    um processo por vez.
+    """
+    if not settings.METRICAS_DIR:
+        return
+    nome = f'{pid}.json'
+    arquivo = os.path.join(settings.METRICAS_DIR, nome)
+    encerrados = os.path.join(settings.METRICAS_DIR, ARQUIVO_ENCERRADOS)
+    try:
+        dados = _ler_json(arquivo)
+    except (OSError, ValueError):
+        return
+    total = Metricas()
+    incluidos = []
+    try:
+        anterior = _ler_json(encerrados)
+        total.somar(anterior['metricas'])
+        incluidos = anterior['incluidos']
+    except (OSError, ValueError, KeyError):
+        pass
+    total.somar(dados)
+    # grava antes de apagar: um scrape no meio ignora o arquivo pela lista de incluídos
+    _gravar_json(encerrados, {'metricas': total.exportar(), 'incluidos': [*incluidos, nome][-MAX_INCLUIDOS:]})
+    os.remove(arquivo)
+
+
+def encerrar_processos_anteriores():
+    """No start do master: snapshots que sobraram de workers de uma execução anterior."""
+    if not settings.METRICAS_DIR or not os.path.isdir(settings.METRICAS_DIR):
+        return
+    for nome in os.listdir(settings.METRICAS_DIR):
+        pid, _, extensao = nome.partition('.')
+        if extensao == 'json' and pid.isdigit():
+            encerrar_processo(int(pid))
+
+
+def metricas_agregadas():
+    """Métricas de todos os workers: as deste processo, os snapshots dos outros e as dos encerrados."""
+    atual = obter_metricas()
+    if not settings.METRICAS_DIR or not os.path.isdir(settings.METRICAS_DIR):
+        return atual
+    total = Metricas()
+    total.somar(atual.exportar())
+    ignorar = {f'{os.getpid()}.json', ARQUIVO_ENCERRADOS}
+    try:
+        encerrados = _ler_json(os.path.join(settings.METRICAS_DIR, ARQUIVO_ENCERRADOS))
+        total.somar(encerrados['metricas'])
+        ignorar.update(encerrados['incluidos'])
+    except (OSError, ValueError, KeyError):
+        pass
+    for nome in os.listdir(settings.METRICAS_DIR):
+        if not nome.endswith('.json') or nome in ignorar:
+            continue
+        try:
+            total.somar(_ler_json(os.path.join(settings.METRICAS_DIR, nome)))
+        except (OSError, ValueError, KeyError):
+            continue  # worker saindo: o master já está somando em encerrados.json
+    return total
+
+
+class InstrumentacaoMiddleware:
+    """Server-Timing, cProfile amostrado e métricas por view (ver o docstring do módulo)."""
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        medicao = _medicao.get()
+        if medicao is not None:
+            medicao.inicio_view = time.perf_counter()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicao = Medicao()
+        token = _medicao.set(medicao)
+        perfil = None
+        if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+            perfil = cProfile.Profile()
+            perfil.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            if perfil is not None:
+                perfil.disable()
+            _medicao.reset(token)
+        self._registrar(request, response, medicao)
+        if perfil is not None:
+            self._gravar_perfil(request, perfil)
+        return response
+
+    async def __acall__(self, request):
+        # cProfile só nos requests síncronos: no event loop ele misturaria as corrotinas concorrentes
+        medicao = Medicao()
+        token = _medicao.set(medicao)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicao.reset(token)
+        self._registrar(request, response, medicao)
+        return response
+
+    def _registrar(self, request, response, medicao):
+        fim = time.perf_counter()
+        total = fim - medicao.inicio
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'nao_resolvida'
+        metricas = obter_metricas()
+        metricas.observar(
+            'toknid_http_request_duration_seconds', total,
+            ajuda='Duração dos requests por view',
+            view=view, method=request.method, status=response.status_code,
+        )
+        for fase in FASES:
+            if medicao.fases[fase]:
+                metricas.observar(
+                    f'toknid_http_{fase}_duration_seconds', medicao.fases[fase],
+                    ajuda=f'Tempo de {fase} por request', view=view,
+                )
+        if medicao.consultas:
+            metricas.contar(
+                'toknid_http_db_queries_total', medicao.consultas,
+                ajuda='Consultas SQL feitas pelos requests', view=view,
+            )
+        _gravar_periodicamente()
+        if self._com_server_timing(request):
+            response['Server-Timing'] = self._server_timing(medicao, fim, total)
+
+    def _com_server_timing(self, request):
+        if settings.SERVER_TIMING == 'staff':
+            usuario = getattr(request, 'user', None)
+            return bool(usuario is not None and usuario.is_staff)
+        return settings.SERVER_TIMING is True
+
+    def _server_timing(self, medicao, fim, total):
+        metricas = []
+        if medicao.inicio_view is not None:
+            metricas.append(f'pre;dur={(medicao.inicio_view - medicao.inicio) * 1000:.1f}')
+            metricas.append(f'view;dur={(fim - medicao.inicio_view) * 1000:.1f}')
+        metricas.append(f'db;dur={medicao.fases["db"] * 1000:.1f};desc="{medicao.consultas} consultas"')
+        if medicao.fases['tpl']:
+            metricas.append(f'tpl;dur={medicao.fases["tpl"] * 1000:.1f}')
+        metricas.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metricas)
+
+    def _gravar_perfil(self, request, perfil):
+        nome = re.sub(r'[^A-Za-z0-9_-]+', '_', request.path.strip('/'))[:80] or 'index'
+        caminho = os.path.join(settings.PROFILE_DIR, f'{nome}-{int(time.time() * 1000)}-{os.getpid()}.prof')
+        try:
+            os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+            perfil.dump_stats(caminho)
+        except OSError:
+            pass
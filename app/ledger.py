@@ -0,0 +1,126 @@
+"""
+Ledger de moedas: lançamentos só de inserção (``Transacao``) e saldo corrente
+por cliente (``Cliente.moedas``).
+
+Cada lançamento e a atualização do saldo acontecem na mesma transação do
+banco, com ``F()`` (sem ler-modificar-gravar em Python). A cada
+``LEDGER_SNAPSHOT_INTERVALO`` lançamentos de um cliente é gravado um
+``SaldoSnapshot``, que permite conferir ou reconstruir o saldo somando só os
+lançamentos posteriores ao checkpoint.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Cliente, SaldoSnapshot, Transacao
+
+
+class SaldoInsuficiente(Exception):
+    """Resgate maior que o saldo do cliente."""
+
+
+def delta_moedas():
+    """Expressão SQL do efeito de um lançamento no saldo (+crédito, -resgate)."""
+    return Case(
+        When(tipo=Transacao.Tipo.RESGATE, then=-F('moedas')),
+        default=F('moedas'),
+        output_field=IntegerField(),
+    )
+
+
+def registrar_transacao(cliente, tipo, moedas, canal=None, descricao='', criado_em=None, credito_job=None):
+    """
+    Grava um lançamento e atualiza o saldo e a última atividade do cliente.
+
+    O UPDATE do cliente vem antes do INSERT: ele trava a linha do cliente até
+    o commit, então lançamentos simultâneos do mesmo cliente ficam em fila e
+    um resgate nunca deixa o saldo negativo.
+
+    Com ``credito_job`` (id do CreditoJob) o lançamento é idempotente: se o
+    job já foi lançado, devolve o lançamento existente sem mexer no saldo.
+    """
+    if moedas <= 0:
+        raise ValueError('moedas deve ser positivo')
+    criado_em = criado_em or timezone.now()
+    if tipo == Transacao.Tipo.RESGATE:
+        delta, atividade = -moedas, f'Resgatou {moedas} moedas'
+    else:
+        delta, atividade = moedas, f'Recebeu {moedas} moedas'
+
+    with transaction.atomic():
+        if credito_job is not None:
+            existente = Transacao.objects.filter(credito_job=credito_job).first()
+            if existente is not None:
+                return existente
+        consulta = Cliente.objects.filter(pk=cliente.pk)
+        if delta < 0:
+            consulta = consulta.filter(moedas__gte=moedas)
+        atualizados = consulta.update(
+            moedas=F('moedas') + delta,
+            ultima_atividade=atividade,
+            ultima_atividade_em=criado_em,
+            transacoes_desde_snapshot=F('transacoes_desde_snapshot') + 1,
+        )
+        if not atualizados:
+            raise SaldoInsuficiente(f'Saldo insuficiente para resgatar {moedas} moedas')
+        return Transacao.objects.create(
+            estabelecimento_id=cliente.estabelecimento_id,
+            cliente=cliente,
+            tipo=tipo,
+            moedas=moedas,
+            canal=canal or cliente.canal,
+            descricao=descricao,
+            criado_em=criado_em,
+            credito_job=credito_job,
+        )
+
+
+def criar_snapshot(cliente_id):
+    """
+    Grava um checkpoint com o saldo atual do cliente.
+
+    Saldo e último lançamento são lidos com a linha do cliente travada, então
+    nenhum lançamento fica no meio; não há soma sobre o ledger. Devolve o
+    snapshot, ou None se o cliente ainda não tem lançamentos.
+    """
+    with transaction.atomic():
+        cliente = (
+            Cliente.objects.select_for_update()
+            .only('id', 'moedas', 'transacoes_desde_snapshot')
+            .get(pk=cliente_id)
+        )
+        ultima = Transacao.objects.filter(cliente_id=cliente_id).aggregate(ultima=Max('id'))['ultima']
+        if ultima is None:
+            return None
+        snapshot = SaldoSnapshot.objects.create(cliente_id=cliente_id, ultima_transacao_id=ultima, saldo=cliente.moedas)
+        Cliente.objects.filter(pk=cliente_id).update(transacoes_desde_snapshot=0)
+    return snapshot
+
+
+def criar_snapshots_pendentes(limite=1000):
+    """Checkpoint dos clientes que passaram de ``LEDGER_SNAPSHOT_INTERVALO`` lançamentos."""
+    pendentes = list(
+        Cliente.objects.filter(transacoes_desde_snapshot__gte=settings.LEDGER_SNAPSHOT_INTERVALO)
+        .values_list('pk', flat=True)[:limite]
+    )
+    for cliente_id in pendentes:
+        criar_snapshot(cliente_id)
+    return len(pendentes)
+
+
+def saldo_reconstruido(cliente_id):
+    """Saldo a partir do ledger: último snapshot + lançamentos posteriores."""
+    snapshot = (
+        SaldoSnapshot.objects.filter(cliente_id=cliente_id)
+        .order_by('-ultima_transacao_id')
+        .only('saldo', 'ultima_transacao_id')
+        .first()
+    )
+    lancamentos = Transacao.objects.filter(cliente_id=cliente_id)
+    base = 0
+    if snapshot is not None:
+        lancamentos = lancamentos.filter(pk__gt=snapshot.ultima_transacao_id)
+        base = snapshot.saldo
+    return base + lancamentos.aggregate(soma=Coalesce(Sum(delta_moedas()), 0))['soma']
@@ -0,0 +1,156 @@
+"""
+Controle de admissão dos endpoints de crédito (/creditar-moedas/ e /lote/).
+
+- Taxa por parceiro: token bucket por carteira de origem (hash da
+  ``chave_privada``), com CREDITO_TAXA fichas por segundo e até
+  CREDITO_RAJADA acumuladas. A chave de assinatura é a credencial do
+  estabelecimento nessas chamadas, que não têm login: o
+  ``?estabelecimento=`` viria do próprio cliente e, na chave do balde,
+  deixaria uma mesma carteira abrir um balde por id e multiplicar a taxa. Os baldes ficam num SQLite local (LIMITES_DB), compartilhado
+  pelos workers do gunicorn do mesmo container: cada consulta é uma
+  transação ``BEGIN IMMEDIATE`` de uma linha, sem ir ao banco principal.
+- Fila: acima de CREDITO_FILA_MAX jobs esperando o ``processar_creditos``,
+  novos créditos são recusados na hora em vez de esperar minutos na fila.
+  ``conferir_fila`` roda dentro da transação que enfileira (app/fila.py),
+  com os enfileiramentos serializados: contagem e insert são uma coisa só.
+
+Os dois só valem para trabalho novo: uma repetição com a mesma
+Idempotency-Key devolve o job existente sem gastar ficha (app/fila.py).
+
+Recusas respondem 429/503 com ``Retry-After`` (nas views) e são contadas em
+/metrics/ (``toknid_credito_recusados_total``).
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from .instrumentacao import obter_metricas
+
+# A cada tantas consultas o processo apaga os baldes cheios (equivalentes a não existir)
+_LIMPEZA_A_CADA = 1000
+
+
+class BaldesSqlite:
+    """Token buckets por chave num arquivo SQLite; uma conexão por thread."""
+
+    def __init__(self, caminho):
+        self.caminho = str(caminho)
+        self._local = threading.local()
+        self._consultas = 0
+
+    def _conexao(self):
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None:
+            Path(self.caminho).parent.mkdir(parents=True, exist_ok=True)
+            # isolation_level=None: as transações são abertas à mão (BEGIN IMMEDIATE)
+            conexao = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute('PRAGMA synchronous=NORMAL')
+            conexao.execute(
+                'CREATE TABLE IF NOT EXISTS baldes '
+                '(chave TEXT PRIMARY KEY, fichas REAL NOT NULL, atualizado REAL NOT NULL)'
+            )
+            self._local.conexao = conexao
+        return conexao
+
+    def consumir(self, chave, taxa, capacidade, custo=1):
+        """
+        Tira ``custo`` fichas do balde de ``chave``. Devolve 0 se conseguiu, ou
+        em quantos segundos o balde terá fichas suficientes.
+        """
+        conexao = self._conexao()
+        agora = time.time()
+        # IMMEDIATE pega o lock de escrita já na leitura: dois workers não gastam a mesma ficha
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            linha = conexao.execute('SELECT fichas, atualizado FROM baldes WHERE chave = ?', (chave,)).fetchone()
+            fichas = capacidade if linha is None else min(capacidade, linha[0] + (agora - linha[1]) * taxa)
+            espera = 0.0
+            if fichas >= custo:
+                fichas -= custo
+            else:
+                espera = (custo - fichas) / taxa
+            conexao.execute(
+                'INSERT INTO baldes (chave, fichas, atualizado) VALUES (?, ?, ?) '
+                'ON CONFLICT (chave) DO UPDATE SET fichas = excluded.fichas, atualizado = excluded.atualizado',
+                (chave, fichas, agora),
+            )
+            self._consultas += 1
+            if self._consultas % _LIMPEZA_A_CADA == 0:
+                # vazio há capacidade/taxa segundos: já estaria cheio de novo
+                conexao.execute('DELETE FROM baldes WHERE atualizado < ?', (agora - capacidade / taxa,))
+            conexao.execute('COMMIT')
+        except BaseException:
+            conexao.execute('ROLLBACK')
+            raise
+        return espera
+
+
+_baldes = None
+_baldes_pid = None
+_baldes_lock = threading.Lock()
+
+
+def obter_baldes():
+    """Baldes do processo atual (conexões SQLite não sobrevivem ao fork)."""
+    global _baldes, _baldes_pid
+    pid = os.getpid()
+    if _baldes is not None and _baldes_pid == pid:
+        return _baldes
+    with _baldes_lock:
+        if _baldes is None or _baldes_pid != pid:
+            _baldes = BaldesSqlite(settings.LIMITES_DB)
+            _baldes_pid = pid
+    return _baldes
+
+
+class CreditoRecusado(Exception):
+    """Crédito não admitido agora; ``status`` é o HTTP e ``retry_after`` os segundos até tentar de novo."""
+
+    def __init__(self, mensagem, status, retry_after, motivo):
+        super().__init__(mensagem)
+        self.status = status
+        self.retry_after = retry_after
+        self.motivo = motivo
+
+
+def _recusar(mensagem, status, retry_after, motivo):
+    obter_metricas().contar(
+        'toknid_credito_recusados_total',
+        ajuda='Créditos recusados pelo controle de admissão', motivo=motivo,
+    )
+    raise CreditoRecusado(mensagem, status, max(1, int(retry_after + 0.999)), motivo)
+
+
+def admitir_credito(chave_privada):
+    """
+    Levanta ``CreditoRecusado`` se a carteira de origem passou da taxa. Uma
+    ficha por requisição, seja crédito único ou lote: o tamanho do lote pesa
+    na fila (``conferir_fila``).
+    """
+    if settings.CREDITO_TAXA > 0:
+        chave = hashlib.sha256(chave_privada.encode()).hexdigest()[:32]
+        espera = obter_baldes().consumir(chave, settings.CREDITO_TAXA, settings.CREDITO_RAJADA)
+        if espera:
+            _recusar('Limite de créditos por segundo excedido para esta carteira', 429, espera, 'taxa')
+
+
+def conferir_fila(destinos=1):
+    """
+    Levanta ``CreditoRecusado`` se a fila não comporta mais ``destinos`` jobs.
+    Só é exata dentro da transação de ``enfileirar_credito``/``enfileirar_lote``,
+    que segura os outros enfileiramentos até o commit.
+    """
+    from .models import CreditoJob
+
+    limite = settings.CREDITO_FILA_MAX
+    if limite > 0:
+        # contagem limitada: com a fila cheia o custo não cresce junto
+        na_fila = CreditoJob.objects.filter(status=CreditoJob.Status.QUEUED)[:limite].count()
+        if na_fila + destinos > limite:
+            _recusar('Fila de créditos cheia; tente de novo em instantes', 503, settings.CREDITO_FILA_RETRY_AFTER, 'fila')
@@ -0,0 +1,206 @@
+"""
+Handlers de logging assíncronos para o ``LOGGING`` do settings.
+
+``FilaHandler`` só coloca o registro numa fila limitada em memória; um
+``QueueListener`` por processo (cada worker do gunicorn tem o seu) repassa
+os registros para o arquivo e para o console. Assim as threads de requisição
+nunca esperam por disco.
+
+Os arquivos são abertos com ``WatchedFileHandler`` e rotacionados por fora
+(logrotate, ver Ver-Logs.md): vários workers escrevem no mesmo arquivo, e uma
+rotação por renomeação feita por um deles deixaria os outros gravando no
+arquivo antigo. O handler percebe que o arquivo foi movido e o reabre.
+
+Com a fila cheia o registro é descartado e contado; o total de descartes é
+registrado como WARNING assim que a fila volta a ter espaço.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# Intervalo mínimo (segundos) entre duas verificações de arquivo rotacionado
+INTERVALO_VERIFICACAO = 1.0
+
+# Atributos padrão de um LogRecord; o resto veio de ``extra=`` e vai para o JSON
+_ATRIBUTOS_PADRAO = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro (LOG_FORMAT=json)."""
+
+    def format(self, record):
+        dados = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'pid': record.process,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            dados['exc'] = record.exc_text
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_PADRAO and not chave.startswith('_'):
+                dados[chave] = valor
+        return json.dumps(dados, default=str, ensure_ascii=False)
+
+
+class _ArquivoObservado(logging.handlers.WatchedFileHandler):
+    """
+    WatchedFileHandler para a thread do listener: confere se o arquivo foi
+    rotacionado no máximo a cada INTERVALO_VERIFICACAO (não um stat por
+    registro) e só faz flush quando a fila esvazia (uma escrita por rajada).
+    """
+
+    def __init__(self, arquivo, fila):
+        super().__init__(arquivo, encoding='utf-8')
+        self.fila = fila
+        self.proxima_verificacao = 0.0
+
+    def reopenIfNeeded(self):
+        agora = time.monotonic()
+        if agora >= self.proxima_verificacao:
+            self.proxima_verificacao = agora + INTERVALO_VERIFICACAO
+            super().reopenIfNeeded()
+
+    def flush(self):
+        if self.fila.empty():
+            super().flush()
+
+
+class FilaHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler com fila limitada, amostragem e listener por processo.
+
+    Parâmetros (chaves do handler no ``LOGGING``):
+      arquivo          arquivo de destino (None para só console)
+      console          também escreve no stderr
+      tamanho_fila     registros em memória antes de descartar
+      taxa_amostragem  fração dos registros abaixo de WARNING que é mantida
+
+    O ``formatter`` configurado neste handler é o usado pelos destinos.
+    """
+
+    def __init__(self, arquivo=None, console=True, tamanho_fila=10000, taxa_amostragem=1.0):
+        super().__init__(queue.Queue(maxsize=tamanho_fila))
+        self.arquivo = str(arquivo) if arquivo else None
+        self.console = console
+        self.tamanho_fila = tamanho_fila
+        self.taxa_amostragem = taxa_amostragem
+        self.descartados = 0
+        self.listener = None
+        self.listener_pid = None
+        self.listener_lock = threading.Lock()
+        atexit.register(self.parar_listener)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._apos_fork)
+
+    # ---------- listener por processo ----------
+
+    def _destinos(self):
+        destinos = []
+        if self.arquivo:
+            os.makedirs(os.path.dirname(self.arquivo) or '.', exist_ok=True)
+            destinos.append(_ArquivoObservado(self.arquivo, self.queue))
+        if self.console:
+            destinos.append(logging.StreamHandler(sys.stderr))
+        for destino in destinos:
+            destino.setFormatter(self.formatter)
+        return destinos
+
+    def _garantir_listener(self):
+        pid = os.getpid()
+        if self.listener is not None and self.listener_pid == pid:
+            return
+        with self.listener_lock:
+            if self.listener is not None and self.listener_pid == pid:
+                return
+            if self.listener_pid is not None:
+                # processo filho (fork do gunicorn): a thread do listener ficou no pai
+                self.queue = queue.Queue(maxsize=self.tamanho_fila)
+                self.descartados = 0
+            self.listener = logging.handlers.QueueListener(self.queue, *self._destinos())
+            self.listener.start()
+            self.listener_pid = pid
+
+    def _apos_fork(self):
+        # no filho só existe a thread que chamou o fork: um lock que outra
+        # thread do pai segurava nunca seria liberado
+        self.listener_lock = threading.Lock()
+
+    def parar_listener(self):
+        """Esvazia a fila e fecha os destinos (chamado no atexit)."""
+        with self.listener_lock:
+            if self.listener is None or self.listener_pid != os.getpid():
+                return
+            try:
+                self.listener.stop()
+            except queue.Full:
+                pass  # sem espaço nem para o sentinela; a thread é daemon
+            for destino in self.listener.handlers:
+                destino.close()
+            self.listener = None
+
+    def close(self):
+        self.parar_listener()
+        super().close()
+
+    # ---------- caminho da requisição ----------
+
+    def prepare(self, record):
+        """
+        Resolve mensagem e traceback já na thread de origem, sem formatar a
+        linha final: a formatação fica para a thread do listener.
+        """
+        if (not record.args and not record.exc_info and isinstance(record.msg, str)
+                and 'request' not in record.__dict__):
+            return record  # nada a resolver (ex.: log de requisições): evita a cópia
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if hasattr(record, 'request'):
+            # o HttpRequest do logger django.request não deve ficar preso na fila
+            request = record.__dict__.pop('request')
+            record.path = getattr(request, 'path', None)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+            return
+        if self.descartados:
+            perdidos, self.descartados = self.descartados, 0
+            aviso = logging.LogRecord(
+                __name__, logging.WARNING, __file__, 0,
+                '%s registros de log descartados (fila cheia)', (perdidos,), None,
+            )
+            try:
+                self.queue.put_nowait(self.prepare(aviso))
+            except queue.Full:
+                self.descartados += perdidos
+
+    def emit(self, record):
+        if (self.taxa_amostragem < 1.0 and record.levelno < logging.WARNING
+                and random.random() >= self.taxa_amostragem):
+            return
+        try:
+            self._garantir_listener()
+            self.enqueue(self.prepare(record))
+        except Exception:
+            self.handleError(record)
@@ -0,0 +1,34 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from app.metricas import ATRASO_SEGURANCA, LOTE_PADRAO, atualizar_metricas, recalcular_metricas
+
+
+class Command(BaseCommand):
+    help = "Agrega as transações novas desde a marca d'água nos rollups do dashboard (MetricaHora/MetricaDia)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=LOTE_PADRAO, help='Transações por transação do banco')
+        parser.add_argument('--recalcular', action='store_true', help='Apaga os rollups e reagrega todo o histórico')
+        parser.add_argument(
+            '--sem-atraso', action='store_true',
+            help='Agrega até o maior id atual sem esperar o atraso de segurança (só com nada gravando transações)',
+        )
+
+    def handle(self, *args, **options):
+        if options['recalcular']:
+            recalcular_metricas()
+            self.stdout.write(self.style.WARNING('Rollups apagados; reagregando todo o histórico'))
+        inicio = time.monotonic()
+        if options['sem_atraso']:
+            total = atualizar_metricas(lote=options['lote'], atraso=timedelta(0))
+        else:
+            # a primeira rodada anota o maior id atual; ele só é agregado depois do atraso
+            total = atualizar_metricas(lote=options['lote'])
+            time.sleep(ATRASO_SEGURANCA.total_seconds())
+            total += atualizar_metricas(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} transação(ões) agregada(s) em {time.monotonic() - inicio:.1f}s'
+        ))
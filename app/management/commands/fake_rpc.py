@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from app.fake_rpc import ConfigFakeRpc, criar_servidor
+
+
+class Command(BaseCommand):
+    help = 'Sobe um RPC falso da Solana para testes de carga offline do crédito.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--porta', type=int, default=8899)
+        parser.add_argument('--latencia-ms', type=float, default=50, help='Latência média por requisição')
+        parser.add_argument('--jitter-ms', type=float, default=20, help='Variação da latência (+/-)')
+        parser.add_argument('--taxa-erro', type=float, default=0.0, help='Fração de respostas 429/503 (0 a 1)')
+        parser.add_argument('--saldo', type=int, default=10 ** 12, help='Saldo da origem em lamports')
+        parser.add_argument('--contas-existentes', type=float, default=0.9, help='Fração de contas destino que já existem')
+        parser.add_argument('--confirmacao-ms', type=float, default=800, help='Tempo até uma transação aparecer confirmada')
+
+    def handle(self, *args, **options):
+        config = ConfigFakeRpc(
+            latencia_ms=options['latencia_ms'],
+            jitter_ms=options['jitter_ms'],
+            taxa_erro=options['taxa_erro'],
+            saldo_lamports=options['saldo'],
+            fracao_contas_existentes=options['contas_existentes'],
+            confirmacao_ms=options['confirmacao_ms'],
+        )
+        servidor = criar_servidor(options['host'], options['porta'], config)
+        self.stdout.write(self.style.SUCCESS(
+            f'RPC falso em http://{options["host"]}:{options["porta"]} '
+            f'(latência {config.latencia_ms}ms, erros {config.taxa_erro:.0%})'
+        ))
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
+            for metodo, total in servidor.estado.chamadas.most_common():
+                self.stdout.write(f'  {metodo}: {total}')
@@ -0,0 +1,131 @@
+import os
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from app.busca import texto_busca
+from app.fake_rpc import base58
+from app.models import Canal, Carteira, Cliente, Estabelecimento, SaldoSnapshot, Transacao
+
+NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique', 'Isabela', 'João',
+         'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Thiago', 'Vanessa', 'Wagner']
+SOBRENOMES = ['Silva', 'Souza', 'Lima', 'Oliveira', 'Santos', 'Pereira', 'Costa', 'Rodrigues', 'Almeida', 'Nunes']
+CANAIS = [Canal.PDV, Canal.PDV, Canal.WHATSAPP, Canal.APP]
+
+
+class Command(BaseCommand):
+    help = 'Gera estabelecimentos, clientes e transações falsos em volume, para benchmarks das listas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--estabelecimentos', type=int, default=1)
+        parser.add_argument('--clientes', type=int, default=300, help='Clientes por estabelecimento')
+        parser.add_argument('--transacoes', type=int, default=3000, help='Transações por estabelecimento')
+        parser.add_argument('--dias', type=int, default=365, help='Período coberto pelas transações')
+        parser.add_argument('--lote', type=int, default=5000, help='Linhas por bulk_create')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        aleatorio = random.Random(options['seed'])
+        inicio = time.monotonic()
+        for _ in range(options['estabelecimentos']):
+            estabelecimento = Estabelecimento.objects.create(
+                nome=f'Loja {aleatorio.choice(SOBRENOMES)} {aleatorio.randint(1, 999)}',
+            )
+            clientes = self._gerar_clientes(estabelecimento, options, aleatorio)
+            total = self._gerar_transacoes(estabelecimento, clientes, options, aleatorio)
+            self.stdout.write(
+                f'{estabelecimento} (id {estabelecimento.pk}): {len(clientes)} clientes, {total} transações'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Concluído em {time.monotonic() - inicio:.1f}s'))
+
+    def _gerar_clientes(self, estabelecimento, options, aleatorio):
+        agora = timezone.now()
+        clientes = []
+        for i in range(options['clientes']):
+            nome = f'{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)}'
+            telefone = f'+55 (11) 9{aleatorio.randint(1000, 9999)}-{aleatorio.randint(1000, 9999)}'
+            email = f'{nome.split()[0].lower()}.{i}@email.com'
+            clientes.append(Cliente(
+                estabelecimento=estabelecimento,
+                nome=nome,
+                telefone=telefone,
+                email=email,
+                busca=texto_busca(nome, telefone, email),
+                vip=aleatorio.random() < 0.1,
+                ativo=aleatorio.random() < 0.8,
+                canal=aleatorio.choice(CANAIS),
+                criado_em=agora - timedelta(days=options['dias'] + aleatorio.randint(0, 365)),
+            ))
+        with transaction.atomic():
+            clientes = Cliente.objects.bulk_create(clientes, batch_size=options['lote'])
+            Carteira.objects.bulk_create(
+                [Carteira(cliente=cliente, endereco=base58(os.urandom(32))) for cliente in clientes],
+                batch_size=options['lote'],
+            )
+        return clientes
+
+    def _gerar_transacoes(self, estabelecimento, clientes, options, aleatorio):
+        """
+        Transações em ordem cronológica, gravadas em lotes direto no ledger
+        (sem ``registrar_transacao``, para gerar milhões de linhas rápido): os
+        saldos são acumulados em memória e gravados no fim, junto com um
+        snapshot por cliente.
+        """
+        total = options['transacoes']
+        if not clientes or not total:
+            return 0
+        agora = timezone.now()
+        momento = agora - timedelta(days=options['dias'])
+        passo_medio = options['dias'] * 86400 / total
+        saldos = {cliente.pk: 0 for cliente in clientes}
+        ultimas = {}
+
+        pendentes = []
+        for _ in range(total):
+            momento += timedelta(seconds=aleatorio.expovariate(1 / passo_medio))
+            cliente = aleatorio.choice(clientes)
+            moedas = aleatorio.choice((10, 20, 40, 50, 60, 80, 100, 120))
+            if saldos[cliente.pk] >= moedas and aleatorio.random() < 0.3:
+                tipo, descricao = Transacao.Tipo.RESGATE, f'Resgate {moedas} moedas'
+                saldos[cliente.pk] -= moedas
+                ultimas[cliente.pk] = (f'Resgatou {moedas} moedas', min(momento, agora))
+            else:
+                tipo, descricao = Transacao.Tipo.CREDITO, f'Compra R$ {moedas},00'
+                saldos[cliente.pk] += moedas
+                ultimas[cliente.pk] = (f'Recebeu {moedas} moedas', min(momento, agora))
+            pendentes.append(Transacao(
+                estabelecimento=estabelecimento,
+                cliente=cliente,
+                tipo=tipo,
+                moedas=moedas,
+                canal=aleatorio.choice(CANAIS),
+                descricao=descricao,
+                criado_em=min(momento, agora),
+            ))
+            if len(pendentes) >= options['lote']:
+                Transacao.objects.bulk_create(pendentes)
+                pendentes = []
+        if pendentes:
+            Transacao.objects.bulk_create(pendentes)
+
+        for cliente in clientes:
+            cliente.moedas = saldos[cliente.pk]
+            cliente.ultima_atividade, cliente.ultima_atividade_em = ultimas.get(cliente.pk, ('', None))
+        Cliente.objects.bulk_update(
+            clientes, ['moedas', 'ultima_atividade', 'ultima_atividade_em'], batch_size=options['lote'],
+        )
+        ultimas_transacoes = (
+            Transacao.objects.filter(estabelecimento=estabelecimento)
+            .values('cliente_id')
+            .annotate(ultima=Max('id'))
+        )
+        SaldoSnapshot.objects.bulk_create([
+            SaldoSnapshot(cliente_id=linha['cliente_id'], ultima_transacao_id=linha['ultima'], saldo=saldos[linha['cliente_id']])
+            for linha in ultimas_transacoes
+        ], batch_size=options['lote'])
+        return total
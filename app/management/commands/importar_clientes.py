@@ -0,0 +1,50 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.importacao import ErroImportacao, importar_clientes, ler_linhas
+from app.models import Estabelecimento
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa clientes de uma planilha CSV ou XLSX (colunas nome, telefone, email, carteira, canal, vip), '
+        'em blocos gravados com bulk_create e sem ler o arquivo inteiro para a memória.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Planilha .csv ou .xlsx')
+        parser.add_argument('--estabelecimento', type=int, required=True)
+        parser.add_argument('--chunk', type=int, default=None, help='Linhas por transação (padrão: IMPORTACAO_CHUNK)')
+        parser.add_argument('--erros', default=None, help='CSV das linhas recusadas (padrão: <arquivo>.erros.csv)')
+        parser.add_argument('--encoding', default='utf-8-sig', help='Codificação do CSV (ex.: cp1252)')
+
+    def handle(self, *args, **options):
+        estabelecimento = Estabelecimento.objects.filter(pk=options['estabelecimento']).first()
+        if estabelecimento is None:
+            raise CommandError(f'Estabelecimento {options["estabelecimento"]} não encontrado')
+        origem = Path(options['arquivo'])
+        caminho_erros = Path(options['erros'] or f'{origem}.erros.csv')
+
+        inicio = time.monotonic()
+        progresso = {'lidas': 0, 'importados': 0, 'duplicados': 0, 'invalidos': 0}
+        with origem.open('rb') as arquivo, caminho_erros.open('w', newline='', encoding='utf-8') as erros:
+            try:
+                linhas = ler_linhas(arquivo, origem.name, options['encoding'])
+                for progresso in importar_clientes(estabelecimento, linhas, erros, chunk=options['chunk']):
+                    self.stdout.write(
+                        f'{progresso["lidas"]} linhas: {progresso["importados"]} importados, '
+                        f'{progresso["duplicados"]} duplicados, {progresso["invalidos"]} inválidos '
+                        f'({progresso["lidas"] / (time.monotonic() - inicio):.0f} linhas/s)'
+                    )
+            except (ErroImportacao, UnicodeDecodeError) as e:
+                raise CommandError(f'{e} (importados até aqui: {progresso["importados"]})')
+
+        if progresso['duplicados'] or progresso['invalidos']:
+            self.stdout.write(self.style.WARNING(f'Linhas recusadas em {caminho_erros}'))
+        else:
+            caminho_erros.unlink()
+        self.stdout.write(self.style.SUCCESS(
+            f'{progresso["importados"]} clientes importados em {time.monotonic() - inicio:.1f}s'
+        ))
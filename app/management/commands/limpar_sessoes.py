@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.sessoes import limpar_sessoes_expiradas, usa_banco
+
+
+class Command(BaseCommand):
+    help = (
+        'Apaga as sessões expiradas em lotes (em vez do DELETE único do clearsessions), '
+        'para não segurar o lock de escrita do banco.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=None, help='Sessões por transação (padrão: SESSION_LIMPEZA_LOTE)')
+        parser.add_argument('--pausa', type=float, default=0.05, help='Espera entre lotes, em segundos')
+
+    def handle(self, *args, **options):
+        if not usa_banco():
+            self.stdout.write('SESSION_ENGINE não grava sessões no banco; nada a limpar')
+            return
+        inicio = time.monotonic()
+        total = limpar_sessoes_expiradas(lote=options['lote'], pausa=options['pausa'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} sessão(ões) expirada(s) apagada(s) em {time.monotonic() - inicio:.1f}s'
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.urls import reverse
+
+from app.renderizacao import gravar_manifest, gravar_prerenderizada
+from app.views import GUIAS_AJUDA
+
+
+class Command(BaseCommand):
+    help = 'Pré-renderiza as páginas de ajuda (HTML e HTML.gz) servidas com ETag/Last-Modified.'
+
+    def handle(self, *args, **options):
+        fabrica = RequestFactory()
+        paginas = [('ajuda/index', 'app/ajuda_suporte.html', reverse('ajuda_home'))]
+        paginas += [
+            (f'ajuda/{slug}', f'app/ajuda/{slug}.html', reverse('ajuda_guia', args=[slug]))
+            for slug in GUIAS_AJUDA
+        ]
+
+        entradas = {}
+        for chave, template, url in paginas:
+            # mesmo contexto da view; o request dá o path usado no menu e nos links de WhatsApp
+            html = render_to_string(
+                template,
+                {'page_title': 'Ajuda / Suporte — tokn.id | partners'},
+                request=fabrica.get(url),
+            )
+            entradas[chave] = gravar_prerenderizada(chave, html)
+            self.stdout.write(
+                f'{url}: {entradas[chave]["tamanho"]} bytes ({entradas[chave]["tamanho_gz"]} gzip)'
+            )
+        gravar_manifest(entradas)
+        self.stdout.write(self.style.SUCCESS(f'{len(entradas)} página(s) pré-renderizada(s)'))
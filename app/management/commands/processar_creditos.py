@@ -0,0 +1,84 @@
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from app.fila import limpar_idempotencia, marcar_orfaos, processar_fila, verificar_enviados
+from app.health import registrar_batimento
+from app.importacao import importacoes_orfas, processar_importacoes
+from app.ledger import criar_snapshots_pendentes
+from app.metricas import atualizar_metricas
+from app.sessoes import limpar_sessoes_expiradas
+from app.signer import obter_pool
+
+
+class Command(BaseCommand):
+    help = 'Processa a fila de créditos (CreditoJob) com N workers em background e as importações de planilhas grandes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Threads consumindo a fila (padrão: 4)')
+        parser.add_argument('--intervalo', type=float, default=0.5, help='Espera quando a fila está vazia, em segundos')
+
+    def handle(self, *args, **options):
+        parar = threading.Event()
+
+        def sinal(signum, frame):
+            self.stdout.write('Encerrando workers de crédito...')
+            parar.set()
+
+        signal.signal(signal.SIGTERM, sinal)
+        signal.signal(signal.SIGINT, sinal)
+
+        orfaos = marcar_orfaos()
+        if orfaos:
+            self.stdout.write(self.style.WARNING(f'{orfaos} job(s) interrompido(s) marcados como falha'))
+
+        threads = [
+            threading.Thread(
+                target=processar_fila,
+                args=(parar, options['intervalo']),
+                name=f'credito-worker-{i}',
+            )
+            for i in range(options['workers'])
+        ]
+        # planilhas grandes de /clientes/importar/ (app/importacao.py), uma por vez
+        threads.append(threading.Thread(
+            target=processar_importacoes, args=(parar, options['intervalo']), name='importacao-worker',
+        ))
+        for t in threads:
+            t.start()
+        self.stdout.write(self.style.SUCCESS(f'{options["workers"]} worker(s) de crédito em execução'))
+
+        # batimento dos signers a cada SIGNER_HEARTBEAT_INTERVAL (lido pelo /readyz/); manutenção a cada 60s
+        self._batimento()
+        proxima_manutencao = time.monotonic() + 60
+        while not parar.is_set():
+            parar.wait(settings.SIGNER_HEARTBEAT_INTERVAL)
+            if parar.is_set():
+                break
+            self._batimento()
+            if time.monotonic() >= proxima_manutencao:
+                proxima_manutencao = time.monotonic() + 60
+                marcar_orfaos()
+                verificar_enviados()
+                importacoes_orfas()
+                limpar_idempotencia()
+                criar_snapshots_pendentes()
+                atualizar_metricas()
+                # no máximo 10 lotes por minuto: um acúmulo grande sai aos poucos
+                limpar_sessoes_expiradas(maximo=10 * settings.SESSION_LIMPEZA_LOTE)
+                uso = obter_pool().estatisticas()['total']
+                self.stdout.write(f'Cache RPC dos signers: {uso["hits"]} hit(s), {uso["misses"]} miss(es)')
+        for t in threads:
+            t.join()
+
+    def _batimento(self):
+        try:
+            registrar_batimento(obter_pool())
+        except Exception as e:
+            self.stderr.write(f'Falha ao gravar o batimento dos signers: {e}')
+        finally:
+            close_old_connections()
@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand
+
+from app.ledger import criar_snapshot
+from app.models import Cliente, SaldoSnapshot, Transacao
+
+
+class Command(BaseCommand):
+    help = (
+        'Confere saldos e snapshots contra o ledger de transações, em blocos de clientes '
+        'e lendo os lançamentos em streaming.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Clientes por bloco')
+        parser.add_argument('--chunk', type=int, default=5000, help='Lançamentos lidos por ida ao banco')
+        parser.add_argument('--estabelecimento', type=int, default=None)
+        parser.add_argument('--corrigir', action='store_true', help='Grava em Cliente.moedas o saldo calculado pelo ledger')
+        parser.add_argument('--snapshot', action='store_true', help='Grava um snapshot novo de cada cliente conferido sem divergência')
+
+    def handle(self, *args, **options):
+        clientes = Cliente.objects.order_by('pk')
+        if options['estabelecimento']:
+            clientes = clientes.filter(estabelecimento_id=options['estabelecimento'])
+
+        conferidos = divergencias_saldo = divergencias_snapshot = 0
+        ultimo_pk = 0
+        while True:
+            bloco = list(clientes.filter(pk__gt=ultimo_pk).values_list('pk', 'moedas')[:options['lote']])
+            if not bloco:
+                break
+            ultimo_pk = bloco[-1][0]
+            saldos = dict(bloco)
+
+            snapshots = {}
+            for snapshot in (
+                SaldoSnapshot.objects.filter(cliente_id__in=saldos)
+                .order_by('cliente_id', 'ultima_transacao_id')
+                .only('id', 'cliente_id', 'ultima_transacao_id', 'saldo')
+            ):
+                snapshots.setdefault(snapshot.cliente_id, []).append(snapshot)
+
+            calculados = dict.fromkeys(saldos, 0)
+            lancamentos = (
+                Transacao.objects.filter(cliente_id__in=saldos)
+                .order_by('cliente_id', 'id')
+                .values_list('cliente_id', 'id', 'tipo', 'moedas')
+                .iterator(chunk_size=options['chunk'])
+            )
+            for cliente_id, transacao_id, tipo, moedas in lancamentos:
+                # snapshots cujo último lançamento já passou são conferidos com a soma até ali
+                divergencias_snapshot += self._conferir_snapshots(
+                    snapshots.get(cliente_id), transacao_id, calculados[cliente_id],
+                )
+                calculados[cliente_id] += moedas if tipo == Transacao.Tipo.CREDITO else -moedas
+            for cliente_id in saldos:
+                divergencias_snapshot += self._conferir_snapshots(snapshots.get(cliente_id), None, calculados[cliente_id])
+
+            for cliente_id, saldo in saldos.items():
+                conferidos += 1
+                if saldo == calculados[cliente_id]:
+                    if options['snapshot']:
+                        criar_snapshot(cliente_id)
+                    continue
+                divergencias_saldo += 1
+                self.stdout.write(self.style.WARNING(
+                    f'Cliente {cliente_id}: saldo {saldo}, ledger {calculados[cliente_id]}'
+                ))
+                if options['corrigir']:
+                    Cliente.objects.filter(pk=cliente_id, moedas=saldo).update(moedas=calculados[cliente_id])
+
+        estilo = self.style.SUCCESS if not (divergencias_saldo or divergencias_snapshot) else self.style.ERROR
+        self.stdout.write(estilo(
+            f'{conferidos} cliente(s) conferido(s): {divergencias_saldo} saldo(s) e '
+            f'{divergencias_snapshot} snapshot(s) divergente(s)'
+        ))
+
+    def _conferir_snapshots(self, snapshots, proxima_transacao_id, soma):
+        """
+        Confere e remove da lista os snapshots anteriores a ``proxima_transacao_id``
+        (todos, se None); ``soma`` é o saldo do ledger até o lançamento anterior.
+        """
+        divergentes = 0
+        while snapshots and (proxima_transacao_id is None or snapshots[0].ultima_transacao_id < proxima_transacao_id):
+            snapshot = snapshots.pop(0)
+            if snapshot.saldo != soma:
+                divergentes += 1
+                self.stdout.write(self.style.WARNING(
+                    f'Snapshot {snapshot.pk} do cliente {snapshot.cliente_id}: '
+                    f'saldo {snapshot.saldo}, ledger {soma} até #{snapshot.ultima_transacao_id}'
+                ))
+        return divergentes
@@ -0,0 +1,56 @@
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from app.storage import PREFIXOS_OTIMIZADOS
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara o tamanho dos estáticos na fonte com o que o nginx serve depois do '
+        'collectstatic (minificado, .gz e .br).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true', help='Inclui os estáticos de terceiros (admin etc.)')
+
+    def handle(self, *args, **options):
+        arquivos = getattr(staticfiles_storage, 'hashed_files', None)
+        if not arquivos:
+            raise CommandError('Manifest de estáticos vazio ou ausente; rode manage.py collectstatic antes.')
+
+        linhas = []
+        for nome, nome_hash in sorted(arquivos.items()):
+            if not options['todos'] and not nome.startswith(PREFIXOS_OTIMIZADOS):
+                continue
+            fonte = finders.find(nome)
+            if fonte is None:
+                continue
+            with open(fonte, 'rb') as arquivo:
+                original = len(arquivo.read())
+            linhas.append((
+                nome,
+                original,
+                staticfiles_storage.size(nome_hash),
+                self._tamanho(nome_hash + '.gz'),
+                self._tamanho(nome_hash + '.br'),
+            ))
+
+        self.stdout.write(f'{"arquivo":40} {"fonte":>9} {"servido":>9} {"gzip":>9} {"brotli":>9}')
+        for nome, original, servido, gz, br in linhas:
+            self.stdout.write(
+                f'{nome:40} {original:9} {servido:9} {self._formatar(gz):>9} {self._formatar(br):>9}'
+            )
+        total_fonte = sum(linha[1] for linha in linhas)
+        total_gz = sum(linha[3] or linha[2] for linha in linhas)
+        total_br = sum(linha[4] or linha[3] or linha[2] for linha in linhas)
+        self.stdout.write(self.style.SUCCESS(
+            f'Total: {total_fonte} bytes na fonte, {sum(linha[2] for linha in linhas)} minificados, '
+            f'{total_gz} com gzip, {total_br} com brotli'
+        ))
+
+    def _tamanho(self, nome):
+        return staticfiles_storage.size(nome) if staticfiles_storage.exists(nome) else None
+
+    def _formatar(self, tamanho):
+        return '-' if tamanho is None else str(tamanho)
@@ -0,0 +1,229 @@
+"""
+Métricas do dashboard pré-agregadas por hora e por dia.
+
+``atualizar_metricas`` lê só as transações novas desde a marca d'água
+(``MarcaAgua``), agrega por estabelecimento/período/canal no banco e soma o
+resultado em ``MetricaHora`` e ``MetricaDia``, tudo na mesma transação que
+avança a marca d'água. O dashboard lê no máximo ``dias x canais`` linhas,
+qualquer que seja o tamanho do histórico.
+
+A agregação fica fora do ``registrar_transacao`` de propósito: somar na hora
+faria todos os lançamentos de um estabelecimento disputarem a mesma linha de
+métrica, e o catch-up também cobre transações gravadas em massa. Quem chama é o loop de manutenção do worker (``processar_creditos``)
+e o comando ``manage.py atualizar_metricas``.
+
+A marca d'água anda só por id, nunca por ``criado_em`` (que pode vir fora de
+ordem: datas retroativas, relógios diferentes entre processos).
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Canal, Cliente, MarcaAgua, MetricaDia, MetricaHora, Transacao
+
+MARCA_TRANSACOES = 'metricas.transacoes'
+
+# Transações agregadas por transação do banco
+LOTE_PADRAO = 20000
+
+# Ids são reservados antes do commit: um id visível pode ter ids menores
+# ainda sem commit. O maior id visível só é agregado depois deste atraso,
+# quando as transações que reservaram ids menores já terminaram
+ATRASO_SEGURANCA = timedelta(seconds=10)
+
+_SOMAS = {
+    'transacoes': Count('id'),
+    'creditos': Count('id', filter=Q(tipo=Transacao.Tipo.CREDITO)),
+    'resgates': Count('id', filter=Q(tipo=Transacao.Tipo.RESGATE)),
+    'moedas_creditadas': Sum('moedas', filter=Q(tipo=Transacao.Tipo.CREDITO), default=0),
+    'moedas_resgatadas': Sum('moedas', filter=Q(tipo=Transacao.Tipo.RESGATE), default=0),
+}
+
+
+def _somar(modelo, chave, grupos):
+    """
+    Soma os grupos agregados nas linhas de ``modelo``: lê as linhas existentes
+    de uma vez e grava com bulk_update/bulk_create. Só quem segura a marca
+    d'água escreve nos rollups, então ler-somar-gravar aqui é seguro.
+    """
+    grupos = list(grupos)
+    if not grupos:
+        return
+    periodos = [grupo['periodo'] for grupo in grupos]
+    existentes = {
+        (linha.estabelecimento_id, linha.canal, getattr(linha, chave)): linha
+        for linha in modelo.objects.filter(
+            estabelecimento_id__in={grupo['estabelecimento_id'] for grupo in grupos},
+            **{f'{chave}__gte': min(periodos), f'{chave}__lte': max(periodos)},
+        )
+    }
+    novos, alterados = [], []
+    for grupo in grupos:
+        linha = existentes.get((grupo['estabelecimento_id'], grupo['canal'], grupo['periodo']))
+        if linha is None:
+            novos.append(modelo(
+                estabelecimento_id=grupo['estabelecimento_id'],
+                canal=grupo['canal'],
+                **{chave: grupo['periodo']},
+                **{campo: grupo[campo] for campo in modelo.CONTADORES},
+            ))
+            continue
+        for campo in modelo.CONTADORES:
+            setattr(linha, campo, getattr(linha, campo) + grupo[campo])
+        alterados.append(linha)
+    modelo.objects.bulk_create(novos, batch_size=1000)
+    modelo.objects.bulk_update(alterados, modelo.CONTADORES, batch_size=1000)
+
+
+def _agregar_lote(inicio, fim):
+    """
+    Agrega as transações com ``inicio < id <= fim`` por hora (UTC) no banco e
+    deriva os totais diários dessas horas, sem uma segunda passada na tabela.
+    Cada hora UTC cai inteira num único dia local porque TIME_ZONE
+    (America/Sao_Paulo) tem offset de hora cheia.
+    """
+    horas = list(
+        Transacao.objects.filter(pk__gt=inicio, pk__lte=fim)
+        .order_by()
+        .values('estabelecimento_id', 'canal', periodo=TruncHour('criado_em', tzinfo=dt_timezone.utc))
+        .annotate(**_SOMAS)
+    )
+    _somar(MetricaHora, 'hora', horas)
+
+    dias = {}
+    for hora in horas:
+        chave = (hora['estabelecimento_id'], hora['canal'], timezone.localdate(hora['periodo']))
+        if chave not in dias:
+            dias[chave] = dict.fromkeys(MetricaDia.CONTADORES, 0)
+            dias[chave].update(estabelecimento_id=chave[0], canal=chave[1], periodo=chave[2])
+        for campo in MetricaDia.CONTADORES:
+            dias[chave][campo] += hora[campo]
+    _somar(MetricaDia, 'dia', dias.values())
+
+
+def _avancar_limite(atraso):
+    """
+    Promove o candidato a limite se ele já tem ``atraso`` de idade e anota o
+    maior id atual como novo candidato. Com ``atraso`` zero (ninguém gravando,
+    ex.: comando manual com o worker parado) o maior id atual vira o limite.
+    """
+    with transaction.atomic():
+        marca = MarcaAgua.objects.select_for_update().get(nome=MARCA_TRANSACOES)
+        agora = timezone.now()
+        if marca.candidato_em is not None and marca.candidato_em > agora - atraso:
+            return
+        maior = Transacao.objects.aggregate(maior=Max('pk'))['maior'] or 0
+        marca.limite_id = maior if not atraso else max(marca.limite_id, marca.candidato_id)
+        marca.candidato_id = maior
+        marca.candidato_em = agora
+        marca.save(update_fields=['limite_id', 'candidato_id', 'candidato_em', 'atualizado_em'])
+
+
+def atualizar_metricas(lote=LOTE_PADRAO, maximo_lotes=None, atraso=ATRASO_SEGURANCA):
+    """
+    Agrega as transações novas desde a marca d'água até o limite seguro, em
+    lotes de ``lote`` ids. Devolve quantas transações foram agregadas.
+    """
+    MarcaAgua.objects.get_or_create(nome=MARCA_TRANSACOES)
+    _avancar_limite(atraso)
+
+    total = 0
+    lotes = 0
+    while maximo_lotes is None or lotes < maximo_lotes:
+        with transaction.atomic():
+            marca = MarcaAgua.objects.select_for_update().get(nome=MARCA_TRANSACOES)
+            ids = list(
+                Transacao.objects.filter(pk__gt=marca.ultimo_id, pk__lte=marca.limite_id)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:lote]
+            )
+            if not ids:
+                break
+            _agregar_lote(marca.ultimo_id, ids[-1])
+            marca.ultimo_id = ids[-1]
+            marca.save(update_fields=['ultimo_id', 'atualizado_em'])
+        total += len(ids)
+        lotes += 1
+        if len(ids) < lote:
+            break
+    return total
+
+
+def recalcular_metricas():
+    """Apaga os rollups e zera a marca d'água; a próxima atualização refaz tudo."""
+    with transaction.atomic():
+        MetricaHora.objects.all().delete()
+        MetricaDia.objects.all().delete()
+        MarcaAgua.objects.filter(nome=MARCA_TRANSACOES).update(ultimo_id=0)
+
+
+def _variacao(atual, anterior):
+    if not anterior:
+        return None
+    return round((atual - anterior) * 100 / anterior)
+
+
+def resumo_dashboard(estabelecimento, dias):
+    """KPIs, série do gráfico e divisão por canal dos últimos ``dias`` dias."""
+    hoje = timezone.localdate()
+    inicio = hoje - timedelta(days=dias - 1)
+    inicio_anterior = inicio - timedelta(days=dias)
+
+    linhas = list(
+        MetricaDia.objects.filter(estabelecimento=estabelecimento, dia__gte=inicio_anterior, dia__lte=hoje)
+        .values('dia', 'canal', *MetricaDia.CONTADORES)
+    )
+    atuais = [linha for linha in linhas if linha['dia'] >= inicio]
+    anteriores = [linha for linha in linhas if linha['dia'] < inicio]
+
+    def total(grupo, campo):
+        return sum(linha[campo] for linha in grupo)
+
+    creditadas = total(atuais, 'moedas_creditadas')
+    resgatadas = total(atuais, 'moedas_resgatadas')
+    transacoes = total(atuais, 'transacoes')
+
+    canais = {}
+    for linha in atuais:
+        canais[linha['canal']] = canais.get(linha['canal'], 0) + linha['transacoes']
+
+    # gráfico: um ponto por dia até 7 dias; acima disso, um por semana
+    tamanho_balde = 1 if dias <= 7 else 7
+    baldes = []
+    for deslocamento in range(0, dias, tamanho_balde):
+        primeiro = inicio + timedelta(days=deslocamento)
+        baldes.append({'inicio': primeiro, 'creditadas': 0, 'resgatadas': 0})
+    for linha in atuais:
+        balde = baldes[(linha['dia'] - inicio).days // tamanho_balde]
+        balde['creditadas'] += linha['moedas_creditadas']
+        balde['resgatadas'] += linha['moedas_resgatadas']
+    maior = max([b['creditadas'] for b in baldes] + [b['resgatadas'] for b in baldes] + [1])
+    for balde in baldes:
+        balde['creditadas_pct'] = round(balde['creditadas'] * 100 / maior)
+        balde['resgatadas_pct'] = round(balde['resgatadas'] * 100 / maior)
+
+    return {
+        'dias': dias,
+        'clientes_ativos': Cliente.objects.filter(
+            estabelecimento=estabelecimento,
+            ultima_atividade_em__gte=timezone.make_aware(datetime.combine(inicio, time.min)),
+        ).count(),
+        'moedas_creditadas': creditadas,
+        'moedas_resgatadas': resgatadas,
+        'variacao_creditadas': _variacao(creditadas, total(anteriores, 'moedas_creditadas')),
+        'variacao_resgatadas': _variacao(resgatadas, total(anteriores, 'moedas_resgatadas')),
+        'taxa_resgate': round(resgatadas * 100 / creditadas) if creditadas else 0,
+        'grafico': baldes,
+        'por_canal': [
+            {
+                'canal': canal,
+                'nome': nome,
+                'transacoes': canais.get(canal, 0),
+                'percentual': round(canais.get(canal, 0) * 100 / transacoes) if transacoes else 0,
+            }
+            for canal, nome in Canal.choices
+        ],
+    }
@@ -1,83 +1,227 @@
-import json
-import os
-from pathlib import Path
+import gzip
+import hashlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
 from django.core.exceptions import DisallowedHost
-from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from .renderizacao import versao_fragmentos
+from .requestlog import registrar
+
+try:
+    import brotli
+except ImportError:  # opcional: sem o pacote, só gzip
+    brotli = None
+
+# Hosts usados pelos healthchecks do Docker e pelo nginx dentro da rede interna
+HOSTS_INTERNOS = frozenset({'127.0.0.1', 'localhost', 'web'})
+
+# Host posto no lugar do recebido quando um healthcheck ou loopback chega com
+# um Host fora do ALLOWED_HOSTS (vale só para aquela requisição)
+HOST_INTERNO_PADRAO = '127.0.0.1'
+
+# Tipos de conteúdo comprimidos por OtimizacaoRespostaMiddleware
+TIPOS_COMPRIMIVEIS = ('text/html', 'application/json', 'text/plain')
+
 
 class DebugHostMiddleware:
     """
     Middleware para debug de problemas com ALLOWED_HOSTS
     Permite healthcheck sem validação de host
+
+    O ALLOWED_HOSTS não é alterado: um healthcheck (/health/) ou um endereço
+    de loopback (127.*) com Host fora dele tem o Host trocado por
+    HOST_INTERNO_PADRAO só naquela requisição (o original fica em
+    ``request.META['HTTP_HOST_ORIGINAL']``). O Host recebido vai para o log
+    estruturado de requisições (app/requestlog.py), gravado pelo listener de
+    logging do processo.
     """
+    async_capable = True
+    sync_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.permitidos = frozenset(settings.ALLOWED_HOSTS)
+
+    def _antes(self, request):
+        http_host = request.META.get('HTTP_HOST', '')
+        host, _, porta = http_host.partition(':')
+
+        # Healthcheck ou loopback com Host desconhecido: aceito só nesta requisição
+        interno = host in HOSTS_INTERNOS or host.startswith('127.') or request.path == '/health/'
+        if host and interno and host not in self.permitidos:
+            request.META['HTTP_HOST_ORIGINAL'] = http_host
+            request.META['HTTP_HOST'] = f'{HOST_INTERNO_PADRAO}:{porta}' if porta else HOST_INTERNO_PADRAO
+
+        registrar({
+            'message': 'Host recebido na requisição',
+            'method': request.method,
+            'path': request.path,
+            'host': http_host,
+        })
+
+    def _host_recusado(self, request, erro):
+        registrar({
+            'message': 'DisallowedHost capturado',
+            'path': request.path,
+            'host': request.META.get('HTTP_HOST', ''),
+            'allowed_hosts': list(settings.ALLOWED_HOSTS),
+            'error': str(erro),
+        }, forcar=True)
 
     def __call__(self, request):
-        # #region agent log
-        import sys
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self._antes(request)
         try:
-            log_path = Path(__file__).resolve().parent.parent / 'logs' / 'debug.log'
-            os.makedirs(log_path.parent, exist_ok=True)
-            http_host = request.META.get('HTTP_HOST', '')
-            from django.conf import settings
-            
-            # Extrair host sem porta para validação
-            host = http_host.split(':')[0] if ':' in http_host else http_host
-            
-            # Garantir que hosts internos estejam sempre em ALLOWED_HOSTS
-            # Isso é crítico para healthchecks do Docker
-            internal_hosts = ['127.0.0.1', 'localhost', 'web']
-            for internal_host in internal_hosts:
-                if internal_host not in settings.ALLOWED_HOSTS:
-                    settings.ALLOWED_HOSTS.append(internal_host)
-            
-            # Para healthcheck ou hosts internos, garantir que o host específico esteja permitido
-            if request.path == '/health/' or host in internal_hosts or host.startswith('127.'):
-                if host and host not in settings.ALLOWED_HOSTS:
-                    settings.ALLOWED_HOSTS.append(host)
-                    print(f"DEBUG: Adicionado {host} ao ALLOWED_HOSTS no middleware", file=sys.stderr)
-            
-            with open(log_path, 'a') as f:
-                f.write(json.dumps({
-                    'sessionId': 'debug-session',
-                    'runId': 'run1',
-                    'hypothesisId': 'C',
-                    'location': 'middleware.py:__call__',
-                    'message': 'Host recebido na requisição (antes do CommonMiddleware)',
-                    'data': {
-                        'HTTP_HOST': http_host,
-                        'ALLOWED_HOSTS': list(settings.ALLOWED_HOSTS),
-                    },
-                    'timestamp': int(__import__('time').time() * 1000)
-                }) + '\n')
-            print(f"DEBUG: HTTP_HOST={http_host}, ALLOWED_HOSTS={list(settings.ALLOWED_HOSTS)}", file=sys.stderr)
-        except Exception as e:
-            import sys
-            print(f"DEBUG MIDDLEWARE ERROR: {e}", file=sys.stderr)
-        # #endregion
+            return self.get_response(request)
+        except DisallowedHost as e:
+            self._host_recusado(request, e)
+            raise
 
+    async def __acall__(self, request):
+        # registrar() só faz put_nowait na fila do handler: pode rodar no event loop
+        self._antes(request)
         try:
-            response = self.get_response(request)
-            return response
+            return await self.get_response(request)
         except DisallowedHost as e:
-            # #region agent log
-            try:
-                log_path = Path(__file__).resolve().parent.parent / 'logs' / 'debug.log'
-                from django.conf import settings
-                with open(log_path, 'a') as f:
-                    f.write(json.dumps({
-                        'sessionId': 'debug-session',
-                        'runId': 'run1',
-                        'hypothesisId': 'C',
-                        'location': 'middleware.py:DisallowedHost',
-                        'message': 'DisallowedHost capturado',
-                        'data': {
-                            'HTTP_HOST': request.META.get('HTTP_HOST', ''),
-                            'ALLOWED_HOSTS': list(settings.ALLOWED_HOSTS),
-                            'error': str(e)
-                        },
-                        'timestamp': int(__import__('time').time() * 1000)
-                    }) + '\n')
-            except: pass
-            # #endregion
+            self._host_recusado(request, e)
             raise
+
+
+def versao_conteudo(funcao):
+    """
+    Declara a versão do conteúdo de uma view: ``funcao(request)`` devolve uma
+    string barata (ids, datas) que muda sempre que a página mudaria.
+    ``OtimizacaoRespostaMiddleware`` deriva dela o ETag e responde 304 sem
+    chamar a view.
+    """
+    def decorador(view):
+        view.versao_conteudo = funcao
+        return view
+    return decorador
+
+
+def _qualidades(accept_encoding):
+    """``{codificação: q}`` do Accept-Encoding."""
+    aceitas = {}
+    for item in accept_encoding.split(','):
+        nome, _, parametros = item.strip().partition(';')
+        qualidade = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                qualidade = float(parametros[2:])
+            except ValueError:
+                qualidade = 0.0
+        aceitas[nome.strip().lower()] = qualidade
+    return aceitas
+
+
+def aceita_gzip(request):
+    """Se o cliente aceita a resposta em gzip (respeita q=0)."""
+    aceitas = _qualidades(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    return aceitas.get('gzip', aceitas.get('*', 0.0)) > 0
+
+
+def _codificacao(accept_encoding):
+    """'br', 'gzip' ou None, conforme o Accept-Encoding (respeita q=0)."""
+    aceitas = _qualidades(accept_encoding)
+    curinga = aceitas.get('*', 0.0)
+    if brotli is not None and aceitas.get('br', curinga) > 0:
+        return 'br'
+    if aceitas.get('gzip', curinga) > 0:
+        return 'gzip'
+    return None
+
+
+class OtimizacaoRespostaMiddleware:
+    """
+    GET condicional e compressão das respostas HTML/JSON.
+
+    - Views com ``@versao_conteudo``: ETag fraco calculado da versão (mais a
+      versão dos templates e a URL). If-None-Match igual devolve 304 antes de
+      a view consultar o banco ou renderizar. As duas versões vêm de estado
+      compartilhado (banco e o cache ``versoes``), então o ETag é o mesmo em
+      todos os workers.
+    - Demais respostas 200 de GET: ETag fraco do hash do corpo, o que ainda
+      poupa a transferência.
+    - Corpos a partir de COMPRESSION_MIN_BYTES são comprimidos com brotli (se
+      instalado) ou gzip. Respostas já codificadas (páginas pré-renderizadas)
+      e streaming ficam como estão.
+    """
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        funcao = getattr(view_func, 'versao_conteudo', None)
+        if funcao is None or request.method not in ('GET', 'HEAD'):
+            return None
+        chave = f'{versao_fragmentos()}|{request.get_full_path()}|{funcao(request)}'
+        request.etag_versao = f'W/"{hashlib.sha1(chave.encode()).hexdigest()[:24]}"'
+        resposta = get_conditional_response(request, etag=request.etag_versao)
+        if resposta is not None:
+            resposta['ETag'] = request.etag_versao
+            patch_cache_control(resposta, private=True, no_cache=True)
+        return resposta
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._otimizar(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        # hash e compressão de um corpo já em memória: CPU curta, fica no event loop
+        return self._otimizar(request, await self.get_response(request))
+
+    def _otimizar(self, request, response):
+        if request.method in ('GET', 'HEAD') and response.status_code == 200 and not response.has_header('ETag'):
+            response = self._etag(request, response)
+        if not response.streaming and response.status_code != 304:
+            self._comprimir(request, response)
+        return response
+
+    def _etag(self, request, response):
+        etag = getattr(request, 'etag_versao', None)
+        if etag is not None:
+            response['ETag'] = etag
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        if response.streaming:
+            return response
+        response['ETag'] = f'W/"{hashlib.sha1(response.content).hexdigest()[:24]}"'
+        return get_conditional_response(request, etag=response['ETag'], response=response) or response
+
+    def _comprimir(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return
+        tipo = response.get('Content-Type', '').partition(';')[0].strip()
+        if tipo not in TIPOS_COMPRIMIVEIS:
+            return
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < settings.COMPRESSION_MIN_BYTES:
+            return
+        codificacao = _codificacao(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if codificacao == 'br':
+            comprimido = brotli.compress(response.content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+        elif codificacao == 'gzip':
+            comprimido = gzip.compress(response.content, compresslevel=6, mtime=0)
+        else:
+            return
+        if len(comprimido) >= len(response.content):
+            return
+        response.content = comprimido
+        response['Content-Length'] = str(len(comprimido))
+        response['Content-Encoding'] = codificacao
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            # o corpo comprimido não é byte a byte o mesmo: ETag forte vira fraco
+            response['ETag'] = f'W/{etag}'
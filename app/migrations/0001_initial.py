@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-16 22:26
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CreditoJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('queued', 'Na fila'), ('submitted', 'Enviado'), ('confirmed', 'Confirmado'), ('failed', 'Falhou')], default='queued', max_length=16)),
+                ('chave_privada', models.TextField(blank=True)),
+                ('carteira_destino', models.CharField(max_length=64)),
+                ('valor_minimo', models.BooleanField(default=False)),
+                ('valor', models.FloatField(blank=True, null=True)),
+                ('signature', models.CharField(blank=True, max_length=128)),
+                ('erro', models.TextField(blank=True)),
+                ('tentativas', models.PositiveSmallIntegerField(default=0)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('enviado_em', models.DateTimeField(blank=True, null=True)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'criado_em'], name='creditojob_status_criado_idx')],
+            },
+        ),
+    ]
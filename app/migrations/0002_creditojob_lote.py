@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-16 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='creditojob',
+            name='indice_lote',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='creditojob',
+            name='lote',
+            field=models.UUIDField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='creditojob',
+            name='reserva',
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='creditojob',
+            index=models.Index(fields=['lote', 'indice_lote'], name='creditojob_lote_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-16 22:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_creditojob_lote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='creditojob',
+            name='chave_idempotencia',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='creditojob',
+            name='hash_requisicao',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='creditojob',
+            name='idempotencia_expira_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
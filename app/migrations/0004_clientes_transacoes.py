@@ -0,0 +1,78 @@
+# Generated by Django 6.0.1 on 2026-10-16 23:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_creditojob_idempotencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=120)),
+                ('telefone', models.CharField(blank=True, max_length=32)),
+                ('email', models.EmailField(blank=True, max_length=254)),
+                ('vip', models.BooleanField(default=False)),
+                ('ativo', models.BooleanField(default=True)),
+                ('canal', models.CharField(choices=[('pdv', 'PDV'), ('whatsapp', 'WhatsApp'), ('app', 'App / Link')], default='pdv', max_length=16)),
+                ('moedas', models.IntegerField(default=0)),
+                ('ultima_atividade', models.CharField(blank=True, max_length=120)),
+                ('ultima_atividade_em', models.DateTimeField(blank=True, null=True)),
+                ('criado_em', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Estabelecimento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=120)),
+                ('criado_em', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Carteira',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endereco', models.CharField(max_length=64, unique=True)),
+                ('criado_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('cliente', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='carteira', to='app.cliente')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='estabelecimento',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clientes', to='app.estabelecimento'),
+        ),
+        migrations.CreateModel(
+            name='Transacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('credito', 'Creditada'), ('resgate', 'Resgatada')], max_length=16)),
+                ('moedas', models.PositiveIntegerField()),
+                ('canal', models.CharField(choices=[('pdv', 'PDV'), ('whatsapp', 'WhatsApp'), ('app', 'App / Link')], default='pdv', max_length=16)),
+                ('descricao', models.CharField(blank=True, max_length=200)),
+                ('criado_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transacoes', to='app.cliente')),
+                ('estabelecimento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transacoes', to='app.estabelecimento')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['estabelecimento', 'criado_em', 'id'], name='cliente_estab_criado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['estabelecimento', 'criado_em', 'id'], name='transacao_estab_criado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transacao',
+            index=models.Index(fields=['cliente', 'criado_em', 'id'], name='transacao_cliente_criado_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.0.1 on 2026-10-16 23:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_clientes_transacoes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('saldo', models.IntegerField()),
+                ('criado_em', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='transacoes_desde_snapshot',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['transacoes_desde_snapshot'], name='cliente_snapshot_pend_idx'),
+        ),
+        migrations.AddField(
+            model_name='saldosnapshot',
+            name='cliente',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='app.cliente'),
+        ),
+        migrations.AddField(
+            model_name='saldosnapshot',
+            name='ultima_transacao',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='app.transacao'),
+        ),
+        migrations.AddIndex(
+            model_name='saldosnapshot',
+            index=models.Index(fields=['cliente', 'ultima_transacao'], name='snapshot_cliente_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 6.0.1 on 2026-10-17 00:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_ledger_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaAgua',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=64, unique=True)),
+                ('ultimo_id', models.BigIntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MetricaDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('canal', models.CharField(choices=[('pdv', 'PDV'), ('whatsapp', 'WhatsApp'), ('app', 'App / Link')], max_length=16)),
+                ('transacoes', models.PositiveIntegerField(default=0)),
+                ('creditos', models.PositiveIntegerField(default=0)),
+                ('resgates', models.PositiveIntegerField(default=0)),
+                ('moedas_creditadas', models.BigIntegerField(default=0)),
+                ('moedas_resgatadas', models.BigIntegerField(default=0)),
+                ('dia', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MetricaHora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('canal', models.CharField(choices=[('pdv', 'PDV'), ('whatsapp', 'WhatsApp'), ('app', 'App / Link')], max_length=16)),
+                ('transacoes', models.PositiveIntegerField(default=0)),
+                ('creditos', models.PositiveIntegerField(default=0)),
+                ('resgates', models.PositiveIntegerField(default=0)),
+                ('moedas_creditadas', models.BigIntegerField(default=0)),
+                ('moedas_resgatadas', models.BigIntegerField(default=0)),
+                ('hora', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['estabelecimento', 'ultima_atividade_em'], name='cliente_estab_atividade_idx'),
+        ),
+        migrations.AddField(
+            model_name='metricadia',
+            name='estabelecimento',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.estabelecimento'),
+        ),
+        migrations.AddField(
+            model_name='metricahora',
+            name='estabelecimento',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.estabelecimento'),
+        ),
+        migrations.AddConstraint(
+            model_name='metricadia',
+            constraint=models.UniqueConstraint(fields=('estabelecimento', 'dia', 'canal'), name='metricadia_unica'),
+        ),
+        migrations.AddConstraint(
+            model_name='metricahora',
+            constraint=models.UniqueConstraint(fields=('estabelecimento', 'hora', 'canal'), name='metricahora_unica'),
+        ),
+    ]
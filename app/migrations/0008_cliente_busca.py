@@ -0,0 +1,44 @@
+# Generated by Django 6.0.1 on 2026-10-16 23:15
+
+from django.db import migrations, models
+
+from app.busca import instalar_indices, remover_indices, texto_busca
+
+
+def preencher_busca(apps, schema_editor):
+    Cliente = apps.get_model('app', 'Cliente')
+    pendentes = []
+    for cliente in Cliente.objects.only('id', 'nome', 'telefone', 'email').iterator(chunk_size=2000):
+        cliente.busca = texto_busca(cliente.nome, cliente.telefone, cliente.email)
+        pendentes.append(cliente)
+        if len(pendentes) >= 2000:
+            Cliente.objects.bulk_update(pendentes, ['busca'])
+            pendentes = []
+    if pendentes:
+        Cliente.objects.bulk_update(pendentes, ['busca'])
+
+
+def criar_indices(apps, schema_editor):
+    instalar_indices(schema_editor.connection)
+
+
+def apagar_indices(apps, schema_editor):
+    remover_indices(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_batimentos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='busca',
+            field=models.CharField(blank=True, default='', editable=False, max_length=400),
+        ),
+        migrations.RunPython(preencher_busca, migrations.RunPython.noop),
+        # pg_trgm (Postgres) ou FTS5 trigram + triggers (SQLite); ver app/busca.py
+        migrations.RunPython(criar_indices, apagar_indices),
+    ]
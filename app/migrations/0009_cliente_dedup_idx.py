@@ -0,0 +1,21 @@
+# Generated by Django 6.0.1 on 2026-10-17 01:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_cliente_busca'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['estabelecimento', 'telefone'], name='cliente_estab_telefone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['estabelecimento', 'email'], name='cliente_estab_email_idx'),
+        ),
+    ]
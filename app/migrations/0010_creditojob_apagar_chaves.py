@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def apagar_chaves(apps, schema_editor):
+    # jobs reservados ou terminados não precisam mais da chave (ver app/fila.py)
+    CreditoJob = apps.get_model('app', 'CreditoJob')
+    CreditoJob.objects.exclude(status='queued').exclude(chave_privada='').update(chave_privada='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_cliente_dedup_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(apagar_chaves, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_creditojob_apagar_chaves'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transacao',
+            name='credito_job',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
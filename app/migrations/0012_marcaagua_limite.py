@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_transacao_credito_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='marcaagua',
+            name='candidato_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='marcaagua',
+            name='candidato_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='marcaagua',
+            name='limite_id',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
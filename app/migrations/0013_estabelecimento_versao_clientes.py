@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_marcaagua_limite'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estabelecimento',
+            name='versao_clientes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
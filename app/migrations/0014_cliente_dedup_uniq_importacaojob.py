@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:38
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def conferir_duplicados(apps, schema_editor):
+    # a constraint não escolhe qual cadastro fica: duplicados existentes precisam ser resolvidos antes
+    Cliente = apps.get_model('app', 'Cliente')
+    for campo in ('telefone', 'email'):
+        repetidos = list(
+            Cliente.objects.exclude(**{campo: ''})
+            .values('estabelecimento_id', campo)
+            .annotate(total=Count('id'))
+            .filter(total__gt=1)[:10]
+        )
+        if repetidos:
+            raise RuntimeError(
+                f'clientes com {campo} repetido no mesmo estabelecimento; '
+                f'una ou corrija os cadastros antes de migrar: {repetidos}'
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_estabelecimento_versao_clientes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacaoJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('queued', 'Na fila'), ('running', 'Importando'), ('done', 'Concluída'), ('failed', 'Falhou')], default='queued', max_length=16)),
+                ('nome_arquivo', models.CharField(max_length=255)),
+                ('encoding', models.CharField(default='utf-8-sig', max_length=32)),
+                ('lidas', models.PositiveIntegerField(default=0)),
+                ('importados', models.PositiveIntegerField(default=0)),
+                ('duplicados', models.PositiveIntegerField(default=0)),
+                ('invalidos', models.PositiveIntegerField(default=0)),
+                ('erro', models.TextField(blank=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('atualizado_em', models.DateTimeField(blank=True, null=True)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(conferir_duplicados, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='cliente',
+            name='cliente_estab_telefone_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='cliente',
+            name='cliente_estab_email_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='cliente',
+            constraint=models.UniqueConstraint(condition=models.Q(('telefone', ''), _negated=True), fields=('estabelecimento', 'telefone'), name='cliente_estab_telefone_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='cliente',
+            constraint=models.UniqueConstraint(condition=models.Q(('email', ''), _negated=True), fields=('estabelecimento', 'email'), name='cliente_estab_email_uniq'),
+        ),
+        migrations.AddField(
+            model_name='importacaojob',
+            name='estabelecimento',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='importacoes', to='app.estabelecimento'),
+        ),
+        migrations.AddIndex(
+            model_name='importacaojob',
+            index=models.Index(fields=['status', 'criado_em'], name='importacaojob_status_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_cliente_dedup_uniq_importacaojob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='creditojob',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Na fila'), ('submitted', 'Enviado'), ('verificar', 'Verificando na rede'), ('confirmed', 'Confirmado'), ('failed', 'Falhou')], default='queued', max_length=16),
+        ),
+    ]
@@ -1,3 +1,394 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
+
+from .busca import texto_busca
+
+
+class Canal(models.TextChoices):
+    PDV = 'pdv', 'PDV'
+    WHATSAPP = 'whatsapp', 'WhatsApp'
+    APP = 'app', 'App / Link'
+
+
+class LedgerImutavel(Exception):
+    """Transações são só de inserção: correções entram como novos lançamentos."""
+
+
+class Estabelecimento(models.Model):
+    """Parceiro (loja) que credita e resgata moedas dos seus clientes."""
+
+    nome = models.CharField(max_length=120)
+    # muda a cada cliente ou carteira gravados: entra no ETag de /clientes/buscar/ (app/busca.py)
+    versao_clientes = models.PositiveIntegerField(default=0, editable=False)
+    criado_em = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.nome
+
+
+class Cliente(models.Model):
+    """
+    Cliente de um estabelecimento.
+
+    ``moedas`` e os campos ``ultima_atividade*`` são desnormalizados a partir
+    das transações, para a lista de clientes não precisar agregar nada.
+    """
+
+    estabelecimento = models.ForeignKey(Estabelecimento, on_delete=models.CASCADE, related_name='clientes')
+    nome = models.CharField(max_length=120)
+    telefone = models.CharField(max_length=32, blank=True)
+    email = models.EmailField(blank=True)
+    vip = models.BooleanField(default=False)
+    ativo = models.BooleanField(default=True)
+    canal = models.CharField(max_length=16, choices=Canal.choices, default=Canal.PDV)
+    moedas = models.IntegerField(default=0)
+    ultima_atividade = models.CharField(max_length=120, blank=True)
+    ultima_atividade_em = models.DateTimeField(null=True, blank=True)
+    # lançamentos desde o último SaldoSnapshot; ao passar do intervalo, um novo é gravado
+    transacoes_desde_snapshot = models.PositiveIntegerField(default=0)
+    # nome, e-mail e telefone normalizados para /clientes/buscar/ (app/busca.py)
+    busca = models.CharField(max_length=400, blank=True, default='', editable=False)
+    criado_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estabelecimento', 'criado_em', 'id'], name='cliente_estab_criado_idx'),
+            models.Index(fields=['transacoes_desde_snapshot'], name='cliente_snapshot_pend_idx'),
+            # clientes ativos no período = última atividade dentro do período
+            models.Index(fields=['estabelecimento', 'ultima_atividade_em'], name='cliente_estab_atividade_idx'),
+        ]
+        constraints = [
+            # um telefone/e-mail por cliente no estabelecimento; também são os índices da
+            # deduplicação da importação de planilhas (app/importacao.py)
+            models.UniqueConstraint(
+                fields=['estabelecimento', 'telefone'], condition=~models.Q(telefone=''),
+                name='cliente_estab_telefone_uniq',
+            ),
+            models.UniqueConstraint(
+                fields=['estabelecimento', 'email'], condition=~models.Q(email=''),
+                name='cliente_estab_email_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return self.nome
+
+    def save(self, *args, **kwargs):
+        self.busca = texto_busca(self.nome, self.telefone, self.email)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'nome', 'telefone', 'email'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'busca'}
+        super().save(*args, **kwargs)
+
+    @property
+    def contato(self):
+        return ' · '.join(filter(None, [self.telefone, self.email]))
+
+    @property
+    def ultima(self):
+        return self.ultima_atividade or 'Sem atividade recente'
+
+    @property
+    def ultima_data(self):
+        if not self.ultima_atividade_em:
+            return ''
+        return timezone.localtime(self.ultima_atividade_em).strftime('%d/%m/%Y')
+
+    @property
+    def status(self):
+        return 'Ativo' if self.ativo else 'Inativo'
+
+
+class Carteira(models.Model):
+    """Carteira Solana que recebe as moedas do cliente."""
+
+    cliente = models.OneToOneField(Cliente, on_delete=models.CASCADE, related_name='carteira')
+    endereco = models.CharField(max_length=64, unique=True)
+    criado_em = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.endereco
+
+
+class TransacaoQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        raise LedgerImutavel('Transações não podem ser alteradas')
+
+    def delete(self):
+        raise LedgerImutavel('Transações não podem ser apagadas')
+
+
+class Transacao(models.Model):
+    """
+    Lançamento do ledger de moedas (crédito ou resgate) de um cliente.
+
+    Só de inserção: use ``app.ledger.registrar_transacao``, que atualiza o
+    saldo do cliente na mesma transação do banco.
+    """
+
+    class Tipo(models.TextChoices):
+        CREDITO = 'credito', 'Creditada'
+        RESGATE = 'resgate', 'Resgatada'
+
+    estabelecimento = models.ForeignKey(Estabelecimento, on_delete=models.CASCADE, related_name='transacoes')
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='transacoes')
+    tipo = models.CharField(max_length=16, choices=Tipo.choices)
+    moedas = models.PositiveIntegerField()
+    canal = models.CharField(max_length=16, choices=Canal.choices, default=Canal.PDV)
+    descricao = models.CharField(max_length=200, blank=True)
+    criado_em = models.DateTimeField(default=timezone.now)
+    # CreditoJob confirmado que gerou o lançamento: no máximo um por job
+    credito_job = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+
+    objects = TransacaoQuerySet.as_manager()
+
+    class Meta:
+        # ``id`` no fim desempata transações no mesmo instante na paginação por cursor
+        indexes = [
+            models.Index(fields=['estabelecimento', 'criado_em', 'id'], name='transacao_estab_criado_idx'),
+            models.Index(fields=['cliente', 'criado_em', 'id'], name='transacao_cliente_criado_idx'),
+        ]
+
+    def __str__(self):
+        return self.referencia
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise LedgerImutavel('Transações não podem ser alteradas')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise LedgerImutavel('Transações não podem ser apagadas')
+
+    @property
+    def delta(self):
+        return self.moedas if self.tipo == self.Tipo.CREDITO else -self.moedas
+
+    @property
+    def referencia(self):
+        return f'#TRX-{self.pk:04d}' if self.pk else ''
+
+    @property
+    def data(self):
+        return timezone.localtime(self.criado_em).strftime('%d/%m/%Y · %H:%M')
+
+
+class SaldoSnapshot(models.Model):
+    """
+    Checkpoint do saldo de um cliente: ``saldo`` é a soma do ledger até
+    ``ultima_transacao`` (inclusive). O saldo em qualquer momento posterior é
+    o snapshot mais a soma dos lançamentos seguintes, sem varrer o histórico.
+    """
+
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='snapshots')
+    ultima_transacao = models.ForeignKey(Transacao, on_delete=models.PROTECT, related_name='+')
+    saldo = models.IntegerField()
+    criado_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['cliente', 'ultima_transacao'], name='snapshot_cliente_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.cliente_id}: {self.saldo} até #{self.ultima_transacao_id}'
+
+
+class MetricaBase(models.Model):
+    """Contadores somáveis de transações de um estabelecimento, por canal."""
+
+    estabelecimento = models.ForeignKey(Estabelecimento, on_delete=models.CASCADE, related_name='+')
+    canal = models.CharField(max_length=16, choices=Canal.choices)
+    transacoes = models.PositiveIntegerField(default=0)
+    creditos = models.PositiveIntegerField(default=0)
+    resgates = models.PositiveIntegerField(default=0)
+    moedas_creditadas = models.BigIntegerField(default=0)
+    moedas_resgatadas = models.BigIntegerField(default=0)
+
+    CONTADORES = ('transacoes', 'creditos', 'resgates', 'moedas_creditadas', 'moedas_resgatadas')
+
+    class Meta:
+        abstract = True
+
+
+class MetricaHora(MetricaBase):
+    """Rollup por hora (UTC); preenchido por ``app.metricas.atualizar_metricas``."""
+
+    hora = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['estabelecimento', 'hora', 'canal'], name='metricahora_unica'),
+        ]
+
+
+class MetricaDia(MetricaBase):
+    """Rollup por dia no fuso do projeto (TIME_ZONE); é o que o dashboard lê."""
+
+    dia = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['estabelecimento', 'dia', 'canal'], name='metricadia_unica'),
+        ]
+
+
+class MarcaAgua(models.Model):
+    """
+    Até onde (maior id) uma tabela de origem já foi agregada.
+
+    ``limite_id`` é até onde é seguro agregar: ids são reservados antes do
+    commit, então o maior id visível agora (``candidato_id``) só vira limite
+    depois de um atraso de segurança contado de ``candidato_em``.
+    """
+
+    nome = models.CharField(max_length=64, unique=True)
+    ultimo_id = models.BigIntegerField(default=0)
+    limite_id = models.BigIntegerField(default=0)
+    candidato_id = models.BigIntegerField(default=0)
+    candidato_em = models.DateTimeField(null=True, blank=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.nome}: {self.ultimo_id}'
+
+
+class Batimento(models.Model):
+    """
+    Último sinal de vida de um serviço de background (ex.: o pool de signers
+    do ``processar_creditos``), lido pelo /readyz/ do web.
+    """
+
+    nome = models.CharField(max_length=64, unique=True)
+    detalhes = models.JSONField(default=dict, blank=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.nome} @ {self.atualizado_em:%Y-%m-%d %H:%M:%S}'
+
+
+class CreditoJob(models.Model):
+    """
+    Crédito de moedas enfileirado para execução em background.
+    Criado pelos endpoints /creditar-moedas/ e /creditar-moedas/lote/ e
+    processado pelo comando ``manage.py processar_creditos``.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Na fila'
+        SUBMITTED = 'submitted', 'Enviado'
+        # signer estourou o timeout depois de assinar: a transação pode estar na rede,
+        # o job espera a consulta pela signature (fila.verificar_enviados)
+        VERIFICAR = 'verificar', 'Verificando na rede'
+        CONFIRMED = 'confirmed', 'Confirmado'
+        FAILED = 'failed', 'Falhou'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED)
+    # apagada assim que o job termina (sucesso ou falha)
+    chave_privada = models.TextField(blank=True)
+    carteira_destino = models.CharField(max_length=64)
+    valor_minimo = models.BooleanField(default=False)
+    valor = models.FloatField(null=True, blank=True)
+    signature = models.CharField(max_length=128, blank=True)
+    erro = models.TextField(blank=True)
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    # créditos em lote compartilham o mesmo ``lote``; indice_lote guarda a ordem da entrada
+    lote = models.UUIDField(null=True, blank=True)
+    indice_lote = models.PositiveIntegerField(null=True, blank=True)
+    # token gravado na reserva, para saber quais jobs um worker pegou
+    reserva = models.UUIDField(null=True, blank=True, db_index=True)
+    # Idempotency-Key do cliente; liberada (NULL) quando expira
+    chave_idempotencia = models.CharField(max_length=255, null=True, blank=True, unique=True)
+    hash_requisicao = models.CharField(max_length=64, blank=True)
+    idempotencia_expira_em = models.DateTimeField(null=True, blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'criado_em'], name='creditojob_status_criado_idx'),
+            models.Index(fields=['lote', 'indice_lote'], name='creditojob_lote_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.id} ({self.status})'
+
+    def save(self, *args, **kwargs):
+        # job terminado (pelo worker, pelo admin ou por script) não guarda a chave
+        if self.finalizado and self.chave_privada:
+            self.chave_privada = ''
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'chave_privada'}
+        super().save(*args, **kwargs)
+
+    @property
+    def finalizado(self):
+        return self.status in (self.Status.CONFIRMED, self.Status.FAILED)
+
+    @property
+    def explorer(self):
+        return f'https://solscan.io/tx/{self.signature}' if self.signature else ''
+
+    def as_dict(self):
+        def ms(inicio, fim):
+            if not inicio or not fim:
+                return None
+            return int((fim - inicio).total_seconds() * 1000)
+
+        return {
+            'job_id': str(self.id),
+            'status': self.status,
+            'carteira_destino': self.carteira_destino,
+            'valor': self.valor,
+            'signature': self.signature,
+            'explorer': self.explorer,
+            'erro': self.erro,
+            'tentativas': self.tentativas,
+            'lote_id': str(self.lote) if self.lote else None,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None,
+            'enviado_em': self.enviado_em.isoformat() if self.enviado_em else None,
+            'concluido_em': self.concluido_em.isoformat() if self.concluido_em else None,
+            'espera_fila_ms': ms(self.criado_em, self.enviado_em),
+            'execucao_ms': ms(self.enviado_em, self.concluido_em),
+        }
+
+
+class ImportacaoJob(models.Model):
+    """
+    Planilha enviada a /clientes/importar/ grande demais para importar dentro
+    da requisição. O arquivo fica em IMPORTACAO_DIR e o worker (``manage.py
+    processar_creditos``) importa, gravando o progresso a cada bloco.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Na fila'
+        RUNNING = 'running', 'Importando'
+        DONE = 'done', 'Concluída'
+        FAILED = 'failed', 'Falhou'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    estabelecimento = models.ForeignKey(Estabelecimento, on_delete=models.CASCADE, related_name='importacoes')
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED)
+    nome_arquivo = models.CharField(max_length=255)
+    encoding = models.CharField(max_length=32, default='utf-8-sig')
+    lidas = models.PositiveIntegerField(default=0)
+    importados = models.PositiveIntegerField(default=0)
+    duplicados = models.PositiveIntegerField(default=0)
+    invalidos = models.PositiveIntegerField(default=0)
+    erro = models.TextField(blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    # reserva e cada bloco gravado; parada há muito tempo = worker morto (volta para a fila)
+    atualizado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'criado_em'], name='importacaojob_status_idx'),
+        ]
 
-# Create your models here.
+    def __str__(self):
+        return f'{self.id} ({self.status})'
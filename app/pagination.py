@@ -0,0 +1,75 @@
+"""
+Paginação por cursor (keyset) para listas ordenadas por ``criado_em``.
+
+Em vez de OFFSET, que lê e descarta todas as linhas anteriores, a próxima
+página parte da última linha vista: ``(criado_em, id) < (cursor)``. Com um
+índice em (filtro, criado_em, id) o custo de qualquer página é o mesmo, seja
+a primeira ou a milésima.
+
+O cursor vai na query string (``?apos=`` para a próxima página, ``?antes=``
+para a anterior) como ``criado_em|id`` em base64.
+"""
+import base64
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.db.models import Q
+
+TAMANHO_PADRAO = 50
+
+
+@dataclass
+class PaginaKeyset:
+    itens: list
+    apos: str = None   # cursor da próxima página (mais antiga)
+    antes: str = None  # cursor da página anterior (mais recente)
+
+
+def codificar_cursor(objeto, campo='criado_em'):
+    valor = f'{getattr(objeto, campo).isoformat()}|{objeto.pk}'
+    return base64.urlsafe_b64encode(valor.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """``(datetime, pk)`` do cursor, ou None se ele for inválido."""
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        data, pk = bruto.split('|')
+        return datetime.fromisoformat(data), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def paginar_keyset(queryset, params, tamanho=TAMANHO_PADRAO, campo='criado_em'):
+    """
+    Página de ``queryset`` do mais recente para o mais antigo.
+
+    ``params`` é o ``request.GET``; um cursor inválido volta para a primeira página.
+    """
+    apos = decodificar_cursor(params.get('apos', '')) if params.get('apos') else None
+    antes = decodificar_cursor(params.get('antes', '')) if params.get('antes') else None
+
+    if antes:
+        # página anterior: sobe a partir do cursor e inverte no fim
+        data, pk = antes
+        queryset = queryset.filter(Q(**{f'{campo}__gt': data}) | Q(**{campo: data, 'pk__gt': pk}))
+        itens = list(queryset.order_by(campo, 'pk')[:tamanho + 1])
+        tem_mais = len(itens) > tamanho
+        itens = itens[:tamanho][::-1]
+        return PaginaKeyset(
+            itens=itens,
+            apos=codificar_cursor(itens[-1], campo) if itens else None,
+            antes=codificar_cursor(itens[0], campo) if itens and tem_mais else None,
+        )
+
+    if apos:
+        data, pk = apos
+        queryset = queryset.filter(Q(**{f'{campo}__lt': data}) | Q(**{campo: data, 'pk__lt': pk}))
+    itens = list(queryset.order_by(f'-{campo}', '-pk')[:tamanho + 1])
+    tem_mais = len(itens) > tamanho
+    itens = itens[:tamanho]
+    return PaginaKeyset(
+        itens=itens,
+        apos=codificar_cursor(itens[-1], campo) if itens and tem_mais else None,
+        antes=codificar_cursor(itens[0], campo) if itens and apos else None,
+    )
@@ -0,0 +1,154 @@
+"""
+Cache de renderização de templates.
+
+- ``versao_fragmentos``: versão que entra na chave dos ``{% cache %}`` do
+  ``base.html`` (menu lateral e modais) e nos ETags de app/middleware.py.
+  Muda com TEMPLATE_FRAGMENT_VERSION (deploy) ou com ``invalidar_fragmentos()``
+  (em tempo de execução). Fica no cache ``versoes``, em arquivo compartilhado
+  pelos workers do gunicorn e pelo ``processar_creditos`` (como as sessões):
+  o cache ``default`` é LocMem, um por processo.
+- Páginas pré-renderizadas: ``manage.py prerender_ajuda`` grava as páginas de
+  ajuda em HTML e HTML.gz com um manifest (ETag, data); as views servem
+  esses arquivos direto, com resposta 304 para If-None-Match/If-Modified-Since.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+
+CHAVE_VERSAO = 'renderizacao:versao-fragmentos'
+ARQUIVO_MANIFEST = 'manifest.json'
+
+
+# ---------- fragmentos ----------
+
+def versao_fragmentos():
+    versao = caches['versoes'].get(CHAVE_VERSAO, '1')
+    return f'{settings.TEMPLATE_FRAGMENT_VERSION}.{versao}'
+
+
+def invalidar_fragmentos():
+    """
+    Troca a versão dos fragmentos em todos os processos; as entradas antigas
+    expiram sozinhas. Um valor novo em vez de incr: o FileBasedCache não
+    incrementa de forma atômica, e duas trocas simultâneas não podem dar na
+    mesma versão.
+    """
+    versao = uuid.uuid4().hex[:12]
+    caches['versoes'].set(CHAVE_VERSAO, versao, timeout=None)
+    return versao
+
+
+def renderizacao(request):
+    """Context processor: versão dos fragmentos e path atual (item ativo do menu)."""
+    return {
+        'versao_fragmentos': versao_fragmentos(),
+        'current': request.path,
+    }
+
+
+# ---------- páginas pré-renderizadas ----------
+
+def gravar_prerenderizada(chave, html):
+    """Grava ``chave``.html e ``chave``.html.gz em PRERENDER_ROOT; devolve a entrada do manifest."""
+    raiz = Path(settings.PRERENDER_ROOT)
+    conteudo = html.encode('utf-8')
+    destino = raiz / f'{chave}.html'
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    destino.write_bytes(conteudo)
+    comprimido = gzip.compress(conteudo, compresslevel=9, mtime=0)
+    Path(f'{destino}.gz').write_bytes(comprimido)
+    return {
+        'arquivo': f'{chave}.html',
+        'etag': hashlib.sha256(conteudo).hexdigest()[:32],
+        'modificado_em': int(destino.stat().st_mtime),
+        'tamanho': len(conteudo),
+        'tamanho_gz': len(comprimido),
+    }
+
+
+def gravar_manifest(entradas):
+    raiz = Path(settings.PRERENDER_ROOT)
+    raiz.mkdir(parents=True, exist_ok=True)
+    temporario = raiz / f'{ARQUIVO_MANIFEST}.tmp'
+    temporario.write_text(json.dumps(entradas, indent=2, sort_keys=True))
+    os.replace(temporario, raiz / ARQUIVO_MANIFEST)
+
+
+class _Prerenderizadas:
+    """Manifest e conteúdo em memória, recarregados quando o manifest muda."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.entradas = {}
+        self.conteudos = {}
+
+    def obter(self, chave):
+        caminho = Path(settings.PRERENDER_ROOT) / ARQUIVO_MANIFEST
+        try:
+            mtime = caminho.stat().st_mtime
+        except OSError:
+            return None, None, None
+        if mtime != self.mtime:
+            with self.lock:
+                if mtime != self.mtime:
+                    self.entradas = json.loads(caminho.read_text())
+                    self.conteudos = {}
+                    self.mtime = mtime
+        entrada = self.entradas.get(chave)
+        if entrada is None:
+            return None, None, None
+        conteudo = self.conteudos.get(chave)
+        if conteudo is None:
+            arquivo = Path(settings.PRERENDER_ROOT) / entrada['arquivo']
+            try:
+                conteudo = (arquivo.read_bytes(), Path(f'{arquivo}.gz').read_bytes())
+            except OSError:
+                return None, None, None
+            self.conteudos[chave] = conteudo
+        return entrada, conteudo[0], conteudo[1]
+
+
+_prerenderizadas = _Prerenderizadas()
+
+
+def resposta_prerenderizada(request, chave):
+    """
+    Resposta com a página pré-renderizada ``chave`` (ex.: 'ajuda/guias-rapidos'),
+    ou None se ela não foi gerada (a view renderiza normalmente).
+    """
+    entrada, html, html_gz = _prerenderizadas.obter(chave)
+    if entrada is None:
+        return None
+
+    etag = f'"{entrada["etag"]}"'
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags_cliente = [e.strip().removeprefix('W/') for e in if_none_match.split(',')]
+        nao_modificado = '*' in etags_cliente or etag in etags_cliente
+    else:
+        desde = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        nao_modificado = desde is not None and entrada['modificado_em'] <= desde
+    if nao_modificado:
+        resposta = HttpResponseNotModified()
+    else:
+        from .middleware import aceita_gzip  # import local: o middleware importa este módulo
+
+        comprimir = aceita_gzip(request)
+        resposta = HttpResponse(html_gz if comprimir else html, content_type='text/html; charset=utf-8')
+        if comprimir:
+            resposta['Content-Encoding'] = 'gzip'
+    resposta['ETag'] = etag
+    resposta['Last-Modified'] = http_date(entrada['modificado_em'])
+    resposta['Vary'] = 'Accept-Encoding'
+    resposta['Cache-Control'] = 'no-cache'
+    return resposta
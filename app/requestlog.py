@@ -0,0 +1,36 @@
+"""
+Log estruturado de requisições, fora do caminho quente.
+
+Não há uma thread própria: os registros vão para o logger
+``toknid.requisicoes``, ligado no ``LOGGING`` do settings a um
+``FilaHandler`` (app/log_handlers.py), o mesmo mecanismo do log do Django.
+A requisição só enfileira; o listener do processo formata em JSON (uma linha
+por registro) e grava em REQUEST_LOG_PATH. Com a fila cheia o registro é
+descartado e contado, nunca bloqueia a requisição.
+
+Configuração (settings/env):
+  REQUEST_LOG_PATH         arquivo de destino (vazio desliga o log)
+  REQUEST_LOG_SAMPLE_RATE  fração das requisições registradas (0.0 a 1.0)
+  REQUEST_LOG_QUEUE_SIZE   registros em memória antes de descartar
+
+A rotação fica com o logrotate do host (ver Ver-Logs.md).
+"""
+import logging
+
+logger = logging.getLogger('toknid.requisicoes')
+
+
+def registrar(registro, forcar=False):
+    """
+    Registra ``registro`` (dict serializável em JSON; ``message`` vira a
+    mensagem e o resto vira campos da linha). Com ``forcar`` o registro sai
+    como WARNING, que o handler nunca descarta por amostragem.
+    """
+    nivel = logging.WARNING if forcar else logging.INFO
+    if not logger.isEnabledFor(nivel):
+        return
+    dados = dict(registro)
+    mensagem = dados.pop('message', '')
+    # makeRecord direto: o arquivo/linha de origem (findCaller, que percorre a
+    # pilha) não interessa neste log
+    logger.handle(logger.makeRecord(logger.name, nivel, __file__, 0, mensagem, (), None, extra=dados))
@@ -0,0 +1,51 @@
+"""
+Sessões do Django.
+
+Só o /admin/ usa sessão: as páginas do app não tocam em ``request.session``
+nem em ``request.user``, e o ``SessionMiddleware`` só lê a sessão quando
+alguém a acessa, então elas não consultam ``django_session`` (medido em
+benchmarks/bench_sessoes.py). Para o admin, SESSION_ENGINE escolhe:
+
+- ``cached_db`` (padrão): leitura pelo cache ``sessoes`` (FileBasedCache em
+  SESSION_CACHE_DIR, compartilhado pelos workers do container); gravação no
+  cache e no banco, que segue sendo a cópia durável;
+- ``signed_cookies``: a sessão vai assinada no cookie e nada fica no
+  servidor; um logout não invalida cópias antigas do cookie;
+- ``db``: o padrão do Django, uma consulta por request do admin.
+
+As sessões expiradas são apagadas em lotes (``limpar_sessoes_expiradas``):
+um DELETE só com todas seguraria o lock de escrita do SQLite e atrasaria
+os créditos gravados no mesmo banco.
+"""
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+
+def usa_banco():
+    """O SESSION_ENGINE atual grava sessões na tabela django_session?"""
+    return settings.SESSION_ENGINE.rsplit('.', 1)[-1] in ('db', 'cached_db')
+
+
+def limpar_sessoes_expiradas(lote=None, pausa=0.05, maximo=None):
+    """
+    Apaga sessões expiradas, ``lote`` por transação com ``pausa`` segundos
+    entre lotes, até ``maximo`` (None = todas). Devolve quantas apagou.
+    """
+    from django.contrib.sessions.models import Session
+
+    if not usa_banco():
+        return 0
+    lote = lote or settings.SESSION_LIMPEZA_LOTE
+    agora = timezone.now()
+    total = 0
+    while maximo is None or total < maximo:
+        chaves = list(Session.objects.filter(expire_date__lt=agora).values_list('pk', flat=True)[:lote])
+        if not chaves:
+            break
+        total += Session.objects.filter(pk__in=chaves).delete()[0]
+        if len(chaves) < lote:
+            break
+        time.sleep(pausa)
+    return total
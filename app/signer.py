@@ -0,0 +1,429 @@
+"""
+Pool de processos Node persistentes que assinam e enviam transações na Solana.
+
+Cada worker executa ``app/ts/signer-worker.ts`` uma única vez (npx + tsx +
+@solana/web3.js) e recebe pedidos em JSON delimitado por linha via stdin,
+respondendo via stdout. Assim evitamos o cold start de um processo por crédito.
+"""
+import atexit
+import json
+import logging
+import os
+import platform
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from pathlib import Path
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SCRIPT_WORKER = Path(__file__).parent / 'ts' / 'signer-worker.ts'
+
+# O worker não assina nada depois de ``prazo_envio`` (o timeout do pedido menos esta
+# margem): assinatura que não chegou até o timeout é transação que nunca foi enviada
+MARGEM_ENVIO = 1.0  # segundos
+
+
+class SignerErro(Exception):
+    """Falha genérica ao falar com o pool de signers."""
+
+
+class SignerIndisponivel(SignerErro):
+    """Nenhum worker disponível (processo morto, pool cheio ou tsx ausente)."""
+
+
+class SignerOcupado(SignerIndisponivel):
+    """Os workers (ou o worker pedido) estão com SIGNER_MAX_IN_FLIGHT pedidos em voo."""
+
+
+class SignerTimeout(SignerErro):
+    """
+    O worker não respondeu dentro do prazo. ``assinadas`` traz as transações
+    que ele já tinha assinado (e pode ter enviado) até ali: dicts com
+    ``signature`` e, nos lotes, os ``indices`` dos destinos.
+    """
+
+    def __init__(self, mensagem, assinadas=()):
+        super().__init__(mensagem)
+        self.assinadas = list(assinadas)
+
+
+def _comando_worker():
+    """Monta o comando que inicia um worker (string no Windows, lista no resto)."""
+    if platform.system() == 'Windows':
+        return f'npx tsx "{SCRIPT_WORKER}"', True
+    return ['npx', 'tsx', str(SCRIPT_WORKER)], False
+
+
+def _somar_confirmacoes(acumulado, worker):
+    """Soma os contadores e o histograma de latência (app/ts/confirmacao.ts) de mais um worker."""
+    if acumulado is None:
+        return worker
+    latencia, outra = acumulado['latencia'], worker['latencia']
+    return {
+        **{campo: valor + worker.get(campo, 0) for campo, valor in acumulado.items() if campo != 'latencia'},
+        'latencia': {
+            'buckets': latencia['buckets'],
+            'contagens': [a + b for a, b in zip(latencia['contagens'], outra['contagens'])],
+            'soma': latencia['soma'] + outra['soma'],
+            'total': latencia['total'] + outra['total'],
+        },
+    }
+
+
+class SignerWorker:
+    """Um processo Node persistente e os pedidos em andamento nele."""
+
+    def __init__(self, indice, ao_morrer):
+        self.indice = indice
+        self.em_voo = 0
+        self.reinicios = 0
+        self.ultimo_ping = None
+        self.processo = None
+        self._ao_morrer = ao_morrer
+        self._pendentes = {}
+        self._lock = threading.Lock()
+        self._escrita = threading.Lock()
+        self.reinicio_lock = threading.Lock()
+
+    @property
+    def vivo(self):
+        return self.processo is not None and self.processo.poll() is None
+
+    def iniciar(self):
+        comando, use_shell = _comando_worker()
+        self.processo = subprocess.Popen(
+            comando,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=None,  # logs do Node vão direto para o stderr do gunicorn
+            text=True,
+            bufsize=1,
+            cwd=BASE_DIR,
+            shell=use_shell,
+        )
+        leitor = threading.Thread(
+            target=self._ler_respostas,
+            args=(self.processo,),
+            name=f'signer-leitor-{self.indice}',
+            daemon=True,
+        )
+        leitor.start()
+        logger.info('Signer worker %s iniciado (pid=%s)', self.indice, self.processo.pid)
+
+    def parar(self):
+        processo, self.processo = self.processo, None
+        if processo is None:
+            return
+        try:
+            processo.stdin.close()
+            processo.wait(timeout=5)
+        except Exception:
+            processo.kill()
+        self._falhar_pendentes(SignerIndisponivel('Signer worker encerrado'))
+
+    def enviar(self, pedido):
+        """
+        Escreve o pedido no stdin do worker e devolve um Future da resposta.
+        As transações assinadas antes da resposta ficam em ``futuro.assinadas``.
+        """
+        futuro = Future()
+        futuro.assinadas = []
+        with self._lock:
+            self._pendentes[pedido['id']] = futuro
+        try:
+            with self._escrita:
+                self.processo.stdin.write(json.dumps(pedido) + '\n')
+                self.processo.stdin.flush()
+        except (BrokenPipeError, OSError, ValueError) as e:
+            with self._lock:
+                self._pendentes.pop(pedido['id'], None)
+            raise SignerIndisponivel(f'Signer worker {self.indice} indisponível: {e}')
+        return futuro
+
+    def descartar(self, pedido_id):
+        with self._lock:
+            self._pendentes.pop(pedido_id, None)
+
+    def _ler_respostas(self, processo):
+        for linha in processo.stdout:
+            linha = linha.strip()
+            if not linha.startswith('{'):
+                continue
+            try:
+                resposta = json.loads(linha)
+            except json.JSONDecodeError:
+                logger.warning('Signer worker %s: linha inválida no stdout: %s', self.indice, linha[:200])
+                continue
+            with self._lock:
+                if 'assinada' in resposta:
+                    # aviso de progresso: a resposta final do pedido ainda vem
+                    futuro = self._pendentes.get(resposta.get('id'))
+                    if futuro is not None:
+                        futuro.assinadas.append(resposta['assinada'])
+                    continue
+                futuro = self._pendentes.pop(resposta.get('id'), None)
+            if futuro is not None and not futuro.done():
+                futuro.set_result(resposta)
+
+        # EOF: o processo morreu (crash, kill ou stdin fechado)
+        if processo is self.processo:
+            logger.warning('Signer worker %s saiu (código=%s)', self.indice, processo.poll())
+            self._falhar_pendentes(SignerIndisponivel('Signer worker encerrou inesperadamente'))
+            self._ao_morrer(self, processo)
+
+    def _falhar_pendentes(self, erro):
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, {}
+        for futuro in pendentes.values():
+            if not futuro.done():
+                futuro.set_exception(erro)
+
+
+class SignerPool:
+    """
+    Pool de workers Node com limite de pedidos simultâneos por worker,
+    health check periódico (ping) e reinício automático em caso de crash.
+    """
+
+    def __init__(self, tamanho=None, max_em_voo=None, timeout=None, intervalo_healthcheck=None):
+        self.tamanho = tamanho or settings.SIGNER_POOL_SIZE
+        self.max_em_voo = max_em_voo or settings.SIGNER_MAX_IN_FLIGHT
+        self.timeout = timeout or settings.SIGNER_TIMEOUT
+        self.intervalo_healthcheck = intervalo_healthcheck or settings.SIGNER_HEALTHCHECK_INTERVAL
+        self._cond = threading.Condition()
+        self._encerrado = False
+        self.workers = [SignerWorker(i, self._worker_morreu) for i in range(self.tamanho)]
+        try:
+            for worker in self.workers:
+                worker.iniciar()
+        except BaseException:
+            # um Popen falhou no meio: não deixar órfãos os processos já iniciados
+            self.encerrar()
+            raise
+        self._healthcheck = threading.Thread(target=self._loop_healthcheck, name='signer-healthcheck', daemon=True)
+        self._healthcheck.start()
+
+    # ---------- API pública ----------
+
+    def transferir(self, chave_privada, carteira_destino, valor_minimo=False, valor=None, timeout=None):
+        """Executa uma transferência e devolve o dict de resposta do worker."""
+        return self.executar({
+            'op': 'transferir',
+            'chave_privada': chave_privada,
+            'carteira_destino': carteira_destino,
+            'valor_minimo': bool(valor_minimo),
+            'valor': valor,
+        }, timeout=timeout)
+
+    def transferir_lote(self, chave_privada, destinos, timeout=None):
+        """
+        Envia vários créditos empacotados no menor número de transações.
+        ``destinos`` é uma lista de dicts com carteira_destino, valor_minimo e valor;
+        a resposta traz ``resultados`` na mesma ordem.
+        """
+        return self.executar({
+            'op': 'lote',
+            'chave_privada': chave_privada,
+            'destinos': destinos,
+        }, timeout=timeout)
+
+    def consultar_assinaturas(self, signatures, timeout=None):
+        """
+        Status na rede de transações já enviadas (getSignatureStatuses com o
+        histórico). ``status`` da resposta só traz as que a rede conhece:
+        ``{signature: {"confirmada": bool, "erro": str | None}}``.
+        """
+        return self.executar({'op': 'status', 'signatures': list(signatures)}, timeout=timeout)
+
+    def executar(self, pedido, timeout=None):
+        timeout = timeout or self.timeout
+        prazo = time.monotonic() + timeout
+        pedido = dict(pedido, id=uuid.uuid4().hex, prazo_envio=time.time() + timeout - MARGEM_ENVIO)
+
+        worker = self._reservar(prazo)
+        try:
+            futuro = worker.enviar(pedido)
+            try:
+                return futuro.result(timeout=max(0.0, prazo - time.monotonic()))
+            except FutureTimeout:
+                worker.descartar(pedido['id'])
+                raise SignerTimeout(f'Signer não respondeu em {timeout} segundos', futuro.assinadas)
+        finally:
+            self._liberar(worker)
+
+    def ping(self, worker, timeout=5):
+        resposta = self._enviar_para(worker, 'ping', timeout)
+        worker.ultimo_ping = time.time()
+        return resposta
+
+    def estatisticas(self, timeout=5):
+        """
+        Contadores do cache de RPC de cada worker vivo e o total do pool
+        (cada hit é uma consulta RPC que deixou de ser feita), e as
+        confirmações de transação somadas de todos os workers.
+        """
+        total = {'hits': 0, 'misses': 0}
+        confirmacoes = None
+        por_worker = []
+        vivos = [worker for worker in self.workers if worker.vivo]
+        # todos os workers ao mesmo tempo: um travado custa ``timeout`` uma vez, não uma por worker
+        with ThreadPoolExecutor(max_workers=max(1, len(vivos)), thread_name_prefix='signer-stats') as executor:
+            respostas = list(executor.map(lambda worker: self._stats(worker, timeout), vivos))
+        for worker, resposta in zip(vivos, respostas):
+            if resposta is None:
+                continue
+            cache = resposta.get('cache', {})
+            por_worker.append({'indice': worker.indice, 'cache': cache})
+            for campo in total:
+                total[campo] += cache.get('total', {}).get(campo, 0)
+            if resposta.get('confirmacoes'):
+                confirmacoes = _somar_confirmacoes(confirmacoes, resposta['confirmacoes'])
+        return {'total': total, 'workers': por_worker, 'confirmacoes': confirmacoes}
+
+    def _stats(self, worker, timeout):
+        try:
+            return self._enviar_para(worker, 'stats', timeout)
+        except SignerErro:
+            return None
+
+    def _enviar_para(self, worker, op, timeout):
+        """
+        Envia uma operação de controle para um worker específico, respeitando
+        o mesmo limite de pedidos em voo dos créditos.
+        """
+        prazo = time.monotonic() + timeout
+        pedido = {'op': op, 'id': uuid.uuid4().hex}
+        self._reservar(prazo, worker)
+        try:
+            futuro = worker.enviar(pedido)
+            return futuro.result(timeout=max(0.0, prazo - time.monotonic()))
+        except FutureTimeout:
+            worker.descartar(pedido['id'])
+            raise SignerTimeout(f'Signer worker {worker.indice} não respondeu ao {op}')
+        finally:
+            self._liberar(worker)
+
+    def status(self):
+        with self._cond:
+            return [
+                {
+                    'indice': w.indice,
+                    'pid': w.processo.pid if w.processo else None,
+                    'vivo': w.vivo,
+                    'em_voo': w.em_voo,
+                    'reinicios': w.reinicios,
+                    'ultimo_ping': w.ultimo_ping,
+                }
+                for w in self.workers
+            ]
+
+    def encerrar(self):
+        with self._cond:
+            self._encerrado = True
+            self._cond.notify_all()
+        for worker in self.workers:
+            worker.parar()
+
+    # ---------- internos ----------
+
+    def _reservar(self, prazo, worker=None):
+        """
+        Escolhe o worker vivo com menos pedidos em voo (ou reserva ``worker``),
+        esperando vaga até o prazo.
+        """
+        candidatos = self.workers if worker is None else [worker]
+        with self._cond:
+            while True:
+                if self._encerrado:
+                    raise SignerIndisponivel('Pool de signers encerrado')
+                livres = [w for w in candidatos if w.vivo and w.em_voo < self.max_em_voo]
+                if livres:
+                    escolhido = min(livres, key=lambda w: w.em_voo)
+                    escolhido.em_voo += 1
+                    return escolhido
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    if worker is None:
+                        raise SignerOcupado('Todos os signer workers estão ocupados')
+                    raise SignerOcupado(f'Signer worker {worker.indice} ocupado')
+                self._cond.wait(restante)
+
+    def _liberar(self, worker):
+        with self._cond:
+            worker.em_voo -= 1
+            # quem espera pode estar esperando este worker em particular (_enviar_para)
+            self._cond.notify_all()
+
+    def _worker_morreu(self, worker, processo):
+        if self._encerrado:
+            return
+        # pequeno backoff exponencial para não entrar em loop de crash
+        time.sleep(0.1 * 2 ** min(worker.reinicios, 8))
+        self._reiniciar(worker, processo)
+
+    def _reiniciar(self, worker, processo):
+        """Substitui ``processo`` por um novo, se ninguém já o fez."""
+        with worker.reinicio_lock:
+            if self._encerrado or worker.processo is not processo:
+                return
+            worker.processo = None
+            if processo is not None and processo.poll() is None:
+                processo.kill()
+            worker._falhar_pendentes(SignerIndisponivel('Signer worker reiniciado'))
+            worker.reinicios += 1
+            try:
+                worker.iniciar()
+            except OSError:
+                logger.exception('Falha ao reiniciar signer worker %s', worker.indice)
+        with self._cond:
+            self._cond.notify_all()
+
+    def _loop_healthcheck(self):
+        while True:
+            time.sleep(self.intervalo_healthcheck)
+            if self._encerrado:
+                return
+            for worker in self.workers:
+                processo = worker.processo
+                if not worker.vivo:
+                    self._reiniciar(worker, processo)
+                    continue
+                try:
+                    self.ping(worker)
+                except SignerOcupado:
+                    continue  # sem vaga para o ping: está respondendo créditos
+                except SignerErro:
+                    logger.warning('Signer worker %s falhou no health check; reiniciando', worker.indice)
+                    self._reiniciar(worker, processo)
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def obter_pool():
+    """
+    Devolve o pool do processo atual, criando-o na primeira chamada.
+    O pid é verificado para que workers do gunicorn criados via fork
+    não herdem pipes de outro processo.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = SignerPool()
+            _pool_pid = os.getpid()
+        return _pool
+
+
+@atexit.register
+def _encerrar_pool():
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.encerrar()
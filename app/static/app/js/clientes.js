@@ -64,9 +64,8 @@ window.toknUI = (function () {
   }
 
   function search(form) {
-    const q = form.q?.value || "";
-    console.log("Buscar clientes:", q);
-    // impede submit real por enquanto
+    // busca na hora (sem esperar o debounce) e impede o submit da página
+    buscarNaLista(form.q?.value || "");
     return false;
   }
 
@@ -111,6 +110,9 @@ window.toknUI = (function () {
     const { overlay, credit, novo, campaign, success } = getModals();
     if (!overlay || !credit) return;
 
+    // nova chave de idempotência a cada abertura do modal
+    creditIdempotencyKey = null;
+
     // garante que só um modal fique aberto
     if (novo) novo.classList.remove("is-open");
     if (campaign) campaign.classList.remove("is-open");
@@ -224,6 +226,36 @@ window.toknUI = (function () {
   // TODO: Definir regra de conversão real conforme regra de negócio
   const MOEDAS_POR_SOL = 1000; // 1 SOL = 1000 moedas
 
+  // Idempotency-Key do crédito em andamento: cliques repetidos e retries
+  // reaproveitam a mesma chave e o backend não transfere duas vezes
+  let creditIdempotencyKey = null;
+
+  function novaChaveIdempotencia() {
+    if (window.crypto && typeof window.crypto.randomUUID === 'function') {
+      return window.crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+  }
+
+  // Status do crédito enfileirado até confirmar/falhar (máx. ~2 min). Sob ASGI o
+  // servidor segura a resposta (long-poll); sob WSGI responde na hora com
+  // Retry-After e a espera entre consultas fica aqui no navegador
+  const STATUS_FINAIS = ['confirmed', 'failed'];
+  const PRAZO_ACOMPANHAMENTO_MS = 120000;
+
+  async function acompanharCredito(statusUrl) {
+    const prazo = Date.now() + PRAZO_ACOMPANHAMENTO_MS;
+    let data = null;
+    do {
+      const response = await fetch(`${API_BASE_URL}${statusUrl}?aguardar=20`);
+      data = await response.json();
+      if (!response.ok || STATUS_FINAIS.includes(data.status)) break;
+      const retryAfter = Number(response.headers.get('Retry-After'));
+      if (retryAfter > 0) await new Promise((resolve) => setTimeout(resolve, retryAfter * 1000));
+    } while (Date.now() < prazo);
+    return data;
+  }
+
   async function creditarMoedas() {
     console.log('creditarMoedas() chamada');
     const walletInput = document.getElementById('tokn-wallet-input');
@@ -248,6 +280,8 @@ window.toknUI = (function () {
     // Converter moedas para SOL
     const valorSOL = moedas / MOEDAS_POR_SOL;
     
+    if (!creditIdempotencyKey) creditIdempotencyKey = novaChaveIdempotencia();
+
     // Desabilitar botão durante requisição
     const confirmBtn = document.querySelector('#toknCreditModal .tokn-btn--primary');
     const originalText = confirmBtn?.textContent;
@@ -265,22 +299,15 @@ window.toknUI = (function () {
       };
       const requestUrl = `${API_BASE_URL}/creditar-moedas/`;
       
-      // #region agent log
-      fetch('http://127.0.0.1:7249/ingest/dab86f37-fc48-474b-a390-aff1ce5adac2',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'clientes.js:234',message:'Antes da requisição fetch',data:{API_BASE_URL,requestUrl,requestBody:{...requestBody,chave_privada:'[REDACTED]'}},timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'A'})}).catch(()=>{});
-      // #endregion
-      
       const response = await fetch(requestUrl, {
         method: 'POST',
         headers: { 
-          'Content-Type': 'application/json'
+          'Content-Type': 'application/json',
+          'Idempotency-Key': creditIdempotencyKey
         },
         body: JSON.stringify(requestBody)
       });
       
-      // #region agent log
-      fetch('http://127.0.0.1:7249/ingest/dab86f37-fc48-474b-a390-aff1ce5adac2',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'clientes.js:243',message:'Resposta recebida',data:{status:response.status,statusText:response.statusText,ok:response.ok,headers:Object.fromEntries(response.headers.entries())},timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'B'})}).catch(()=>{});
-      // #endregion
-      
       // Verificar content-type antes de fazer parse
       const contentType = response.headers.get('content-type') || '';
       let data;
@@ -289,9 +316,6 @@ window.toknUI = (function () {
       } else {
         // Se não for JSON, ler como texto para ver o erro
         const textResponse = await response.text();
-        // #region agent log
-        fetch('http://127.0.0.1:7249/ingest/dab86f37-fc48-474b-a390-aff1ce5adac2',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'clientes.js:252',message:'Resposta não é JSON',data:{contentType,textPreview:textResponse.substring(0,2000)},timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'E'})}).catch(()=>{});
-        // #endregion
         // Tentar extrair mensagem de erro do HTML do Django
         const errorTitleMatch = textResponse.match(/<title>(.*?)<\/title>/);
         const errorTypeMatch = textResponse.match(/<h1>(.*?)<\/h1>/);
@@ -305,18 +329,25 @@ window.toknUI = (function () {
           trace: errorTraceMatch ? errorTraceMatch[1].substring(0, 1000) : 'Sem traceback'
         };
         
-        // #region agent log
-        fetch('http://127.0.0.1:7249/ingest/dab86f37-fc48-474b-a390-aff1ce5adac2',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'clientes.js:265',message:'Detalhes do erro extraídos do HTML',data:errorDetails,timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'E'})}).catch(()=>{});
-        // #endregion
-        
         throw new Error(`Erro do servidor: ${errorDetails.type} - ${errorDetails.value.substring(0, 200)}`);
       }
       
-      // #region agent log
-      fetch('http://127.0.0.1:7249/ingest/dab86f37-fc48-474b-a390-aff1ce5adac2',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'clientes.js:260',message:'Dados parseados da resposta',data,timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'C'})}).catch(()=>{});
-      // #endregion
-      
+      // Crédito aceito (202): acompanhar o job até a confirmação na rede
+      if (response.status === 202 && data.sucesso && data.status_url) {
+        if (confirmBtn) confirmBtn.textContent = 'Confirmando na rede...';
+        data = await acompanharCredito(data.status_url);
+        if (data.sucesso && !STATUS_FINAIS.includes(data.status)) {
+          closeModals();
+          // 'verificar': a transação pode já estar na rede; não é falha, então não se reenvia
+          alert(data.status === 'verificar'
+            ? 'Crédito enviado, conferindo a transação na rede. Aguarde a conclusão antes de creditar de novo.'
+            : 'Crédito em processamento. A confirmação na rede está demorando mais que o normal.');
+          return;
+        }
+      }
+
       if (response.ok && data.sucesso) {
+        creditIdempotencyKey = null;
         closeModals();
         // Limpar campos
         if (walletInput) walletInput.value = '';
@@ -324,16 +355,13 @@ window.toknUI = (function () {
         // Abrir modal de sucesso
         openSuccessModal(data.signature, data.explorer);
       } else {
+        // Job que terminou em falha: a próxima tentativa é um crédito novo, com outra
+        // chave (reaproveitar a chave só devolveria a mesma falha)
+        if (data.status === 'failed') creditIdempotencyKey = null;
         const erroMsg = data.erro || data.message || 'Erro desconhecido';
-        // #region agent log
-        fetch('http://127.0.0.1:7249/ingest/dab86f37-fc48-474b-a390-aff1ce5adac2',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'clientes.js:254',message:'Resposta com erro',data:{status:response.status,erroMsg,data},timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'D'})}).catch(()=>{});
-        // #endregion
         alert(`Erro ao creditar moedas: ${erroMsg}`);
       }
     } catch (error) {
-      // #region agent log
-      fetch('http://127.0.0.1:7249/ingest/dab86f37-fc48-474b-a390-aff1ce5adac2',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'clientes.js:257',message:'Erro capturado no catch',data:{errorName:error?.name,errorMessage:error?.message,errorStack:error?.stack,API_BASE_URL,requestUrl:`${API_BASE_URL}/creditar-moedas`},timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'E'})}).catch(()=>{});
-      // #endregion
       console.error('Erro ao creditar moedas:', error);
       alert('Erro ao conectar com a API. Verifique se o servidor está rodando em ' + API_BASE_URL);
     } finally {
@@ -480,10 +508,192 @@ window.toknUI = (function () {
     return false;
   }
 
+  // ============================================================
+  // BUSCA DE CLIENTES (/clientes/buscar/)
+  // ============================================================
+
+  const BUSCA_MIN_CARACTERES = 2;
+  const BUSCA_DEBOUNCE_MS = 200;
+
+  function debounce(fn, ms) {
+    let timer = null;
+    return function (...args) {
+      clearTimeout(timer);
+      timer = setTimeout(() => fn.apply(this, args), ms);
+    };
+  }
+
+  // uma busca em voo por campo: a anterior é cancelada quando o termo muda
+  function criarBuscador() {
+    let controller = null;
+    return async function (q) {
+      if (controller) controller.abort();
+      controller = new AbortController();
+      const params = new URLSearchParams({ q });
+      const estabelecimento = new URLSearchParams(window.location.search).get("estabelecimento");
+      if (estabelecimento) params.set("estabelecimento", estabelecimento);
+      try {
+        const response = await fetch(`${API_BASE_URL}/clientes/buscar/?${params}`, {
+          signal: controller.signal,
+        });
+        if (!response.ok) return null;
+        return (await response.json()).resultados;
+      } catch (error) {
+        if (error.name !== "AbortError") console.error("Erro na busca de clientes:", error);
+        return null;
+      }
+    };
+  }
+
+  // --- lista da página de clientes ---
+  const buscarLista = criarBuscador();
+  let linhasOriginais = null;
+
+  function linhaCliente(c) {
+    const tr = document.createElement("tr");
+
+    const tdCliente = document.createElement("td");
+    tdCliente.dataset.label = "Cliente";
+    const nome = document.createElement("div");
+    nome.className = "tokn-name";
+    nome.textContent = c.nome + " ";
+    if (c.vip) {
+      const badge = document.createElement("span");
+      badge.className = "tokn-badge";
+      badge.textContent = "VIP";
+      nome.appendChild(badge);
+    }
+    const contato = document.createElement("div");
+    contato.className = "tokn-meta";
+    contato.textContent = [c.telefone, c.email].filter(Boolean).join(" · ");
+    tdCliente.append(nome, contato);
+
+    const celula = (label, texto) => {
+      const td = document.createElement("td");
+      td.dataset.label = label;
+      td.textContent = texto;
+      return td;
+    };
+
+    const tdStatus = document.createElement("td");
+    tdStatus.dataset.label = "Status";
+    const status = document.createElement("span");
+    status.className = c.ativo ? "tokn-status tokn-status--on" : "tokn-status tokn-status--off";
+    status.textContent = c.ativo ? "Ativo" : "Inativo";
+    tdStatus.appendChild(status);
+
+    const tdAcoes = document.createElement("td");
+    tdAcoes.dataset.label = "Ações";
+    const acoes = document.createElement("div");
+    acoes.className = "tokn-acts";
+    const ver = document.createElement("button");
+    ver.className = "tokn-act";
+    ver.textContent = "🔍";
+    ver.addEventListener("click", () => openPanel(c.nome));
+    acoes.appendChild(ver);
+    tdAcoes.appendChild(acoes);
+
+    const tdUltima = celula("Última atividade", c.ultima);
+    const ultimaData = document.createElement("span");
+    ultimaData.className = "tokn-meta";
+    ultimaData.textContent = c.ultima_data;
+    tdUltima.append(document.createElement("br"), ultimaData);
+
+    tr.append(
+      tdCliente,
+      celula("Moedas", c.moedas),
+      tdUltima,
+      celula("Canal principal", c.canal),
+      tdStatus,
+      tdAcoes
+    );
+    return tr;
+  }
+
+  async function buscarNaLista(q) {
+    const tbody = document.getElementById("tokn-clientes-tbody");
+    if (!tbody) return;
+    if (linhasOriginais === null) linhasOriginais = Array.from(tbody.children);
+    const paginacao = document.querySelector(".tokn-paginacao");
+
+    q = q.trim();
+    if (q.length < BUSCA_MIN_CARACTERES) {
+      tbody.replaceChildren(...linhasOriginais);
+      if (paginacao) paginacao.classList.remove("is-hidden");
+      return;
+    }
+    const resultados = await buscarLista(q);
+    if (resultados === null) return;
+    tbody.replaceChildren(...resultados.map(linhaCliente));
+    if (paginacao) paginacao.classList.add("is-hidden");
+  }
+
+  function setupClientSearch() {
+    const input = document.getElementById("tokn-q");
+    if (!input) return;
+    input.addEventListener("input", debounce(() => buscarNaLista(input.value), BUSCA_DEBOUNCE_MS));
+  }
+
+  // --- modal de crédito: buscar cliente cadastrado ---
+  const buscarModal = criarBuscador();
+
+  function escolherCliente(c) {
+    const walletInput = document.getElementById("tokn-wallet-input");
+    if (walletInput && c.carteira) walletInput.value = c.carteira;
+    setFoundClient({
+      nome: c.nome,
+      telefone: c.telefone,
+      email: c.email,
+      canal: c.canal,
+      vip: c.vip,
+      idTokn: `CLT-${String(c.id).padStart(6, "0")}`,
+    });
+    toggleCreditSearch(false);
+  }
+
+  async function buscarNoModal(q) {
+    const lista = document.getElementById("toknClientResults");
+    if (!lista) return;
+    q = q.trim();
+    if (q.length < BUSCA_MIN_CARACTERES) {
+      lista.replaceChildren();
+      return;
+    }
+    const resultados = await buscarModal(q);
+    if (resultados === null) return;
+    lista.replaceChildren(
+      ...resultados.map((c) => {
+        const botao = document.createElement("button");
+        botao.type = "button";
+        botao.className = "tokn-chip-action";
+        botao.textContent = [c.nome, c.telefone].filter(Boolean).join(" · ");
+        botao.addEventListener("click", () => escolherCliente(c));
+        return botao;
+      })
+    );
+  }
+
+  function toggleCreditSearch(open) {
+    const bloco = document.getElementById("toknClientSearch");
+    const input = document.getElementById("tokn-credit-q");
+    if (!bloco) return;
+    const abrir = typeof open === "boolean" ? open : bloco.classList.contains("is-hidden");
+    bloco.classList.toggle("is-hidden", !abrir);
+    if (abrir && input) input.focus();
+  }
+
+  function setupCreditSearch() {
+    const input = document.getElementById("tokn-credit-q");
+    if (!input) return;
+    input.addEventListener("input", debounce(() => buscarNoModal(input.value), BUSCA_DEBOUNCE_MS));
+  }
+
   // ---------- INIT ----------
   document.addEventListener("DOMContentLoaded", function () {
     setupNav();
     initNewClientTabs();
+    setupClientSearch();
+    setupCreditSearch();
     
     // Adicionar event listener ao botão de confirmar crédito
     // Usar delegação de eventos para garantir que funcione mesmo se o modal não estiver no DOM
@@ -516,6 +726,7 @@ window.toknUI = (function () {
     // Cliente identificado
     setFoundClient,
     clearFoundClient,
+    toggleCreditSearch,
     debugShowFoundClient,
 
     // Campanhas – painel lateral
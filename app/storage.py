@@ -0,0 +1,340 @@
+"""
+Storage do collectstatic para os estáticos do app.
+
+Sobre o ``ManifestStaticFilesStorage`` (nomes com hash do conteúdo +
+``staticfiles.json``), para os arquivos em ``PREFIXOS_OTIMIZADOS``:
+
+- remove do CSS as regras cujos seletores usam classes/ids que não aparecem
+  em nenhum template nem JS (``STATIC_CSS_SAFELIST`` força a manter);
+- minifica CSS e JS (comentários e espaços; sem renomear nada);
+- grava ``.gz`` e ``.br`` ao lado de cada arquivo com hash, para o nginx
+  servir com ``gzip_static``/``brotli_static`` sem comprimir na requisição.
+
+A otimização roda antes do hash, lendo sempre o arquivo-fonte: o hash é o do
+conteúdo servido, e rodar o collectstatic de novo depois de mudar um template
+refaz a limpeza do CSS mesmo que o CSS não tenha mudado.
+"""
+import gzip
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.template.utils import get_app_template_dirs
+
+try:
+    import brotli
+except ImportError:  # opcional: sem o pacote, só .gz
+    brotli = None
+
+# Só os estáticos do projeto são minificados e limpos (admin fica como está)
+PREFIXOS_OTIMIZADOS = ('app/',)
+
+# Extensões que ganham cópias .gz/.br
+EXTENSOES_COMPRIMIVEIS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.map')
+
+# Arquivos menores que isso não compensam a cópia comprimida
+TAMANHO_MINIMO_COMPRIMIR = 256
+
+_TOKEN = re.compile(r'[A-Za-z0-9_-]+')
+_ESPACOS = re.compile(r'\s+')
+
+
+# ---------- strings protegidas ----------
+
+def _restaurar(texto, protegidos):
+    return re.sub('\x00(\\d+)\x00', lambda m: protegidos[int(m.group(1))], texto)
+
+
+def _proteger_css(css):
+    """Tira comentários e troca strings por marcadores ``\\0N\\0``."""
+    saida, protegidos, i = [], [], 0
+    while i < len(css):
+        c = css[i]
+        if css.startswith('/*', i):
+            fim = css.find('*/', i + 2)
+            i = len(css) if fim < 0 else fim + 2
+            saida.append(' ')
+        elif c in '"\'':
+            fim = i + 1
+            while fim < len(css) and css[fim] != c:
+                fim += 2 if css[fim] == '\\' else 1
+            saida.append(f'\x00{len(protegidos)}\x00')
+            protegidos.append(css[i:fim + 1])
+            i = fim + 1
+        else:
+            saida.append(c)
+            i += 1
+    return ''.join(saida), protegidos
+
+
+# ---------- CSS ----------
+
+def _fechamento(texto, inicio):
+    """Índice da ``}`` que fecha a ``{`` em ``inicio``."""
+    profundidade = 0
+    for i in range(inicio, len(texto)):
+        if texto[i] == '{':
+            profundidade += 1
+        elif texto[i] == '}':
+            profundidade -= 1
+            if profundidade == 0:
+                return i
+    return len(texto)
+
+
+def _dividir_seletores(prelude):
+    """Divide ``a, b:not(.c, .d)`` nas vírgulas de nível zero."""
+    partes, atual, profundidade = [], [], 0
+    for c in prelude:
+        if c in '([':
+            profundidade += 1
+        elif c in ')]':
+            profundidade -= 1
+        elif c == ',' and profundidade == 0:
+            partes.append(''.join(atual))
+            atual = []
+            continue
+        atual.append(c)
+    partes.append(''.join(atual))
+    return [parte.strip() for parte in partes if parte.strip()]
+
+
+def _seletor_usado(seletor, usados):
+    # o que está dentro de :not(...) e [...] não precisa existir na página
+    seletor = re.sub(r':not\([^)]*\)|\[[^\]]*\]', '', seletor)
+    nomes = re.findall(r'[.#](-?[A-Za-z_][\w-]*)', seletor)
+    return all(nome in usados for nome in nomes)
+
+
+def _minificar_declaracoes(corpo):
+    corpo = _ESPACOS.sub(' ', corpo).strip()
+    corpo = re.sub(r'\s*([:;,])\s*', r'\1', corpo)
+    corpo = re.sub(r'\s*!important', '!important', corpo)
+    return corpo.rstrip(';')
+
+
+def _minificar_seletor(prelude):
+    prelude = _ESPACOS.sub(' ', prelude).strip()
+    return re.sub(r'\s*([,>])\s*', r'\1', prelude)
+
+
+def _processar_regras(texto, usados):
+    """Percorre as regras de ``texto`` (sem comentários/strings) e devolve o CSS limpo e minificado."""
+    saida, i = [], 0
+    while i < len(texto):
+        abre = texto.find('{', i)
+        ponto_virgula = texto.find(';', i)
+        if abre < 0 and ponto_virgula < 0:
+            break
+        if ponto_virgula >= 0 and (abre < 0 or ponto_virgula < abre):
+            # @import/@charset etc.
+            instrucao = _ESPACOS.sub(' ', texto[i:ponto_virgula]).strip()
+            if instrucao:
+                saida.append(instrucao + ';')
+            i = ponto_virgula + 1
+            continue
+        fecha = _fechamento(texto, abre)
+        prelude, corpo = texto[i:abre].strip(), texto[abre + 1:fecha]
+        i = fecha + 1
+        if prelude.startswith('@'):
+            cabecalho = _ESPACOS.sub(' ', prelude)
+            if re.match(r'@(media|supports|container|layer)\b', prelude):
+                interno = _processar_regras(corpo, usados)
+                if interno:
+                    saida.append(f'{cabecalho}{{{interno}}}')
+            else:
+                # @keyframes, @font-face, @page: mantidos, só minificados
+                saida.append(f'{cabecalho}{{{_minificar_blocos(corpo)}}}')
+            continue
+        if usados is not None:
+            seletores = [s for s in _dividir_seletores(prelude) if _seletor_usado(s, usados)]
+            if not seletores:
+                continue
+            prelude = ','.join(seletores)
+        declaracoes = _minificar_declaracoes(corpo)
+        if declaracoes:
+            saida.append(f'{_minificar_seletor(prelude)}{{{declaracoes}}}')
+    return ''.join(saida)
+
+
+def _minificar_blocos(corpo):
+    if '{' not in corpo:
+        return _minificar_declaracoes(corpo)
+    return _processar_regras(corpo, None)
+
+
+def otimizar_css(css, usados=None):
+    """Minifica ``css``; com ``usados`` (conjunto de tokens), remove as regras sem uso."""
+    texto, protegidos = _proteger_css(css)
+    return _restaurar(_processar_regras(texto, usados), protegidos)
+
+
+# ---------- JS ----------
+
+# Depois destes caracteres/palavras, ``/`` abre uma regex, não uma divisão
+_ANTES_DE_REGEX = set('(,=:[!&|?{};+-*%<>~^')
+_PALAVRAS_ANTES_DE_REGEX = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw'}
+
+
+def _fim_string(js, i, aspas):
+    fim = i + 1
+    profundidade = 0
+    while fim < len(js):
+        c = js[fim]
+        if c == '\\':
+            fim += 2
+            continue
+        if aspas == '`':
+            if js.startswith('${', fim):
+                profundidade += 1
+                fim += 2
+                continue
+            if c == '}' and profundidade:
+                profundidade -= 1
+            elif c == '`' and not profundidade:
+                return fim
+        elif c == aspas or c == '\n':
+            return fim
+        fim += 1
+    return fim
+
+
+def _fim_regex(js, i):
+    fim, classe = i + 1, False
+    while fim < len(js) and js[fim] != '\n':
+        c = js[fim]
+        if c == '\\':
+            fim += 2
+            continue
+        if c == '[':
+            classe = True
+        elif c == ']':
+            classe = False
+        elif c == '/' and not classe:
+            fim += 1
+            while fim < len(js) and js[fim].isalnum():
+                fim += 1
+            return fim - 1
+        fim += 1
+    return fim
+
+
+def _abre_regex(saida):
+    anterior = ''.join(saida).rstrip()
+    if not anterior or anterior[-1] in _ANTES_DE_REGEX:
+        return True
+    palavra = re.search(r'[A-Za-z_$]+$', anterior)
+    return bool(palavra) and palavra.group() in _PALAVRAS_ANTES_DE_REGEX
+
+
+def minificar_js(js):
+    """
+    Minificação conservadora: tira comentários, indentação e linhas vazias.
+    Quebras de linha ficam (ASI) e nenhum identificador muda de nome.
+    """
+    saida, protegidos, i = [], [], 0
+    while i < len(js):
+        c = js[i]
+        if c in '"\'`':
+            fim = _fim_string(js, i, c)
+        elif js.startswith('//', i):
+            fim = js.find('\n', i)
+            i = len(js) if fim < 0 else fim
+            continue
+        elif js.startswith('/*', i):
+            fim = js.find('*/', i + 2)
+            fim = len(js) if fim < 0 else fim + 2
+            saida.append('\n' if '\n' in js[i:fim] else ' ')
+            i = fim
+            continue
+        elif c == '/' and _abre_regex(saida[-40:]):
+            fim = _fim_regex(js, i)
+        else:
+            saida.append(c)
+            i += 1
+            continue
+        saida.append(f'\x00{len(protegidos)}\x00')
+        protegidos.append(js[i:fim + 1])
+        i = fim + 1
+    linhas = (re.sub(r'[ \t]+', ' ', linha).strip() for linha in ''.join(saida).splitlines())
+    return _restaurar('\n'.join(linha for linha in linhas if linha), protegidos) + '\n'
+
+
+# ---------- storage ----------
+
+def _comprimir(conteudo):
+    """Pares (extensão, bytes) das versões comprimidas que ficam menores que o original."""
+    versoes = [('.gz', gzip.compress(conteudo, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        versoes.append(('.br', brotli.compress(conteudo, quality=11)))
+    return [(extensao, dados) for extensao, dados in versoes if len(dados) < len(conteudo)]
+
+
+class ToknStaticStorage(ManifestStaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            paths = self._otimizar(paths)
+        processados = {}
+        for nome, nome_hash, processado in super().post_process(paths, dry_run, **options):
+            if nome_hash and not isinstance(processado, Exception):
+                processados[nome] = nome_hash
+            yield nome, nome_hash, processado
+        if not dry_run:
+            for nome_hash in processados.values():
+                self._gravar_comprimidos(nome_hash)
+
+    def _otimizar(self, paths):
+        """
+        Grava em STATIC_ROOT as versões otimizadas e devolve ``paths`` apontando
+        para elas: o ManifestStaticFilesStorage calcula o hash lendo dali.
+        """
+        alvos = [
+            caminho for caminho in paths
+            if caminho.startswith(PREFIXOS_OTIMIZADOS) and caminho.endswith(('.css', '.js'))
+        ]
+        if not alvos:
+            return paths
+        paths = dict(paths)
+        usados = self._tokens_usados(paths)
+        for caminho in alvos:
+            origem, caminho_origem = paths[caminho]
+            with origem.open(caminho_origem) as arquivo:
+                texto = arquivo.read().decode('utf-8')
+            if caminho.endswith('.css'):
+                texto = otimizar_css(texto, usados)
+            else:
+                texto = minificar_js(texto)
+            if self.exists(caminho):
+                self.delete(caminho)
+            self._save(caminho, ContentFile(texto.encode('utf-8')))
+            paths[caminho] = (self, caminho)
+        return paths
+
+    def _tokens_usados(self, paths):
+        """Palavras que aparecem em templates e JS: candidatas a classe/id em uso."""
+        usados = set(getattr(settings, 'STATIC_CSS_SAFELIST', ()))
+        diretorios = [diretorio for engine in settings.TEMPLATES for diretorio in engine.get('DIRS', ())]
+        diretorios += get_app_template_dirs('templates')
+        for diretorio in diretorios:
+            for template in Path(diretorio).rglob('*.html'):
+                usados.update(_TOKEN.findall(template.read_text(encoding='utf-8', errors='ignore')))
+        for caminho, (origem, caminho_origem) in paths.items():
+            if caminho.startswith(PREFIXOS_OTIMIZADOS) and caminho.endswith('.js'):
+                with origem.open(caminho_origem) as arquivo:
+                    usados.update(_TOKEN.findall(arquivo.read().decode('utf-8', errors='ignore')))
+        return usados
+
+    def _gravar_comprimidos(self, nome):
+        if not nome.endswith(EXTENSOES_COMPRIMIVEIS):
+            return
+        with self.open(nome) as arquivo:
+            conteudo = arquivo.read()
+        if len(conteudo) < TAMANHO_MINIMO_COMPRIMIR:
+            return
+        for extensao, dados in _comprimir(conteudo):
+            if self.exists(nome + extensao):
+                self.delete(nome + extensao)
+            self._save(nome + extensao, ContentFile(dados))
@@ -1,3 +1,926 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import unittest
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .fila import (
+    _lancar_no_ledger, enfileirar_credito, enfileirar_lote, executar_reservados, reservar_proximo, verificar_enviados,
+)
+from .busca import buscar_clientes
+from .health import FrenteASGI, FrenteWSGI
+from .importacao import executar_importacao, importar_clientes, ler_linhas, reservar_importacao
+from .instrumentacao import Metricas, encerrar_processo
+from .ledger import registrar_transacao, saldo_reconstruido
+from .limites import BaldesSqlite
+from .log_handlers import FilaHandler, JsonFormatter
+from .metricas import ATRASO_SEGURANCA, MARCA_TRANSACOES, atualizar_metricas
+from .middleware import DebugHostMiddleware
+from .pagination import paginar_keyset
+from .renderizacao import (
+    CHAVE_VERSAO, gravar_manifest, gravar_prerenderizada, invalidar_fragmentos, resposta_prerenderizada,
+    versao_fragmentos,
+)
+from .signer import SignerPool, SignerTimeout
+from .models import (
+    Carteira, Cliente, CreditoJob, Estabelecimento, ImportacaoJob, MarcaAgua, MetricaDia, Transacao,
+)
+
+CHAVE = 'chave-privada-de-teste'
+CARTEIRA = 'So11111111111111111111111111111111111111112'
+
+
+class FilaCreditoTests(TestCase):
+    def test_reserva_tira_a_chave_do_banco(self):
+        job, _ = enfileirar_credito(CHAVE, CARTEIRA, valor=0.01)
+
+        reservados = reservar_proximo()
+
+        self.assertEqual([j.pk for j in reservados], [job.pk])
+        self.assertEqual(reservados[0].chave_privada, CHAVE)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CreditoJob.Status.SUBMITTED)
+        self.assertEqual(job.chave_privada, '')
+
+    def test_job_terminado_nao_guarda_a_chave(self):
+        job, _ = enfileirar_credito(CHAVE, CARTEIRA, valor=0.01)
+
+        job.status = CreditoJob.Status.FAILED
+        job.save(update_fields=['status'])
+
+        job.refresh_from_db()
+        self.assertEqual(job.chave_privada, '')
+
+
+@override_settings(MOEDAS_POR_SOL=1000)
+class CreditoNoLedgerTests(TestCase):
+    def setUp(self):
+        estabelecimento = Estabelecimento.objects.create(nome='Loja')
+        self.cliente = Cliente.objects.create(estabelecimento=estabelecimento, nome='Ana')
+        Carteira.objects.create(cliente=self.cliente, endereco=CARTEIRA)
+
+    def _executar(self, resposta):
+        with mock.patch('app.fila._chamar_signer', return_value=resposta):
+            return executar_reservados(reservar_proximo())
+
+    def test_job_confirmado_lanca_as_moedas(self):
+        job, _ = enfileirar_credito(CHAVE, CARTEIRA, valor=0.05)
+
+        self._executar({'sucesso': True, 'signature': 'sig-1'})
+
+        transacao = Transacao.objects.get()
+        self.assertEqual(transacao.credito_job, job.pk)
+        self.assertEqual((transacao.tipo, transacao.moedas), (Transacao.Tipo.CREDITO, 50))
+        self.cliente.refresh_from_db()
+        self.assertEqual(self.cliente.moedas, 50)
+        self.assertEqual(saldo_reconstruido(self.cliente.pk), 50)
+
+    def test_lancamento_e_idempotente_pelo_job(self):
+        job, _ = enfileirar_credito(CHAVE, CARTEIRA, valor=0.05)
+        self._executar({'sucesso': True, 'signature': 'sig-1'})
+        job.refresh_from_db()
+
+        _lancar_no_ledger([job])
+
+        self.assertEqual(Transacao.objects.count(), 1)
+        self.cliente.refresh_from_db()
+        self.assertEqual(self.cliente.moedas, 50)
+
+    def test_job_que_falhou_nao_lanca(self):
+        enfileirar_credito(CHAVE, CARTEIRA, valor=0.05)
+
+        self._executar({'sucesso': False, 'erro': 'rede'})
+
+        self.assertFalse(Transacao.objects.exists())
+        self.cliente.refresh_from_db()
+        self.assertEqual(self.cliente.moedas, 0)
+
+    def test_lote_lanca_so_os_destinos_confirmados(self):
+        outra = 'Outra1111111111111111111111111111111111111'
+        enfileirar_lote(CHAVE, [
+            {'carteira_destino': CARTEIRA, 'valor': 0.01},
+            {'carteira_destino': outra, 'valor': 0.01},
+            {'carteira_destino': CARTEIRA, 'valor': 0.02},
+        ])
+
+        self._executar({'sucesso': True, 'resultados': [
+            {'indice': 0, 'sucesso': True, 'signature': 'a'},
+            {'indice': 1, 'sucesso': True, 'signature': 'a'},
+            {'indice': 2, 'sucesso': False, 'erro': 'rede'},
+        ]})
+
+        self.assertEqual(Transacao.objects.count(), 1)
+        self.cliente.refresh_from_db()
+        self.assertEqual(self.cliente.moedas, 10)
+
+    def _timeout(self, *assinadas):
+        return {'sucesso': False, 'erro': 'Timeout ao executar transação', 'assinadas': list(assinadas)}
+
+    def test_timeout_depois_de_assinar_fica_em_verificacao(self):
+        job, _ = enfileirar_credito(CHAVE, CARTEIRA, valor=0.05, chave_idempotencia='pdv-1')
+
+        self._executar(self._timeout({'signature': 'sig-1'}))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.signature), (CreditoJob.Status.VERIFICAR, 'sig-1'))
+        self.assertFalse(job.finalizado)
+        self.assertFalse(Transacao.objects.exists())
+        # o retry do cliente cai no mesmo job, sem outra transferência
+        self.assertEqual(enfileirar_credito(CHAVE, CARTEIRA, valor=0.05, chave_idempotencia='pdv-1'), (job, False))
+
+        status = {'sig-1': {'confirmada': True, 'erro': None}}
+        with mock.patch('app.fila._chamar_signer', return_value={'sucesso': True, 'status': status}):
+            self.assertEqual(verificar_enviados(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, CreditoJob.Status.CONFIRMED)
+        self.cliente.refresh_from_db()
+        self.assertEqual(self.cliente.moedas, 50)
+
+    def test_timeout_antes_de_assinar_falha(self):
+        job, _ = enfileirar_credito(CHAVE, CARTEIRA, valor=0.05)
+
+        self._executar(self._timeout())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, CreditoJob.Status.FAILED)
+        self.assertIn('não foi enviada', job.erro)
+
+    def test_timeout_do_lote_separa_os_destinos_assinados(self):
+        enfileirar_lote(CHAVE, [{'carteira_destino': CARTEIRA, 'valor': 0.01} for _ in range(3)])
+
+        jobs = self._executar(self._timeout({'signature': 'a', 'indices': [0, 2]}))
+
+        self.assertEqual(
+            [(job.status, job.signature) for job in jobs],
+            [(CreditoJob.Status.VERIFICAR, 'a'), (CreditoJob.Status.FAILED, ''), (CreditoJob.Status.VERIFICAR, 'a')],
+        )
+
+    def test_verificacao_sem_status_na_rede(self):
+        job, _ = enfileirar_credito(CHAVE, CARTEIRA, valor=0.05)
+        self._executar(self._timeout({'signature': 'sig-1'}))
+        desconhecida = {'sucesso': True, 'status': {}}
+
+        # dentro do prazo do blockhash: continua esperando
+        with mock.patch('app.fila._chamar_signer', return_value=desconhecida):
+            self.assertEqual(verificar_enviados(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CreditoJob.Status.VERIFICAR)
+
+        CreditoJob.objects.filter(pk=job.pk).update(enviado_em=timezone.now() - timedelta(hours=1))
+        with mock.patch('app.fila._chamar_signer', return_value=desconhecida):
+            self.assertEqual(verificar_enviados(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, CreditoJob.Status.FAILED)
+        self.assertFalse(Transacao.objects.exists())
+
+
+class MetricasTests(TestCase):
+    def setUp(self):
+        estabelecimento = Estabelecimento.objects.create(nome='Loja')
+        self.cliente = Cliente.objects.create(estabelecimento=estabelecimento, nome='Ana')
+
+    def _lancar(self, moedas, **extra):
+        return registrar_transacao(self.cliente, Transacao.Tipo.CREDITO, moedas, **extra)
+
+    def _agregadas(self):
+        return sum(MetricaDia.objects.values_list('moedas_creditadas', flat=True))
+
+    def test_criado_em_fora_de_ordem_nao_trava_a_marca(self):
+        agora = timezone.now()
+        self._lancar(10, criado_em=agora + timedelta(days=1))  # relógio adiantado
+        self._lancar(20, criado_em=agora - timedelta(days=2))  # lançamento retroativo
+
+        self.assertEqual(atualizar_metricas(atraso=timedelta(0)), 2)
+
+        self.assertEqual(self._agregadas(), 30)
+        self.assertEqual(MarcaAgua.objects.get(nome=MARCA_TRANSACOES).ultimo_id, Transacao.objects.latest('pk').pk)
+
+    def test_ids_novos_esperam_o_atraso(self):
+        self._lancar(10)
+
+        self.assertEqual(atualizar_metricas(), 0)
+        MarcaAgua.objects.filter(nome=MARCA_TRANSACOES).update(
+            candidato_em=timezone.now() - ATRASO_SEGURANCA - timedelta(seconds=1),
+        )
+        self._lancar(5)  # posterior ao candidato: fica para a próxima rodada
+        self.assertEqual(atualizar_metricas(), 1)
+
+        self.assertEqual(self._agregadas(), 10)
+        self.assertEqual(atualizar_metricas(), 0)
+
+
+class StatusCreditoTests(TestCase):
+    def setUp(self):
+        self.job, _ = enfileirar_credito(CHAVE, CARTEIRA, valor=0.01)
+        self.url = f'/creditar-moedas/{self.job.pk}/'
+
+    def test_wsgi_responde_na_hora_com_retry_after(self):
+        for aguardar in ('20', 'nan', 'inf', '-inf', '-5', 'abc'):
+            with self.subTest(aguardar=aguardar):
+                inicio = time.monotonic()
+                response = self.client.get(self.url, {'aguardar': aguardar})
+                self.assertLess(time.monotonic() - inicio, 1)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['status'], CreditoJob.Status.QUEUED)
+                self.assertEqual(response['Retry-After'], '2')
+
+    def test_job_terminado_sem_retry_after(self):
+        CreditoJob.objects.filter(pk=self.job.pk).update(status=CreditoJob.Status.CONFIRMED)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.json()['status'], CreditoJob.Status.CONFIRMED)
+        self.assertFalse(response.has_header('Retry-After'))
+
+    @override_settings(LONG_POLL_WSGI_MAX=60)
+    def test_wsgi_nunca_espera_mais_que_o_teto(self):
+        inicio = time.monotonic()
+        response = self.client.get(self.url, {'aguardar': '20'})
+
+        self.assertLess(time.monotonic() - inicio, 3)
+        self.assertEqual(response['Retry-After'], '2')
+
+    async def test_asgi_espera_o_job_terminar(self):
+        async def confirmar():
+            await asyncio.sleep(0.3)
+            await CreditoJob.objects.filter(pk=self.job.pk).aupdate(status=CreditoJob.Status.CONFIRMED)
+
+        tarefa = asyncio.create_task(confirmar())
+        response = await self.async_client.get(self.url, {'aguardar': '5'})
+        await tarefa
+
+        self.assertEqual(response.json()['status'], CreditoJob.Status.CONFIRMED)
+        self.assertFalse(response.has_header('Retry-After'))
+
+    async def test_asgi_aguardar_nao_finito_nao_prende_o_request(self):
+        for aguardar in ('nan', 'inf', '-inf', '-5'):
+            with self.subTest(aguardar=aguardar):
+                inicio = time.monotonic()
+                response = await self.async_client.get(self.url, {'aguardar': aguardar})
+                self.assertLess(time.monotonic() - inicio, 1)
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.has_header('Retry-After'))
+
+
+@override_settings(CREDITO_TAXA=0)
+class CreditarMoedasTests(TestCase):
+    url = '/creditar-moedas/'
+
+    def _post(self, corpo, **headers):
+        return self.client.post(self.url, json.dumps(corpo), content_type='application/json', headers=headers)
+
+    def _corpo(self, **extra):
+        return {'chave_privada': CHAVE, 'carteira_destino': CARTEIRA, 'valor': 0.01, **extra}
+
+    def test_idempotency_key_que_nao_e_texto(self):
+        for chave in (123, {'a': 1}, ['x']):
+            with self.subTest(chave=chave):
+                response = self._post(self._corpo(idempotency_key=chave))
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(CreditoJob.objects.exists())
+
+    def test_corpo_que_nao_e_objeto(self):
+        self.assertEqual(self._post([1, 2]).status_code, 400)
+
+    def test_repeticao_com_a_mesma_chave_devolve_o_mesmo_job(self):
+        primeira = self._post(self._corpo(), **{'Idempotency-Key': 'pedido-1'})
+        segunda = self._post(self._corpo(), **{'Idempotency-Key': 'pedido-1'})
+
+        self.assertEqual(primeira.status_code, 202)
+        self.assertEqual(segunda.status_code, 202)
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertEqual(segunda.json()['job_id'], primeira.json()['job_id'])
+        self.assertEqual(CreditoJob.objects.count(), 1)
+
+    def test_mesma_chave_com_outros_dados(self):
+        self._post(self._corpo(), **{'Idempotency-Key': 'pedido-1'})
+
+        response = self._post(self._corpo(valor=0.02), **{'Idempotency-Key': 'pedido-1'})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(CreditoJob.objects.count(), 1)
+
+
+class CreditarLoteTests(TestCase):
+    url = '/creditar-moedas/lote/'
+
+    def _post(self, corpo):
+        return self.client.post(self.url, json.dumps(corpo), content_type='application/json')
+
+    def test_corpo_que_nao_e_objeto(self):
+        for corpo in ([], 'x', 1):
+            with self.subTest(corpo=corpo):
+                self.assertEqual(self._post(corpo).status_code, 400)
+
+    def test_carteira_destino_que_nao_e_texto(self):
+        for carteira in (123, ['x'], {'a': 1}):
+            with self.subTest(carteira=carteira):
+                response = self._post({'chave_privada': CHAVE, 'destinos': [{'carteira_destino': carteira}]})
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(CreditoJob.objects.exists())
+
+    def test_lote_valido_e_enfileirado(self):
+        response = self._post({'chave_privada': CHAVE, 'destinos': [{'carteira_destino': CARTEIRA, 'valor': 0.01}]})
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(CreditoJob.objects.filter(lote=response.json()['lote_id']).count(), 1)
+
+
+class AdmissaoTests(TestCase):
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(
+            LIMITES_DB=os.path.join(diretorio.name, 'limites.sqlite3'), CREDITO_TAXA=0.001, CREDITO_RAJADA=1,
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        # baldes novos, no arquivo deste teste
+        baldes = mock.patch('app.limites._baldes', None)
+        baldes.start()
+        self.addCleanup(baldes.stop)
+
+    def _post(self, url, corpo, **headers):
+        return self.client.post(url, json.dumps(corpo), content_type='application/json', headers=headers)
+
+    def _credito(self, **headers):
+        corpo = {'chave_privada': CHAVE, 'carteira_destino': CARTEIRA, 'valor': 0.01}
+        return self._post('/creditar-moedas/', corpo, **headers)
+
+    def test_repeticao_idempotente_nao_gasta_ficha(self):
+        primeira = self._credito(**{'Idempotency-Key': 'pedido-1'})
+
+        repeticao = self._credito(**{'Idempotency-Key': 'pedido-1'})
+        nova = self._credito(**{'Idempotency-Key': 'pedido-2'})
+
+        self.assertEqual(primeira.status_code, 202)
+        self.assertEqual(repeticao.status_code, 202)
+        self.assertEqual(repeticao['Idempotent-Replayed'], 'true')
+        self.assertEqual(nova.status_code, 429)
+        self.assertEqual(nova['Retry-After'], str(nova.json()['retry_after']))
+        self.assertEqual(CreditoJob.objects.count(), 1)
+
+    def test_balde_da_carteira_vale_para_qualquer_estabelecimento(self):
+        corpo = {'chave_privada': CHAVE, 'carteira_destino': CARTEIRA, 'valor': 0.01}
+
+        primeira = self._post('/creditar-moedas/?estabelecimento=1', corpo)
+        outro = self._post('/creditar-moedas/?estabelecimento=2', corpo)
+        outra_chave = self._post('/creditar-moedas/?estabelecimento=2', {**corpo, 'chave_privada': 'outra-chave'})
+
+        self.assertEqual(primeira.status_code, 202)
+        self.assertEqual(outro.status_code, 429)
+        self.assertEqual(outra_chave.status_code, 202)
+
+    @override_settings(CREDITO_TAXA=0, CREDITO_FILA_MAX=3)
+    def test_fila_cheia(self):
+        lote = {'chave_privada': CHAVE, 'destinos': [{'carteira_destino': CARTEIRA, 'valor': 0.01}] * 2}
+        self.assertEqual(self._credito(**{'Idempotency-Key': 'pedido-1'}).status_code, 202)
+        self.assertEqual(self._post('/creditar-moedas/lote/', lote).status_code, 202)
+
+        cheia = self._post('/creditar-moedas/lote/', lote)
+        repeticao = self._credito(**{'Idempotency-Key': 'pedido-1'})
+        nova = self._credito(**{'Idempotency-Key': 'pedido-2'})
+
+        self.assertEqual(cheia.status_code, 503)
+        self.assertEqual(cheia['Retry-After'], '5')
+        self.assertEqual(repeticao.status_code, 202)
+        self.assertEqual(nova.status_code, 503)
+        self.assertEqual(CreditoJob.objects.filter(status=CreditoJob.Status.QUEUED).count(), 3)
+
+
+class PaginacaoKeysetTests(TestCase):
+    def setUp(self):
+        self.estabelecimento = Estabelecimento.objects.create(nome='Loja')
+        agora = timezone.now()
+        # pares com o mesmo criado_em: o id desempata
+        self.clientes = [
+            Cliente.objects.create(
+                estabelecimento=self.estabelecimento, nome=f'C{i}', criado_em=agora - timedelta(minutes=i // 2),
+            )
+            for i in range(7)
+        ]
+        self.consulta = Cliente.objects.filter(estabelecimento=self.estabelecimento)
+
+    def _ids(self, pagina):
+        return [c.pk for c in pagina.itens]
+
+    def test_percorre_sem_repetir_nem_pular(self):
+        esperado = [c.pk for c in sorted(self.clientes, key=lambda c: (c.criado_em, c.pk), reverse=True)]
+        vistos, params = [], {}
+        while True:
+            pagina = paginar_keyset(self.consulta, params, tamanho=3)
+            vistos += self._ids(pagina)
+            if not pagina.apos:
+                break
+            params = {'apos': pagina.apos}
+
+        self.assertEqual(vistos, esperado)
+
+    def test_volta_para_a_pagina_anterior(self):
+        primeira = paginar_keyset(self.consulta, {}, tamanho=3)
+        segunda = paginar_keyset(self.consulta, {'apos': primeira.apos}, tamanho=3)
+
+        anterior = paginar_keyset(self.consulta, {'antes': segunda.antes}, tamanho=3)
+
+        self.assertEqual(self._ids(anterior), self._ids(primeira))
+        self.assertIsNone(primeira.antes)
+
+    def test_insercao_nao_desloca_a_proxima_pagina(self):
+        primeira = paginar_keyset(self.consulta, {}, tamanho=3)
+        esperada = self._ids(paginar_keyset(self.consulta, {'apos': primeira.apos}, tamanho=3))
+
+        Cliente.objects.create(estabelecimento=self.estabelecimento, nome='Novo')
+
+        self.assertEqual(self._ids(paginar_keyset(self.consulta, {'apos': primeira.apos}, tamanho=3)), esperada)
+
+    def test_cursor_invalido_volta_para_a_primeira(self):
+        primeira = self._ids(paginar_keyset(self.consulta, {}, tamanho=3))
+        for cursor in ('lixo', '!!!', 'MjAyNnxhYmM'):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self._ids(paginar_keyset(self.consulta, {'apos': cursor}, tamanho=3)), primeira)
+
+
+class BuscaClientesTests(TestCase):
+    def setUp(self):
+        self.estabelecimento = Estabelecimento.objects.create(nome='Loja')
+        Cliente.objects.create(estabelecimento=self.estabelecimento, nome='Mariana Lima')
+        Cliente.objects.create(estabelecimento=self.estabelecimento, nome='Ana Souza', email='contato@exemplo.com')
+        bruno = Cliente.objects.create(
+            estabelecimento=self.estabelecimento, nome='Bruno Anastácio', telefone='+55 (11) 98765-4321',
+        )
+        Carteira.objects.create(cliente=bruno, endereco=CARTEIRA)
+        outra = Estabelecimento.objects.create(nome='Outra')
+        Cliente.objects.create(estabelecimento=outra, nome='Ana de outra loja')
+
+    def _nomes(self, termo, limite=None):
+        return [c.nome for c in buscar_clientes(self.estabelecimento.pk, termo, limite)]
+
+    def test_relevancia_nome_palavra_trecho(self):
+        self.assertEqual(self._nomes('ana'), ['Ana Souza', 'Bruno Anastácio', 'Mariana Lima'])
+
+    def test_acentos_e_maiusculas(self):
+        self.assertEqual(self._nomes('ANASTACIO'), ['Bruno Anastácio'])
+
+    def test_telefone_com_ou_sem_mascara(self):
+        for termo in ('(11) 98765', '1198765', '4321'):
+            with self.subTest(termo=termo):
+                self.assertEqual(self._nomes(termo), ['Bruno Anastácio'])
+
+    def test_email_e_carteira(self):
+        self.assertEqual(self._nomes('contato@'), ['Ana Souza'])
+        self.assertEqual(self._nomes(CARTEIRA[:8]), ['Bruno Anastácio'])
+
+    def test_termo_curto_e_limite(self):
+        self.assertEqual(self._nomes('a'), [])
+        self.assertEqual(len(self._nomes('ana', limite=1)), 1)
+        with override_settings(BUSCA_LIMITE_MAX=2):
+            self.assertEqual(len(self._nomes('ana', limite=50)), 2)
+
+
+class BaldesTests(SimpleTestCase):
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.baldes = BaldesSqlite(os.path.join(diretorio.name, 'limites.sqlite3'))
+        self.addCleanup(lambda: self.baldes._conexao().close())
+        self.agora = 1000.0
+        relogio = mock.patch('app.limites.time.time', lambda: self.agora)
+        relogio.start()
+        self.addCleanup(relogio.stop)
+
+    def test_rajada_espera_e_reposicao(self):
+        self.assertEqual([self.baldes.consumir('a', taxa=2, capacidade=3) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(self.baldes.consumir('a', taxa=2, capacidade=3), 0.5)
+
+        self.agora += 0.5
+
+        self.assertEqual(self.baldes.consumir('a', taxa=2, capacidade=3), 0)
+        self.assertGreater(self.baldes.consumir('a', taxa=2, capacidade=3), 0)
+
+    def test_um_balde_por_chave(self):
+        self.baldes.consumir('a', taxa=1, capacidade=1)
+
+        self.assertGreater(self.baldes.consumir('a', taxa=1, capacidade=1), 0)
+        self.assertEqual(self.baldes.consumir('b', taxa=1, capacidade=1), 0)
+
+    def test_nao_acumula_alem_da_capacidade(self):
+        self.baldes.consumir('a', taxa=1, capacidade=2)
+        self.agora += 3600
+
+        self.assertEqual([self.baldes.consumir('a', taxa=1, capacidade=2) for _ in range(2)], [0, 0])
+        self.assertGreater(self.baldes.consumir('a', taxa=1, capacidade=2), 0)
+
+
+class HostsInternosTests(TestCase):
+    def test_healthcheck_com_host_desconhecido_nao_altera_allowed_hosts(self):
+        from django.conf import settings
+
+        antes = list(settings.ALLOWED_HOSTS)
+        for _ in range(3):
+            response = self.client.get('/health/', HTTP_HOST='172.18.0.5:8000')
+            self.assertEqual(response.status_code, 200)
+        response = self.client.get('/healthz/', HTTP_HOST='127.0.0.9')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(settings.ALLOWED_HOSTS, antes)
+
+    def test_host_desconhecido_fora_do_healthcheck_continua_recusado(self):
+        self.client.get('/health/', HTTP_HOST='evil.example')
+
+        response = self.client.get('/healthz/', HTTP_HOST='evil.example')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class FrenteProbesTests(SimpleTestCase):
+    def _django(self, *args):
+        raise AssertionError('probe chegou ao Django')
+
+    def _wsgi(self, metodo):
+        inicio = {}
+        corpo = FrenteWSGI(self._django)(
+            {'REQUEST_METHOD': metodo, 'PATH_INFO': '/health/'},
+            lambda status, cabecalhos: inicio.update(status=status, cabecalhos=dict(cabecalhos)),
+        )
+        return inicio['status'], inicio['cabecalhos'], b''.join(corpo)
+
+    async def _asgi(self, metodo):
+        mensagens = []
+
+        async def send(mensagem):
+            mensagens.append(mensagem)
+
+        await FrenteASGI(self._django)({'type': 'http', 'method': metodo, 'path': '/health/'}, None, send)
+        return mensagens[0]['status'], dict(mensagens[0]['headers']), mensagens[1]['body']
+
+    def test_head_no_wsgi_sem_corpo(self):
+        status, cabecalhos, corpo = self._wsgi('GET')
+        self.assertEqual((status, len(corpo)), ('200 OK', int(cabecalhos['Content-Length'])))
+
+        status, cabecalhos_head, corpo = self._wsgi('HEAD')
+
+        self.assertEqual((status, corpo), ('200 OK', b''))
+        self.assertEqual(cabecalhos_head, cabecalhos)
+
+    async def test_head_no_asgi_sem_corpo(self):
+        status, cabecalhos, corpo = await self._asgi('GET')
+        self.assertEqual((status, len(corpo)), (200, int(cabecalhos[b'content-length'])))
+
+        status, cabecalhos_head, corpo = await self._asgi('HEAD')
+
+        self.assertEqual((status, corpo), (200, b''))
+        self.assertEqual(cabecalhos_head, cabecalhos)
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'precisa de os.fork')
+class LogAposForkTests(SimpleTestCase):
+    """Preload do gunicorn: handler e middleware criados no master, usados no worker."""
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.diretorio.cleanup)
+        self.arquivo = os.path.join(self.diretorio.name, 'requests.log')
+        self.handler = FilaHandler(arquivo=self.arquivo, console=False)
+        self.handler.setFormatter(JsonFormatter())
+        self.addCleanup(self.handler.close)
+        logger = logging.getLogger('toknid.requisicoes')
+        self.addCleanup(setattr, logger, 'handlers', logger.handlers)
+        logger.handlers = [self.handler]
+
+    def _linhas(self):
+        with open(self.arquivo, encoding='utf-8') as arquivo:
+            return [json.loads(linha) for linha in arquivo]
+
+    def test_worker_grava_o_log_de_requisicoes(self):
+        middleware = DebugHostMiddleware(lambda request: None)
+        middleware(RequestFactory().get('/no-master/'))  # listener do master já rodando
+
+        pid = os.fork()
+        if pid == 0:
+            codigo = 1
+            try:
+                middleware(RequestFactory().get('/no-worker/'))
+                self.handler.parar_listener()
+                codigo = 0
+            finally:
+                os._exit(codigo)
+        _, status = os.waitpid(pid, 0)
+        self.handler.parar_listener()
+
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        registros = {linha['path']: linha['pid'] for linha in self._linhas()}
+        self.assertEqual(registros, {'/no-master/': os.getpid(), '/no-worker/': pid})
+
+
+class PrerenderizadaTests(SimpleTestCase):
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(PRERENDER_ROOT=diretorio.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        gravar_manifest({'ajuda/teste': gravar_prerenderizada('ajuda/teste', '<p>ajuda</p>')})
+
+    def _resposta(self, accept_encoding):
+        request = RequestFactory().get('/ajuda/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return resposta_prerenderizada(request, 'ajuda/teste')
+
+    def test_gzip_so_quando_aceito(self):
+        casos = {'gzip, br': True, 'br;q=1.0, gzip;q=0.5': True, 'gzip;q=0': False, 'gzip;q=0, *': False, '': False}
+        for accept_encoding, comprimida in casos.items():
+            with self.subTest(accept_encoding=accept_encoding):
+                resposta = self._resposta(accept_encoding)
+                self.assertEqual(resposta.has_header('Content-Encoding'), comprimida)
+                if not comprimida:
+                    self.assertEqual(resposta.content, b'<p>ajuda</p>')
+
+
+class VersaoFragmentosTests(SimpleTestCase):
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.diretorio = diretorio.name
+        configuracao = override_settings(
+            CACHES={**settings.CACHES, 'versoes': {**settings.CACHES['versoes'], 'LOCATION': self.diretorio}},
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def test_invalidacao_vale_para_os_outros_processos(self):
+        from django.core.cache.backends.filebased import FileBasedCache
+
+        antes = versao_fragmentos()
+        versao = invalidar_fragmentos()
+
+        # outro worker: outra instância do cache, lendo os mesmos arquivos
+        outro = FileBasedCache(self.diretorio, {})
+        self.assertEqual(outro.get(CHAVE_VERSAO), versao)
+        self.assertNotEqual(versao_fragmentos(), antes)
+        self.assertNotEqual(invalidar_fragmentos(), versao)
+
+
+class MetricasWorkersTests(TestCase):
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.diretorio = diretorio.name
+        configuracao = override_settings(METRICAS_DIR=self.diretorio)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def _snapshot(self, pid, recusas):
+        outro = Metricas()
+        outro.contar('toknid_credito_recusados_total', recusas, ajuda='Recusas', motivo='taxa')
+        with open(os.path.join(self.diretorio, f'{pid}.json'), 'w') as arquivo:
+            json.dump(outro.exportar(), arquivo)
+
+    def _recusas(self):
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        for linha in response.content.decode().splitlines():
+            if linha.startswith('toknid_credito_recusados_total{motivo="taxa"}'):
+                return int(linha.rsplit(' ', 1)[1])
+        return 0
+
+    @override_settings(SECURE_SSL_REDIRECT=True)
+    def test_scrape_em_http_sem_redirect(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 200)
+        self.assertEqual(self.client.get('/healthz/').status_code, 301)
+
+    def test_soma_os_outros_workers_e_os_encerrados(self):
+        proprias = self._recusas()  # deste processo (outros testes recusam créditos)
+        self._snapshot(999991, 3)
+        self._snapshot(999992, 4)
+        self.assertEqual(self._recusas(), proprias + 7)
+
+        encerrar_processo(999991)  # worker reciclado: o total não cai
+
+        self.assertFalse(os.path.exists(os.path.join(self.diretorio, '999991.json')))
+        self.assertEqual(self._recusas(), proprias + 7)
+
+
+class ServerTimingTests(TestCase):
+    @override_settings(SERVER_TIMING=False)
+    def test_desligado_por_padrao(self):
+        self.assertFalse(self.client.get('/healthz/').has_header('Server-Timing'))
+
+    @override_settings(SERVER_TIMING='staff')
+    def test_staff_so_para_staff(self):
+        self.assertFalse(self.client.get('/clientes/buscar/').has_header('Server-Timing'))
+        self.client.force_login(User.objects.create(username='admin', is_staff=True))
+        self.assertTrue(self.client.get('/clientes/buscar/').has_header('Server-Timing'))
+
+
+# sem collectstatic nos testes: {% static %} sem manifest
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class VersaoConteudoTests(TestCase):
+    def setUp(self):
+        self.estabelecimento = Estabelecimento.objects.create(nome='Loja')
+
+    def test_cliente_novo_muda_o_etag_da_busca(self):
+        url = '/clientes/buscar/?q=ana'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Cliente.objects.create(estabelecimento=self.estabelecimento, nome='Ana Souza')
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([r['nome'] for r in response.json()['resultados']], ['Ana Souza'])
+
+    def test_transacoes_responde_304_sem_mudanca(self):
+        etag = self.client.get('/transacoes/')['ETag']
+
+        response = self.client.get('/transacoes/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_invalidacao_em_outro_processo_muda_o_etag(self):
+        from django.core.cache.backends.filebased import FileBasedCache
+
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        with override_settings(CACHES={**settings.CACHES, 'versoes': {**settings.CACHES['versoes'], 'LOCATION': diretorio.name}}):
+            etag = self.client.get('/transacoes/')['ETag']
+            # o admin ou o processar_creditos, com a sua própria instância do cache
+            FileBasedCache(diretorio.name, {}).set(CHAVE_VERSAO, 'outro-processo', timeout=None)
+
+            response = self.client.get('/transacoes/', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ImportacaoTests(TestCase):
+    csv = 'nome;telefone;email\nAna Souza;11987654321;ana@exemplo.com\nBruno;11912345678;\n'
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(IMPORTACAO_DIR=diretorio.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.estabelecimento = Estabelecimento.objects.create(nome='Loja')
+        self.staff = User.objects.create(username='equipe', is_staff=True)
+
+    def _planilha(self, conteudo):
+        return ler_linhas(io.BytesIO(conteudo.encode()), 'clientes.csv')
+
+    def _importar(self, client, conteudo=None):
+        arquivo = SimpleUploadedFile('clientes.csv', (conteudo or self.csv).encode())
+        return client.post(f'/clientes/importar/?estabelecimento={self.estabelecimento.pk}', {'arquivo': arquivo})
+
+    def test_exige_staff(self):
+        self.assertEqual(self._importar(self.client).status_code, 403)
+        self.client.force_login(User.objects.create(username='parceiro'))
+        self.assertEqual(self._importar(self.client).status_code, 403)
+        self.assertFalse(Cliente.objects.exists())
+
+    def test_exige_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.staff)
+
+        self.assertEqual(self._importar(client).status_code, 403)
+        self.assertFalse(Cliente.objects.exists())
+
+    def test_importa_e_invalida_busca_e_fragmentos(self):
+        self.client.force_login(self.staff)
+        fragmentos = versao_fragmentos()
+        busca = self.client.get('/clientes/buscar/?q=ana')['ETag']
+
+        response = self._importar(self.client)
+
+        linhas = [json.loads(linha) for linha in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(linhas[-1]['importados'], 2)
+        self.assertIsNone(linhas[-1]['erros_url'])
+        self.assertNotEqual(versao_fragmentos(), fragmentos)
+        response = self.client.get('/clientes/buscar/?q=ana', HTTP_IF_NONE_MATCH=busca)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['nome'] for r in response.json()['resultados']], ['Ana Souza'])
+
+    def test_repetidos_no_banco_e_no_arquivo(self):
+        Cliente.objects.create(estabelecimento=self.estabelecimento, nome='Ana', telefone='+55 (11) 98765-4321')
+        conteudo = self.csv + 'Bruno de novo;(11) 91234-5678;\nCarla;;carla@exemplo.com\n'
+
+        progresso = list(importar_clientes(self.estabelecimento, self._planilha(conteudo)))[-1]
+
+        self.assertEqual(progresso, {'lidas': 4, 'importados': 2, 'duplicados': 2, 'invalidos': 0})
+
+    def test_cadastro_durante_a_importacao_nao_duplica(self):
+        # o cadastro entra entre a consulta de duplicados e o insert
+        with mock.patch('app.importacao._duplicados', return_value=[None, None]):
+            Cliente.objects.create(estabelecimento=self.estabelecimento, nome='Ana', email='ana@exemplo.com')
+            progresso = list(importar_clientes(self.estabelecimento, self._planilha(self.csv)))[-1]
+
+        self.assertEqual(progresso['importados'], 1)
+        self.assertEqual(progresso['duplicados'], 1)
+        self.assertEqual(Cliente.objects.filter(email='ana@exemplo.com').count(), 1)
+
+    def test_telefone_unico_no_estabelecimento(self):
+        Cliente.objects.create(estabelecimento=self.estabelecimento, nome='Ana', telefone='+55 (11) 98765-4321')
+        Cliente.objects.create(estabelecimento=self.estabelecimento, nome='Sem telefone')
+        Cliente.objects.create(estabelecimento=self.estabelecimento, nome='Outro sem telefone')
+
+        with self.assertRaises(IntegrityError):
+            Cliente.objects.create(estabelecimento=self.estabelecimento, nome='Bia', telefone='+55 (11) 98765-4321')
+
+    @override_settings(IMPORTACAO_SINCRONA_MAX_BYTES=10)
+    def test_planilha_grande_vai_para_a_fila(self):
+        self.client.force_login(self.staff)
+
+        response = self._importar(self.client, self.csv + 'Sem nome válido;123;\n')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Cliente.objects.exists())
+        status_url = response.json()['status_url']
+        self.assertEqual(self.client.get(status_url).json()['status'], 'queued')
+
+        job = reservar_importacao()
+        self.assertIsNone(reservar_importacao())
+        executar_importacao(job)
+
+        status = self.client.get(status_url).json()
+        self.assertEqual(status['status'], ImportacaoJob.Status.DONE)
+        self.assertEqual((status['importados'], status['invalidos']), (2, 1))
+        self.assertEqual(self.client.get(status['erros_url']).status_code, 200)
+        self.assertEqual(Cliente.objects.count(), 2)
+
+
+# worker que responde ao stats depois de 0,5 s (no lugar do Node)
+class ExportacaoTests(TestCase):
+    def setUp(self):
+        self.estabelecimento = Estabelecimento.objects.create(nome='Loja')
+        cliente = Cliente.objects.create(estabelecimento=self.estabelecimento, nome='Ana')
+        registrar_transacao(cliente, Transacao.Tipo.CREDITO, 10)
+        self.url = f'/transacoes/exportar/?estabelecimento={self.estabelecimento.pk}'
+
+    def test_exige_staff(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_login(User.objects.create(username='parceiro'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_staff_exporta(self):
+        self.client.force_login(User.objects.create(username='equipe', is_staff=True))
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Ana', b''.join(response.streaming_content).decode())
+
+
+WORKER_LENTO = (
+    'import json, sys, time\n'
+    'for linha in sys.stdin:\n'
+    '    pedido = json.loads(linha)\n'
+    '    time.sleep(0.5)\n'
+    '    print(json.dumps({"id": pedido["id"], "cache": {"total": {"hits": 1, "misses": 0}}}), flush=True)\n'
+)
+
+
+WORKER_MUDO = (
+    'import json, sys\n'
+    'for linha in sys.stdin:\n'
+    '    pedido = json.loads(linha)\n'
+    '    print(json.dumps({"id": pedido["id"], "assinada": {"signature": "sig-1", "indices": [0]}}), flush=True)\n'
+)
+
+
+class EstatisticasSignerTests(SimpleTestCase):
+    def test_timeout_traz_as_transacoes_assinadas(self):
+        with mock.patch('app.signer._comando_worker', return_value=([sys.executable, '-c', WORKER_MUDO], False)):
+            pool = SignerPool(tamanho=1, intervalo_healthcheck=3600)
+        self.addCleanup(pool.encerrar)
+
+        with self.assertRaises(SignerTimeout) as contexto:
+            pool.transferir_lote(CHAVE, [{'carteira_destino': CARTEIRA}], timeout=1)
+
+        self.assertEqual(contexto.exception.assinadas, [{'signature': 'sig-1', 'indices': [0]}])
+
+    def test_workers_consultados_em_paralelo(self):
+        with mock.patch('app.signer._comando_worker', return_value=([sys.executable, '-c', WORKER_LENTO], False)):
+            pool = SignerPool(tamanho=3, intervalo_healthcheck=3600)
+        self.addCleanup(pool.encerrar)
+
+        inicio = time.monotonic()
+        estatisticas = pool.estatisticas(timeout=2)
+
+        self.assertLess(time.monotonic() - inicio, 1.2)
+        self.assertEqual(estatisticas['total']['hits'], 3)
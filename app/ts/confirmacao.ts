@@ -0,0 +1,295 @@
+/**
+ * Rastreador de confirmações das transações enviadas pelo signer-worker.
+ *
+ * Em vez de cada crédito esperar a própria confirmação (sendAndConfirmTransaction
+ * abre uma assinatura e consulta getSignatureStatus por transação), as
+ * transações enviadas entram num mapa de pendentes e um único timer consulta
+ * todas com getSignatureStatuses, até 256 assinaturas por chamada. A cada tick:
+ * - confirmadas resolvem quem espera; as que falharam na execução rejeitam;
+ * - sem status: os mesmos bytes assinados são reenviados a cada
+ *   intervaloReenvioMs, até a altura de bloco passar do lastValidBlockHeight
+ *   do blockhash, quando a transação não pode mais entrar e a espera falha.
+ *
+ * A signature sai dos próprios bytes assinados, então a transação entra nos
+ * pendentes antes do primeiro envio: um erro no sendRawTransaction (timeout,
+ * RPC que caiu depois de repassar) não diz se ela chegou à rede, e ela segue
+ * consultada e reenviada até o lastValidBlockHeight como qualquer outra. A
+ * exceção é a simulação do preflight recusar a transação: ela foi executada
+ * e falhou, então a espera falha na hora.
+ *
+ * A carga no RPC cresce com os ticks, não com o número de créditos pendentes.
+ *
+ * Configuração por ambiente:
+ *   SOLANA_CONFIRMACAO_INTERVALO_MS  intervalo entre consultas (padrão: 500)
+ *   SOLANA_REENVIO_INTERVALO_MS      intervalo entre reenvios de uma transação (padrão: 2000)
+ */
+
+import { Commitment, SendTransactionError, SignatureStatus } from "@solana/web3.js";
+import bs58 from "bs58";
+import { PoolRpc } from "./rpc-pool";
+
+// getSignatureStatuses aceita no máximo 256 assinaturas por chamada
+const MAX_ASSINATURAS_POR_CONSULTA = 256;
+
+// Limites (segundos) do histograma de latência de confirmação; um blockhash vale ~60-90s
+const BUCKETS_SEGUNDOS = [0.5, 1, 2, 5, 10, 20, 30, 60, 90];
+
+interface OpcoesRastreador {
+  intervaloMs?: number;
+  intervaloReenvioMs?: number;
+  commitment?: Commitment;
+}
+
+interface Pendente {
+  bruta: Buffer;
+  lastValidBlockHeight: number;
+  enviadaEm: number;
+  ultimoEnvio: number;
+  // Erro do último envio que falhou; entra na mensagem se o blockhash expirar
+  erroEnvio?: string;
+  espera: Promise<string>;
+  resolver: (signature: string) => void;
+  rejeitar: (erro: Error) => void;
+}
+
+/**
+ * Signature (id na rede) de uma transação serializada: a primeira assinatura,
+ * depois da quantidade de assinaturas (compact-u16, um byte até 127)
+ */
+function signatureDe(bruta: Buffer): string {
+  if (bruta.length < 65 || bruta[0] === 0 || bruta[0] > 0x7f) {
+    throw new Error("transação serializada sem assinatura");
+  }
+  return bs58.encode(bruta.subarray(1, 65));
+}
+
+/**
+ * Recusa definitiva do preflight: a simulação executou a transação e ela falhou
+ * (saldo, conta, programa). Blockhash que o nó ainda não viu e transação já
+ * processada não dizem nada sobre a rede; erros do nó (atrasado, fora do ar)
+ * nem chegam a simular.
+ */
+function recusadaNaSimulacao(error: any): boolean {
+  if (!(error instanceof SendTransactionError)) return false;
+  const mensagem = error.transactionError.message ?? "";
+  return mensagem.includes("Transaction simulation failed")
+    && !/Blockhash not found|already been processed/i.test(mensagem);
+}
+
+class RastreadorConfirmacoes {
+  private intervaloMs: number;
+  private intervaloReenvioMs: number;
+  private commitment: Commitment;
+
+  private pendentes = new Map<string, Pendente>();
+  private timer: NodeJS.Timeout | null = null;
+  private emTick = false;
+  // Altura de bloco lida no tick anterior, antes da consulta de status do tick atual
+  private alturaBloco = 0;
+
+  readonly contadores = { confirmadas: 0, falhas: 0, expiradas: 0, reenvios: 0, consultas: 0 };
+  private latencia = { contagens: BUCKETS_SEGUNDOS.map(() => 0), soma: 0, total: 0 };
+
+  constructor(private rpc: PoolRpc, opcoes: OpcoesRastreador = {}) {
+    this.intervaloMs = opcoes.intervaloMs ?? 500;
+    this.intervaloReenvioMs = opcoes.intervaloReenvioMs ?? 2_000;
+    this.commitment = opcoes.commitment ?? "confirmed";
+  }
+
+  static doAmbiente(rpc: PoolRpc): RastreadorConfirmacoes {
+    const numero = (valor: string | undefined) => (valor ? Number(valor) : undefined);
+    return new RastreadorConfirmacoes(rpc, {
+      intervaloMs: numero(process.env.SOLANA_CONFIRMACAO_INTERVALO_MS),
+      intervaloReenvioMs: numero(process.env.SOLANA_REENVIO_INTERVALO_MS),
+    });
+  }
+
+  /**
+   * Envia a transação assinada (com simulação prévia) e espera a confirmação
+   * @param bruta - Transação serializada
+   * @param lastValidBlockHeight - Última altura de bloco em que o blockhash da transação vale
+   * @returns Signature da transação confirmada
+   */
+  async enviar(bruta: Buffer, lastValidBlockHeight: number): Promise<string> {
+    const signature = signatureDe(bruta);
+    // Acompanhada antes do envio: se ele falhar, a transação pode ter chegado à rede mesmo assim
+    const espera = this.acompanhar(signature, bruta, lastValidBlockHeight);
+    try {
+      // maxRetries 0: o reenvio é feito pelo rastreador, não pelo nó RPC.
+      // Reenviar a mesma transação assinada em outro endpoint não duplica a transferência.
+      await this.rpc.executar((c) => c.sendRawTransaction(bruta, {
+        preflightCommitment: this.commitment,
+        maxRetries: 0,
+      }));
+    } catch (error: any) {
+      if (recusadaNaSimulacao(error)) {
+        this.contadores.falhas++;
+        this.encerrar(signature, new Error(`recusada na simulação: ${error.transactionError.message}`));
+        return espera;
+      }
+      const pendente = this.pendentes.get(signature);
+      if (pendente) pendente.erroEnvio = error?.message || String(error);
+      console.error(`Falha ao enviar ${signature}, segue acompanhada:`, error?.message || error);
+    }
+    return espera;
+  }
+
+  /**
+   * Status na rede de transações enviadas antes, por este ou por outro processo
+   * (getSignatureStatuses com o histórico). Só as que a rede conhece entram no resultado.
+   */
+  async consultar(signatures: string[]): Promise<Record<string, { confirmada: boolean; erro: string | null }>> {
+    const resultado: Record<string, { confirmada: boolean; erro: string | null }> = {};
+    for (let i = 0; i < signatures.length; i += MAX_ASSINATURAS_POR_CONSULTA) {
+      const bloco = signatures.slice(i, i + MAX_ASSINATURAS_POR_CONSULTA);
+      const { value } = await this.rpc.ler((c) => c.getSignatureStatuses(bloco, { searchTransactionHistory: true }));
+      this.contadores.consultas++;
+      value.forEach((status, j) => {
+        if (status === null) return;
+        resultado[bloco[j]] = {
+          confirmada: !status.err && this.confirmada(status),
+          erro: status.err ? JSON.stringify(status.err) : null,
+        };
+      });
+    }
+    return resultado;
+  }
+
+  /**
+   * Acompanha uma transação já enviada até confirmar, falhar ou o blockhash expirar
+   */
+  acompanhar(signature: string, bruta: Buffer, lastValidBlockHeight: number): Promise<string> {
+    const existente = this.pendentes.get(signature);
+    if (existente) {
+      return existente.espera;
+    }
+    const agora = Date.now();
+    let resolver!: (signature: string) => void;
+    let rejeitar!: (erro: Error) => void;
+    const espera = new Promise<string>((res, rej) => {
+      resolver = res;
+      rejeitar = rej;
+    });
+    this.pendentes.set(signature, {
+      bruta, lastValidBlockHeight, enviadaEm: agora, ultimoEnvio: agora, espera, resolver, rejeitar,
+    });
+    this.iniciar();
+    return espera;
+  }
+
+  private iniciar() {
+    // O timer só existe enquanto há pendentes: sem nada a confirmar, nenhuma consulta ao RPC
+    if (this.timer) return;
+    this.timer = setInterval(() => {
+      this.tick().catch((error) => {
+        console.error("Falha ao consultar confirmações:", error?.message || error);
+      });
+    }, this.intervaloMs);
+  }
+
+  private parar() {
+    if (this.timer) {
+      clearInterval(this.timer);
+      this.timer = null;
+    }
+  }
+
+  private async tick() {
+    if (this.emTick) return;
+    this.emTick = true;
+    try {
+      const assinaturas = [...this.pendentes.keys()];
+      const consultas = [];
+      for (let i = 0; i < assinaturas.length; i += MAX_ASSINATURAS_POR_CONSULTA) {
+        const bloco = assinaturas.slice(i, i + MAX_ASSINATURAS_POR_CONSULTA);
+        consultas.push(
+          this.rpc.ler((c) => c.getSignatureStatuses(bloco)).then(({ value }) => {
+            value.forEach((status, j) => this.aplicar(bloco[j], status));
+          })
+        );
+      }
+      this.contadores.consultas += consultas.length;
+      await Promise.all(consultas);
+
+      const semStatus = assinaturas.filter((signature) => this.pendentes.has(signature));
+      if (semStatus.length === 0) return;
+      const agora = Date.now();
+      for (const signature of semStatus) {
+        const pendente = this.pendentes.get(signature)!;
+        // A altura foi lida antes desta consulta de status: se já tinha passado do
+        // lastValidBlockHeight e a transação ainda não aparece, ela não entra mais
+        if (this.alturaBloco > pendente.lastValidBlockHeight) {
+          const envio = pendente.erroEnvio ? `; último erro de envio: ${pendente.erroEnvio}` : "";
+          this.encerrar(signature, new Error(
+            `blockhash expirou sem a transação confirmar (válido até o bloco ${pendente.lastValidBlockHeight})${envio}`
+          ));
+          this.contadores.expiradas++;
+        } else if (agora - pendente.ultimoEnvio >= this.intervaloReenvioMs) {
+          pendente.ultimoEnvio = agora;
+          this.contadores.reenvios++;
+          this.rpc.executar((c) => c.sendRawTransaction(pendente.bruta, { skipPreflight: true, maxRetries: 0 }))
+            .catch((error) => {
+              pendente.erroEnvio = error?.message || String(error);
+              console.error(`Falha ao reenviar ${signature}:`, error?.message || error);
+            });
+        }
+      }
+      this.alturaBloco = await this.rpc.ler((c) => c.getBlockHeight(this.commitment));
+    } finally {
+      this.emTick = false;
+      if (this.pendentes.size === 0) this.parar();
+    }
+  }
+
+  private aplicar(signature: string, status: SignatureStatus | null) {
+    const pendente = this.pendentes.get(signature);
+    if (!pendente || status === null) return;
+    if (status.err) {
+      this.contadores.falhas++;
+      this.encerrar(signature, new Error(`erro na execução: ${JSON.stringify(status.err)}`));
+      return;
+    }
+    if (!this.confirmada(status)) return;
+
+    this.contadores.confirmadas++;
+    const segundos = (Date.now() - pendente.enviadaEm) / 1000;
+    BUCKETS_SEGUNDOS.forEach((limite, i) => {
+      if (segundos <= limite) this.latencia.contagens[i]++;
+    });
+    this.latencia.soma += segundos;
+    this.latencia.total++;
+    this.pendentes.delete(signature);
+    pendente.resolver(signature);
+  }
+
+  private confirmada(status: SignatureStatus): boolean {
+    return this.commitment === "finalized"
+      ? status.confirmationStatus === "finalized"
+      : status.confirmationStatus === "confirmed" || status.confirmationStatus === "finalized";
+  }
+
+  private encerrar(signature: string, erro: Error) {
+    const pendente = this.pendentes.get(signature);
+    if (!pendente) return;
+    this.pendentes.delete(signature);
+    pendente.rejeitar(erro);
+  }
+
+  /**
+   * Contadores e histograma de latência (acumulados, no formato do Prometheus)
+   */
+  estatisticas() {
+    return {
+      pendentes: this.pendentes.size,
+      ...this.contadores,
+      latencia: {
+        buckets: BUCKETS_SEGUNDOS,
+        contagens: [...this.latencia.contagens],
+        soma: this.latencia.soma,
+        total: this.latencia.total,
+      },
+    };
+  }
+}
+
+export { RastreadorConfirmacoes, MAX_ASSINATURAS_POR_CONSULTA };
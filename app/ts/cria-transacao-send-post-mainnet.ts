@@ -1,35 +1,76 @@
 import { 
-  Connection, 
   PublicKey, 
   SystemProgram, 
   Transaction, 
-  sendAndConfirmTransaction,
   LAMPORTS_PER_SOL,
-  Keypair
+  PACKET_DATA_SIZE,
+  Keypair,
+  TransactionInstruction
 } from "@solana/web3.js";
 import bs58 from "bs58";
+import { RastreadorConfirmacoes } from "./confirmacao";
+import { CacheRpc, UsoCache } from "./rpc-cache";
+import { PoolRpc } from "./rpc-pool";
+
+// Rent mínimo em Solana é aproximadamente 890,880 lamports (0.00089 SOL)
+const RENT_EXEMPT_MINIMUM = 890880;
+
+// Taxa estimada por assinatura (~5000 lamports)
+const TAXA_ESTIMADA = 5000;
+
+// Pool de endpoints RPC, cache e rastreador de confirmações são criados uma vez por
+// processo e reaproveitados entre créditos (o signer-worker é persistente)
+let contexto: { rpc: PoolRpc; cache: CacheRpc; confirmacoes: RastreadorConfirmacoes } | null = null;
+
+function obtemContexto() {
+  if (contexto === null) {
+    // ⚠️ CONEXÃO COM A REDE PRINCIPAL (MAINNET) - VALORES REAIS
+    // Endpoints em SOLANA_RPC_URLS (padrão: https://api.mainnet-beta.solana.com)
+    const rpc = PoolRpc.doAmbiente();
+    contexto = { rpc, cache: new CacheRpc(rpc), confirmacoes: RastreadorConfirmacoes.doAmbiente(rpc) };
+  }
+  return contexto;
+}
 
 /**
- * Cria e envia uma transação de envio de SOL na rede principal (Mainnet) - VALORES REAIS
- * @param chavePrivadaBase58 - Chave privada em formato base58
- * @param carteiraDestino - Chave pública da carteira de destino
- * @param valorMinimo - Se true, usa 1 lamport (valor mínimo), senão usa o valor informado ou do config
- * @param valorSOL - Valor em SOL (usado apenas se valorMinimo for false, opcional - usa config se não informado)
- * @returns Signature da transação enviada
+ * Contadores de cache (hits/misses) e latência por endpoint RPC acumulados pelo processo
  */
-async function criaEEnviaTransacaoSendMainnet(
-  chavePrivadaBase58: string,
-  carteiraDestino: string,
-  valorMinimo: boolean = true,
-  valorSOL?: number
-): Promise<string> {
-  // ⚠️ CONEXÃO COM A REDE PRINCIPAL (MAINNET) - VALORES REAIS
-  const connection = new Connection("https://api.mainnet-beta.solana.com", "confirmed");
-  
-  // Valor mínimo em Solana é 1 lamport = 0.000000001 SOL
-  const valorMinimoLamports = 1;
-  
-  // Validar e decodificar a chave privada
+function estatisticasCache() {
+  const { rpc, cache } = obtemContexto();
+  return { ...cache.estatisticas(), endpoints: rpc.estatisticas() };
+}
+
+/**
+ * Confirmações acompanhadas pelo processo: pendentes, reenvios e histograma de latência
+ */
+function estatisticasConfirmacoes() {
+  return obtemContexto().confirmacoes.estatisticas();
+}
+
+/**
+ * Status na rede de transações já enviadas (jobs que o Python deixou em "verificar")
+ */
+function consultaAssinaturas(signatures: string[]) {
+  return obtemContexto().confirmacoes.consultar(signatures);
+}
+
+interface OpcoesEnvio {
+  // Epoch (ms) a partir do qual nada mais é assinado: o processo Python já desistiu do pedido
+  prazo?: number;
+  // Chamado com a signature logo depois de assinar, antes do envio (indices: destinos do lote)
+  aoAssinar?: (signature: string, indices?: number[]) => void;
+}
+
+function conferePrazo(envio?: OpcoesEnvio) {
+  if (envio?.prazo !== undefined && Date.now() > envio.prazo) {
+    throw new Error("Prazo do pedido esgotado antes da assinatura; transação não enviada");
+  }
+}
+
+/**
+ * Decodifica a chave privada base58 (64 bytes) em um Keypair
+ */
+function decodificaKeypair(chavePrivadaBase58: string): Keypair {
   if (!chavePrivadaBase58 || chavePrivadaBase58.trim().length === 0) {
     throw new Error("Chave privada inválida ou vazia");
   }
@@ -44,7 +85,51 @@ async function criaEEnviaTransacaoSendMainnet(
     throw new Error(`Erro ao decodificar chave privada: ${error.message}`);
   }
   
-  const keypair = Keypair.fromSecretKey(secretKey);
+  return Keypair.fromSecretKey(secretKey);
+}
+
+/**
+ * Calcula o valor em lamports de uma transferência
+ * @param valorMinimo - Se true, usa 1 lamport (ou rent mínimo + 1 se a conta destino não existe)
+ * @param valorSOL - Valor em SOL (obrigatório quando valorMinimo for false)
+ * @param contaExiste - Se a conta destino já existe na rede
+ */
+function calculaLamports(valorMinimo: boolean, valorSOL: number | undefined, contaExiste: boolean): number {
+  // Valor mínimo em Solana é 1 lamport = 0.000000001 SOL
+  const valorMinimoLamports = 1;
+
+  if (valorMinimo) {
+    // Se usar valor mínimo e a conta não existe, precisa enviar rent mínimo
+    return contaExiste ? valorMinimoLamports : RENT_EXEMPT_MINIMUM + valorMinimoLamports;
+  }
+  // Usar valor do parâmetro (obrigatório quando valorMinimo é false)
+  if (valorSOL === undefined || valorSOL <= 0) {
+    throw new Error("Valor em SOL deve ser fornecido e maior que 0 quando valorMinimo for false");
+  }
+  return Math.floor(valorSOL * LAMPORTS_PER_SOL);
+}
+
+/**
+ * Cria e envia uma transação de envio de SOL na rede principal (Mainnet) - VALORES REAIS
+ * @param chavePrivadaBase58 - Chave privada em formato base58
+ * @param carteiraDestino - Chave pública da carteira de destino
+ * @param valorMinimo - Se true, usa 1 lamport (valor mínimo), senão usa o valor informado ou do config
+ * @param valorSOL - Valor em SOL (usado apenas se valorMinimo for false, opcional - usa config se não informado)
+ * @param uso - Contadores de cache deste crédito (opcional)
+ * @param envio - Prazo para assinar e aviso da signature antes do envio (opcional)
+ * @returns Signature da transação enviada
+ */
+async function criaEEnviaTransacaoSendMainnet(
+  chavePrivadaBase58: string,
+  carteiraDestino: string,
+  valorMinimo: boolean = true,
+  valorSOL?: number,
+  uso?: UsoCache,
+  envio?: OpcoesEnvio
+): Promise<string> {
+  const { cache, confirmacoes } = obtemContexto();
+  
+  const keypair = decodificaKeypair(chavePrivadaBase58);
   const fromPublicKey = keypair.publicKey;
   
   // Validar carteira destino
@@ -55,45 +140,27 @@ async function criaEEnviaTransacaoSendMainnet(
     throw new Error(`Carteira destino inválida: ${error.message}`);
   }
   
+  // Saldo da origem, existência da conta destino e blockhash: consultas independentes,
+  // em paralelo e servidas do cache quando possível
+  const [balance, [contaExiste], { blockhash, lastValidBlockHeight }] = await Promise.all([
+    cache.saldo(fromPublicKey, uso),
+    cache.contasExistem([toPublicKey], uso),
+    cache.blockhash(uso),
+  ]);
+  
   // Verificar saldo da conta origem
-  const balance = await connection.getBalance(fromPublicKey);
   if (balance === 0) {
     throw new Error("Conta origem não possui saldo suficiente");
   }
   
-  // Verificar se a conta destino existe
-  const accountInfo = await connection.getAccountInfo(toPublicKey);
-  const contaExiste = accountInfo !== null;
-  
-  // Se usar valor mínimo e a conta não existe, precisa enviar rent mínimo
-  // Rent mínimo em Solana é aproximadamente 890,880 lamports (0.00089 SOL)
-  const RENT_EXEMPT_MINIMUM = 890880;
-  
-  let valorLamports: number;
-  if (valorMinimo) {
-    if (contaExiste) {
-      valorLamports = valorMinimoLamports; // 1 lamport se a conta já existe
-    } else {
-      valorLamports = RENT_EXEMPT_MINIMUM + 1; // Rent mínimo + 1 lamport se a conta não existe
-    }
-  } else {
-    // Usar valor do parâmetro (obrigatório quando valorMinimo é false)
-    if (valorSOL === undefined || valorSOL <= 0) {
-      throw new Error("Valor em SOL deve ser fornecido e maior que 0 quando valorMinimo for false");
-    }
-    valorLamports = Math.floor(valorSOL * LAMPORTS_PER_SOL);
-  }
+  const valorLamports = calculaLamports(valorMinimo, valorSOL, contaExiste);
   
   // Verificar se há saldo suficiente (incluindo taxa de transação ~5000 lamports)
-  const taxaEstimada = 5000;
-  const saldoNecessario = valorLamports + taxaEstimada;
+  const saldoNecessario = valorLamports + TAXA_ESTIMADA;
   if (balance < saldoNecessario) {
     throw new Error(`Saldo insuficiente. Necessário: ${saldoNecessario / LAMPORTS_PER_SOL} SOL, Disponível: ${balance / LAMPORTS_PER_SOL} SOL`);
   }
   
-  // Obter o recent blockhash
-  const { blockhash, lastValidBlockHeight } = await connection.getLatestBlockhash("confirmed");
-  
   // Criar a transação
   const transaction = new Transaction({
     feePayer: fromPublicKey,
@@ -107,32 +174,183 @@ async function criaEEnviaTransacaoSendMainnet(
   );
   
   // Assinar a transação
+  conferePrazo(envio);
   transaction.sign(keypair);
   
   // Verificar se a transação está assinada
   if (!transaction.signature) {
     throw new Error("Falha ao assinar a transação");
   }
+  envio?.aoAssinar?.(bs58.encode(transaction.signature));
   
-  // Enviar e confirmar a transação
-  const signature = await sendAndConfirmTransaction(
-    connection,
-    transaction,
-    [keypair],
-    {
-      commitment: "confirmed",
-      maxRetries: 3,
-    }
-  );
+  // Descontar localmente antes de enviar, para créditos simultâneos verem o saldo atualizado
+  cache.debitar(fromPublicKey, saldoNecessario);
   
-  // Verificar se a transação foi confirmada
-  const status = await connection.getSignatureStatus(signature);
-  if (!status || !status.value || status.value.err) {
-    throw new Error(`Transação falhou: ${status?.value?.err || "Status desconhecido"}`);
+  // Enviar e esperar a confirmação pelo rastreador (lança erro se a transação
+  // falhar na rede ou o blockhash expirar antes de ela entrar)
+  let signature: string;
+  try {
+    signature = await confirmacoes.enviar(transaction.serialize(), lastValidBlockHeight);
+  } catch (error) {
+    cache.invalidarSaldo(fromPublicKey);
+    throw error;
   }
   
+  cache.registrarConta(toPublicKey);
   return signature;
 }
 
-export { criaEEnviaTransacaoSendMainnet };
+interface DestinoLote {
+  carteiraDestino: string;
+  valorMinimo?: boolean;
+  valorSOL?: number;
+}
+
+interface ResultadoLote {
+  indice: number;
+  sucesso: boolean;
+  signature?: string;
+  erro?: string;
+}
+
+/**
+ * Tamanho serializado de uma transação com um único assinante (fee payer)
+ */
+function tamanhoTransacao(transaction: Transaction): number {
+  // shortvec do número de assinaturas (1 byte) + 64 bytes por assinatura + mensagem
+  return 1 + 64 + transaction.serializeMessage().length;
+}
+
+/**
+ * Verifica se a instrução ainda cabe na transação sem passar do limite de pacote (1232 bytes)
+ */
+function cabeNaTransacao(transaction: Transaction, instrucao: TransactionInstruction): boolean {
+  transaction.instructions.push(instrucao);
+  try {
+    return tamanhoTransacao(transaction) <= PACKET_DATA_SIZE;
+  } finally {
+    transaction.instructions.pop();
+  }
+}
+
+/**
+ * Envia SOL para vários destinos empacotando o máximo de transferências por transação
+ * (rede principal - VALORES REAIS). As transações do lote são enviadas em paralelo.
+ * @param chavePrivadaBase58 - Chave privada em formato base58
+ * @param destinos - Lista de destinos (carteira, valorMinimo, valorSOL)
+ * @param uso - Contadores de cache deste lote (opcional)
+ * @param envio - Prazo para assinar e aviso de cada signature antes do envio (opcional)
+ * @returns Resultado por destino, na mesma ordem da entrada
+ */
+async function criaEEnviaTransacoesLoteMainnet(
+  chavePrivadaBase58: string,
+  destinos: DestinoLote[],
+  uso?: UsoCache,
+  envio?: OpcoesEnvio
+): Promise<ResultadoLote[]> {
+  const { cache, confirmacoes } = obtemContexto();
+  
+  const keypair = decodificaKeypair(chavePrivadaBase58);
+  const fromPublicKey = keypair.publicKey;
+  
+  const resultados: ResultadoLote[] = destinos.map((_, indice) => ({ indice, sucesso: false }));
+  
+  // Validar carteiras destino (inválidas falham sozinhas, sem derrubar o lote)
+  const validos: { indice: number; destino: DestinoLote; toPublicKey: PublicKey }[] = [];
+  destinos.forEach((destino, indice) => {
+    try {
+      validos.push({ indice, destino, toPublicKey: new PublicKey(destino.carteiraDestino) });
+    } catch (error: any) {
+      resultados[indice].erro = `Carteira destino inválida: ${error.message}`;
+    }
+  });
+  if (validos.length === 0) {
+    return resultados;
+  }
+  
+  // Saldo, blockhash e existência das contas destino em paralelo (com cache)
+  const [balance, { blockhash, lastValidBlockHeight }, contasExistem] = await Promise.all([
+    cache.saldo(fromPublicKey, uso),
+    cache.blockhash(uso),
+    cache.contasExistem(validos.map((v) => v.toPublicKey), uso),
+  ]);
+  
+  // Empacotar transferências: nova transação sempre que a atual estourar o limite de tamanho
+  const lotes: { transaction: Transaction; indices: number[]; custo: number }[] = [];
+  let atual: { transaction: Transaction; indices: number[]; custo: number } | null = null;
+  let saldoRestante = balance;
+  
+  for (let k = 0; k < validos.length; k++) {
+    const v = validos[k];
+    let valorLamports: number;
+    try {
+      valorLamports = calculaLamports(v.destino.valorMinimo === true, v.destino.valorSOL, contasExistem[k]);
+    } catch (error: any) {
+      resultados[v.indice].erro = error.message;
+      continue;
+    }
+    
+    const instrucao = SystemProgram.transfer({
+      fromPubkey: fromPublicKey,
+      toPubkey: v.toPublicKey,
+      lamports: valorLamports,
+    });
+    
+    if (atual === null || !cabeNaTransacao(atual.transaction, instrucao)) {
+      atual = {
+        transaction: new Transaction({ feePayer: fromPublicKey, blockhash, lastValidBlockHeight }),
+        indices: [],
+        custo: 0,
+      };
+    }
+    
+    // A taxa é paga uma vez por transação
+    const custo = valorLamports + (atual.indices.length === 0 ? TAXA_ESTIMADA : 0);
+    if (custo > saldoRestante) {
+      resultados[v.indice].erro = `Saldo insuficiente. Necessário: ${custo / LAMPORTS_PER_SOL} SOL, Disponível: ${saldoRestante / LAMPORTS_PER_SOL} SOL`;
+      continue;
+    }
+    
+    if (atual.indices.length === 0) {
+      lotes.push(atual);
+    }
+    atual.transaction.add(instrucao);
+    atual.indices.push(v.indice);
+    atual.custo += custo;
+    saldoRestante -= custo;
+  }
+  
+  // Enviar todas as transações do lote em paralelo; as confirmações são
+  // consultadas juntas pelo rastreador
+  const chavePorIndice = new Map(validos.map((v) => [v.indice, v.toPublicKey]));
+  await Promise.all(lotes.map(async (lote) => {
+    cache.debitar(fromPublicKey, lote.custo);
+    try {
+      conferePrazo(envio);
+      lote.transaction.sign(keypair);
+      envio?.aoAssinar?.(bs58.encode(lote.transaction.signature!), lote.indices);
+      const signature = await confirmacoes.enviar(lote.transaction.serialize(), lastValidBlockHeight);
+      for (const indice of lote.indices) {
+        resultados[indice] = { indice, sucesso: true, signature };
+        cache.registrarConta(chavePorIndice.get(indice)!);
+      }
+    } catch (error: any) {
+      cache.invalidarSaldo(fromPublicKey);
+      for (const indice of lote.indices) {
+        resultados[indice].erro = `Transação falhou: ${error?.message || String(error)}`;
+      }
+    }
+  }));
+  
+  return resultados;
+}
+
+export {
+  consultaAssinaturas,
+  criaEEnviaTransacaoSendMainnet,
+  criaEEnviaTransacoesLoteMainnet,
+  estatisticasCache,
+  estatisticasConfirmacoes,
+};
+export type { DestinoLote, OpcoesEnvio, ResultadoLote };
 
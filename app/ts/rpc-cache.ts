@@ -0,0 +1,203 @@
+/**
+ * Cache de consultas RPC do caminho de transferência.
+ *
+ * Vive dentro do processo do signer-worker (persistente), então é
+ * compartilhado por todos os créditos atendidos pelo worker:
+ * - blockhash recente, renovado em background
+ * - saldo da carteira origem, debitado localmente a cada transferência enviada
+ * - cache só-positivo de contas destino que já existem na rede
+ */
+
+import { PublicKey } from "@solana/web3.js";
+import { PoolRpc } from "./rpc-pool";
+
+// getMultipleAccountsInfo aceita no máximo 100 contas por chamada
+const MAX_CONTAS_POR_CONSULTA = 100;
+
+interface OpcoesCache {
+  ttlBlockhashMs?: number;
+  intervaloBlockhashMs?: number;
+  ttlSaldoMs?: number;
+  ttlContaMs?: number;
+}
+
+interface Blockhash {
+  blockhash: string;
+  lastValidBlockHeight: number;
+}
+
+/**
+ * Contadores de acertos/erros de cache; um por crédito e um global por worker
+ */
+interface UsoCache {
+  hits: number;
+  misses: number;
+}
+
+function novoUso(): UsoCache {
+  return { hits: 0, misses: 0 };
+}
+
+class CacheRpc {
+  private ttlBlockhashMs: number;
+  private intervaloBlockhashMs: number;
+  private ttlSaldoMs: number;
+  private ttlContaMs: number;
+
+  private blockhashAtual: (Blockhash & { obtidoEm: number }) | null = null;
+  private blockhashPendente: Promise<Blockhash> | null = null;
+  private renovacao: NodeJS.Timeout | null = null;
+
+  private saldos = new Map<string, { lamports: number; obtidoEm: number }>();
+  private contas = new Map<string, number>();
+
+  readonly uso: Record<"blockhash" | "saldo" | "conta", UsoCache> = {
+    blockhash: novoUso(),
+    saldo: novoUso(),
+    conta: novoUso(),
+  };
+
+  constructor(private rpc: PoolRpc, opcoes: OpcoesCache = {}) {
+    this.ttlBlockhashMs = opcoes.ttlBlockhashMs ?? 30_000;
+    this.intervaloBlockhashMs = opcoes.intervaloBlockhashMs ?? 10_000;
+    this.ttlSaldoMs = opcoes.ttlSaldoMs ?? 30_000;
+    this.ttlContaMs = opcoes.ttlContaMs ?? 10 * 60_000;
+  }
+
+  private contar(tipo: keyof CacheRpc["uso"], hit: boolean, uso?: UsoCache) {
+    const campo = hit ? "hits" : "misses";
+    this.uso[tipo][campo]++;
+    if (uso) uso[campo]++;
+  }
+
+  // ---------- BLOCKHASH ----------
+
+  private buscarBlockhash(): Promise<Blockhash> {
+    // Consultas simultâneas compartilham a mesma requisição
+    if (!this.blockhashPendente) {
+      this.blockhashPendente = this.rpc
+        .ler((c) => c.getLatestBlockhash("confirmed"))
+        .then((resultado) => {
+          this.blockhashAtual = { ...resultado, obtidoEm: Date.now() };
+          return resultado;
+        })
+        .finally(() => {
+          this.blockhashPendente = null;
+        });
+    }
+    return this.blockhashPendente;
+  }
+
+  private iniciarRenovacao() {
+    if (this.renovacao) return;
+    this.renovacao = setInterval(() => {
+      this.buscarBlockhash().catch((error) => {
+        console.error("Falha ao renovar blockhash em background:", error?.message || error);
+      });
+    }, this.intervaloBlockhashMs);
+    // Não segura o processo vivo só por causa da renovação
+    this.renovacao.unref();
+  }
+
+  async blockhash(uso?: UsoCache): Promise<Blockhash> {
+    this.iniciarRenovacao();
+    const atual = this.blockhashAtual;
+    if (atual && Date.now() - atual.obtidoEm < this.ttlBlockhashMs) {
+      this.contar("blockhash", true, uso);
+      return { blockhash: atual.blockhash, lastValidBlockHeight: atual.lastValidBlockHeight };
+    }
+    this.contar("blockhash", false, uso);
+    return this.buscarBlockhash();
+  }
+
+  // ---------- SALDO DA ORIGEM ----------
+
+  async saldo(chave: PublicKey, uso?: UsoCache): Promise<number> {
+    const atual = this.saldos.get(chave.toBase58());
+    if (atual && Date.now() - atual.obtidoEm < this.ttlSaldoMs) {
+      this.contar("saldo", true, uso);
+      return atual.lamports;
+    }
+    this.contar("saldo", false, uso);
+    const lamports = await this.rpc.ler((c) => c.getBalance(chave));
+    this.saldos.set(chave.toBase58(), { lamports, obtidoEm: Date.now() });
+    return lamports;
+  }
+
+  /**
+   * Desconta localmente uma transferência enviada (valor + taxa)
+   */
+  debitar(chave: PublicKey, lamports: number) {
+    const atual = this.saldos.get(chave.toBase58());
+    if (atual) {
+      atual.lamports = Math.max(0, atual.lamports - lamports);
+    }
+  }
+
+  /**
+   * Descarta o saldo local (ex.: transação falhou e o débito local não vale mais)
+   */
+  invalidarSaldo(chave: PublicKey) {
+    this.saldos.delete(chave.toBase58());
+  }
+
+  // ---------- EXISTÊNCIA DAS CONTAS DESTINO ----------
+
+  /**
+   * Indica, para cada chave, se a conta existe na rede.
+   * Só contas existentes ficam em cache: uma conta inexistente pode ser criada a qualquer momento.
+   */
+  async contasExistem(chaves: PublicKey[], uso?: UsoCache): Promise<boolean[]> {
+    const agora = Date.now();
+    const existe: boolean[] = chaves.map((chave) => {
+      const obtidoEm = this.contas.get(chave.toBase58());
+      return obtidoEm !== undefined && agora - obtidoEm < this.ttlContaMs;
+    });
+
+    const faltantes = chaves.map((_, i) => i).filter((i) => !existe[i]);
+    chaves.forEach((_, i) => this.contar("conta", existe[i], uso));
+    if (faltantes.length === 0) {
+      return existe;
+    }
+
+    const consultas = [];
+    for (let i = 0; i < faltantes.length; i += MAX_CONTAS_POR_CONSULTA) {
+      const bloco = faltantes.slice(i, i + MAX_CONTAS_POR_CONSULTA);
+      consultas.push(
+        this.rpc.ler((c) => c.getMultipleAccountsInfo(bloco.map((k) => chaves[k]))).then((infos) => {
+          infos.forEach((info, j) => {
+            if (info !== null) {
+              existe[bloco[j]] = true;
+              this.registrarConta(chaves[bloco[j]]);
+            }
+          });
+        })
+      );
+    }
+    await Promise.all(consultas);
+    return existe;
+  }
+
+  /**
+   * Marca a conta como existente (ex.: acabou de receber uma transferência confirmada)
+   */
+  registrarConta(chave: PublicKey) {
+    this.contas.set(chave.toBase58(), Date.now());
+  }
+
+  estatisticas() {
+    const total = (Object.values(this.uso) as UsoCache[]).reduce(
+      (acc, u) => ({ hits: acc.hits + u.hits, misses: acc.misses + u.misses }),
+      novoUso()
+    );
+    return {
+      ...this.uso,
+      total,
+      contas_em_cache: this.contas.size,
+      saldos_em_cache: this.saldos.size,
+    };
+  }
+}
+
+export { CacheRpc, novoUso };
+export type { UsoCache, Blockhash };
@@ -0,0 +1,183 @@
+/**
+ * Pool de endpoints RPC da Solana com failover e leituras "hedged".
+ *
+ * - Uma Connection por endpoint, criada uma vez e reaproveitada (keep-alive)
+ * - Latência medida por endpoint (média móvel exponencial)
+ * - Failover em 429/5xx/erros de rede, suspendendo o endpoint por um tempo
+ * - Leituras opcionalmente duplicadas nos dois endpoints mais rápidos
+ *
+ * Configuração por ambiente:
+ *   SOLANA_RPC_URLS   lista separada por vírgula (padrão: mainnet público)
+ *   SOLANA_RPC_HEDGE  "1" para duplicar leituras nos dois endpoints mais rápidos
+ */
+
+import { Commitment, Connection } from "@solana/web3.js";
+
+const RPC_PADRAO = "https://api.mainnet-beta.solana.com";
+
+// Peso da última medição na média móvel de latência
+const PESO_LATENCIA = 0.2;
+
+// Suspensão após falha: cresce a cada falha seguida, até o máximo
+const SUSPENSAO_BASE_MS = 1_000;
+const SUSPENSAO_MAX_MS = 60_000;
+
+interface EndpointRpc {
+  url: string;
+  connection: Connection;
+  latenciaMs: number | null;
+  requisicoes: number;
+  falhas: number;
+  falhasSeguidas: number;
+  suspensoAte: number;
+}
+
+interface OpcoesPool {
+  commitment?: Commitment;
+  hedge?: boolean;
+}
+
+/**
+ * Erros que justificam tentar outro endpoint: rate limit, 5xx e falhas de rede
+ */
+function erroRecuperavel(error: any): boolean {
+  const mensagem = String(error?.message || error);
+  return (
+    /\b429\b/.test(mensagem) ||
+    /\b5\d\d\b/.test(mensagem) ||
+    /fetch failed|ECONNRESET|ECONNREFUSED|ETIMEDOUT|EAI_AGAIN|socket hang up/i.test(mensagem)
+  );
+}
+
+/**
+ * Resolve com a primeira promessa que der certo; rejeita só se todas falharem
+ */
+function primeiroSucesso<T>(promessas: Promise<T>[]): Promise<T> {
+  return new Promise((resolve, reject) => {
+    let falhas = 0;
+    promessas.forEach((promessa) =>
+      promessa.then(resolve, (error) => {
+        falhas++;
+        if (falhas === promessas.length) reject(error);
+      })
+    );
+  });
+}
+
+class PoolRpc {
+  readonly endpoints: EndpointRpc[];
+  private hedge: boolean;
+
+  constructor(urls: string[], opcoes: OpcoesPool = {}) {
+    if (urls.length === 0) {
+      throw new Error("Pool RPC precisa de pelo menos um endpoint");
+    }
+    this.hedge = opcoes.hedge ?? false;
+    this.endpoints = urls.map((url) => ({
+      url,
+      // disableRetryOnRateLimit: no 429 preferimos trocar de endpoint a esperar no mesmo
+      connection: new Connection(url, {
+        commitment: opcoes.commitment ?? "confirmed",
+        disableRetryOnRateLimit: true,
+      }),
+      latenciaMs: null,
+      requisicoes: 0,
+      falhas: 0,
+      falhasSeguidas: 0,
+      suspensoAte: 0,
+    }));
+  }
+
+  static doAmbiente(): PoolRpc {
+    const urls = (process.env.SOLANA_RPC_URLS || RPC_PADRAO)
+      .split(",")
+      .map((url) => url.trim())
+      .filter(Boolean);
+    return new PoolRpc(urls, { hedge: process.env.SOLANA_RPC_HEDGE === "1" });
+  }
+
+  /**
+   * Endpoints disponíveis, do mais rápido para o mais lento
+   * (sem medição ainda = prioridade; se todos estiverem suspensos, usa todos)
+   */
+  private ordenados(): EndpointRpc[] {
+    const agora = Date.now();
+    const ativos = this.endpoints.filter((e) => e.suspensoAte <= agora);
+    const candidatos = ativos.length > 0 ? ativos : [...this.endpoints];
+    return candidatos.sort((a, b) => (a.latenciaMs ?? -1) - (b.latenciaMs ?? -1));
+  }
+
+  /**
+   * Connection do endpoint mais rápido no momento
+   */
+  conexaoPrincipal(): Connection {
+    return this.ordenados()[0].connection;
+  }
+
+  private async medir<T>(endpoint: EndpointRpc, operacao: (c: Connection) => Promise<T>): Promise<T> {
+    const inicio = Date.now();
+    endpoint.requisicoes++;
+    try {
+      const resultado = await operacao(endpoint.connection);
+      const duracao = Date.now() - inicio;
+      endpoint.latenciaMs = endpoint.latenciaMs === null
+        ? duracao
+        : endpoint.latenciaMs * (1 - PESO_LATENCIA) + duracao * PESO_LATENCIA;
+      endpoint.falhasSeguidas = 0;
+      return resultado;
+    } catch (error) {
+      if (erroRecuperavel(error)) {
+        endpoint.falhas++;
+        endpoint.falhasSeguidas++;
+        const suspensao = Math.min(SUSPENSAO_MAX_MS, SUSPENSAO_BASE_MS * 2 ** (endpoint.falhasSeguidas - 1));
+        endpoint.suspensoAte = Date.now() + suspensao;
+      }
+      throw error;
+    }
+  }
+
+  /**
+   * Executa a operação no endpoint mais rápido, passando para o próximo em erro recuperável
+   */
+  async executar<T>(operacao: (c: Connection) => Promise<T>): Promise<T> {
+    let ultimoErro: any;
+    for (const endpoint of this.ordenados()) {
+      try {
+        return await this.medir(endpoint, operacao);
+      } catch (error) {
+        ultimoErro = error;
+        if (!erroRecuperavel(error)) throw error;
+      }
+    }
+    throw ultimoErro;
+  }
+
+  /**
+   * Leitura idempotente: com hedge ligado vai aos dois endpoints mais rápidos e usa a primeira resposta
+   */
+  async ler<T>(operacao: (c: Connection) => Promise<T>): Promise<T> {
+    const ordenados = this.ordenados();
+    if (!this.hedge || ordenados.length < 2) {
+      return this.executar(operacao);
+    }
+    try {
+      return await primeiroSucesso(ordenados.slice(0, 2).map((e) => this.medir(e, operacao)));
+    } catch (error) {
+      if (!erroRecuperavel(error) || ordenados.length <= 2) throw error;
+      return this.executar(operacao);
+    }
+  }
+
+  estatisticas() {
+    const agora = Date.now();
+    return this.endpoints.map((e) => ({
+      url: e.url,
+      latencia_ms: e.latenciaMs === null ? null : Math.round(e.latenciaMs),
+      requisicoes: e.requisicoes,
+      falhas: e.falhas,
+      suspenso: e.suspensoAte > agora,
+    }));
+  }
+}
+
+export { PoolRpc, erroRecuperavel };
@@ -0,0 +1,165 @@
+/**
+ * Worker persistente do signer: carrega @solana/web3.js uma única vez e
+ * atende pedidos em JSON delimitado por linha (NDJSON) via stdin/stdout.
+ *
+ * Pedido:   {"id": "...", "op": "transferir", "chave_privada": "...", "carteira_destino": "...", "valor_minimo": false, "valor": 0.01}
+ *           {"id": "...", "op": "lote", "chave_privada": "...", "destinos": [{"carteira_destino": "...", "valor_minimo": false, "valor": 0.01}]}
+ *           {"id": "...", "op": "status", "signatures": ["..."]}
+ *           {"id": "...", "op": "ping"}
+ *           {"id": "...", "op": "stats"}
+ *           (opcional em todos: "prazo_envio", epoch em segundos depois do qual nada é assinado)
+ * Aviso:    {"id": "...", "assinada": {"signature": "...", "indices": [0, 1]}}  (antes de cada envio)
+ * Resposta: {"id": "...", "sucesso": true, "signature": "...", "cache": {"hits": 3, "misses": 0}}
+ *           {"id": "...", "sucesso": true, "status": {"<signature>": {"confirmada": true, "erro": null}}}
+ *           {"id": "...", "sucesso": true, "cache": {...}, "confirmacoes": {"pendentes": 2, "latencia": {...}}}  (stats)
+ *           {"id": "...", "sucesso": true, "resultados": [{"indice": 0, "sucesso": true, "signature": "..."}]}
+ *           {"id": "...", "sucesso": false, "erro": "..."}
+ *
+ * Uso: npx tsx signer-worker.ts  (iniciado pelo pool em app/signer.py)
+ */
+
+import * as readline from 'readline';
+import {
+  consultaAssinaturas,
+  criaEEnviaTransacaoSendMainnet,
+  criaEEnviaTransacoesLoteMainnet,
+  estatisticasCache,
+  estatisticasConfirmacoes,
+} from './cria-transacao-send-post-mainnet';
+import type { OpcoesEnvio } from './cria-transacao-send-post-mainnet';
+import { novoUso } from './rpc-cache';
+
+// stdout é reservado para o protocolo; qualquer log das bibliotecas vai para stderr
+console.log = (...args: any[]) => console.error(...args);
+console.info = (...args: any[]) => console.error(...args);
+
+const iniciadoEm = Date.now();
+let emAndamento = 0;
+let entradaFechada = false;
+
+function responder(resposta: Record<string, any>) {
+  process.stdout.write(JSON.stringify(resposta) + '\n');
+}
+
+/**
+ * Prazo do pedido e aviso de cada transação assinada: se o pedido passar do
+ * timeout no Python, ele sabe quais transações podem ter chegado à rede
+ */
+function opcoesEnvio(id: string | null, pedido: any): OpcoesEnvio {
+  return {
+    prazo: typeof pedido.prazo_envio === 'number' ? pedido.prazo_envio * 1000 : undefined,
+    aoAssinar: (signature, indices) => responder({ id, assinada: { signature, indices } }),
+  };
+}
+
+function talvezEncerrar() {
+  // Processo pai fechou o stdin: termina assim que os pedidos pendentes acabarem
+  if (entradaFechada && emAndamento === 0) {
+    process.exit(0);
+  }
+}
+
+async function atender(pedido: any) {
+  const id = pedido?.id ?? null;
+  try {
+    switch (pedido?.op) {
+      case 'ping':
+        responder({
+          id,
+          sucesso: true,
+          pid: process.pid,
+          em_andamento: emAndamento,
+          uptime_ms: Date.now() - iniciadoEm,
+        });
+        return;
+
+      case 'stats':
+        responder({
+          id,
+          sucesso: true,
+          pid: process.pid,
+          cache: estatisticasCache(),
+          confirmacoes: estatisticasConfirmacoes(),
+        });
+        return;
+
+      case 'status': {
+        if (!Array.isArray(pedido.signatures)) {
+          throw new Error('signatures é obrigatório');
+        }
+        responder({ id, sucesso: true, status: await consultaAssinaturas(pedido.signatures) });
+        return;
+      }
+
+      case 'transferir': {
+        if (!pedido.chave_privada || !pedido.carteira_destino) {
+          throw new Error('chave_privada e carteira_destino são obrigatórios');
+        }
+        const valorSOL = pedido.valor !== undefined && pedido.valor !== null
+          ? parseFloat(pedido.valor)
+          : undefined;
+        // Consultas RPC evitadas pelo cache neste crédito
+        const uso = novoUso();
+        const signature = await criaEEnviaTransacaoSendMainnet(
+          pedido.chave_privada,
+          pedido.carteira_destino,
+          pedido.valor_minimo === true,
+          valorSOL,
+          uso,
+          opcoesEnvio(id, pedido)
+        );
+        responder({ id, sucesso: true, signature, cache: uso });
+        return;
+      }
+
+      case 'lote': {
+        if (!pedido.chave_privada || !Array.isArray(pedido.destinos)) {
+          throw new Error('chave_privada e destinos são obrigatórios');
+        }
+        const uso = novoUso();
+        const resultados = await criaEEnviaTransacoesLoteMainnet(
+          pedido.chave_privada,
+          pedido.destinos.map((d: any) => ({
+            carteiraDestino: d.carteira_destino,
+            valorMinimo: d.valor_minimo === true,
+            valorSOL: d.valor !== undefined && d.valor !== null ? parseFloat(d.valor) : undefined,
+          })),
+          uso,
+          opcoesEnvio(id, pedido)
+        );
+        responder({ id, sucesso: true, resultados, cache: uso });
+        return;
+      }
+
+      default:
+        throw new Error(`Operação desconhecida: ${pedido?.op}`);
+    }
+  } catch (error: any) {
+    responder({ id, sucesso: false, erro: error?.message || String(error) });
+  }
+}
+
+const rl = readline.createInterface({ input: process.stdin, terminal: false });
+
+rl.on('line', (linha: string) => {
+  if (!linha.trim()) return;
+
+  let pedido: any;
+  try {
+    pedido = JSON.parse(linha);
+  } catch {
+    responder({ id: null, sucesso: false, erro: 'JSON inválido no pedido' });
+    return;
+  }
+
+  emAndamento++;
+  atender(pedido).finally(() => {
+    emAndamento--;
+    talvezEncerrar();
+  });
+});
+
+rl.on('close', () => {
+  entradaFechada = true;
+  talvezEncerrar();
+});
@@ -4,9 +4,16 @@ from . import views
 urlpatterns = [
     path('healthz/', views.healthz_view, name='healthz'),
     path('health/', views.healthcheck, name='healthcheck'),
+    path('readyz/', views.readyz, name='readyz'),
+    path('metrics/', views.metrics, name='metrics'),
     path('', views.index, name='index'),
     path('clientes/', views.clientes, name='clientes'),
+    path('clientes/buscar/', views.clientes_buscar, name='clientes_buscar'),
+    path('clientes/importar/', views.clientes_importar, name='clientes_importar'),
+    path('clientes/importar/<uuid:importacao_id>/', views.clientes_importar_status, name='clientes_importar_status'),
+    path('clientes/importar/<uuid:importacao_id>/erros/', views.clientes_importar_erros, name='clientes_importar_erros'),
     path('transacoes/', views.transacoes, name='transacoes'),
+    path('transacoes/exportar/', views.exportar_transacoes, name='exportar_transacoes'),
     path('campanhas/', views.campanhas, name='campanhas'),
     path('configuracoes/', views.configuracoes, name='configuracoes'),
     path('configuracoes/estabelecimento/', views.configuracoes_estabelecimento, name='configuracoes_estabelecimento'),
@@ -14,4 +21,7 @@ urlpatterns = [
     path('ajuda/', views.ajuda_home, name='ajuda_home'),
     path('ajuda/<str:slug>/', views.ajuda_guia, name='ajuda_guia'),
     path('creditar-moedas/', views.creditar_moedas, name='creditar_moedas'),
+    path('creditar-moedas/<uuid:job_id>/', views.creditar_moedas_status, name='creditar_moedas_status'),
+    path('creditar-moedas/lote/', views.creditar_moedas_lote, name='creditar_moedas_lote'),
+    path('creditar-moedas/lote/<uuid:lote_id>/', views.creditar_moedas_lote_status, name='creditar_moedas_lote_status'),
 ]
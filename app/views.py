@@ -1,15 +1,51 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render
-from django.http import Http404, JsonResponse, HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, JsonResponse, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from pathlib import Path
+import asyncio
+import csv
 import json
-import subprocess
-import platform
+import math
+import time
+import uuid
+from functools import partial
+
+from .busca import buscar_clientes
+from .exportacao import FORMATOS, FiltroInvalido, blocos_async, blocos_exportacao, filtrar_transacoes
+from .fila import ConflitoIdempotencia, enfileirar_credito, enfileirar_lote
+from .health import metricas_signer, prontidao
+from .importacao import (
+    ErroImportacao, caminho_erros, enfileirar_importacao, importar_clientes, ler_linhas, limpar_erros_antigos,
+)
+from .instrumentacao import metricas_agregadas
+from .limites import CreditoRecusado, admitir_credito
+from .metricas import MARCA_TRANSACOES, resumo_dashboard
+from .middleware import aceita_gzip, versao_conteudo
+from .models import Cliente, CreditoJob, Estabelecimento, ImportacaoJob, MarcaAgua, Transacao
+from .pagination import paginar_keyset
+from .renderizacao import resposta_prerenderizada
+
+# Long-poll do status de crédito: intervalo entre consultas (segundos). Os prazos
+# vêm de LONG_POLL_MAX (ASGI) e LONG_POLL_WSGI_MAX (WSGI) no settings
+LONG_POLL_INTERVALO = 0.5
+# Sob WSGI cada espera prende um worker síncrono inteiro: nenhuma configuração
+# passa deste teto; depois dele o Retry-After diz quando consultar de novo
+TETO_LONG_POLL_WSGI = 2
+
+# Linhas por página nas listas de clientes e transações
+TAMANHO_PAGINA = 50
+
+# Períodos (dias) do filtro do dashboard; o primeiro é o padrão
+PERIODOS_DASHBOARD = ('7', '30', '90')
 
 # Create your views here.
 
-def healthcheck(request):
+async def healthcheck(request):
     """
     Endpoint de healthcheck para Docker.
     Retorna status 200 OK sem validar host ou autenticação.
@@ -18,7 +54,7 @@ def healthcheck(request):
     return JsonResponse({'status': 'ok', 'service': 'django'}, status=200)
 
 @require_http_methods(["GET"])
-def healthz_view(request):
+async def healthz_view(request):
     """
     Endpoint de liveness para healthcheck do Docker.
     Sempre retorna 200 OK com texto simples "ok".
@@ -26,111 +62,318 @@ def healthz_view(request):
     Usado exclusivamente para verificar se o container está vivo.
     """
     return HttpResponse("ok", content_type="text/plain", status=200)
+
+
+@require_http_methods(["GET"])
+async def readyz(request):
+    """
+    Readiness: banco, signers do processar_creditos e fila de créditos.
+    Em produção quem responde é app/health.py, antes do Django; esta view
+    cobre o runserver e quem montar a aplicação sem o wrapper.
+    """
+    status, corpo = await sync_to_async(prontidao)()
+    response = HttpResponse(corpo, content_type='application/json', status=status)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@require_http_methods(["GET"])
+def metrics(request):
+    """
+    Histogramas e contadores de todos os workers no formato texto do
+    Prometheus, mais os dos signers do ``processar_creditos`` (pelo batimento).
+    """
+    return HttpResponse(
+        metricas_agregadas().prometheus() + metricas_signer(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+def _ultima_transacao():
+    return Transacao.objects.order_by('-pk').values_list('pk', flat=True).first()
+
+
+def _versao_transacoes(request):
+    # o ledger é só de inserção: o último id (e o dia, para as datas) basta
+    return f'{_ultima_transacao()}.{timezone.localdate()}'
+
+
+def _versao_dashboard(request):
+    # rollups mudam quando a marca d'água anda; clientes ativos, a cada lançamento
+    marca = MarcaAgua.objects.filter(nome=MARCA_TRANSACOES).values_list('ultimo_id', flat=True).first()
+    return f'{marca}.{_versao_transacoes(request)}'
+
+
+@versao_conteudo(_versao_dashboard)
 def index(request):
-    # home já renderiza o dashboard direto
+    # home já renderiza o dashboard direto, lido dos rollups de app/metricas.py
+    dias = request.GET.get('dias', '')
+    dias = int(dias if dias in PERIODOS_DASHBOARD else PERIODOS_DASHBOARD[0])
+    estabelecimento = _estabelecimento_atual(request)
     return render(
         request,
         'app/dashboard.html',
-        {'page_title': 'Dashboard — tokn.id | partners'}
+        {
+            'page_title': 'Dashboard — tokn.id | partners',
+            'estabelecimento': estabelecimento,
+            'periodos': [int(p) for p in PERIODOS_DASHBOARD],
+            'resumo': resumo_dashboard(estabelecimento, dias) if estabelecimento else None,
+        }
     )
 
 
+def _estabelecimento_atual(request):
+    """
+    Estabelecimento cujas listas são exibidas: ``?estabelecimento=<id>`` ou o
+    primeiro cadastrado (ainda não há login de parceiro).
+    """
+    estabelecimento_id = request.GET.get('estabelecimento')
+    consulta = Estabelecimento.objects.only('id', 'nome', 'versao_clientes')
+    if estabelecimento_id and estabelecimento_id.isdigit():
+        return consulta.filter(pk=estabelecimento_id).first()
+    return consulta.order_by('pk').first()
+
+
 def clientes(request):
-    # MOCK de dados pra alimentar o {% for c in clientes %}
-    clientes_mock = [
-        {
-            "nome": "João Silva",
-            "vip": True,
-            "contato": "+55 (11) 98888-1111 · joao@email.com",
-            "moedas": 650,
-            "ultima": "Recebeu 50 moedas",
-            "ultima_data": "02/11/2025",
-            "canal": "PDV",
-            "status": "Ativo",
-        },
-        {
-            "nome": "Maria Souza",
-            "vip": False,
-            "contato": "+55 (11) 97777-2222 · maria@email.com",
-            "moedas": 120,
-            "ultima": "Resgatou 40 moedas",
-            "ultima_data": "28/10/2025",
-            "canal": "WhatsApp",
-            "status": "Ativo",
-        },
-        {
-            "nome": "Carlos Lima",
-            "vip": False,
-            "contato": "+55 (11) 96666-3333 · carlos@email.com",
-            "moedas": 0,
-            "ultima": "Sem atividade recente",
-            "ultima_data": "05/09/2025",
-            "canal": "App",
-            "status": "Inativo",
-        },
-    ]
+    estabelecimento = _estabelecimento_atual(request)
+    pagina = None
+    if estabelecimento is not None:
+        consulta = Cliente.objects.filter(estabelecimento=estabelecimento).only(
+            'id', 'nome', 'telefone', 'email', 'vip', 'ativo', 'canal', 'moedas',
+            'ultima_atividade', 'ultima_atividade_em', 'criado_em',
+        )
+        pagina = paginar_keyset(consulta, request.GET, tamanho=TAMANHO_PAGINA)
 
     return render(
         request,
         'app/clientes.html',
         {
             'page_title': 'Clientes — tokn.id | partners',
-            'clientes': clientes_mock,
+            'estabelecimento': estabelecimento,
+            'clientes': pagina.itens if pagina else [],
+            'pagina': pagina,
         }
     )
 
 
+def _versao_busca(request):
+    # clientes criados, editados ou importados (versao_clientes) e saldos (cada lançamento)
+    estabelecimento = _estabelecimento_atual(request)
+    versao = estabelecimento.versao_clientes if estabelecimento else None
+    return f'{versao}.{_versao_transacoes(request)}'
+
+
+@versao_conteudo(_versao_busca)
+@require_http_methods(["GET"])
+def clientes_buscar(request):
+    """
+    Busca de clientes para a lista e o modal de crédito (app/busca.py).
+    ``?q=`` (nome, telefone, e-mail ou carteira) e ``?limite=`` (máx. BUSCA_LIMITE_MAX).
+    """
+    termo = request.GET.get('q', '')[:100]
+    limite = request.GET.get('limite', '')
+    estabelecimento = _estabelecimento_atual(request)
+    resultados = []
+    if estabelecimento is not None:
+        resultados = [
+            {
+                'id': c.pk,
+                'nome': c.nome,
+                'telefone': c.telefone,
+                'email': c.email,
+                'canal': c.get_canal_display(),
+                'vip': c.vip,
+                'ativo': c.ativo,
+                'moedas': c.moedas,
+                'ultima': c.ultima,
+                'ultima_data': c.ultima_data,
+                'carteira': c.carteira.endereco if hasattr(c, 'carteira') else '',
+            }
+            for c in buscar_clientes(estabelecimento.pk, termo, int(limite) if limite.isdigit() else None)
+        ]
+    response = JsonResponse({'q': termo, 'resultados': resultados})
+    # digitar e apagar repete termos: o navegador reaproveita por alguns segundos
+    response['Cache-Control'] = 'private, max-age=10'
+    return response
+
+
+def _restrito_equipe(request):
+    # importação (cria clientes em massa) e exportação (o histórico inteiro): só staff logado
+    if not request.user.is_staff:
+        return JsonResponse({'sucesso': False, 'erro': 'acesso restrito à equipe'}, status=403)
+    return None
+
+
+@require_http_methods(["POST"])
+def clientes_importar(request):
+    """
+    Importa clientes de uma planilha CSV ou XLSX (campo ``arquivo``, multipart)
+    no estabelecimento atual (ver app/importacao.py). Responde em JSON Lines:
+    uma linha de progresso por bloco gravado e, no fim, o resumo, com
+    ``erros_url`` quando alguma linha foi recusada.
+
+    Acima de IMPORTACAO_SINCRONA_MAX_BYTES a planilha vai para a fila do
+    worker: 202 com ``status_url`` para acompanhar o progresso.
+    """
+    negada = _restrito_equipe(request)
+    if negada:
+        return negada
+    arquivo = request.FILES.get('arquivo')
+    if arquivo is None:
+        return JsonResponse({'sucesso': False, 'erro': 'envie a planilha no campo "arquivo"'}, status=400)
+    if arquivo.size > settings.IMPORTACAO_MAX_BYTES:
+        return JsonResponse({
+            'sucesso': False, 'erro': f'arquivo maior que {settings.IMPORTACAO_MAX_BYTES // (1024 * 1024)} MB',
+        }, status=413)
+    estabelecimento = _estabelecimento_atual(request)
+    if estabelecimento is None:
+        return JsonResponse({'sucesso': False, 'erro': 'Estabelecimento não encontrado'}, status=404)
+    encoding = request.POST.get('encoding') or 'utf-8-sig'
+    if arquivo.size > settings.IMPORTACAO_SINCRONA_MAX_BYTES:
+        job = enfileirar_importacao(estabelecimento, arquivo, encoding)
+        return JsonResponse({
+            'sucesso': True,
+            'importacao_id': str(job.pk),
+            'status': job.status,
+            'status_url': reverse('clientes_importar_status', args=[job.pk]),
+        }, status=202)
+    try:
+        linhas = ler_linhas(arquivo, arquivo.name, encoding)
+    except (ErroImportacao, UnicodeDecodeError, LookupError) as e:
+        return JsonResponse({'sucesso': False, 'erro': str(e)}, status=400)
+
+    importacao_id = uuid.uuid4()
+
+    def progresso():
+        limpar_erros_antigos()
+        caminho = caminho_erros(importacao_id)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        parcial = {'lidas': 0, 'importados': 0, 'duplicados': 0, 'invalidos': 0}
+        resumo = {'sucesso': True}
+        try:
+            with open(caminho, 'w', newline='', encoding='utf-8') as erros:
+                for parcial in importar_clientes(estabelecimento, linhas, erros):
+                    yield json.dumps(parcial).encode() + b'\n'
+        except (UnicodeDecodeError, csv.Error) as e:
+            # os blocos anteriores já foram gravados
+            resumo = {'sucesso': False, 'erro': f'leitura interrompida depois da linha {parcial["lidas"] + 1}: {e}'}
+        recusadas = parcial['duplicados'] + parcial['invalidos']
+        if not recusadas:
+            caminho.unlink(missing_ok=True)
+        resumo.update(parcial, erros_url=(
+            reverse('clientes_importar_erros', args=[importacao_id]) if recusadas else None
+        ))
+        yield json.dumps(resumo).encode() + b'\n'
+
+    blocos = progresso()
+    if isinstance(request, ASGIRequest):
+        blocos = blocos_async(blocos)
+    response = StreamingHttpResponse(blocos, content_type='application/x-ndjson; charset=utf-8')
+    response['Cache-Control'] = 'no-store'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@require_http_methods(["GET"])
+def clientes_importar_status(request, importacao_id):
+    """Progresso de uma importação enfileirada (planilha grande)."""
+    negada = _restrito_equipe(request)
+    if negada:
+        return negada
+    job = ImportacaoJob.objects.filter(pk=importacao_id).first()
+    if job is None:
+        return JsonResponse({'sucesso': False, 'erro': 'Importação não encontrada'}, status=404)
+    recusadas = job.duplicados + job.invalidos
+    return JsonResponse({
+        'sucesso': job.status != ImportacaoJob.Status.FAILED,
+        'status': job.status,
+        'lidas': job.lidas,
+        'importados': job.importados,
+        'duplicados': job.duplicados,
+        'invalidos': job.invalidos,
+        'erro': job.erro,
+        'erros_url': (
+            reverse('clientes_importar_erros', args=[job.pk])
+            if recusadas and job.status == ImportacaoJob.Status.DONE else None
+        ),
+    })
+
+
+@require_http_methods(["GET"])
+def clientes_importar_erros(request, importacao_id):
+    """CSV com as linhas recusadas de uma importação (linha, motivo e valores lidos)."""
+    negada = _restrito_equipe(request)
+    if negada:
+        return negada
+    caminho = caminho_erros(importacao_id)
+    if not caminho.exists():
+        raise Http404('Arquivo de erros não encontrado')
+    return FileResponse(
+        caminho.open('rb'), as_attachment=True, filename=f'erros-importacao-{importacao_id}.csv',
+        content_type='text/csv; charset=utf-8',
+    )
+
+
+@versao_conteudo(_versao_transacoes)
 def transacoes(request):
-    # MOCK de transações para montar a tabela / cards
-    transacoes_mock = [
-        {
-            "cliente": "João Silva",
-            "tipo": "Creditada",
-            "moedas": 120,
-            "canal": "PDV",
-            "descricao": "Compra R$ 120,00",
-            "data": "02/11/2025 · 18:42",
-            "referencia": "#TRX-1001",
-        },
-        {
-            "cliente": "Maria Souza",
-            "tipo": "Resgatada",
-            "moedas": 40,
-            "canal": "WhatsApp",
-            "descricao": "Resgate 40 moedas · Desconto no pedido",
-            "data": "01/11/2025 · 15:08",
-            "referencia": "#TRX-0992",
-        },
-        {
-            "cliente": "Carlos Lima",
-            "tipo": "Creditada",
-            "moedas": 80,
-            "canal": "App / Link",
-            "descricao": "Compra R$ 89,90",
-            "data": "30/10/2025 · 20:17",
-            "referencia": "#TRX-0981",
-        },
-        {
-            "cliente": "João Silva",
-            "tipo": "Creditada",
-            "moedas": 60,
-            "canal": "PDV",
-            "descricao": "Campanha Outubro em Dobro",
-            "data": "28/10/2025 · 11:03",
-            "referencia": "#TRX-0975",
-        },
-    ]
+    estabelecimento = _estabelecimento_atual(request)
+    pagina = None
+    if estabelecimento is not None:
+        consulta = (
+            Transacao.objects.filter(estabelecimento=estabelecimento)
+            .select_related('cliente')
+            .only('id', 'tipo', 'moedas', 'canal', 'descricao', 'criado_em', 'cliente__nome')
+        )
+        pagina = paginar_keyset(consulta, request.GET, tamanho=TAMANHO_PAGINA)
 
     return render(
         request,
         'app/transacoes.html',
         {
             'page_title': 'Transações — tokn.id | partners',
-            'transacoes': transacoes_mock,
+            'estabelecimento': estabelecimento,
+            'transacoes': pagina.itens if pagina else [],
+            'pagina': pagina,
         }
     )
 
 
+@require_http_methods(["GET"])
+def exportar_transacoes(request):
+    """
+    Histórico completo de transações do estabelecimento em CSV (padrão) ou
+    JSON Lines (``?formato=jsonl``), em streaming (ver app/exportacao.py).
+    Filtros: ``de``/``ate`` (AAAA-MM-DD), ``canal`` e ``tipo``. Só staff.
+    """
+    negada = _restrito_equipe(request)
+    if negada:
+        return negada
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS:
+        return JsonResponse({'sucesso': False, 'erro': 'formato deve ser csv ou jsonl'}, status=400)
+    estabelecimento = _estabelecimento_atual(request)
+    if estabelecimento is None:
+        return JsonResponse({'sucesso': False, 'erro': 'Estabelecimento não encontrado'}, status=404)
+    try:
+        consulta = filtrar_transacoes(estabelecimento, request.GET)
+    except FiltroInvalido as e:
+        return JsonResponse({'sucesso': False, 'erro': str(e)}, status=400)
+
+    comprimir = aceita_gzip(request)
+    blocos = blocos_exportacao(consulta, formato, comprimir=comprimir)
+    if isinstance(request, ASGIRequest):
+        blocos = blocos_async(blocos)
+    response = StreamingHttpResponse(blocos, content_type=FORMATOS[formato])
+    nome = f'transacoes-{estabelecimento.pk}-{timezone.localdate():%Y%m%d}.{formato}'
+    response['Content-Disposition'] = f'attachment; filename="{nome}"'
+    response['Cache-Control'] = 'no-store'
+    response['X-Accel-Buffering'] = 'no'  # o nginx repassa cada pedaço sem acumular
+    response['Vary'] = 'Accept-Encoding'
+    if comprimir:
+        response['Content-Encoding'] = 'gzip'
+    return response
+
+
 def campanhas(request):
     return render(
         request,
@@ -157,8 +400,24 @@ def configuracoes_regra_padrao(request):
 
 # ========= AJUDA / SUPORTE =========
 
+# Guias estáticos de /ajuda/<slug>/ (também usados por manage.py prerender_ajuda)
+GUIAS_AJUDA = (
+    "cliente-nao-recebeu-moedas",
+    "como-resgatar-no-balcao",
+    "carteira-phantom-o-que-o-cliente-precisa-fazer",
+    "campanhas-como-criar-e-usar",
+    "integracoes-pdv-e-whatsapp",
+    "ajustar-regra-padrao",
+    "boas-praticas-para-crescer",
+    "guias-rapidos",
+    "checklist-problemas-comuns",
+)
+
 def ajuda_home(request):
-    # Landing principal de Ajuda / Suporte
+    # Landing principal de Ajuda / Suporte (pré-renderizada por manage.py prerender_ajuda)
+    resposta = resposta_prerenderizada(request, 'ajuda/index')
+    if resposta is not None:
+        return resposta
     return render(
         request,
         'app/ajuda_suporte.html',
@@ -168,21 +427,13 @@ def ajuda_home(request):
 
 def ajuda_guia(request, slug):
     # whitelist simples pra evitar template injection
-    allowed = {
-        "cliente-nao-recebeu-moedas",
-        "como-resgatar-no-balcao",
-        "carteira-phantom-o-que-o-cliente-precisa-fazer",
-        "campanhas-como-criar-e-usar",
-        "integracoes-pdv-e-whatsapp",
-        "ajustar-regra-padrao",
-        "boas-praticas-para-crescer",
-        "guias-rapidos",
-        "checklist-problemas-comuns",
-    }
-
-    if slug not in allowed:
+    if slug not in GUIAS_AJUDA:
         raise Http404("Página de ajuda não encontrada")
 
+    resposta = resposta_prerenderizada(request, f'ajuda/{slug}')
+    if resposta is not None:
+        return resposta
+
     template_path = f'app/ajuda/{slug}.html'
     return render(
         request,
@@ -191,17 +442,37 @@ def ajuda_guia(request, slug):
     )
 
 
+def _resposta_recusa(recusa):
+    """429 (taxa da carteira) ou 503 (fila cheia), com Retry-After: falha rápida em vez de timeout."""
+    response = JsonResponse({
+        'sucesso': False,
+        'erro': str(recusa),
+        'retry_after': recusa.retry_after,
+    }, status=recusa.status)
+    response['Retry-After'] = str(recusa.retry_after)
+    return response
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
-def creditar_moedas(request):
+async def creditar_moedas(request):
     """
-    View para creditar moedas chamando o script TypeScript que executa transação na Solana.
+    View para creditar moedas: enfileira a transação na Solana e responde na hora.
+    Assíncrona: sob ASGI, a espera pelo banco não prende o worker.
     Recebe: chave_privada, carteira_destino, valor_minimo, valor
-    Retorna: JSON com sucesso e signature ou erro
+            e opcionalmente header Idempotency-Key (ou campo idempotency_key)
+    Retorna: 202 com job_id e status_url (acompanhar em /creditar-moedas/<job_id>/)
+             Repetição com a mesma chave devolve o mesmo job, sem nova transferência.
+             429 (taxa da carteira) ou 503 (fila cheia) com Retry-After; ver app/limites.py.
     """
     try:
         # Parse do JSON recebido
         body = json.loads(request.body)
+        if not isinstance(body, dict):
+            return JsonResponse({
+                'sucesso': False,
+                'erro': 'o corpo deve ser um objeto JSON'
+            }, status=400)
         chave_privada = body.get('chave_privada')
         carteira_destino = body.get('carteira_destino')
         valor_minimo = body.get('valor_minimo', False)
@@ -213,124 +484,59 @@ def creditar_moedas(request):
                 'sucesso': False,
                 'erro': 'chave_privada e carteira_destino são obrigatórios'
             }, status=400)
-        
-        # Caminho para o script TypeScript
-        script_path = Path(__file__).parent / 'ts' / 'exec-transacao.ts'
-        
-        # Preparar argumentos para o script
-        # No Windows, usar shell=True e construir comando como string
-        use_shell = platform.system() == 'Windows'
-        
-        if use_shell:
-            # Windows: construir comando como string
-            cmd_parts = [
-                'npx', 'tsx',
-                f'"{script_path}"',
-                f'"{chave_privada}"',
-                f'"{carteira_destino}"',
-                str(valor_minimo).lower(),
-            ]
-            if valor is not None:
-                cmd_parts.append(str(valor))
-            args = ' '.join(cmd_parts)
-        else:
-            # Linux/Mac: usar lista
-            args = [
-                'npx', 'tsx',
-                str(script_path),
-                chave_privada,
-                carteira_destino,
-                str(valor_minimo).lower(),
-            ]
-            if valor is not None:
-                args.append(str(valor))
-        
-        # Executar o script TypeScript
-        try:
-            result = subprocess.run(
-                args,
-                capture_output=True,
-                text=True,
-                timeout=60,  # Timeout de 60 segundos
-                cwd=Path(__file__).parent.parent,  # Diretório raiz do projeto
-                shell=use_shell
-            )
-            
-            # Tentar parsear a saída (stdout ou stderr)
-            output = result.stdout.strip() or result.stderr.strip()
-            
-            if result.returncode == 0:
-                # Sucesso - parsear JSON da stdout
-                # Pode haver texto adicional (como console.log), extrair apenas o JSON
-                try:
-                    # Tentar parsear diretamente
-                    data = json.loads(output)
-                except json.JSONDecodeError:
-                    # Se falhar, tentar pegar a última linha que contém JSON válido
-                    lines = output.split('\n')
-                    data = None
-                    for line in reversed(lines):
-                        line = line.strip()
-                        if line.startswith('{') and line.endswith('}'):
-                            try:
-                                data = json.loads(line)
-                                break
-                            except json.JSONDecodeError:
-                                continue
-                    
-                    if data is None:
-                        raise json.JSONDecodeError("JSON não encontrado no output", output, 0)
-                
-                try:
-                    if data.get('sucesso'):
-                        # Adicionar link do explorer
-                        signature = data.get('signature', '')
-                        explorer_url = f'https://solscan.io/tx/{signature}' if signature else ''
-                        return JsonResponse({
-                            'sucesso': True,
-                            'signature': signature,
-                            'explorer': explorer_url
-                        })
-                    else:
-                        return JsonResponse({
-                            'sucesso': False,
-                            'erro': data.get('erro', 'Erro desconhecido')
-                        }, status=500)
-                except json.JSONDecodeError:
-                    return JsonResponse({
-                        'sucesso': False,
-                        'erro': f'Erro ao processar resposta do script: {output[:200]}'
-                    }, status=500)
-            else:
-                # Erro - tentar parsear JSON do stderr
-                try:
-                    error_data = json.loads(result.stderr.strip())
-                    return JsonResponse({
-                        'sucesso': False,
-                        'erro': error_data.get('erro', 'Erro ao executar transação')
-                    }, status=500)
-                except json.JSONDecodeError:
-                    return JsonResponse({
-                        'sucesso': False,
-                        'erro': f'Erro ao executar script: {result.stderr[:200] or result.stdout[:200]}'
-                    }, status=500)
-                    
-        except subprocess.TimeoutExpired:
+
+        if valor is not None:
+            try:
+                valor = float(valor)
+            except (TypeError, ValueError):
+                return JsonResponse({
+                    'sucesso': False,
+                    'erro': 'valor deve ser numérico'
+                }, status=400)
+
+        chave_idempotencia = request.headers.get('Idempotency-Key') or body.get('idempotency_key')
+        if chave_idempotencia is not None and not isinstance(chave_idempotencia, str):
             return JsonResponse({
                 'sucesso': False,
-                'erro': 'Timeout ao executar transação (limite de 60 segundos)'
-            }, status=500)
-        except FileNotFoundError:
+                'erro': 'idempotency_key deve ser texto'
+            }, status=400)
+        if chave_idempotencia and len(chave_idempotencia) > 255:
             return JsonResponse({
                 'sucesso': False,
-                'erro': 'tsx não encontrado. Certifique-se de ter Node.js e npx instalados.'
-            }, status=500)
-        except Exception as e:
+                'erro': 'Idempotency-Key deve ter no máximo 255 caracteres'
+            }, status=400)
+
+        try:
+            # a admissão (app/limites.py) só vale para job novo: repetição com a mesma chave não gasta ficha
+            job, criado = await sync_to_async(enfileirar_credito)(
+                chave_privada, carteira_destino, valor_minimo, valor, chave_idempotencia,
+                admitir=partial(admitir_credito, chave_privada),
+            )
+        except CreditoRecusado as e:
+            return _resposta_recusa(e)
+        except ConflitoIdempotencia as e:
             return JsonResponse({
                 'sucesso': False,
-                'erro': f'Erro ao executar script: {str(e)}'
-            }, status=500)
-            
+                'erro': str(e)
+            }, status=422)
+
+        if criado:
+            return JsonResponse({
+                'sucesso': True,
+                'job_id': str(job.id),
+                'status': job.status,
+                'status_url': reverse('creditar_moedas_status', args=[job.id]),
+            }, status=202)
+
+        # Repetição: devolve o estado atual do job original
+        response = JsonResponse({
+            'sucesso': job.status != CreditoJob.Status.FAILED,
+            'status_url': reverse('creditar_moedas_status', args=[job.id]),
+            **job.as_dict(),
+        }, status=200 if job.finalizado else 202)
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
     except json.JSONDecodeError:
         return JsonResponse({
             'sucesso': False,
@@ -341,3 +547,173 @@ def creditar_moedas(request):
             'sucesso': False,
             'erro': f'Erro ao processar requisição: {str(e)}'
         }, status=500)
+
+
+def _tempo_long_poll(request):
+    """
+    Prazo (monotonic) do long-poll pedido em ?aguardar=<segundos>, limitado a
+    [0, LONG_POLL_MAX] sob ASGI e a [0, LONG_POLL_WSGI_MAX] (no máximo
+    TETO_LONG_POLL_WSGI) sob WSGI.
+    """
+    try:
+        aguardar = float(request.GET.get('aguardar', 0))
+    except ValueError:
+        aguardar = 0
+    if not math.isfinite(aguardar):
+        aguardar = 0
+    if isinstance(request, ASGIRequest):
+        limite = settings.LONG_POLL_MAX
+    else:
+        limite = min(settings.LONG_POLL_WSGI_MAX, TETO_LONG_POLL_WSGI)
+    return time.monotonic() + min(max(aguardar, 0), limite)
+
+
+def _resposta_status(request, corpo, finalizado):
+    """JSON do status; sob WSGI, se ainda não terminou, com Retry-After para a próxima consulta."""
+    response = JsonResponse(corpo)
+    if not finalizado and not isinstance(request, ASGIRequest):
+        response['Retry-After'] = str(settings.LONG_POLL_RETRY_AFTER)
+    return response
+
+
+@require_http_methods(["GET"])
+async def creditar_moedas_status(request, job_id):
+    """
+    Status de um crédito enfileirado (queued, submitted, verificar, confirmed ou
+    failed; verificar ainda não terminou).
+    Com ?aguardar=<segundos> faz long-poll até o job terminar ou o prazo acabar;
+    sob ASGI a espera é um asyncio.sleep, sem ocupar um worker, até
+    LONG_POLL_MAX. Sob WSGI a espera prende o worker, então fica limitada a
+    LONG_POLL_WSGI_MAX (0 por padrão, na hora; nunca mais que
+    TETO_LONG_POLL_WSGI) e a resposta leva Retry-After enquanto o job não terminar.
+    """
+    prazo = _tempo_long_poll(request)
+
+    while True:
+        job = await CreditoJob.objects.filter(pk=job_id).afirst()
+        if job is None:
+            return JsonResponse({
+                'sucesso': False,
+                'erro': 'Job de crédito não encontrado'
+            }, status=404)
+        if job.finalizado or time.monotonic() >= prazo:
+            break
+        await asyncio.sleep(LONG_POLL_INTERVALO)
+
+    return _resposta_status(request, {
+        'sucesso': job.status != CreditoJob.Status.FAILED,
+        **job.as_dict(),
+    }, job.finalizado)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def creditar_moedas_lote(request):
+    """
+    Crédito em lote (ex.: pagamento de campanha): enfileira um job por destino.
+    Os workers empacotam várias transferências por transação na Solana.
+    Recebe: chave_privada, destinos: [{carteira_destino, valor, valor_minimo}]
+    Retorna: 202 com lote_id e status_url (acompanhar em /creditar-moedas/lote/<lote_id>/)
+             429/503 com Retry-After como em /creditar-moedas/
+    """
+    try:
+        body = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'sucesso': False,
+            'erro': 'JSON inválido no corpo da requisição'
+        }, status=400)
+    if not isinstance(body, dict):
+        return JsonResponse({
+            'sucesso': False,
+            'erro': 'o corpo deve ser um objeto JSON'
+        }, status=400)
+
+    chave_privada = body.get('chave_privada')
+    destinos = body.get('destinos')
+
+    if not isinstance(chave_privada, str) or not chave_privada or not isinstance(destinos, list) or not destinos:
+        return JsonResponse({
+            'sucesso': False,
+            'erro': 'chave_privada e destinos (lista não vazia) são obrigatórios'
+        }, status=400)
+
+    if len(destinos) > settings.CREDITO_LOTE_MAX_DESTINOS:
+        return JsonResponse({
+            'sucesso': False,
+            'erro': f'Máximo de {settings.CREDITO_LOTE_MAX_DESTINOS} destinos por lote'
+        }, status=400)
+
+    normalizados = []
+    for indice, destino in enumerate(destinos):
+        if not isinstance(destino, dict) or not destino.get('carteira_destino'):
+            return JsonResponse({
+                'sucesso': False,
+                'erro': f'destinos[{indice}]: carteira_destino é obrigatória'
+            }, status=400)
+        if not isinstance(destino['carteira_destino'], str):
+            return JsonResponse({
+                'sucesso': False,
+                'erro': f'destinos[{indice}]: carteira_destino deve ser texto'
+            }, status=400)
+        valor = destino.get('valor')
+        if valor is not None:
+            try:
+                valor = float(valor)
+            except (TypeError, ValueError):
+                return JsonResponse({
+                    'sucesso': False,
+                    'erro': f'destinos[{indice}]: valor deve ser numérico'
+                }, status=400)
+        normalizados.append({
+            'carteira_destino': destino['carteira_destino'],
+            'valor_minimo': bool(destino.get('valor_minimo', False)),
+            'valor': valor,
+        })
+
+    try:
+        lote, jobs = await sync_to_async(enfileirar_lote)(
+            chave_privada, normalizados, admitir=partial(admitir_credito, chave_privada),
+        )
+    except CreditoRecusado as e:
+        return _resposta_recusa(e)
+    return JsonResponse({
+        'sucesso': True,
+        'lote_id': str(lote),
+        'total': len(jobs),
+        'status_url': reverse('creditar_moedas_lote_status', args=[lote]),
+    }, status=202)
+
+
+@require_http_methods(["GET"])
+async def creditar_moedas_lote_status(request, lote_id):
+    """
+    Resultado por destinatário de um crédito em lote, na ordem da requisição.
+    Com ?aguardar=<segundos> faz long-poll até todos os jobs terminarem
+    (sob WSGI com a mesma espera limitada de creditar_moedas_status).
+    """
+    prazo = _tempo_long_poll(request)
+
+    while True:
+        jobs = [job async for job in CreditoJob.objects.filter(lote=lote_id).order_by('indice_lote')]
+        if not jobs:
+            return JsonResponse({
+                'sucesso': False,
+                'erro': 'Lote de crédito não encontrado'
+            }, status=404)
+        pendentes = sum(1 for job in jobs if not job.finalizado)
+        if not pendentes or time.monotonic() >= prazo:
+            break
+        await asyncio.sleep(LONG_POLL_INTERVALO)
+
+    resumo = {status: 0 for status in CreditoJob.Status.values}
+    for job in jobs:
+        resumo[job.status] += 1
+
+    return _resposta_status(request, {
+        'sucesso': True,
+        'lote_id': str(lote_id),
+        'finalizado': pendentes == 0,
+        'resumo': resumo,
+        'destinatarios': [job.as_dict() for job in jobs],
+    }, pendentes == 0)
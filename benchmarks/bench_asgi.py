@@ -0,0 +1,153 @@
+"""
+Créditos concorrentes por worker: gunicorn sync (WSGI) x uvicorn (ASGI).
+
+Cada cliente faz POST /creditar-moedas/ e acompanha o job com long-poll em
+/creditar-moedas/<id>/?aguardar=10, como o front. Um thread do benchmark faz
+o papel do serviço ``worker``: confirma cada job entre 0,5x e 1,5x
+``--latencia`` segundos depois de criado (tempo de envio + confirmação na
+rede, que varia de um crédito para outro). Os dois modos rodam
+com um único worker do gunicorn, num banco SQLite temporário.
+
+Uso (na raiz do projeto, com gunicorn e uvicorn-worker instalados):
+    python benchmarks/bench_asgi.py --clientes 50 --creditos 150 --latencia 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+MODOS = {
+    'sync (WSGI)': ['--worker-class', 'sync', 'settings.wsgi:application'],
+    'uvicorn (ASGI)': ['--worker-class', 'uvicorn_worker.UvicornWorker', 'settings.asgi:application'],
+}
+
+
+def preparar_ambiente(diretorio):
+    """Settings do benchmark: as do projeto, com banco e logs temporários."""
+    (Path(diretorio) / 'bench_settings.py').write_text(
+        'from settings.settings import *  # noqa\n'
+        f'DATABASES["default"]["NAME"] = {str(Path(diretorio) / "bench.sqlite3")!r}\n'
+        'DATABASES["default"].setdefault("OPTIONS", {})["timeout"] = 30\n'
+    )
+    ambiente = {
+        **os.environ,
+        'PYTHONPATH': os.pathsep.join([diretorio, str(RAIZ)]),
+        'DJANGO_SETTINGS_MODULE': 'bench_settings',
+        'REQUEST_LOG_PATH': '',
+        'LOG_LEVEL': 'WARNING',
+    }
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'], cwd=RAIZ, env=ambiente, check=True)
+    return ambiente
+
+
+def confirmar_jobs(latencia, parar):
+    """Serviço worker simulado: confirma cada job quando vence a latência sorteada para ele."""
+    import random
+
+    from django.db import close_old_connections
+    from django.utils import timezone
+
+    from app.models import CreditoJob
+
+    sorteio = random.Random(1)
+    vencimentos = {}
+    while not parar.is_set():
+        close_old_connections()
+        agora = timezone.now()
+        for pk, criado_em in CreditoJob.objects.filter(status=CreditoJob.Status.QUEUED).values_list('pk', 'criado_em'):
+            if pk not in vencimentos:
+                vencimentos[pk] = criado_em.timestamp() + latencia * sorteio.uniform(0.5, 1.5)
+        vencidos = [pk for pk, vencimento in vencimentos.items() if vencimento <= agora.timestamp()]
+        if vencidos:
+            CreditoJob.objects.filter(pk__in=vencidos).update(
+                status=CreditoJob.Status.CONFIRMED, signature='bench', chave_privada='', concluido_em=agora,
+            )
+            for pk in vencidos:
+                del vencimentos[pk]
+        parar.wait(0.05)
+
+
+def creditar(base, indice):
+    inicio = time.perf_counter()
+    pedido = urllib.request.Request(
+        f'{base}/creditar-moedas/',
+        data=json.dumps({'chave_privada': 'bench', 'carteira_destino': f'destino-{indice}', 'valor': 1}).encode(),
+        headers={'Content-Type': 'application/json'},
+    )
+    with urllib.request.urlopen(pedido, timeout=120) as resposta:
+        status_url = json.loads(resposta.read())['status_url']
+    while True:
+        with urllib.request.urlopen(f'{base}{status_url}?aguardar=10', timeout=120) as resposta:
+            if json.loads(resposta.read())['status'] in ('confirmed', 'failed'):
+                return time.perf_counter() - inicio
+
+
+def medir(modo, argumentos, ambiente, porta, clientes, creditos):
+    servidor = subprocess.Popen(
+        ['gunicorn', '--bind', f'127.0.0.1:{porta}', '--workers', '1', '--timeout', '120', *argumentos],
+        cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f'http://127.0.0.1:{porta}'
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(f'{base}/healthz/', timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.1)
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(clientes) as executor:
+            tempos = sorted(executor.map(lambda i: creditar(base, i), range(creditos)))
+        total = time.perf_counter() - inicio
+    finally:
+        servidor.terminate()
+        servidor.wait()
+    print(
+        f'{modo:16} {creditos / total:10.1f} {statistics.median(tempos):10.2f} '
+        f'{tempos[int(len(tempos) * 0.95)]:10.2f} {total:10.1f}'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clientes', type=int, default=50, help='Créditos simultâneos')
+    parser.add_argument('--creditos', type=int, default=150, help='Total de créditos por modo')
+    parser.add_argument('--latencia', type=float, default=3.0, help='Segundos médios até o job ser confirmado')
+    parser.add_argument('--porta', type=int, default=8765)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench-asgi-') as diretorio:
+        ambiente = preparar_ambiente(diretorio)
+        os.environ.update({chave: ambiente[chave] for chave in ('DJANGO_SETTINGS_MODULE', 'REQUEST_LOG_PATH')})
+        sys.path[:0] = [diretorio, str(RAIZ)]
+        import django
+        django.setup()
+
+        parar = threading.Event()
+        confirmador = threading.Thread(target=confirmar_jobs, args=(args.latencia, parar), daemon=True)
+        confirmador.start()
+        print(
+            f'{args.creditos} créditos, {args.clientes} simultâneos, 1 worker, '
+            f'confirmação em {args.latencia / 2:.2f}-{args.latencia * 1.5:.2f}s'
+        )
+        print(f'{"modo":16} {"créditos/s":>10} {"p50 s":>10} {"p95 s":>10} {"total s":>10}')
+        try:
+            for modo, argumentos in MODOS.items():
+                medir(modo, argumentos, ambiente, args.porta, args.clientes, args.creditos)
+        finally:
+            parar.set()
+            confirmador.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Latência da busca de clientes (app/busca.py) num estabelecimento grande.
+
+Gera ``--clientes`` clientes (padrão: 1 milhão) num banco SQLite temporário
+com o ``gerar_dados`` e mede ``buscar_clientes`` com termos sorteados dos
+próprios dados, por tipo: prefixo de nome, trecho do sobrenome, dígitos do
+telefone, trecho do e-mail, prefixo de carteira e termo sem resultado. Para
+comparação, a busca ingênua (``icontains`` em cada campo, varrendo a tabela)
+roda com poucos termos de cada tipo.
+
+Com ``--postgres`` usa o banco de DB_NAME/DB_USER/... (descartável: o
+benchmark roda as migrations e grava nele) e o índice ``pg_trgm``.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_busca.py --clientes 1000000
+    python benchmarks/bench_busca.py --clientes 200000 --consultas 500
+"""
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+def preparar(diretorio, clientes, postgres):
+    (Path(diretorio) / 'bench_busca_settings.py').write_text(
+        'from settings.settings import *  # noqa\n'
+        + ('' if postgres else f'DATABASES["default"]["NAME"] = {str(Path(diretorio) / "busca.sqlite3")!r}\n')
+    )
+    ambiente = {
+        **os.environ,
+        'PYTHONPATH': os.pathsep.join([diretorio, str(RAIZ)]),
+        'DJANGO_SETTINGS_MODULE': 'bench_busca_settings',
+        'DB_ENGINE': 'postgresql' if postgres else 'sqlite',
+        'REQUEST_LOG_PATH': '',
+    }
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'], cwd=RAIZ, env=ambiente, check=True)
+    inicio = time.monotonic()
+    subprocess.run(
+        [sys.executable, 'manage.py', 'gerar_dados', '--clientes', str(clientes), '--transacoes', '0',
+         '--seed', '1', '--lote', '20000'],
+        cwd=RAIZ, env=ambiente, check=True, stdout=subprocess.DEVNULL,
+    )
+    print(f'{clientes} clientes gerados em {time.monotonic() - inicio:.0f}s')
+    os.environ.update(ambiente)
+    sys.path[:0] = [diretorio, str(RAIZ)]
+
+
+def termos(amostra, quantidade, sorteio):
+    """``{tipo: [termos]}`` tirados de clientes reais do banco."""
+    def trecho(texto, minimo, maximo):
+        tamanho = sorteio.randint(minimo, min(maximo, len(texto)))
+        inicio = sorteio.randint(0, len(texto) - tamanho)
+        return texto[inicio:inicio + tamanho]
+
+    tipos = {
+        'nome (prefixo)': lambda c: c.nome[:sorteio.randint(2, 6)],
+        'sobrenome (trecho)': lambda c: trecho(c.nome.split()[-1], 3, 5),
+        'telefone (dígitos)': lambda c: trecho(''.join(d for d in c.telefone if d.isdigit())[2:], 4, 8),
+        'e-mail (trecho)': lambda c: trecho(c.email.split('@')[0], 4, 9),
+        'carteira (prefixo)': lambda c: c.carteira.endereco[:sorteio.randint(5, 10)],
+        'sem resultado': lambda c: ''.join(sorteio.choice('qxzkwy') for _ in range(5)),
+    }
+    return {tipo: [gerar(sorteio.choice(amostra)) for _ in range(quantidade)] for tipo, gerar in tipos.items()}
+
+
+def medir(funcao, lista):
+    tempos = []
+    for termo in lista:
+        inicio = time.perf_counter()
+        funcao(termo)
+        tempos.append(time.perf_counter() - inicio)
+    tempos.sort()
+    return tempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clientes', type=int, default=1_000_000)
+    parser.add_argument('--consultas', type=int, default=300, help='Termos por tipo na busca indexada')
+    parser.add_argument('--consultas-antes', type=int, default=10, help='Termos por tipo na busca ingênua')
+    parser.add_argument('--postgres', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench-busca-') as diretorio:
+        preparar(diretorio, args.clientes, args.postgres)
+        import django
+        django.setup()
+        from django.db.models import Q
+
+        from app.busca import buscar_clientes
+        from app.models import Cliente, Estabelecimento
+
+        estabelecimento_id = Estabelecimento.objects.order_by('-pk').values_list('pk', flat=True).first()
+        sorteio = random.Random(1)
+        ids = Cliente.objects.filter(estabelecimento_id=estabelecimento_id).values_list('pk', flat=True)
+        amostra = list(Cliente.objects.filter(pk__in=sorteio.sample(list(ids), 2000)).select_related('carteira'))
+        por_tipo = termos(amostra, args.consultas, sorteio)
+
+        def ingenua(termo):
+            return list(Cliente.objects.filter(
+                Q(nome__icontains=termo) | Q(telefone__icontains=termo) | Q(email__icontains=termo)
+                | Q(carteira__endereco__startswith=termo),
+                estabelecimento_id=estabelecimento_id,
+            )[:10])
+
+        def indexada(termo):
+            return buscar_clientes(estabelecimento_id, termo)
+
+        # aquecimento: cache de páginas do banco e conexões
+        medir(indexada, [t for lista in por_tipo.values() for t in lista[:20]])
+
+        print(f'{"tipo":22} {"antes p50":>10} {"antes p95":>10} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+        todos = []
+        for tipo, lista in por_tipo.items():
+            antes = medir(ingenua, lista[:args.consultas_antes])
+            depois = medir(indexada, lista)
+            todos += depois
+            print(
+                f'{tipo:22} {statistics.median(antes) * 1000:10.1f} {antes[int(len(antes) * 0.95)] * 1000:10.1f} '
+                f'{statistics.median(depois) * 1000:8.2f} {depois[int(len(depois) * 0.95)] * 1000:8.2f} '
+                f'{depois[int(len(depois) * 0.99)] * 1000:8.2f}'
+            )
+        todos.sort()
+        print(
+            f'{"geral":22} {"":10} {"":10} {statistics.median(todos) * 1000:8.2f} '
+            f'{todos[int(len(todos) * 0.95)] * 1000:8.2f} {todos[int(len(todos) * 0.99)] * 1000:8.2f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,394 @@
+"""
+Carga e latência de todas as rotas de ``app/urls.py`` contra um servidor local.
+
+Sobe o gunicorn (sync, ou uvicorn com ``--asgi``) num banco SQLite temporário
+com dados do ``gerar_dados`` e dispara ``--requisicoes`` requisições por rota
+com ``--concorrencia`` clientes simultâneos. O crédito não sai da máquina: um
+thread do benchmark faz o papel do ``processar_creditos`` (confirma os jobs e
+grava o batimento dos signers), então nada de Node, chave ou RPC.
+
+Para cada rota: p50/p95/p99 em ms, requisições/s e erros; no fim, o RSS de cada
+worker do gunicorn. Com ``--saida`` o resultado vai para um JSON; com
+``--comparar`` o resultado é confrontado com um JSON anterior e o benchmark
+sai com código 1 se alguma rota piorou além de ``--limite`` (p95 maior ou
+vazão menor), o que serve de portão num deploy.
+
+Uma rota nova em app/urls.py sem entrada em ROTAS faz o benchmark falhar.
+
+Uso (na raiz do projeto, com gunicorn instalado):
+    python benchmarks/bench_carga.py --saida benchmarks/base.json
+    python benchmarks/bench_carga.py --comparar benchmarks/base.json --limite 0.2
+    python benchmarks/bench_carga.py --rotas clientes transacoes --concorrencia 32
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+
+def _json(corpo):
+    return json.dumps(corpo).encode(), {'Content-Type': 'application/json'}
+
+
+def _credito(contexto, indice):
+    return ('POST', '/creditar-moedas/', *_json({
+        'chave_privada': 'bench', 'carteira_destino': f'destino-{indice}', 'valor': 1,
+    }))
+
+
+def _lote(contexto, indice):
+    return ('POST', '/creditar-moedas/lote/', *_json({
+        'chave_privada': 'bench',
+        'destinos': [{'carteira_destino': f'lote-{indice}-{i}', 'valor': 1} for i in range(10)],
+    }))
+
+
+def _importacao(contexto, indice):
+    """Planilha pequena por requisição: 20 clientes novos e uma linha inválida (gera o CSV de erros)."""
+    linhas = ['nome;telefone;email'] + [
+        f'Importado {indice}-{i};11 9{indice % 10000:04d}-{i:04d};imp{indice}.{i}@bench.com' for i in range(20)
+    ] + ['Sem telefone valido;123;']
+    fronteira = 'bench-importacao'
+    corpo = (
+        f'--{fronteira}\r\nContent-Disposition: form-data; name="arquivo"; filename="clientes.csv"\r\n'
+        f'Content-Type: text/csv\r\n\r\n' + '\n'.join(linhas) + f'\r\n--{fronteira}--\r\n'
+    ).encode()
+    return ('POST', '/clientes/importar/', corpo, {
+        **contexto['staff'], 'Content-Type': f'multipart/form-data; boundary={fronteira}',
+    })
+
+
+def _staff(caminho):
+    # rotas de importação: só staff logado
+    return lambda contexto, indice: ('GET', next(contexto[caminho]), None, contexto['staff'])
+
+
+def _get_staff(caminho):
+    # exportação: só staff logado
+    return lambda contexto, indice: ('GET', caminho, None, contexto['staff'])
+
+
+def _get(caminho):
+    return lambda contexto, indice: ('GET', caminho, None, {})
+
+
+# nome da rota em app/urls.py -> (método, caminho, corpo, cabeçalhos) da requisição ``indice``
+ROTAS = {
+    'healthz': _get('/healthz/'),
+    'healthcheck': _get('/health/'),
+    'readyz': _get('/readyz/'),
+    'metrics': _get('/metrics/'),
+    'index': _get('/'),
+    'clientes': _get('/clientes/'),
+    'clientes_buscar': lambda contexto, indice: ('GET', f'/clientes/buscar/?q={next(contexto["termos"])}', None, {}),
+    'clientes_importar': _importacao,
+    'clientes_importar_status': _staff('status_importacao'),
+    'clientes_importar_erros': _staff('erros_importacao'),
+    'transacoes': _get('/transacoes/'),
+    'exportar_transacoes': _get_staff('/transacoes/exportar/?canal=pdv'),
+    'campanhas': _get('/campanhas/'),
+    'configuracoes': _get('/configuracoes/'),
+    'configuracoes_estabelecimento': _get('/configuracoes/estabelecimento/'),
+    'configuracoes_regra_padrao': _get('/configuracoes/regra-padrao/'),
+    'ajuda_home': _get('/ajuda/'),
+    'ajuda_guia': lambda contexto, indice: ('GET', f'/ajuda/{next(contexto["guias"])}/', None, {}),
+    'creditar_moedas': _credito,
+    'creditar_moedas_status': lambda contexto, indice: ('GET', next(contexto['status_credito']), None, {}),
+    'creditar_moedas_lote': _lote,
+    'creditar_moedas_lote_status': lambda contexto, indice: ('GET', next(contexto['status_lote']), None, {}),
+}
+
+
+def preparar_ambiente(diretorio, clientes, transacoes):
+    """Settings do benchmark: as do projeto, com banco, estáticos e logs temporários."""
+    (Path(diretorio) / 'bench_carga_settings.py').write_text(
+        'from settings.settings import *  # noqa\n'
+        f'DATABASES["default"]["NAME"] = {str(Path(diretorio) / "bench.sqlite3")!r}\n'
+        'STORAGES = {**STORAGES, "staticfiles": '
+        '{"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}}\n'
+        f'PRERENDER_ROOT = {str(Path(diretorio) / "prerender")!r}\n'
+        f'IMPORTACAO_DIR = {str(Path(diretorio) / "importacoes")!r}\n'
+        f'CACHES["versoes"]["LOCATION"] = {str(Path(diretorio) / "versoes")!r}\n'
+        # limites altos: o benchmark mede o custo do controle de admissão, sem ser recusado por ele
+        f'LIMITES_DB = {str(Path(diretorio) / "limites.sqlite3")!r}\n'
+        'CREDITO_TAXA = CREDITO_RAJADA = CREDITO_FILA_MAX = 10 ** 9\n'
+    )
+    ambiente = {
+        **os.environ,
+        'PYTHONPATH': os.pathsep.join([diretorio, str(RAIZ)]),
+        'DJANGO_SETTINGS_MODULE': 'bench_carga_settings',
+        'REQUEST_LOG_PATH': '',
+        'LOG_LEVEL': 'WARNING',
+    }
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'], cwd=RAIZ, env=ambiente, check=True)
+    subprocess.run(
+        [sys.executable, 'manage.py', 'gerar_dados', '--clientes', str(clientes), '--transacoes', str(transacoes),
+         '--seed', '1'],
+        cwd=RAIZ, env=ambiente, check=True, stdout=subprocess.DEVNULL,
+    )
+    subprocess.run(
+        [sys.executable, 'manage.py', 'prerender_ajuda'], cwd=RAIZ, env=ambiente, check=True, stdout=subprocess.DEVNULL,
+    )
+    return ambiente
+
+
+def signer_simulado(latencia, parar):
+    """Faz o papel do ``processar_creditos``: batimento dos signers e confirmação dos jobs."""
+    from django.db import close_old_connections
+    from django.utils import timezone
+
+    from app.health import BATIMENTO_SIGNER
+    from app.models import Batimento, CreditoJob
+
+    while not parar.is_set():
+        close_old_connections()
+        Batimento.objects.update_or_create(
+            nome=BATIMENTO_SIGNER, defaults={'detalhes': {'vivos': 1, 'total': 1, 'em_voo': 0}},
+        )
+        agora = timezone.now()
+        CreditoJob.objects.filter(
+            status=CreditoJob.Status.QUEUED, criado_em__lte=agora - datetime.timedelta(seconds=latencia),
+        ).update(status=CreditoJob.Status.CONFIRMED, signature='bench', chave_privada='', concluido_em=agora)
+        parar.wait(0.2)
+
+
+def requisitar(base, metodo, caminho, corpo, cabecalhos):
+    """``(segundos, status)``; o corpo é lido inteiro, como um navegador faria."""
+    pedido = urllib.request.Request(f'{base}{caminho}', data=corpo, headers=cabecalhos, method=metodo)
+    inicio = time.perf_counter()
+    try:
+        with urllib.request.urlopen(pedido, timeout=120) as resposta:
+            resposta.read()
+            status = resposta.status
+    except urllib.error.HTTPError as erro:
+        erro.read()
+        status = erro.code
+    except OSError:
+        status = 0
+    return time.perf_counter() - inicio, status
+
+
+def status_urls(base, rota, quantidade, chave='status_url', contexto=None):
+    """Jobs, lotes e importações criados antes da medição, para as rotas de status e de erros."""
+    urls = []
+    for indice in range(quantidade):
+        metodo, caminho, corpo, cabecalhos = ROTAS[rota](contexto or {}, 10 ** 6 + indice)
+        pedido = urllib.request.Request(f'{base}{caminho}', data=corpo, headers=cabecalhos, method=metodo)
+        with urllib.request.urlopen(pedido, timeout=30) as resposta:
+            # a importação responde em JSON Lines: o resumo é a última linha
+            urls.append(json.loads(resposta.read().splitlines()[-1])[chave])
+    return cycle(urls)
+
+
+def sessao_staff():
+    """Cookies de sessão e CSRF (com o cabeçalho) de um usuário staff, para as rotas de importação e exportação."""
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.utils.crypto import get_random_string
+
+    cliente = Client()
+    cliente.force_login(User.objects.get_or_create(username='bench', defaults={'is_staff': True})[0])
+    csrf = get_random_string(32)
+    return {'Cookie': f'sessionid={cliente.cookies["sessionid"].value}; csrftoken={csrf}', 'X-CSRFToken': csrf}
+
+
+def importacoes_na_fila(quantidade):
+    """Status de importações enfileiradas (planilha grande), gravadas direto no banco."""
+    from django.urls import reverse
+
+    from app.models import Estabelecimento, ImportacaoJob
+
+    estabelecimento = Estabelecimento.objects.order_by('pk').first()
+    return cycle([
+        reverse('clientes_importar_status', args=[
+            ImportacaoJob.objects.create(estabelecimento=estabelecimento, nome_arquivo='bench.csv').pk
+        ])
+        for _ in range(quantidade)
+    ])
+
+
+def rss_workers(pid_master):
+    """``{pid: MB}`` dos processos filhos do gunicorn (Linux, via /proc)."""
+    workers = {}
+    for entrada in Path('/proc').iterdir():
+        if not entrada.name.isdigit():
+            continue
+        try:
+            ppid = int((entrada / 'stat').read_text().rsplit(')', 1)[1].split()[1])
+            if ppid != pid_master:
+                continue
+            for linha in (entrada / 'status').read_text().splitlines():
+                if linha.startswith('VmRSS:'):
+                    workers[int(entrada.name)] = int(linha.split()[1]) / 1024
+        except (OSError, IndexError, ValueError):
+            continue
+    return workers
+
+
+def medir_rota(base, rota, contexto, requisicoes, concorrencia):
+    pedidos = [ROTAS[rota](contexto, indice) for indice in range(requisicoes)]
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(concorrencia) as executor:
+        resultados = list(executor.map(lambda pedido: requisitar(base, *pedido), pedidos))
+    total = time.perf_counter() - inicio
+    tempos = sorted(tempo for tempo, _ in resultados)
+    erros = sum(1 for _, status in resultados if not 200 <= status < 400)
+
+    def percentil(p):
+        return round(tempos[min(len(tempos) - 1, int(len(tempos) * p))] * 1000, 2)
+
+    return {
+        'requisicoes': requisicoes,
+        'p50_ms': round(statistics.median(tempos) * 1000, 2),
+        'p95_ms': percentil(0.95),
+        'p99_ms': percentil(0.99),
+        'rps': round(requisicoes / total, 1),
+        'erros': erros,
+    }
+
+
+def comparar(base, atual, limite, piso_ms):
+    """Rotas que pioraram além do ``limite`` (fração); diferenças abaixo de ``piso_ms`` são ruído."""
+    regressoes = []
+    for rota, novo in atual['rotas'].items():
+        antigo = base['rotas'].get(rota)
+        if antigo is None:
+            continue
+        if novo['p95_ms'] > antigo['p95_ms'] * (1 + limite) and novo['p95_ms'] - antigo['p95_ms'] > piso_ms:
+            regressoes.append(f'{rota}: p95 {antigo["p95_ms"]} -> {novo["p95_ms"]} ms')
+        if novo['rps'] < antigo['rps'] * (1 - limite):
+            regressoes.append(f'{rota}: vazão {antigo["rps"]} -> {novo["rps"]} req/s')
+        if novo['erros'] > antigo['erros']:
+            regressoes.append(f'{rota}: erros {antigo["erros"]} -> {novo["erros"]}')
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concorrencia', type=int, default=8, help='Clientes simultâneos por rota')
+    parser.add_argument('--requisicoes', type=int, default=200, help='Requisições por rota')
+    parser.add_argument('--workers', type=int, default=2, help='Workers do gunicorn')
+    parser.add_argument('--asgi', action='store_true', help='Workers uvicorn (settings.asgi) em vez de sync')
+    parser.add_argument('--rotas', nargs='*', help='Só estas rotas (nomes de app/urls.py)')
+    parser.add_argument('--clientes', type=int, default=300)
+    parser.add_argument('--transacoes', type=int, default=3000)
+    parser.add_argument('--latencia', type=float, default=1.0, help='Segundos até o signer simulado confirmar')
+    parser.add_argument('--porta', type=int, default=8766)
+    parser.add_argument('--saida', help='Grava o resultado neste JSON')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior')
+    parser.add_argument('--limite', type=float, default=0.15, help='Piora tolerada (0.15 = 15%%)')
+    parser.add_argument('--piso-ms', type=float, default=2.0, help='Diferença de p95 ignorada como ruído')
+    args = parser.parse_args()
+
+    base_json = json.loads(Path(args.comparar).read_text()) if args.comparar else None
+
+    with tempfile.TemporaryDirectory(prefix='bench-carga-') as diretorio:
+        ambiente = preparar_ambiente(diretorio, args.clientes, args.transacoes)
+        os.environ.update({chave: ambiente[chave] for chave in ('DJANGO_SETTINGS_MODULE', 'REQUEST_LOG_PATH')})
+        sys.path.insert(0, diretorio)
+        import django
+        django.setup()
+        from app.urls import urlpatterns
+        from app.views import GUIAS_AJUDA
+
+        faltando = {padrao.name for padrao in urlpatterns} - ROTAS.keys()
+        if faltando:
+            sys.exit(f'Rotas sem cenário em ROTAS: {", ".join(sorted(faltando))}')
+        rotas = args.rotas or list(ROTAS)
+
+        servidor_args = (
+            ['--worker-class', 'uvicorn_worker.UvicornWorker', 'settings.asgi:application'] if args.asgi
+            else ['--worker-class', 'sync', 'settings.wsgi:application']
+        )
+        servidor = subprocess.Popen(
+            ['gunicorn', '--bind', f'127.0.0.1:{args.porta}', '--workers', str(args.workers),
+             '--timeout', '120', *servidor_args],
+            cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        parar = threading.Event()
+        signer = threading.Thread(target=signer_simulado, args=(args.latencia, parar), daemon=True)
+        signer.start()
+        base = f'http://127.0.0.1:{args.porta}'
+        resultado = {
+            'meta': {
+                'data': datetime.datetime.now().isoformat(timespec='seconds'),
+                'modo': 'asgi' if args.asgi else 'sync',
+                'workers': args.workers,
+                'concorrencia': args.concorrencia,
+                'requisicoes': args.requisicoes,
+            },
+            'rotas': {},
+        }
+        try:
+            for _ in range(100):
+                if requisitar(base, 'GET', '/healthz/', None, {})[1] == 200:
+                    break
+                time.sleep(0.1)
+            contexto = {
+                'staff': sessao_staff(),
+                'guias': cycle(GUIAS_AJUDA),
+                'termos': cycle(('an', 'silva', 'ana+s', 'gab', '9123', 'souza', 'email', 'xyz')),
+                'status_credito': status_urls(base, 'creditar_moedas', 20),
+                'status_lote': status_urls(base, 'creditar_moedas_lote', 5),
+                'status_importacao': importacoes_na_fila(5),
+            }
+            contexto['erros_importacao'] = status_urls(base, 'clientes_importar', 5, 'erros_url', contexto)
+            print(
+                f'{len(rotas)} rotas x {args.requisicoes} requisições, {args.concorrencia} simultâneas, '
+                f'{args.workers} worker(s) {resultado["meta"]["modo"]}'
+            )
+            print(f'{"rota":30} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"req/s":>8} {"erros":>6}')
+            for rota in rotas:
+                # aquecimento: primeiros acessos (templates, conexões) fora da medição
+                medir_rota(base, rota, contexto, args.concorrencia, args.concorrencia)
+                medida = medir_rota(base, rota, contexto, args.requisicoes, args.concorrencia)
+                resultado['rotas'][rota] = medida
+                print(
+                    f'{rota:30} {medida["p50_ms"]:8.1f} {medida["p95_ms"]:8.1f} {medida["p99_ms"]:8.1f} '
+                    f'{medida["rps"]:8.1f} {medida["erros"]:6}'
+                )
+            resultado['rss_workers_mb'] = {
+                str(pid): round(mb, 1) for pid, mb in sorted(rss_workers(servidor.pid).items())
+            }
+            print('RSS por worker (MB): ' + ', '.join(
+                f'{pid}={mb}' for pid, mb in resultado['rss_workers_mb'].items()
+            ))
+        finally:
+            parar.set()
+            signer.join()
+            servidor.terminate()
+            servidor.wait()
+
+    if args.saida:
+        Path(args.saida).write_text(json.dumps(resultado, indent=2, ensure_ascii=False) + '\n')
+        print(f'Resultado gravado em {args.saida}')
+    if base_json is not None:
+        diferentes = [chave for chave, valor in resultado['meta'].items()
+                      if chave != 'data' and base_json['meta'].get(chave) != valor]
+        if diferentes:
+            print(f'Atenção: {args.comparar} foi medido com outro(a) {", ".join(diferentes)}')
+        regressoes = comparar(base_json, resultado, args.limite, args.piso_ms)
+        if regressoes:
+            print(f'Regressões acima de {args.limite:.0%} em relação a {args.comparar}:')
+            for regressao in regressoes:
+                print(f'  {regressao}')
+            sys.exit(1)
+        print(f'Sem regressões acima de {args.limite:.0%} em relação a {args.comparar}')
+
+
+if __name__ == '__main__':
+    main()
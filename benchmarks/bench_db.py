@@ -0,0 +1,133 @@
+"""
+Escritores concorrentes no banco: N processos gravando no ledger, cada
+gravação tratada como uma requisição (conexões liberadas no fim, como o
+Django faz ao terminar o request). A cada 5 gravações, 4 são lançamentos
+(``registrar_transacao``: UPDATE do saldo + INSERT) e 1 é um snapshot de
+saldo (``criar_snapshot``: leitura e depois escrita na mesma transação, o
+caso que dá "database is locked" no SQLite com BEGIN DEFERRED).
+
+Variantes:
+- SQLite como era (journal padrão, BEGIN DEFERRED, timeout de 5s) x SQLite
+  com as pragmas atuais (WAL, BEGIN IMMEDIATE, busy_timeout, synchronous=NORMAL);
+- com ``--postgres``: sem reuso de conexão x CONN_MAX_AGE x pool do psycopg,
+  usando DB_NAME/DB_USER/DB_PASSWORD/DB_HOST/DB_PORT do ambiente. Use um banco
+  descartável: o benchmark roda as migrations e grava dados nele.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_db.py --processos 8 --escritas 300
+    DB_NAME=toknid_bench python benchmarks/bench_db.py --postgres
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+def variantes(diretorio, postgres):
+    if postgres:
+        return {
+            'postgres sem reuso': ('postgresql', {'CONN_MAX_AGE': 0, 'OPTIONS': {'connect_timeout': 10}}),
+            'postgres CONN_MAX_AGE': ('postgresql', {'CONN_MAX_AGE': 60, 'OPTIONS': {'connect_timeout': 10}}),
+            'postgres pool': ('postgresql', {}),
+        }
+    return {
+        'sqlite antes': ('sqlite', {'NAME': str(Path(diretorio) / 'antes.sqlite3'), 'OPTIONS': {}}),
+        'sqlite WAL': ('sqlite', {'NAME': str(Path(diretorio) / 'wal.sqlite3')}),
+    }
+
+
+def preparar(diretorio, nome, engine, ajustes, clientes):
+    """Settings da variante (as do projeto + ``ajustes``), migrations e clientes."""
+    modulo = f'bench_db_{abs(hash(nome))}'
+    (Path(diretorio) / f'{modulo}.py').write_text(
+        'import json\n'
+        'from settings.settings import *  # noqa\n'
+        f'DATABASES["default"].update(json.loads({json.dumps(json.dumps(ajustes))}))\n'
+    )
+    ambiente = {
+        **os.environ,
+        'PYTHONPATH': os.pathsep.join([diretorio, str(RAIZ)]),
+        'DJANGO_SETTINGS_MODULE': modulo,
+        'DB_ENGINE': engine,
+        'DB_POOL': 'True',
+        'REQUEST_LOG_PATH': '',
+    }
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'], cwd=RAIZ, env=ambiente, check=True)
+    subprocess.run(
+        [sys.executable, 'manage.py', 'gerar_dados', '--clientes', str(clientes), '--transacoes', '0'],
+        cwd=RAIZ, env=ambiente, check=True, stdout=subprocess.DEVNULL,
+    )
+    return ambiente
+
+
+def escritor(ambiente, escritas, semente):
+    os.environ.update(ambiente)
+    sys.path[:0] = ambiente['PYTHONPATH'].split(os.pathsep)
+    import random
+
+    import django
+    django.setup()
+    from django.db import OperationalError, close_old_connections
+
+    from app.ledger import criar_snapshot, registrar_transacao
+    from app.models import Cliente, Transacao
+
+    sorteio = random.Random(semente)
+    clientes = list(Cliente.objects.only('id', 'estabelecimento_id', 'canal').order_by('-pk')[:200])
+    close_old_connections()
+    tempos, erros = [], 0
+    comeco = time.time()
+    for indice in range(escritas):
+        cliente = sorteio.choice(clientes)
+        inicio = time.perf_counter()
+        try:
+            if indice % 5 == 4:
+                criar_snapshot(cliente.pk)
+            else:
+                registrar_transacao(cliente, Transacao.Tipo.CREDITO, 10)
+        except OperationalError:
+            erros += 1
+        finally:
+            close_old_connections()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos, erros, comeco, time.time()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processos', type=int, default=8, help='Escritores simultâneos (workers)')
+    parser.add_argument('--escritas', type=int, default=300, help='Gravações por processo')
+    parser.add_argument('--clientes', type=int, default=200)
+    parser.add_argument('--postgres', action='store_true', help='Compara os modos de conexão do Postgres')
+    args = parser.parse_args()
+
+    contexto = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory(prefix='bench-db-') as diretorio:
+        print(f'{args.processos} processos x {args.escritas} gravações')
+        print(f'{"variante":22} {"escritas/s":>10} {"p50 ms":>8} {"p99 ms":>8} {"erros":>6}')
+        for nome, (engine, ajustes) in variantes(diretorio, args.postgres).items():
+            ambiente = preparar(diretorio, nome, engine, ajustes, args.clientes)
+            with contexto.Pool(args.processos) as pool:
+                resultados = pool.starmap(
+                    escritor, [(ambiente, args.escritas, semente) for semente in range(args.processos)],
+                )
+            # do primeiro lançamento ao último, sem contar a subida dos processos
+            total = max(r[3] for r in resultados) - min(r[2] for r in resultados)
+            tempos = sorted(t for r in resultados for t in r[0])
+            erros = sum(r[1] for r in resultados)
+            print(
+                f'{nome:22} {(len(tempos) - erros) / total:10.0f} '
+                f'{statistics.median(tempos) * 1000:8.1f} {tempos[int(len(tempos) * 0.99)] * 1000:8.1f} {erros:6}'
+            )
+
+
+if __name__ == '__main__':
+    main()
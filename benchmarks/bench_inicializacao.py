@@ -0,0 +1,126 @@
+"""
+Tempo de inicialização de um processo web: imports e aquecimento.
+
+Roda ``--execucoes`` vezes, cada uma num interpretador novo,
+``python -X importtime`` importando ``settings.wsgi`` e o URLconf (o que um
+worker do gunicorn carrega antes do primeiro request) e em seguida
+``aquecer(banco=False)`` de app/aquecimento.py. Mostra a mediana do tempo
+total de import, do aquecimento e dos pacotes que mais pesam (tempo próprio
+dos módulos, somado por pacote raiz). O tempo próprio de ``settings`` inclui o
+``django.setup()`` (registro dos apps e modelos), que roda no import do
+settings/wsgi.py.
+
+Com ``--saida`` o resultado vai para um JSON; com ``--comparar`` é
+confrontado com um JSON anterior e o benchmark sai com código 1 se o import
+total, o aquecimento ou algum pacote piorou além de ``--limite`` (e mais
+que ``--piso-ms``), como o bench_carga.py.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_inicializacao.py --saida benchmarks/inicializacao.json
+    python benchmarks/bench_inicializacao.py --comparar benchmarks/inicializacao.json
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+# Executado em cada interpretador novo; a última linha do stdout é o aquecimento
+PROGRAMA = (
+    'import json\n'
+    'import settings.wsgi, settings.urls\n'
+    'from app.aquecimento import aquecer\n'
+    'print(json.dumps(aquecer(banco=False)))\n'
+)
+
+
+def medir_execucao():
+    """``(import total em ms, ms por pacote raiz, aquecimento em ms)`` de um processo novo."""
+    ambiente = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'settings.settings'),
+        'REQUEST_LOG_PATH': '',
+        'LOG_LEVEL': 'WARNING',
+    }
+    processo = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROGRAMA],
+        cwd=RAIZ, env=ambiente, capture_output=True, text=True, check=True,
+    )
+    total = 0
+    por_pacote = defaultdict(float)
+    for linha in processo.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        proprio, cumulativo, modulo = linha.split(':', 1)[1].split('|')
+        if not modulo.startswith('  ', 1):
+            total += int(cumulativo)  # módulo importado no nível de cima: já inclui os de baixo
+        por_pacote[modulo.strip().split('.')[0]] += int(proprio)
+    aquecimento = json.loads(processo.stdout.strip().splitlines()[-1])
+    return total / 1000, {pacote: us / 1000 for pacote, us in por_pacote.items()}, aquecimento['segundos'] * 1000
+
+
+def comparar(base, atual, limite, piso_ms):
+    """Medidas que pioraram além do ``limite`` (fração); diferenças abaixo de ``piso_ms`` são ruído."""
+    pares = [('import total', base['import_ms'], atual['import_ms']),
+             ('aquecimento', base['aquecimento_ms'], atual['aquecimento_ms'])]
+    pares += [
+        (f'pacote {pacote}', base['pacotes_ms'].get(pacote, 0.0), ms) for pacote, ms in atual['pacotes_ms'].items()
+    ]
+    return [
+        f'{nome}: {antigo:.1f} -> {novo:.1f} ms'
+        for nome, antigo, novo in pares
+        if novo > antigo * (1 + limite) and novo - antigo > piso_ms
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--execucoes', type=int, default=5, help='Processos medidos (vale a mediana)')
+    parser.add_argument('--top', type=int, default=15, help='Pacotes mostrados')
+    parser.add_argument('--saida', help='Grava o resultado neste JSON')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior')
+    parser.add_argument('--limite', type=float, default=0.2, help='Piora tolerada (0.2 = 20%%)')
+    parser.add_argument('--piso-ms', type=float, default=20.0, help='Diferença ignorada como ruído')
+    args = parser.parse_args()
+
+    execucoes = [medir_execucao() for _ in range(args.execucoes)]
+    pacotes = {pacote for _, por_pacote, _ in execucoes for pacote in por_pacote}
+    resultado = {
+        'meta': {'data': datetime.datetime.now().isoformat(timespec='seconds'), 'python': sys.version.split()[0]},
+        'import_ms': round(statistics.median(total for total, _, _ in execucoes), 1),
+        'aquecimento_ms': round(statistics.median(aquecimento for _, _, aquecimento in execucoes), 1),
+        'pacotes_ms': dict(sorted(
+            ((pacote, round(statistics.median(p.get(pacote, 0.0) for _, p, _ in execucoes), 1)) for pacote in pacotes),
+            key=lambda item: -item[1],
+        )),
+    }
+
+    print(f'import (settings.wsgi + URLconf): {resultado["import_ms"]:.1f} ms')
+    print(f'aquecimento (rotas e templates):  {resultado["aquecimento_ms"]:.1f} ms')
+    print(f'{"pacote":30} {"ms":>8}')
+    for pacote, ms in list(resultado['pacotes_ms'].items())[:args.top]:
+        print(f'{pacote:30} {ms:8.1f}')
+
+    if args.saida:
+        Path(args.saida).write_text(json.dumps(resultado, indent=2, ensure_ascii=False) + '\n')
+        print(f'Resultado gravado em {args.saida}')
+    if args.comparar:
+        base = json.loads(Path(args.comparar).read_text())
+        regressoes = comparar(base, resultado, args.limite, args.piso_ms)
+        if regressoes:
+            print(f'Regressões acima de {args.limite:.0%} em relação a {args.comparar}:')
+            for regressao in regressoes:
+                print(f'  {regressao}')
+            sys.exit(1)
+        print(f'Sem regressões em relação a {args.comparar}')
+
+
+if __name__ == '__main__':
+    main()
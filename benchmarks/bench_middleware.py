@@ -0,0 +1,120 @@
+"""
+Overhead por requisição do DebugHostMiddleware: versão antiga (append em
+arquivo + print a cada requisição) contra a atual (fila do handler de logging).
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_middleware.py --requisicoes 20000
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings.settings')
+
+
+class MiddlewareAntigo:
+    """Cópia do comportamento anterior: makedirs, open/append e print por requisição."""
+
+    def __init__(self, get_response, log_path):
+        self.get_response = get_response
+        self.log_path = Path(log_path)
+
+    def __call__(self, request):
+        from django.conf import settings
+        os.makedirs(self.log_path.parent, exist_ok=True)
+        http_host = request.META.get('HTTP_HOST', '')
+        host = http_host.split(':')[0] if ':' in http_host else http_host
+        internal_hosts = ['127.0.0.1', 'localhost', 'web']
+        for internal_host in internal_hosts:
+            if internal_host not in settings.ALLOWED_HOSTS:
+                settings.ALLOWED_HOSTS.append(internal_host)
+        if request.path == '/health/' or host in internal_hosts or host.startswith('127.'):
+            if host and host not in settings.ALLOWED_HOSTS:
+                settings.ALLOWED_HOSTS.append(host)
+        with open(self.log_path, 'a') as f:
+            f.write(json.dumps({
+                'message': 'Host recebido na requisição (antes do CommonMiddleware)',
+                'data': {'HTTP_HOST': http_host, 'ALLOWED_HOSTS': list(settings.ALLOWED_HOSTS)},
+                'timestamp': int(time.time() * 1000),
+            }) + '\n')
+        print(f'DEBUG: HTTP_HOST={http_host}, ALLOWED_HOSTS={list(settings.ALLOWED_HOSTS)}', file=sys.stderr)
+        return self.get_response(request)
+
+
+def medir(middleware, requisicoes, total):
+    tempos = []
+    for i in range(total):
+        request = requisicoes[i % len(requisicoes)]
+        inicio = time.perf_counter_ns()
+        middleware(request)
+        tempos.append(time.perf_counter_ns() - inicio)
+    tempos.sort()
+    return {
+        'media_us': statistics.fmean(tempos) / 1000,
+        'p50_us': tempos[len(tempos) // 2] / 1000,
+        'p99_us': tempos[int(len(tempos) * 0.99)] / 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requisicoes', type=int, default=20000)
+    parser.add_argument('--amostragem', type=float, default=1.0, help='REQUEST_LOG_SAMPLE_RATE da versão atual')
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix='bench-middleware-')
+    os.environ['REQUEST_LOG_PATH'] = os.path.join(diretorio, 'requests.log')
+    os.environ['REQUEST_LOG_SAMPLE_RATE'] = str(args.amostragem)
+
+    import django
+    django.setup()
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+
+    from app.middleware import DebugHostMiddleware
+
+    def view(request):
+        return HttpResponse('ok')
+
+    fabrica = RequestFactory()
+    requisicoes = [
+        fabrica.get('/health/', HTTP_HOST='127.0.0.1:8000'),
+        fabrica.get('/', HTTP_HOST='localhost'),
+        fabrica.get('/clientes/', HTTP_HOST='web:8000'),
+    ]
+
+    antigo = MiddlewareAntigo(view, os.path.join(diretorio, 'debug.log'))
+    atual = DebugHostMiddleware(view)
+
+    # o print em stderr fazia parte do custo antigo; vai para /dev/null para não poluir a saída
+    stderr = sys.stderr
+    sys.stderr = open(os.devnull, 'w')
+    try:
+        resultado_antigo = medir(antigo, requisicoes, args.requisicoes)
+    finally:
+        sys.stderr.close()
+        sys.stderr = stderr
+    resultado_atual = medir(atual, requisicoes, args.requisicoes)
+    handler, = logging.getLogger('toknid.requisicoes').handlers
+    handler.parar_listener()
+    with open(os.environ['REQUEST_LOG_PATH'], encoding='utf-8') as arquivo:
+        gravados = sum(1 for _ in arquivo)
+
+    print(f'{args.requisicoes} requisições (amostragem {args.amostragem})')
+    print(f'{"":10} {"média µs":>10} {"p50 µs":>10} {"p99 µs":>10}')
+    for nome, r in (('antes', resultado_antigo), ('depois', resultado_atual)):
+        print(f'{nome:10} {r["media_us"]:10.2f} {r["p50_us"]:10.2f} {r["p99_us"]:10.2f}')
+    print(f'ganho na média: {resultado_antigo["media_us"] / resultado_atual["media_us"]:.1f}x')
+    print(f'log de requisições: {gravados} gravados, {handler.descartados} descartados')
+
+
+if __name__ == '__main__':
+    main()
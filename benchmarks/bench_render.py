@@ -0,0 +1,105 @@
+"""
+Tempo de renderização por view, sem e com o cache de renderização
+(loader em cache + fragmentos {% cache %} + páginas de ajuda pré-renderizadas).
+
+Usa um banco de teste temporário, populado com ``gerar_dados``.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_render.py --repeticoes 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings.settings')
+os.environ.setdefault('REQUEST_LOG_PATH', '')
+
+URLS = [
+    '/',
+    '/clientes/',
+    '/transacoes/',
+    '/campanhas/',
+    '/configuracoes/',
+    '/ajuda/',
+    '/ajuda/guias-rapidos/',
+    '/ajuda/cliente-nao-recebeu-moedas/',
+]
+
+
+def medir(cliente, url, repeticoes):
+    cliente.get(url)  # aquecimento (compila templates, enche caches)
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resposta = cliente.get(url)
+        tempos.append(time.perf_counter() - inicio)
+        assert resposta.status_code == 200, (url, resposta.status_code)
+    tempos.sort()
+    return statistics.fmean(tempos) * 1000, tempos[int(len(tempos) * 0.95)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticoes', type=int, default=200)
+    parser.add_argument('--clientes', type=int, default=300)
+    parser.add_argument('--transacoes', type=int, default=20000)
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    call_command('gerar_dados', clientes=args.clientes, transacoes=args.transacoes, seed=1, stdout=open(os.devnull, 'w'))
+    call_command('atualizar_metricas', sem_atraso=True, stdout=open(os.devnull, 'w'))
+
+    opcoes = settings.TEMPLATES[0]['OPTIONS']
+    sem_cache = [{
+        **settings.TEMPLATES[0],
+        'OPTIONS': {
+            **opcoes,
+            'loaders': ['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader'],
+        },
+    }]
+    cliente = Client(HTTP_HOST='localhost')
+    resultados = {}
+    # sem collectstatic não há manifest de estáticos com hash
+    override_settings(STORAGES={
+        **settings.STORAGES,
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    }).enable()
+    with override_settings(
+        TEMPLATES=sem_cache,
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+        PRERENDER_ROOT=tempfile.mkdtemp(prefix='bench-render-vazio-'),
+    ):
+        for url in URLS:
+            resultados[url] = [medir(cliente, url, args.repeticoes)]
+
+    with override_settings(PRERENDER_ROOT=tempfile.mkdtemp(prefix='bench-render-')):
+        call_command('prerender_ajuda', stdout=open(os.devnull, 'w'))
+        for url in URLS:
+            resultados[url].append(medir(cliente, url, args.repeticoes))
+
+    print(f'{args.repeticoes} requisições por view ({args.transacoes} transações no banco)')
+    print(f'{"view":38} {"sem cache ms (p95)":>20} {"com cache ms (p95)":>20} {"ganho":>7}')
+    for url, ((media_antes, p95_antes), (media_depois, p95_depois)) in resultados.items():
+        print(
+            f'{url:38} {media_antes:10.2f} ({p95_antes:6.2f}) {media_depois:10.2f} ({p95_depois:6.2f}) '
+            f'{media_antes / media_depois:6.1f}x'
+        )
+
+
+if __name__ == '__main__':
+    main()
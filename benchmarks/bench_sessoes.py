@@ -0,0 +1,99 @@
+"""
+Consultas SQL por request, por página e por SESSION_ENGINE (app/sessoes.py).
+
+Num banco SQLite temporário com dados do ``gerar_dados``, faz ``--repeticoes``
+GETs em cada página, como visitante (com um cookie de sessão qualquer, como
+o de quem já passou pelo admin) e logado no admin, e conta as consultas de
+cada request: total e quantas tocam ``django_session``. O engine ``db`` é o
+padrão do Django (o antes); ``cached_db`` e ``signed_cookies``, as opções.
+
+Uso (na raiz do projeto):
+    python benchmarks/bench_sessoes.py
+    python benchmarks/bench_sessoes.py --repeticoes 50
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+ENGINES = ('db', 'cached_db', 'signed_cookies')
+
+PAGINAS = ('/', '/clientes/', '/transacoes/', '/clientes/buscar/?q=ana', '/admin/', '/admin/app/cliente/')
+
+
+def preparar(diretorio):
+    (Path(diretorio) / 'bench_sessoes_settings.py').write_text(
+        'from settings.settings import *  # noqa\n'
+        f'DATABASES["default"]["NAME"] = {str(Path(diretorio) / "sessoes.sqlite3")!r}\n'
+        f'CACHES["sessoes"]["LOCATION"] = {str(Path(diretorio) / "sessoes")!r}\n'
+        'STORAGES = {**STORAGES, "staticfiles": '
+        '{"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}}\n'
+    )
+    ambiente = {
+        **os.environ,
+        'PYTHONPATH': os.pathsep.join([diretorio, str(RAIZ)]),
+        'DJANGO_SETTINGS_MODULE': 'bench_sessoes_settings',
+        'REQUEST_LOG_PATH': '',
+        'LOG_LEVEL': 'WARNING',
+    }
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'], cwd=RAIZ, env=ambiente, check=True)
+    subprocess.run(
+        [sys.executable, 'manage.py', 'gerar_dados', '--clientes', '2000', '--transacoes', '5000', '--seed', '1'],
+        cwd=RAIZ, env=ambiente, check=True, stdout=subprocess.DEVNULL,
+    )
+    os.environ.update(ambiente)
+    sys.path[:0] = [diretorio, str(RAIZ)]
+
+
+def medir(cliente, pagina, repeticoes):
+    """Média de consultas por request (total, em django_session), depois de um request de aquecimento."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    cliente.get(pagina)
+    with CaptureQueriesContext(connection) as capturadas:
+        for _ in range(repeticoes):
+            resposta = cliente.get(pagina)
+            assert resposta.status_code < 400, (pagina, resposta.status_code)
+    sessao = sum(1 for consulta in capturadas.captured_queries if 'django_session' in consulta['sql'])
+    return len(capturadas) / repeticoes, sessao / repeticoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticoes', type=int, default=20, help='Requests medidos por página')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench-sessoes-') as diretorio:
+        preparar(diretorio)
+        import django
+        django.setup()
+        from django.contrib.auth.models import User
+        from django.test import Client, override_settings
+
+        admin = User.objects.create_superuser('bench', 'bench@example.com', 'bench')
+        print(f'{"página":26} {"acesso":9} ' + ' '.join(f'{engine:>18}' for engine in ENGINES))
+        print(f'{"":26} {"":9} ' + ' '.join(f'{"consultas (sess.)":>18}' for _ in ENGINES))
+        for pagina in PAGINAS:
+            for acesso in ('visitante', 'admin'):
+                if acesso == 'visitante' and pagina.startswith('/admin/'):
+                    continue
+                colunas = []
+                for engine in ENGINES:
+                    with override_settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{engine}'):
+                        cliente = Client(HTTP_HOST='localhost')
+                        if acesso == 'admin':
+                            cliente.force_login(admin)
+                        else:
+                            cliente.cookies['sessionid'] = 'visitante' * 4
+                        total, sessao = medir(cliente, pagina, args.repeticoes)
+                    colunas.append(f'{total:9.1f} ({sessao:.1f})')
+                print(f'{pagina:26} {acesso:9} ' + ' '.join(f'{coluna:>18}' for coluna in colunas))
+
+
+if __name__ == '__main__':
+    main()
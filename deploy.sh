@@ -48,6 +48,10 @@ docker-compose -f docker-compose.prod.yml exec -T web python manage.py migrate -
 echo "📦 Coletando arquivos estáticos..."
 docker-compose -f docker-compose.prod.yml exec -T web python manage.py collectstatic --noinput
 
+# Pré-renderizar as páginas de ajuda (usam os nomes com hash dos estáticos)
+echo "📄 Pré-renderizando páginas de ajuda..."
+docker-compose -f docker-compose.prod.yml exec -T web python manage.py prerender_ajuda
+
 # Reiniciar web para aplicar mudanças
 echo "🔄 Reiniciando serviço web..."
 docker-compose -f docker-compose.prod.yml restart web
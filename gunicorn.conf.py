@@ -0,0 +1,56 @@
+"""
+Configuração do gunicorn (lida de ./gunicorn.conf.py; os docker-compose a passam
+com --config). Bind, workers, --max-requests e logs continuam na linha de
+comando; aqui ficam o preload e o aquecimento (app/aquecimento.py).
+
+GUNICORN_PRELOAD=True (padrão): o master importa o Django, o URLconf e
+compila rotas e templates uma vez; cada worker (inclusive os que substituem
+os reciclados pelo --max-requests) nasce de um fork já aquecido e só abre a
+conexão com o banco. Nada que não sobrevive a um fork fica aberto no master:
+as conexões são fechadas antes de cada fork, e threads (listeners de log,
+signer) e conexões do limite de taxa são criadas por processo, pelo pid.
+Os middlewares são instanciados no master: não guardam nada disso (o
+DebugHostMiddleware registra pelo logger a cada requisição).
+Com GUNICORN_PRELOAD=False cada worker carrega e aquece o app sozinho.
+"""
+import os
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+
+# os hooks do master leem o settings mesmo sem preload (métricas de workers encerrados)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings.settings')
+
+
+def when_ready(server):
+    # master, com o app já carregado (preload) e antes do primeiro fork
+    from app.instrumentacao import encerrar_processos_anteriores
+
+    encerrar_processos_anteriores()
+    if preload_app:
+        from app.aquecimento import aquecer
+
+        server.log.info('Aquecimento no master: %s', aquecer(banco=False))
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        from app.aquecimento import fechar_conexoes
+
+        fechar_conexoes()
+
+
+def post_worker_init(worker):
+    # no worker, antes de aceitar conexões
+    from app.aquecimento import abrir_conexoes, aquecer
+
+    if preload_app:
+        abrir_conexoes()
+    else:
+        worker.log.info('Aquecimento do worker %s: %s', worker.pid, aquecer())
+
+
+def child_exit(server, worker):
+    # master: as métricas do worker que saiu (reciclado ou morto) vão para encerrados.json
+    from app.instrumentacao import encerrar_processo
+
+    encerrar_processo(worker.pid)
@@ -13,4 +13,7 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings.settings')
 
-application = get_asgi_application()
+# Probes de saúde (/healthz/, /health/, /readyz/) respondidos antes do Django: app/health.py
+from app.health import FrenteASGI  # noqa: E402
+
+application = FrenteASGI(get_asgi_application())
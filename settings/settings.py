@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -54,8 +55,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.instrumentacao.InstrumentacaoMiddleware',  # Server-Timing, cProfile amostrado e /metrics/
     'django.middleware.security.SecurityMiddleware',
     'app.middleware.DebugHostMiddleware',  # Debug middleware para ALLOWED_HOSTS
+    'app.middleware.OtimizacaoRespostaMiddleware',  # ETag/304 e compressão brotli/gzip
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -68,31 +71,121 @@ ROOT_URLCONF = 'settings.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'app.instrumentacao.DjangoTemplatesMedidos',  # DjangoTemplates + tempo de render
         'DIRS': [ BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # templates compilados uma vez por processo (no runserver o autoreload limpa o cache)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'app.renderizacao.renderizacao',
             ],
         },
     },
 ]
 
+# Cache usado pelos {% cache %} dos templates (menu lateral e modais do base.html)
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'toknid'),
+        'TIMEOUT': 3600,
+    }
+}
+
+# Sessões (app/sessoes.py; só o /admin/ usa). SESSION_ENGINE: cached_db (padrão: lidas do cache
+# "sessoes", em arquivos compartilhados pelos workers, e gravadas também no banco), signed_cookies
+# (nada no servidor) ou db. As expiradas são apagadas em lotes de SESSION_LIMPEZA_LOTE pelo
+# processar_creditos ou por manage.py limpar_sessoes.
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.environ.get('SESSION_ENGINE', 'cached_db')
+SESSION_CACHE_ALIAS = 'sessoes'
+SESSION_CACHE_DIR = os.environ.get('SESSION_CACHE_DIR', str(BASE_DIR / 'logs' / 'sessoes'))
+SESSION_LIMPEZA_LOTE = int(os.environ.get('SESSION_LIMPEZA_LOTE', '1000'))
+CACHES['sessoes'] = {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': SESSION_CACHE_DIR,
+    'TIMEOUT': None,  # o cached_db grava cada sessão com a validade dela
+    'OPTIONS': {'MAX_ENTRIES': 10000},
+}
+
+# Entra na chave dos fragmentos em cache; troque a cada deploy que mude o base.html
+TEMPLATE_FRAGMENT_VERSION = os.environ.get('TEMPLATE_FRAGMENT_VERSION', '1')
+# Versão dos fragmentos trocada em tempo de execução (app/renderizacao.py): em arquivo, para valer em
+# todos os workers e no processar_creditos (o cache default é LocMem, um por processo)
+CACHES['versoes'] = {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': os.environ.get('VERSOES_CACHE_DIR', str(BASE_DIR / 'logs' / 'versoes')),
+    'TIMEOUT': None,
+}
+
+# Páginas de ajuda pré-renderizadas por manage.py prerender_ajuda
+PRERENDER_ROOT = BASE_DIR / 'prerender'
+
+# Compressão de HTML/JSON (app.middleware.OtimizacaoRespostaMiddleware);
+# brotli só é usado se o pacote estiver instalado
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', '5'))
+
 WSGI_APPLICATION = 'settings.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=sqlite (padrão) ou postgresql
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite').lower()
+
+if DB_ENGINE in ('postgres', 'postgresql'):
+    # Pool de conexões do psycopg 3 por processo; não convive com CONN_MAX_AGE,
+    # então sem pool as conexões ficam persistentes por DB_CONN_MAX_AGE segundos
+    DB_POOL = os.environ.get('DB_POOL', 'True') == 'True'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'toknid_d2_prd'),
+            'USER': os.environ.get('DB_USER', 'toknid_user'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': 10,
+                **({'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+                    'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+                    'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+                }} if DB_POOL else {}),
+            },
+        }
+    }
+else:
+    # SQLite com WAL: leitores não bloqueiam o escritor; transações pegam o lock
+    # de escrita já no BEGIN (IMMEDIATE) e esperam até busy_timeout em vez de
+    # falhar com "database is locked" na troca de leitura para escrita
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    f"PRAGMA busy_timeout={int(os.environ.get('SQLITE_BUSY_TIMEOUT', '20000'))};"
+                    'PRAGMA synchronous=NORMAL;'
+                    f"PRAGMA mmap_size={int(os.environ.get('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024)))};"
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -135,10 +228,23 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# collectstatic grava nomes com hash + manifest, CSS/JS minificados e cópias .gz/.br (app/storage.py)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'app.storage.ToknStaticStorage'},
+}
+
+# Classes/ids montados dinamicamente que a limpeza de CSS do collectstatic deve manter
+STATIC_CSS_SAFELIST = ()
+
 # Media files
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Scrape interno do Prometheus, em HTTP direto no web (web:8000/metrics/): fora do SECURE_SSL_REDIRECT.
+# O SecurityMiddleware compara com o path sem a barra inicial
+SECURE_REDIRECT_EXEMPT = [r'^metrics/$']
+
 # Security settings for production
 if not DEBUG:
     SECURE_SSL_REDIRECT = os.environ.get('SECURE_SSL_REDIRECT', 'False') == 'True'
@@ -159,7 +265,99 @@ CSRF_TRUSTED_ORIGINS = [
     if origin.strip() and (origin.strip().startswith('http://') or origin.strip().startswith('https://'))
 ] if csrf_origins else []
 
+# Pool de signers Node (app/signer.py)
+# Cada worker do gunicorn mantém SIGNER_POOL_SIZE processos Node persistentes
+SIGNER_POOL_SIZE = int(os.environ.get('SIGNER_POOL_SIZE', '2'))
+SIGNER_MAX_IN_FLIGHT = int(os.environ.get('SIGNER_MAX_IN_FLIGHT', '8'))
+SIGNER_TIMEOUT = int(os.environ.get('SIGNER_TIMEOUT', '60'))  # segundos
+SIGNER_HEALTHCHECK_INTERVAL = int(os.environ.get('SIGNER_HEALTHCHECK_INTERVAL', '30'))  # segundos
+
+# Probes (app/health.py): /healthz/ e /health/ respondidos antes do Django; /readyz/ com
+# resultado em cache por processo. O processar_creditos grava o batimento dos signers a cada
+# SIGNER_HEARTBEAT_INTERVAL e o readiness falha se ele ficar mais velho que SIGNER_HEARTBEAT_MAX_AGE.
+READINESS_CACHE_SECONDS = float(os.environ.get('READINESS_CACHE_SECONDS', '1'))
+READINESS_MAX_QUEUE = int(os.environ.get('READINESS_MAX_QUEUE', '1000'))  # jobs na fila
+SIGNER_HEARTBEAT_INTERVAL = int(os.environ.get('SIGNER_HEARTBEAT_INTERVAL', '10'))  # segundos
+SIGNER_HEARTBEAT_MAX_AGE = int(os.environ.get('SIGNER_HEARTBEAT_MAX_AGE', '30'))  # segundos
+
+# Créditos em lote (/creditar-moedas/lote/)
+CREDITO_LOTE_MAX_DESTINOS = int(os.environ.get('CREDITO_LOTE_MAX_DESTINOS', '5000'))  # por requisição
+CREDITO_LOTE_TAMANHO = int(os.environ.get('CREDITO_LOTE_TAMANHO', '200'))  # por reserva de worker
+
+# Controle de admissão dos créditos (app/limites.py): token bucket por carteira de origem
+# (CREDITO_TAXA requisições/s, rajada de CREDITO_RAJADA; 0 desliga) guardado em LIMITES_DB, um
+# SQLite local compartilhado pelos workers, e teto de jobs na fila (0 desliga); acima dele, 503
+CREDITO_TAXA = float(os.environ.get('CREDITO_TAXA', '5'))
+CREDITO_RAJADA = int(os.environ.get('CREDITO_RAJADA', '20'))
+CREDITO_FILA_MAX = int(os.environ.get('CREDITO_FILA_MAX', '20000'))  # jobs na fila
+CREDITO_FILA_RETRY_AFTER = int(os.environ.get('CREDITO_FILA_RETRY_AFTER', '5'))  # segundos
+LIMITES_DB = os.environ.get('LIMITES_DB', str(BASE_DIR / 'logs' / 'limites.sqlite3'))
+
+# Jobs em ``verificar`` (timeout do signer depois de assinar, app/fila.py): sem status na rede
+# passado este prazo do envio, o blockhash já expirou e o crédito falha (seguro para reenviar)
+CREDITO_VERIFICACAO_PRAZO = int(os.environ.get('CREDITO_VERIFICACAO_PRAZO', '300'))  # segundos
+
+# Idempotency-Key em /creditar-moedas/: por quanto tempo um resultado é reaproveitado
+IDEMPOTENCIA_TTL = int(os.environ.get('IDEMPOTENCIA_TTL', str(24 * 60 * 60)))  # segundos
+
+# Long-poll do status de crédito (?aguardar=, app/views.py): espera máxima sob ASGI (uvicorn),
+# espera sob WSGI (workers sync; cada segundo prende um worker, teto de 2s no código) e o
+# Retry-After das respostas WSGI de jobs ainda não terminados (segundos)
+LONG_POLL_MAX = float(os.environ.get('LONG_POLL_MAX', '25'))
+LONG_POLL_WSGI_MAX = float(os.environ.get('LONG_POLL_WSGI_MAX', '0'))
+LONG_POLL_RETRY_AFTER = int(os.environ.get('LONG_POLL_RETRY_AFTER', '2'))
+
+# Ledger de moedas (app/ledger.py): lançamentos por cliente entre dois snapshots de saldo
+LEDGER_SNAPSHOT_INTERVALO = int(os.environ.get('LEDGER_SNAPSHOT_INTERVALO', '500'))
+# Moedas lançadas no ledger por SOL creditado por um CreditoJob confirmado (app/fila.py);
+# o mesmo fator de MOEDAS_POR_SOL em static/app/js/clientes.js
+MOEDAS_POR_SOL = int(os.environ.get('MOEDAS_POR_SOL', '1000'))
+
+# Exportação de transações (/transacoes/exportar/): linhas lidas do cursor e enviadas por vez
+EXPORTACAO_CHUNK = int(os.environ.get('EXPORTACAO_CHUNK', '2000'))
+
+# Busca de clientes (/clientes/buscar/, app/busca.py): resultados por resposta (padrão e teto),
+# candidatos lidos do índice de trigramas antes de ordenar e tamanho mínimo do termo
+BUSCA_LIMITE = int(os.environ.get('BUSCA_LIMITE', '10'))
+BUSCA_LIMITE_MAX = int(os.environ.get('BUSCA_LIMITE_MAX', '20'))
+BUSCA_CANDIDATOS = int(os.environ.get('BUSCA_CANDIDATOS', '100'))
+BUSCA_MIN_CARACTERES = int(os.environ.get('BUSCA_MIN_CARACTERES', '2'))
+
+# Importação de clientes (/clientes/importar/ e manage.py importar_clientes, app/importacao.py):
+# linhas por transação/bulk_create, tamanho máximo do upload, até onde importa dentro da requisição
+# (acima disso vai para a fila do worker), quando uma importação parada volta para a fila e onde
+# ficam os uploads e os CSVs de erros
+IMPORTACAO_CHUNK = int(os.environ.get('IMPORTACAO_CHUNK', '1000'))
+IMPORTACAO_MAX_BYTES = int(os.environ.get('IMPORTACAO_MAX_BYTES', str(50 * 1024 * 1024)))  # 50 MB
+IMPORTACAO_SINCRONA_MAX_BYTES = int(os.environ.get('IMPORTACAO_SINCRONA_MAX_BYTES', str(1024 * 1024)))  # 1 MB
+IMPORTACAO_ORFA = int(os.environ.get('IMPORTACAO_ORFA', '600'))  # segundos
+IMPORTACAO_DIR = os.environ.get('IMPORTACAO_DIR', str(BASE_DIR / 'logs' / 'importacoes'))
+
+# Log estruturado de requisições (app/requestlog.py): logger toknid.requisicoes, com o seu
+# handler 'requisicoes' no LOGGING abaixo (vazio desliga)
+REQUEST_LOG_PATH = os.environ.get('REQUEST_LOG_PATH', str(BASE_DIR / 'logs' / 'requests.log'))
+REQUEST_LOG_SAMPLE_RATE = float(os.environ.get('REQUEST_LOG_SAMPLE_RATE', '1.0'))
+REQUEST_LOG_QUEUE_SIZE = int(os.environ.get('REQUEST_LOG_QUEUE_SIZE', '10000'))
+
+# Instrumentação (app/instrumentacao.py): cabeçalho Server-Timing (True, 'staff' ou False), cProfile
+# em uma fração PROFILE_SAMPLE_RATE dos requests síncronos (0 desliga) gravado em PROFILE_DIR, e
+# /metrics/, que soma os snapshots de todos os workers gravados em METRICAS_DIR (vazio: só o processo
+# que atendeu). METRICAS_DIR é só do serviço web: local ao container, não num volume compartilhado.
+SERVER_TIMING = {'True': True, 'False': False}.get(os.environ.get('SERVER_TIMING', 'False'), 'staff')
+METRICAS_DIR = os.environ.get('METRICAS_DIR', os.path.join(tempfile.gettempdir(), 'toknid-metricas'))
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', str(BASE_DIR / 'logs' / 'profiles'))
+
 # Logging configuration
+# Os loggers só enfileiram (app/log_handlers.py); um listener por worker grava arquivo e console.
+# Os arquivos não são rotacionados pelo Django: use o logrotate do host (ver Ver-Logs.md).
+# LOG_FORMAT: "text" (padrão) ou "json" (uma linha JSON por registro)
+# LOG_SAMPLE_RATE: fração dos registros abaixo de WARNING que é mantida (1.0 = todos)
+# LOG_QUEUE_SIZE: registros em memória antes de descartar (os descartes são contados e registrados)
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '1.0'))
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -168,29 +366,46 @@ LOGGING = {
             'format': '{levelname} {asctime} {module} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'app.log_handlers.JsonFormatter',
+        },
     },
     'handlers': {
-        'file': {
+        'fila': {
             'level': 'INFO',
-            'class': 'logging.handlers.RotatingFileHandler',
-            'filename': BASE_DIR / 'logs' / 'django.log',
-            'maxBytes': 1024 * 1024 * 10,  # 10 MB
-            'backupCount': 5,
-            'formatter': 'verbose',
+            '()': 'app.log_handlers.FilaHandler',
+            'arquivo': BASE_DIR / 'logs' / 'django.log',
+            'console': True,
+            'tamanho_fila': LOG_QUEUE_SIZE,
+            'taxa_amostragem': LOG_SAMPLE_RATE,
+            'formatter': 'json' if LOG_FORMAT == 'json' else 'verbose',
         },
-        'console': {
+        # log de requisições: sempre JSON; a amostragem vale para INFO, os registros
+        # forçados (hosts recusados) saem como WARNING
+        'requisicoes': {
             'level': 'INFO',
-            'class': 'logging.StreamHandler',
-            'formatter': 'verbose',
+            '()': 'app.log_handlers.FilaHandler',
+            'arquivo': REQUEST_LOG_PATH or None,
+            'console': False,
+            'tamanho_fila': REQUEST_LOG_QUEUE_SIZE,
+            'taxa_amostragem': REQUEST_LOG_SAMPLE_RATE,
+            'formatter': 'json',
+        } if REQUEST_LOG_PATH else {
+            'class': 'logging.NullHandler',
         },
     },
     'root': {
-        'handlers': ['file', 'console'],
+        'handlers': ['fila'],
         'level': 'INFO',
     },
     'loggers': {
         'django': {
-            'handlers': ['file', 'console'],
+            'handlers': ['fila'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'toknid.requisicoes': {
+            'handlers': ['requisicoes'],
             'level': 'INFO',
             'propagate': False,
         },
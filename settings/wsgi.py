@@ -13,4 +13,7 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings.settings')
 
-application = get_wsgi_application()
+# Probes de saúde (/healthz/, /health/, /readyz/) respondidos antes do Django: app/health.py
+from app.health import FrenteWSGI  # noqa: E402
+
+application = FrenteWSGI(get_wsgi_application())